@@ -120,20 +120,40 @@ class BaseEnum(object):
     re-used more easily outside of a capability container as needed.
     """
     
+    @classmethod
+    def _enum_cache(cls):
+        """
+        Return the (values, value dict, value set) of this enum, computed once
+        per class. The cache is looked up in the class' own __dict__ so every
+        subclass computes its own values. The value set is None if any value
+        is unhashable.
+        """
+        cache = cls.__dict__.get('__enum_cache__')
+        if cache is None:
+            result = {}
+            values = []
+            for attr in dir(cls):
+                value = getattr(cls, attr)
+                if not callable(value) and not attr.startswith('__'):
+                    result[attr] = value
+                    values.append(value)
+            try:
+                value_set = frozenset(values)
+            except TypeError:
+                value_set = None
+            cache = (tuple(values), result, value_set)
+            cls.__enum_cache__ = cache
+        return cache
+
     @classmethod
     def list(cls):
         """List the values of this enum."""
-        return [getattr(cls,attr) for attr in dir(cls) if\
-                not callable(getattr(cls,attr)) and not attr.startswith('__')]
+        return list(cls._enum_cache()[0])
 
     @classmethod
     def dict(cls):
         """Return a dict representation of this enum."""
-        result = {}
-        for attr in dir(cls):
-            if not callable(getattr(cls,attr)) and not attr.startswith('__'):
-                result[attr] = getattr(cls,attr)
-        return result
+        return dict(cls._enum_cache()[1])
 
     @classmethod
     def has(cls, item):
@@ -148,7 +168,13 @@ class BaseEnum(object):
         @retval True if one of the class attributes has value item, false
         otherwise.
         """
-        return item in cls.list()
+        values, _, value_set = cls._enum_cache()
+        if value_set is not None:
+            try:
+                return item in value_set
+            except TypeError:
+                pass
+        return item in values
 
 class EventKey(BaseEnum):
     """Keys to the event dictionary fields as used by the InstrumentProtocol
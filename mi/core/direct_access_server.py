@@ -8,6 +8,7 @@ from mi.core.exceptions import NotImplementedException, InstrumentException
 
 import time
 import gevent
+import gevent.socket
 import uuid
 import errno
 import sys
@@ -76,8 +77,13 @@ class TcpServer(object):
     PORT_RANGE_UPPER = 8010
     close_reason = SessionCloseReasons.client_closed
     activity_seen = False
+    last_activity = None
     server_ready_to_send = False
     stop_server = False
+    connection_socket = None
+    # server greenlet is blocked on a socket and can be woken by stop()
+    waiting = False
+    RECV_BUFFER_SIZE = 65536
 
     def __init__(self, input_callback=None, ip_address=None):
         log.debug("TcpServer.__init__(): IP address = %s" %ip_address)
@@ -113,6 +119,7 @@ class TcpServer(object):
 
         # create token for login verification of telnet 
         self.token = str(uuid.uuid4()).upper()
+        self.last_activity = time.time()
         
         log.debug("TcpServer.__init__(): starting server greenlet")
         self.server = gevent.spawn(self._server_greenlet)
@@ -125,7 +132,7 @@ class TcpServer(object):
 
 
     def any_activity(self):
-        # used by the timer greenlet to support the inactivity timeout detection
+        # reports whether there was activity since the last call, last_activity holds the time of the latest
         if self.activity_seen:
             # re-arm the activity detector
             self.activity_seen = False
@@ -143,6 +150,9 @@ class TcpServer(object):
         # set close reason in case it's not 'parent closed' so server can inform parent via callback
         self.close_reason = reason
         log.debug("TcpServer.stop(): stopping TCP server - reason = %s", SessionCloseReasons.string(self.close_reason))     
+        if self.waiting:
+            # server greenlet is blocked waiting on a socket, interrupt it so it sees the stop request
+            self.server.kill(ServerExitException("TcpServer: stop requested"), block=False)
             
 
     def send(self, data):
@@ -154,18 +164,30 @@ class TcpServer(object):
 
     # private methods
     
+    def _activity(self):
+        # record activity for the inactivity timeout
+        self.activity_seen = True
+        self.last_activity = time.time()
+
+
+    def _wait(self, method, *args):
+        # call a blocking socket method from the server greenlet; stop() interrupts the wait by raising
+        # ServerExitException in the greenlet
+        if self.stop_server:
+            self._exit_handler(self.close_reason)
+        self.waiting = True
+        try:
+            return method(*args)
+        finally:
+            self.waiting = False
+
+
     def _write(self, data):
-        # write data to tcp client
+        # write data to tcp client, waiting for the socket to become writable as needed
         log.debug("TcpServer._write(): data = " + str(data))
         if self.connection_socket:
-            self.activity_seen = True;
-            MSGLEN = len(data)
-            total_sent = 0
-            while total_sent < MSGLEN:
-                sent = self.connection_socket.send(data[total_sent:])
-                if sent == 0:
-                    raise RuntimeError("socket connection broken")
-                total_sent = total_sent + sent
+            self._activity()
+            self.connection_socket.sendall(data)
         else:
             log.warning("TcpServer._write(): no connection yet, can not write data")            
 
@@ -210,35 +232,26 @@ class TcpServer(object):
     def _get_data(self, timeout=None):
         # must be used by all servers that inherit this class to allow the server greenlet to detect that
         # server shut down is requested
+        # blocks until data is available, the timeout elapses (returns '') or a shut down is requested
         log.debug("TcpServer._get_data(): timeout = %s" %str(timeout))
-        start_time = time.time()
-        input_data = ''
-        
-        self.connection_socket.setblocking(0)   # just to be sure!
-        
-        while True:
-            try:
-                # this call must be non-blocking to let server check the stop_server flag
-                input_data = self.connection_socket.recv(1024)
-                if len(input_data) == 0:
-                    # one way that the socket can indicate that the client has closed the connection
-                    self._exit_handler(SessionCloseReasons.client_closed)
-                self.activity_seen = True;
-                return input_data
-            except gevent.socket.error, error:
-                if error.errno == errno.EAGAIN or error.errno == errno.EWOULDBLOCK:
-                    # exceptions that indicate that nothing is available to read
-                    if self.stop_server:
-                        self._exit_handler(self.close_reason)
-                    if timeout:
-                        # if a timeout was specified then check for if it has elapsed
-                        if ((time.time() - start_time) > timeout):
-                            return ''
-                    gevent.sleep(.1)
-                else:
-                    # some socket error condition other than 'nothing to read' so shut down server
-                    log.debug("TcpServer._get_data(): exception caught <%s>" %str(error))
-                    self._exit_handler(SessionCloseReasons.client_closed)
+        try:
+            if timeout:
+                self._wait(gevent.socket.wait_read, self.connection_socket.fileno(), timeout)
+            input_data = self._wait(self.connection_socket.recv, self.RECV_BUFFER_SIZE)
+        except gevent.socket.timeout:
+            return ''
+        except ServerExitException:
+            self._exit_handler(self.close_reason)
+        except gevent.socket.error, error:
+            # some socket error condition so shut down server
+            log.debug("TcpServer._get_data(): exception caught <%s>" %str(error))
+            self._exit_handler(SessionCloseReasons.client_closed)
+
+        if len(input_data) == 0:
+            # one way that the socket can indicate that the client has closed the connection
+            self._exit_handler(SessionCloseReasons.client_closed)
+        self._activity()
+        return input_data
 
                 
     def _readline(self, timeout=None):
@@ -292,31 +305,21 @@ class TcpServer(object):
         # handler for processing.  It expects the handler to raise an exception when it needs to quit,
         # but it will work correctly if it simply returns when done
         log.debug("TcpServer._server_greenlet(): started")
-        # set socket to timeout on blocking calls so accept() method will timeout to let server
-        # check the stop_server flag
-        self.server_socket.settimeout(1.0)
         self.server_socket.listen(1)
-        while True:
-            try:
-                self.connection_socket, address = self.server_socket.accept()
-                log.info("TcpServer._server_greenlet(): connection accepted from <%s>" %str(address))
-                # set socket to non-blocking so recv() will not block to let server 
-                # check the stop_server flag
-                self.connection_socket.setblocking(0)
-                break
-            except Exception as ex:
-                log.debug("TcpServer._server_greenlet(): exception caught while listening for connection <%s>" %str(ex))
-                if self.server_socket.timeout:
-                    # check to see if server shut down is requested
-                    if self.stop_server:
-                        self._notify_parent()
-                        return
-                else:
-                    # something is wrong with the tcp socket so shut down
-                    log.info("TcpServer._server_greenlet(): exception caught while listening for connection <%s>" %str(ex))
-                    self._indicate_server_stopping(SessionCloseReasons.socket_error)
-                    self._notify_parent()
-                    return
+        try:
+            # blocks until a client connects or stop() interrupts the wait
+            self.connection_socket, address = self._wait(self.server_socket.accept)
+            log.info("TcpServer._server_greenlet(): connection accepted from <%s>" %str(address))
+        except ServerExitException:
+            # server shut down was requested
+            self._notify_parent()
+            return
+        except Exception as ex:
+            # something is wrong with the tcp socket so shut down
+            log.info("TcpServer._server_greenlet(): exception caught while listening for connection <%s>" %str(ex))
+            self._indicate_server_stopping(SessionCloseReasons.socket_error)
+            self._notify_parent()
+            return
         # got a client connection so call handler to process it
         try:
             self._handler()
@@ -513,28 +516,28 @@ class DirectAccessServer(object):
         
 
     def _timer_greenlet(self, session_timeout, inactivity_timeout):
-        # implements session and inactivity timeouts
+        # implements session and inactivity timeouts, sleeping until the next deadline
         # do NOT add parent callback to this greenlet
         # ALL callbacks to the parent should be handled by the server greenlet
         log.debug("DirectAccessServer._timer_greenlet(): started - sessionTO=%d, inactivityTO=%d"
                   %(session_timeout, inactivity_timeout))
-        session_start_time = inactivity_start_time = time.time()
+        session_start_time = time.time()
+        session_deadline = session_start_time + session_timeout
         try:
             while True:
-                gevent.sleep(1)
+                # the inactivity deadline moves forward whenever the server sees activity
+                inactivity_deadline = max(self.server.last_activity, session_start_time) + inactivity_timeout
+                gevent.sleep(max(min(session_deadline, inactivity_deadline) - time.time(), 0))
                 timenow = time.time()
 
-                if ((timenow - session_start_time) > session_timeout):
+                if timenow >= session_deadline:
                     log.debug("DirectAccessServer._timer_greenlet(): session exceeded session timeout of %d seconds"
                               %session_timeout)
                     # indicate to the server that it should shut down; the server will inform the parent of the shutdown
                     self._stop(SessionCloseReasons.session_timeout)
                     break
 
-                if self.server.any_activity():
-                    # activity detected so reset the inactivity start time
-                    inactivity_start_time = time.time() 
-                elif ((timenow - inactivity_start_time) > inactivity_timeout):
+                if timenow - max(self.server.last_activity, session_start_time) >= inactivity_timeout:
                     log.debug("DirectAccessServer._timer_greenlet(): session exceeded inactivity timeout of %d seconds"
                               %inactivity_timeout)
                     # indicate to the server that it should shut down; the server will inform the parent of the shutdown
@@ -544,4 +547,3 @@ class DirectAccessServer(object):
             # to detect a kill() from the DA server
             pass
         log.debug("DirectAccessServer._timer_greenlet(): stopped ")
-                     
\ No newline at end of file
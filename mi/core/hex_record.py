@@ -0,0 +1,100 @@
+"""
+@package mi.core.hex_record
+@file mi/core/hex_record.py
+@brief Decoding of fixed width ASCII-hex records
+
+SAMI and SeaBird instruments write records as strings of ASCII-hex digits holding big endian, unsigned
+values of fixed width.  A HexRecordLayout converts a whole record with one unhexlify and unpacks all of
+its fields, including arrays, with one struct call, rather than converting each field with int(field, 16).
+The record checksum is verified from the same bytes.
+"""
+import binascii
+import struct
+from collections import namedtuple
+
+from mi.core.exceptions import SampleException
+
+# struct formats of the values by width in bytes, 3 byte values are unpacked as a byte and a short
+WIDTH_FORMATS = {1: 'B', 2: 'H', 3: 'BH', 4: 'I'}
+
+HexField = namedtuple('HexField', 'name, width, count')
+
+
+class HexRecord(dict):
+    """
+    The values of a decoded record keyed by field name, with the result of the record checksum,
+    None if the layout has no checksum.
+    """
+
+    def __init__(self, values, checksum_valid=None):
+        super(HexRecord, self).__init__(values)
+        self.checksum_valid = checksum_valid
+
+
+class HexRecordLayout(object):
+    """
+    A fixed width layout of an ASCII-hex record, compiled once into a struct.
+    """
+
+    def __init__(self, fields, checksum_start=None):
+        """
+        @param fields list of (name, width) or (name, width, count) tuples in record order.  width is the
+        number of bytes (2 hex digits each) of a value, 1 to 4.  Fields with a count are arrays, decoded
+        to a list of count values.  Fields named None are skipped.
+        @param checksum_start if set, the last byte of the record is a checksum, the low byte of the sum
+        of the record bytes from this offset up to the checksum
+        """
+        self.fields = [HexField(*field) if len(field) == 3 else HexField(field[0], field[1], None)
+                       for field in fields]
+        self.names = [field.name for field in self.fields if field.name is not None]
+        self.size = sum(field.width * (field.count or 1) for field in self.fields)
+        self.hex_length = self.size * 2
+        self.checksum_start = checksum_start
+
+        formats = []
+        # (name, index of the first value, count, width) of each named field
+        self._values = []
+        index = 0
+        for field in self.fields:
+            count = field.count or 1
+            if field.name is None:
+                formats.append('%dx' % (field.width * count))
+                continue
+            formats.append(WIDTH_FORMATS[field.width] * count)
+            self._values.append((field.name, index, field.count, field.width))
+            index += len(WIDTH_FORMATS[field.width]) * count
+
+        self._struct = struct.Struct('>' + ''.join(formats))
+
+    def decode(self, hex_string):
+        """
+        Decode a record.
+        @param hex_string the ASCII-hex digits of the record, exactly hex_length long
+        @retval HexRecord of the field values
+        @throws SampleException if the record is not ASCII-hex or of the wrong length
+        """
+        try:
+            data = binascii.unhexlify(hex_string)
+            values = self._struct.unpack(data)
+        except (TypeError, struct.error) as e:
+            raise SampleException('Unable to decode ASCII-hex record [%s]: %s' % (hex_string, e))
+
+        record = {}
+        for name, index, count, width in self._values:
+            if width == 3:
+                if count is None:
+                    record[name] = values[index] << 16 | values[index + 1]
+                else:
+                    end = index + 2 * count
+                    record[name] = [high << 16 | low for high, low in
+                                    zip(values[index:end:2], values[index + 1:end:2])]
+            elif count is None:
+                record[name] = values[index]
+            else:
+                record[name] = list(values[index:index + count])
+
+        checksum_valid = None
+        if self.checksum_start is not None:
+            checksum_valid = sum(bytearray(data[self.checksum_start:-1])) & 0xff == ord(data[-1])
+
+        return HexRecord(record, checksum_valid)
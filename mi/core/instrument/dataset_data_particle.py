@@ -398,6 +398,26 @@ class DataParticle(object):
         return {DataParticleKey.VALUE_ID: name,
                 DataParticleKey.VALUE: encoded_val}
 
+    def _encode_values(self, values):
+        """
+        Encode a whole record with the compiled ParticleSchema for this particle's stream, built
+        from the class _param_map and/or the preload definition.  Errors are stored in the queue.
+
+        :param values  the raw record, indexed by the schema fields
+        """
+        schemas = self.__class__.__dict__.get('_schemas')
+        if schemas is None:
+            schemas = self.__class__._schemas = {}
+
+        stream_name = self.data_particle_type()
+        schema = schemas.get(stream_name)
+        if schema is None:
+            # numpy and sqlite3 are only imported by particles encoded with a schema
+            from mi.core.instrument.particle_schema import get_compiler
+            schema = schemas[stream_name] = get_compiler().for_particle(self.__class__, stream_name)
+
+        return schema.encode(values, self._encoding_errors)
+
     def get_encoding_errors(self):
         """
         Return the encoding errors list
@@ -228,6 +228,7 @@ class InstrumentDriver(object):
         """
         self._send_event = event_callback
         self._test_mode = False
+        self._stream_filter = None
 
     #############################################################
     # Device connection interface.
@@ -241,6 +242,15 @@ class InstrumentDriver(object):
         """
         self._test_mode = True if mode else False
 
+    def set_stream_filter(self, stream_filter):
+        """
+        Set which particle streams are published, so particles of other streams
+        need not be built.
+        @param stream_filter callable taking a stream name and returning True if
+        the stream is published, or None if all streams are published
+        """
+        self._stream_filter = stream_filter
+
     def initialize(self, *args, **kwargs):
         """
         Initialize driver connection, bringing communications parameters
@@ -970,6 +980,7 @@ class SingleConnectionInstrumentDriver(InstrumentDriver):
 
     def _handler_inst_disconnected_connect(self, *args, **kwargs):
         self._build_protocol()
+        self._protocol.set_stream_filter(self._stream_filter)
         self.set_init_params({})
         self._protocol._connection = self._connection
 
@@ -35,17 +35,32 @@ class InstrumentFSM(object):
         self.states = states
         self.events = events
         self.state_handlers = {}
-        self.current_state = None
+        # per state dispatch maps of event -> handler, and the capability
+        # (non enter/exit) events handled in each state
+        self._dispatch = {}
+        self._state_events = {}
+        self._all_events = []
+        self._handlers = {}
+        self._current_state = None
         self.previous_state = None
         self.enter_event = enter_event
         self.exit_event = exit_event
 
+    @property
+    def current_state(self):
+        return self._current_state
+
+    @current_state.setter
+    def current_state(self, state):
+        self._current_state = state
+        self._handlers = self._dispatch.get(state, {})
+
     def get_current_state(self):
         """
         Return current state.
         """
 
-        return self.current_state
+        return self._current_state
 
     def add_handler(self, state, event, handler):
         """
@@ -63,6 +78,21 @@ class InstrumentFSM(object):
             return False
 
         self.state_handlers[(state, event)] = handler
+
+        handlers = self._dispatch.get(state)
+        if handlers is None:
+            handlers = self._dispatch[state] = {}
+            if state == self._current_state:
+                self._handlers = handlers
+        handlers[event] = handler
+
+        if event != self.enter_event and event != self.exit_event:
+            state_events = self._state_events.setdefault(state, [])
+            if event not in state_events:
+                state_events.append(event)
+            if event not in self._all_events:
+                self._all_events.append(event)
+
         return True
 
     def start(self, state, *args, **kwargs):
@@ -80,7 +110,7 @@ class InstrumentFSM(object):
             return False
 
         self.current_state = state
-        handler = self.state_handlers.get((state, self.enter_event), None)
+        handler = self._handlers.get(self.enter_event)
         if callable(handler):
             handler(*args, **kwargs)
         return True
@@ -97,7 +127,7 @@ class InstrumentFSM(object):
         @raises Any exception raised by the handlers.
         """
         if self.events.has(event):
-            handler = self.state_handlers.get((self.current_state, event), None)
+            handler = self._handlers.get(event)
             if callable(handler):
                 (next_state, result) = handler(*args, **kwargs)
             else:
@@ -125,12 +155,12 @@ class InstrumentFSM(object):
         @raises Any exception raised by the handlers.
         """
 
-        handler = self.state_handlers.get((self.current_state, self.exit_event), None)
+        handler = self._handlers.get(self.exit_event)
         if callable(handler):
             handler(*args, **kwargs)
-        self.previous_state = self.current_state
+        self.previous_state = self._current_state
         self.current_state = next_state
-        handler = self.state_handlers.get((self.current_state, self.enter_event), None)
+        handler = self._handlers.get(self.enter_event)
         if callable(handler):
             handler(*args, **kwargs)
 
@@ -140,19 +170,9 @@ class InstrumentFSM(object):
         @param current_state if true, return events handled in the current state only.
         @retval list of events handled.
         """
-        events = []
-        for (key, handler) in self.state_handlers.iteritems():
-            state = key[0]
-            event = key[1]
-            if not ((event == self.enter_event) or (event == self.exit_event)):
-                if current_state:
-                    if self.current_state == state:
-                        if event not in events:
-                            events.append(event)
-                else:
-                    if event not in events:
-                        events.append(event)
-        return events
+        if current_state:
+            return list(self._state_events.get(self._current_state, ()))
+        return list(self._all_events)
 
 
 class ThreadSafeFSM(InstrumentFSM):
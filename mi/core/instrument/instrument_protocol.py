@@ -19,7 +19,7 @@ from mi.core.log import get_logger, get_logging_metaclass
 
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
 from mi.core.common import BaseEnum, InstErrorCode
-from mi.core.instrument.data_particle import RawDataParticle
+from mi.core.instrument.data_particle import RawDataParticle, CommonDataParticleType
 from mi.core.instrument.instrument_driver import DriverConfigKey
 from mi.core.driver_scheduler import DriverScheduler
 from mi.core.driver_scheduler import DriverSchedulerConfigKey
@@ -91,6 +91,10 @@ class InstrumentProtocol(object):
         # Dictionary to store recently generated particles
         self._particle_dict = {}
 
+        # Predicate of the streams which are published, None if all are, and its results by stream
+        self._stream_filter = None
+        self._published_streams = {}
+
         # The spot to stash a configuration before going into direct access mode
         self._pre_direct_access_config = None
 
@@ -197,6 +201,28 @@ class InstrumentProtocol(object):
     def _got_chunk(self, data, timestamp):
         raise NotImplementedException()
 
+    def set_stream_filter(self, stream_filter):
+        """
+        Set which particle streams are published, particles of other streams need not be built
+        @param stream_filter callable taking a stream name and returning True if the stream is
+        published, or None if all streams are published
+        """
+        self._stream_filter = stream_filter
+        self._published_streams = {}
+
+    def _is_stream_published(self, stream_name):
+        """
+        @param stream_name name of a particle stream
+        @retval True if particles of the stream are published
+        """
+        if self._stream_filter is None:
+            return True
+
+        published = self._published_streams.get(stream_name)
+        if published is None:
+            published = self._published_streams[stream_name] = bool(self._stream_filter(stream_name))
+        return published
+
     def _get_param_result(self, param_list, expire_time):
         """
         return a dictionary of the parameters and values
@@ -259,13 +285,20 @@ class InstrumentProtocol(object):
                the other to notify parsed data.
 
         @retval dict of dicts {'parsed': parsed_sample, 'raw': raw_sample} if
-                the line can be parsed for a sample. Otherwise, None.
+                the line can be parsed for a sample. Otherwise, None. Samples
+                to be published to a stream which is not published are not
+                built and None is returned.
         @todo Figure out how the agent wants the results for a single poll
             and return them that way from here
         """
 
         if regex.match(line):
 
+            # particle types set per instance are only known once the particle is built
+            stream_name = particle_class._data_particle_type
+            if publish and stream_name is not None and not self._is_stream_published(stream_name):
+                return None
+
             particle = particle_class(line, port_timestamp=timestamp)
             parsed_sample = particle.generate()
 
@@ -1141,15 +1174,16 @@ class CommandResponseInstrumentProtocol(InstrumentProtocol):
 
     def publish_raw(self, port_agent_packet):
         """
-        Publish raw data
+        Publish raw data, unless the raw stream is not published
 
         :param port_agent_packet: raw data from instrument
         """
+        if not self._driver_event or not self._is_stream_published(CommonDataParticleType.RAW):
+            return
+
         particle = RawDataParticle(port_agent_packet.get_as_dict(),
                                    port_timestamp=port_agent_packet.get_timestamp())
-
-        if self._driver_event:
-            self._driver_event(DriverAsyncEvent.SAMPLE, particle.generate())
+        self._driver_event(DriverAsyncEvent.SAMPLE, particle.generate())
 
     def wait_for_particles(self, particle_classes, timeout=0):
         """
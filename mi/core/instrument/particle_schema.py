@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.particle_schema
+@file mi/core/instrument/particle_schema.py
+@brief Compiled per-stream particle encoders built from preload or particle class metadata
+
+A ParticleSchema replaces the per-value DataParticle._encode_value calls with a
+single compiled encoder per stream.  The encoder converts a whole record (tuple
+or dict) or a whole column set (one array per parameter) at once, checks
+integer values against the width of their preload value encoding and records
+encoding errors in the same {name: value} form as DataParticle.get_encoding_errors.
+
+The preload database is read from the path in the MI_PRELOAD environment variable, by
+default preload.db at the root of the source tree.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from mi.core.common import BaseEnum
+from mi.core.exceptions import SampleEncodingException
+from mi.core.instrument.data_particle import DataParticleKey
+from mi.core.log import get_logger
+
+log = get_logger()
+
+# The preload database, by default at the root of the source tree independent of the working directory
+PRELOAD_ENV = 'MI_PRELOAD'
+DEFAULT_PRELOAD = os.environ.get(PRELOAD_ENV, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))), 'preload.db'))
+
+# Preload helper items
+
+STREAM_SELECT = '''
+SELECT stream.name as name, parameter_id FROM stream JOIN stream_parameter ON stream.id=stream_id
+'''
+
+PARAMDEF_SELECT = """
+ select parameter.id, name, parameter_type.value, value_encoding.value
+ from parameter, value_encoding, parameter_type
+ where parameter_type_id=parameter_type.id and value_encoding_id=value_encoding.id
+"""
+
+ParameterDef = namedtuple('ParameterDef', 'id, name, parameter_type, value_encoding')
+StreamParam = namedtuple('Stream', 'name, parameter_id')
+
+
+def connect_preload(preload_path=DEFAULT_PRELOAD):
+    """
+    Open the preload database
+    @param preload_path path of the preload database
+    @retval sqlite3 connection to the database
+    @throws IOError if the database does not exist, rather than creating an empty one
+    """
+    import sqlite3
+
+    if not os.path.isfile(preload_path):
+        raise IOError('Preload database %s not found, set %s to its path' % (preload_path, PRELOAD_ENV))
+    return sqlite3.connect(preload_path)
+
+
+def load_paramdefs(conn):
+    log.debug('Loading Parameter Definitions')
+    c = conn.cursor()
+    c.execute(PARAMDEF_SELECT)
+    params = map(ParameterDef._make, c.fetchall())
+    return {x.id: x for x in params}
+
+
+def load_paramdicts(conn):
+    log.debug('Loading Streams')
+    c = conn.cursor()
+    c.execute(STREAM_SELECT)
+    stream_params = map(StreamParam._make, c.fetchall())
+    paramdict = {}
+    for each in stream_params:
+        paramdict.setdefault(each.name, []).append(each.parameter_id)
+    return paramdict
+
+
+class ValueEncoding(BaseEnum):
+    """
+    Preload value encodings
+    """
+    INT8 = 'int8'
+    INT16 = 'int16'
+    INT32 = 'int32'
+    INT64 = 'int64'
+    UINT8 = 'uint8'
+    UINT16 = 'uint16'
+    UINT32 = 'uint32'
+    UINT64 = 'uint64'
+    FLOAT32 = 'float32'
+    FLOAT64 = 'float64'
+    STRING = 'string'
+    STR = 'str'
+    OPAQUE = 'opaque'
+
+
+# Parameters which are supplied by the particle header or computed downstream,
+# never by a particle's values list
+HEADER_PARAMETERS = ('time', 'port_timestamp', 'driver_timestamp', 'internal_timestamp',
+                     'preferred_timestamp', 'ingestion_timestamp')
+SKIP_PARAMETER_TYPES = ('function', 'external')
+
+INTEGER_ENCODINGS = (ValueEncoding.INT8, ValueEncoding.INT16, ValueEncoding.INT32, ValueEncoding.INT64,
+                     ValueEncoding.UINT8, ValueEncoding.UINT16, ValueEncoding.UINT32, ValueEncoding.UINT64)
+FLOAT_ENCODINGS = (ValueEncoding.FLOAT32, ValueEncoding.FLOAT64)
+STRING_ENCODINGS = (ValueEncoding.STRING, ValueEncoding.STR)
+
+# values are converted at full precision (matching int()/float() in _encode_value),
+# the declared width is only used for range validation.  uint64 has no lossless
+# numpy conversion from signed input and is always converted element by element.
+CONVERSION_DTYPES = {enc: np.int64 for enc in INTEGER_ENCODINGS if enc != ValueEncoding.UINT64}
+CONVERSION_DTYPES.update({enc: np.float64 for enc in FLOAT_ENCODINGS})
+
+ENCODING_RANGES = {enc: (np.iinfo(enc).min, np.iinfo(enc).max) for enc in INTEGER_ENCODINGS}
+
+ENCODING_FUNCTIONS = {enc: int for enc in INTEGER_ENCODINGS}
+ENCODING_FUNCTIONS.update({enc: float for enc in FLOAT_ENCODINGS})
+ENCODING_FUNCTIONS.update({enc: str for enc in STRING_ENCODINGS})
+
+# class metadata encoding functions which can be converted a column at a time
+CLASS_ENCODINGS = {int: ValueEncoding.INT64, float: ValueEncoding.FLOAT64}
+
+
+class SchemaField(namedtuple('SchemaField', 'name, encoding_function, value_range, is_array, value_encoding, index')):
+    """
+    A single compiled parameter.  value_encoding is None for fields compiled
+    from class metadata with a custom encoding function.  index, if not None,
+    selects the raw value (or slice of values) for this field from a record.
+    """
+    def encode(self, value):
+        if self.is_array:
+            return [self.encoding_function(x) for x in value]
+        return self.encoding_function(value)
+
+    def in_range(self, value):
+        if self.value_range is None or value is None:
+            return True
+        vmin, vmax = self.value_range
+        if self.is_array:
+            return all(vmin <= x <= vmax for x in value)
+        return vmin <= value <= vmax
+
+
+class ParticleSchema(object):
+    """
+    Compiled encoder for one stream.
+    """
+    def __init__(self, stream_name, fields):
+        self.stream_name = stream_name
+        self.fields = tuple(fields)
+        self.names = tuple(f.name for f in self.fields)
+        self._functions = tuple(f.encode if f.is_array else f.encoding_function for f in self.fields)
+        self._ranged = tuple(i for i, f in enumerate(self.fields) if f.value_range is not None)
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+        indexes = tuple(f.index for f in self.fields)
+        self._indexes = indexes if self.fields and None not in indexes else None
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return 'ParticleSchema(%r, %r)' % (self.stream_name, self.names)
+
+    def select(self, names):
+        """
+        Return a schema for a subset of this schema's fields, in the order given.
+        Used to impose a particle's field order on a preload definition.
+        @throws SampleEncodingException if a name is not part of this schema
+        """
+        try:
+            return ParticleSchema(self.stream_name, [self.fields[self._index[name]] for name in names])
+        except KeyError as e:
+            raise SampleEncodingException('Parameter %s not defined for stream %s' % (e.args[0], self.stream_name))
+
+    def encode(self, values, errors=None):
+        """
+        Encode a whole record.  The fast path converts every field in a single
+        comprehension; only when that fails are the fields revisited one at a
+        time to find out which ones are bad.
+        @param values sequence of raw values in schema field order, or the raw record
+            if the schema fields carry indexes
+        @param errors optional list to which {name: value} errors are appended
+        @return list of {value_id, value} dictionaries
+        @throws SampleEncodingException if the number of values does not match the schema
+        """
+        if self._indexes is not None:
+            try:
+                values = [values[i] for i in self._indexes]
+            except (IndexError, TypeError):
+                raise SampleEncodingException('Stream %s record too short for schema' % self.stream_name)
+        elif len(values) != len(self.fields):
+            raise SampleEncodingException('Stream %s expects %d values, received %d' %
+                                          (self.stream_name, len(self.fields), len(values)))
+        try:
+            encoded = [f(v) for f, v in zip(self._functions, values)]
+        except Exception:
+            encoded = self._encode_slow(values, errors)
+
+        if self._ranged:
+            for i in self._ranged:
+                field = self.fields[i]
+                if not field.in_range(encoded[i]):
+                    self._record_error(errors, field.name, values[i])
+
+        return [{DataParticleKey.VALUE_ID: name, DataParticleKey.VALUE: value}
+                for name, value in zip(self.names, encoded)]
+
+    def encode_dict(self, values, errors=None):
+        """
+        Encode a record supplied as a dictionary keyed by parameter name.  Missing parameters encode as None.
+        """
+        return self.encode([values.get(name) for name in self.names], errors)
+
+    def encode_columns(self, columns):
+        """
+        Encode many records at once.
+        @param columns dictionary of parameter name to a sequence (or 2-D array for array parameters)
+            holding one entry per record
+        @return (records, errors) where records is a list holding a values list per record and errors
+            is a dictionary of record index to a list of {name: value} errors
+        @throws SampleEncodingException if the columns are missing a parameter or differ in length
+        """
+        missing = [name for name in self.names if name not in columns]
+        if missing:
+            raise SampleEncodingException('Stream %s columns missing parameters %r' % (self.stream_name, missing))
+
+        lengths = set(len(columns[name]) for name in self.names)
+        if len(lengths) > 1:
+            raise SampleEncodingException('Stream %s columns differ in length: %r' % (self.stream_name, lengths))
+        count = lengths.pop() if lengths else 0
+
+        errors = {}
+        encoded_columns = [self._encode_column(field, columns[field.name], errors) for field in self.fields]
+
+        records = [[{DataParticleKey.VALUE_ID: name, DataParticleKey.VALUE: value}
+                    for name, value in zip(self.names, row)]
+                   for row in zip(*encoded_columns)] if count else []
+
+        if errors:
+            log.error('Stream %s: %d of %d records had encoding errors', self.stream_name, len(errors), count)
+        return records, errors
+
+    def _encode_slow(self, values, errors):
+        encoded = []
+        failed = []
+        for field, value in zip(self.fields, values):
+            try:
+                encoded.append(field.encode(value))
+            except Exception:
+                encoded.append(None)
+                failed.append(field.name)
+                self._record_error(errors, field.name, value)
+        log.error('Data particle error encoding. Stream: %s Names: %r', self.stream_name, failed)
+        return encoded
+
+    def _encode_column(self, field, column, errors):
+        """
+        Convert one column.  Fields with a preload encoding are converted and range checked with numpy,
+        anything else (or a column numpy cannot convert) falls back to the field's encoding function.
+        """
+        dtype = CONVERSION_DTYPES.get(field.value_encoding)
+        if dtype is not None:
+            try:
+                source = np.asarray(column)
+                if source.dtype.kind not in 'biufSU':
+                    # mixed objects (e.g. None) would be silently coerced, leave them to the encoding function
+                    array = None
+                else:
+                    array = source.astype(dtype)
+                    # numpy silently truncates NaN/inf to an integer, int() does not
+                    if source.dtype.kind == 'f' and array.dtype.kind == 'i' and not np.isfinite(source).all():
+                        array = None
+            except (ValueError, TypeError, OverflowError):
+                array = None
+
+            if array is not None and (not field.is_array or array.ndim == 2):
+                if field.value_range is not None:
+                    vmin, vmax = field.value_range
+                    bad = (array < vmin) | (array > vmax)
+                    if field.is_array:
+                        bad = bad.any(axis=1)
+                    for index in np.flatnonzero(bad).tolist():
+                        self._record_error(errors.setdefault(index, []), field.name, column[index])
+                return array.tolist()
+
+        result = []
+        for index, value in enumerate(column):
+            try:
+                encoded = field.encode(value)
+            except Exception:
+                encoded = None
+                self._record_error(errors.setdefault(index, []), field.name, value)
+            else:
+                if not field.in_range(encoded):
+                    self._record_error(errors.setdefault(index, []), field.name, value)
+            result.append(encoded)
+        return result
+
+    @staticmethod
+    def _record_error(errors, name, value):
+        if errors is not None:
+            errors.append({name: value})
+
+
+def field_from_paramdef(paramdef):
+    """
+    Build a SchemaField from a preload ParameterDef
+    @return SchemaField or None if the parameter is not part of a particle's values
+    """
+    if paramdef.name in HEADER_PARAMETERS or paramdef.parameter_type in SKIP_PARAMETER_TYPES:
+        return None
+
+    is_array = paramdef.parameter_type.startswith('array')
+    encoding_function = ENCODING_FUNCTIONS.get(paramdef.value_encoding)
+    if encoding_function is None:
+        # opaque and other unhandled encodings are passed through untouched
+        encoding_function = lambda x: x
+
+    return SchemaField(paramdef.name, encoding_function, ENCODING_RANGES.get(paramdef.value_encoding),
+                       is_array, paramdef.value_encoding, None)
+
+
+def field_from_param_map(entry):
+    """
+    Build a SchemaField from a particle class metadata entry,
+    either (name, encoding_function) or (name, index, encoding_function)
+    """
+    name, encoding_function = entry[0], entry[-1]
+    index = entry[1] if len(entry) == 3 else None
+    return SchemaField(name, encoding_function, None, False, CLASS_ENCODINGS.get(encoding_function), index)
+
+
+class SchemaCompiler(object):
+    """
+    Builds and caches ParticleSchema objects.  Preload definitions are loaded
+    once, on first use, and each stream is compiled only once.
+    """
+    def __init__(self, preload_path=DEFAULT_PRELOAD):
+        self.preload_path = preload_path
+        self._parameters = None
+        self._streams = None
+        self._cache = {}
+
+    def _load_preload(self):
+        import sqlite3
+
+        try:
+            conn = connect_preload(self.preload_path)
+        except IOError as e:
+            log.warn('%s, values are not range checked', e)
+            self._parameters, self._streams = {}, {}
+            return
+
+        try:
+            self._parameters = load_paramdefs(conn)
+            self._streams = load_paramdicts(conn)
+        except sqlite3.DatabaseError:
+            log.warn('Unable to load preload definitions from %s', self.preload_path)
+            self._parameters, self._streams = {}, {}
+        finally:
+            conn.close()
+
+    def has_stream(self, stream_name):
+        if self._streams is None:
+            self._load_preload()
+        return stream_name in self._streams
+
+    def from_preload(self, stream_name, names=None):
+        """
+        Compile a schema from the preload definition of a stream
+        @param names optional parameter names, imposing particle field order (and subset)
+        @throws SampleEncodingException if preload does not define the stream
+        """
+        key = ('preload', stream_name, tuple(names) if names else None)
+        if key not in self._cache:
+            if not self.has_stream(stream_name):
+                raise SampleEncodingException('Stream %s not defined in preload' % stream_name)
+            paramdefs = sorted((self._parameters[pid] for pid in self._streams[stream_name]
+                                if pid in self._parameters), key=lambda p: p.id)
+            fields = [f for f in map(field_from_paramdef, paramdefs) if f is not None]
+            schema = ParticleSchema(stream_name, fields)
+            if names:
+                schema = schema.select(names)
+            self._cache[key] = schema
+        return self._cache[key]
+
+    def from_param_map(self, stream_name, param_map):
+        """
+        Compile a schema from particle class metadata
+        @param param_map list of (name, encoding_function) or (name, index, encoding_function)
+        """
+        key = ('class', stream_name, id(param_map))
+        if key not in self._cache:
+            self._cache[key] = ParticleSchema(stream_name, map(field_from_param_map, param_map))
+        return self._cache[key]
+
+    def for_particle(self, particle_class, stream_name=None):
+        """
+        Compile the schema for a particle class.  Class metadata (_param_map)
+        defines the field order and encoding functions; where preload covers
+        the stream the preload value encodings replace the generic int/float
+        conversions so that range validation applies.
+        """
+        stream_name = stream_name or particle_class._data_particle_type
+        param_map = getattr(particle_class, '_param_map', None)
+
+        if param_map is None:
+            return self.from_preload(stream_name)
+
+        schema = self.from_param_map(stream_name, param_map)
+        if not self.has_stream(stream_name):
+            return schema
+
+        key = ('merged', stream_name, id(param_map))
+        if key not in self._cache:
+            preload = {f.name: f for f in self.from_preload(stream_name).fields}
+            fields = []
+            for field in schema.fields:
+                preload_field = preload.get(field.name)
+                if preload_field is not None and field.value_encoding is not None \
+                        and not preload_field.is_array \
+                        and preload_field.encoding_function is field.encoding_function:
+                    field = preload_field._replace(index=field.index)
+                fields.append(field)
+            self._cache[key] = ParticleSchema(stream_name, fields)
+        return self._cache[key]
+
+
+_compiler = None
+
+
+def get_compiler():
+    """
+    Return the shared SchemaCompiler, reading the default preload database
+    """
+    global _compiler
+    if _compiler is None:
+        _compiler = SchemaCompiler()
+    return _compiler
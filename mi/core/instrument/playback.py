@@ -6,27 +6,44 @@
 @brief Playback process using ZMQ messaging.
 
 Usage:
-    playback datalog <module> <refdes> <event_url> <particle_url> [--allowed=<particles>]  [--max_events=<events>] <files>...
-    playback ascii <module> <refdes> <event_url> <particle_url> [--allowed=<particles>] [--max_events=<events>] <files>...
-    playback chunky <module> <refdes> <event_url> <particle_url> [--allowed=<particles>] [--max_events=<events>] <files>...
+    playback datalog <module> <refdes> <event_url> <particle_url> [--allowed=<particles>]  [--max_events=<events>] [--workers=<workers>] [--ordering=<ordering>] <files>...
+    playback ascii <module> <refdes> <event_url> <particle_url> [--allowed=<particles>] [--max_events=<events>] [--workers=<workers>] [--ordering=<ordering>] <files>...
+    playback chunky <module> <refdes> <event_url> <particle_url> [--allowed=<particles>] [--max_events=<events>] [--workers=<workers>] [--ordering=<ordering>] <files>...
     playback zplsc <module> <refdes> <event_url> <particle_url> [--allowed=<particles>] [--max_events=<events>] <files>...
 
 Options:
     -h, --help          Show this screen
     --allowed=<particles> Comma-separated list of publishable particles
+    --workers=<workers>    Number of worker processes the files are sharded across [default: 1]
+    --ordering=<ordering>  Order of the published events when sharded, file or time [default: file]
+
+    With more than one worker the sorted files are split into contiguous shards of about equal size, each played
+    back through its own protocol instance in a worker process.  The events of the shards are merged before
+    publishing, either in file order, the order of a serial playback, or in time order, merged by particle
+    timestamp.  Both orderings are deterministic for a given number of workers.  Each worker but the first plays
+    back the last file of the previous shard before its own, discarding the events, so a record split across the
+    files at a shard boundary is completed as in a serial playback.
 
     To run without installing:
     python -m mi.core.instrument.playback ...
 """
+import cPickle as pickle
 import glob
+import heapq
 import importlib
+import multiprocessing
+import shutil
 import sys
+import tempfile
 import time
 from datetime import datetime
+from Queue import Empty
 
 import os
 import re
 from docopt import docopt
+from mi.core.common import BaseEnum
+from mi.core.instrument.data_particle import CommonDataParticleType, DataParticleKey
 from mi.core.instrument.instrument_driver import DriverAsyncEvent
 from mi.core.instrument.instrument_protocol import \
     MenuInstrumentProtocol,\
@@ -47,6 +64,19 @@ DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?Z?$'
 DATE_MATCHER = re.compile(DATE_PATTERN)
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+# Number of events pickled together by the shard workers
+SHARD_CHUNK_EVENTS = 1000
+# Seconds between checks that the shard workers are alive while waiting for a file
+SHARD_POLL_INTERVAL = 1
+
+
+class PlaybackOrdering(BaseEnum):
+    """
+    Order of the published events of a sharded playback
+    """
+    FILE = 'file'   # in the order of the files and of the packets within each file, as a serial playback
+    TIME = 'time'   # merged by particle timestamp, events without one stay with the following particle
+
 
 def string_to_ntp_date_time(datestr):
     """
@@ -123,22 +153,216 @@ class PlaybackPacket(Packet):
                     return packet
 
 
+def build_event(event_type, val=None):
+    """
+    Construct an asynchronous driver event
+    @param event_type a DriverAsyncEvent type specifier.
+    @param val event value for sample and test result events.
+    @retval the event dictionary
+    """
+    event = {
+        'type': event_type,
+        'value': val,
+        'time': time.time()
+    }
+
+    if isinstance(event[EventKeys.VALUE], Exception):
+        event[EventKeys.VALUE] = encode_exception(event[EventKeys.VALUE])
+
+    return event
+
+
+def shard_files(files, shards):
+    """
+    Split files into contiguous shards of about equal total size
+    @param files sorted list of file paths
+    @param shards maximum number of shards
+    @retval list of the non-empty shards, each a list of file paths in the original order
+    """
+    sizes = [max(os.path.getsize(f), 1) for f in files]
+    total = float(sum(sizes))
+
+    result = [[] for _ in xrange(shards)]
+    position = 0
+    for f, size in zip(files, sizes):
+        # each file goes to the shard holding its midpoint, which keeps the shards contiguous
+        index = min(shards - 1, int((position + size / 2.0) / total * shards))
+        result[index].append(f)
+        position += size
+
+    return [shard for shard in result if shard]
+
+
+def event_timestamp(event):
+    """
+    @param event a driver event
+    @retval the preferred timestamp of a sample event, or None for other events
+    """
+    if event.get(EventKeys.TYPE) != DriverAsyncEvent.SAMPLE:
+        return None
+
+    value = event.get(EventKeys.VALUE) or {}
+    preferred = value.get(DataParticleKey.PREFERRED_TIMESTAMP, DataParticleKey.PORT_TIMESTAMP)
+    timestamp = value.get(preferred)
+    if timestamp is None:
+        timestamp = value.get(DataParticleKey.PORT_TIMESTAMP)
+    return timestamp
+
+
+def shard_file_path(work_dir, index):
+    """
+    @retval path of the events of the file with the given index in the work directory of a sharded playback
+    """
+    return os.path.join(work_dir, '%08d.pkl' % index)
+
+
+def read_shard_file(path):
+    """
+    Read the events a shard worker wrote for one file, deleting the file once read
+    @param path path of the pickled events
+    @retval generator of the events
+    """
+    with open(path, 'rb') as fh:
+        while True:
+            try:
+                chunk = pickle.load(fh)
+            except EOFError:
+                break
+            for event in chunk:
+                yield event
+    os.remove(path)
+
+
+class ShardWorker(object):
+    """
+    Plays back one shard of the files through its own protocol instance, in a worker process.
+
+    The protocol is first given the file preceding the shard, if any, so it holds the same partial record at the
+    start of the shard as in a serial playback.  The events of that file are discarded.
+
+    The events of each file are pickled to a file in the work directory, in chunks of SHARD_CHUNK_EVENTS.  Once a
+    file has been played back its index is put on the done queue, or None with the index if it could not be.
+    """
+    def __init__(self, module, reader_klass, stream_filter, files, first_index, work_dir, done_queue,
+                 prime_file=None):
+        self.module = module
+        self.reader_klass = reader_klass
+        self.stream_filter = stream_filter
+        self.files = files
+        self.first_index = first_index
+        self.work_dir = work_dir
+        self.done_queue = done_queue
+        self.prime_file = prime_file
+        self.protocol = None
+        self._events = []
+        self._fh = None
+
+    def run(self):
+        index = self.first_index
+        try:
+            module = importlib.import_module(self.module)
+            self.protocol = module.create_playback_protocol(self.handle_event)
+            if hasattr(self.protocol, 'set_stream_filter'):
+                self.protocol.set_stream_filter(self.stream_filter)
+
+            files = self.files if self.prime_file is None else [self.prime_file] + self.files
+            priming = self.prime_file is not None
+            reader = self.reader_klass(files, self.got_data)
+            for filename in reader.read():
+                if filename is not None:
+                    if priming:
+                        # events are discarded until the first file of the shard is opened
+                        priming = False
+                    else:
+                        if self._fh is not None:
+                            self.finish_file(index)
+                            index += 1
+                        self._fh = open(shard_file_path(self.work_dir, index), 'wb')
+                    if hasattr(self.protocol, 'got_filename'):
+                        self.protocol.got_filename(filename)
+
+            if self._fh is not None:
+                self.finish_file(index)
+                index += 1
+
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            log.exception(e)
+        finally:
+            # report the files which were not played back
+            for failed in xrange(index, self.first_index + len(self.files)):
+                self.done_queue.put((failed, False))
+
+    def finish_file(self, index):
+        self.write_events()
+        self._fh.close()
+        self._fh = None
+        self.done_queue.put((index, True))
+
+    def write_events(self):
+        if self._events:
+            pickle.dump(self._events, self._fh, pickle.HIGHEST_PROTOCOL)
+            self._events = []
+
+    def got_data(self, packet):
+        try:
+            self.protocol.got_data(packet)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            log.exception(e)
+
+    def handle_event(self, event_type, val=None):
+        event = build_event(event_type, val)
+
+        if event[EventKeys.TYPE] == DriverAsyncEvent.ERROR:
+            log.error(event)
+
+        # events of the file preceding the shard
+        if self._fh is None:
+            return
+
+        if event[EventKeys.TYPE] == DriverAsyncEvent.SAMPLE and not self.stream_filter(
+                event[EventKeys.VALUE].get('stream_name')):
+            return
+
+        self._events.append(event)
+        if len(self._events) >= SHARD_CHUNK_EVENTS:
+            self.write_events()
+
+
 class PlaybackWrapper(object):
-    def __init__(self, module, refdes, event_url, particle_url, reader_klass, allowed, files, max_events, handler=None):
+    def __init__(self, module, refdes, event_url, particle_url, reader_klass, allowed, files, max_events, handler=None,
+                 workers=None, ordering=None):
         version = DriverWrapper.get_version(module)
         headers = {'sensor': refdes, 'deliveryType': 'streamed', 'version': version, 'module': module}
+        self.module = module
+        self.reader_klass = reader_klass
+        self.workers = workers if workers else 1
+        self.ordering = ordering if ordering else PlaybackOrdering.FILE
+        if not PlaybackOrdering.has(self.ordering):
+            raise ValueError('Unknown playback ordering: %r' % self.ordering)
         self.max_events = max_events
         self.event_publisher = Publisher.from_url(event_url, handler=handler, headers=headers)
         self.particle_publisher = Publisher.from_url(particle_url, handler=handler, headers=headers, allowed=allowed,
                                                      max_events=max_events)
         self.protocol = self.construct_protocol(module)
+        if hasattr(self.protocol, 'set_stream_filter'):
+            self.protocol.set_stream_filter(self.is_published)
         self.reader = reader_klass(files, self.got_data)
 
     def set_header_filename(self, filename):
+        # the source header is applied when publishing, the queued events are published with the previous one
+        self.flush()
         self.event_publisher.set_source(filename)
         self.particle_publisher.set_source(filename)
 
     def playback(self):
+        if self.workers > 1 and len(self.reader.files) > 1:
+            self.sharded_playback()
+            return
+
         for index, filename in enumerate(self.reader.read()):
             if filename is not None:
                 self.set_header_filename(filename)
@@ -151,6 +375,118 @@ class PlaybackWrapper(object):
         if hasattr(self.particle_publisher, 'write'):
             self.particle_publisher.write()
 
+    def sharded_playback(self):
+        """
+        Play back the files sharded across worker processes, publishing the merged events of the shards
+        """
+        shards = shard_files(self.reader.files, self.workers)
+        work_dir = tempfile.mkdtemp(prefix='playback_')
+        done_queue = multiprocessing.Queue()
+        self._done_files = {}
+        self._workers = []
+        log.info('Playing back %d files in %d shards, ordered by %s',
+                 len(self.reader.files), len(shards), self.ordering)
+
+        try:
+            streams = []
+            first_index = 0
+            prime_file = None
+            for shard in shards:
+                # the worker is forked, sharing the stream filter of the particle publisher
+                worker = ShardWorker(self.module, self.reader_klass, self.is_published, shard, first_index, work_dir,
+                                     done_queue, prime_file)
+                process = multiprocessing.Process(target=worker.run)
+                process.daemon = True
+                process.start()
+                self._workers.append(process)
+                streams.append(self.shard_events(work_dir, done_queue, len(streams), shard, first_index))
+                first_index += len(shard)
+                prime_file = shard[-1]
+
+            if self.ordering == PlaybackOrdering.TIME:
+                merged = (item[-2:] for item in heapq.merge(*[self.keyed_events(shard_index, stream)
+                                                               for shard_index, stream in enumerate(streams)]))
+            else:
+                merged = (item for stream in streams for item in stream)
+
+            filename = None
+            for index, (event_filename, event) in enumerate(merged):
+                if event_filename != filename:
+                    filename = event_filename
+                    self.set_header_filename(filename)
+                self.route_event(event)
+                if index % 1000 == 0:
+                    self.publish()
+
+        finally:
+            for process in self._workers:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        self.publish()
+        if hasattr(self.particle_publisher, 'write'):
+            self.particle_publisher.write()
+
+    def shard_events(self, work_dir, done_queue, shard_index, shard, first_index):
+        """
+        Events of one shard, read back from the work directory as its worker completes each file
+        @retval generator of tuples of the file name and the event
+        """
+        for index, filename in enumerate(shard, first_index):
+            if not self.wait_for_file(done_queue, shard_index, index):
+                log.error('Unable to play back: %r', filename)
+                continue
+
+            for event in read_shard_file(shard_file_path(work_dir, index)):
+                yield filename, event
+
+    def wait_for_file(self, done_queue, shard_index, index):
+        """
+        Wait until a worker has played back a file
+        @retval True if the events of the file were written, False if the worker failed
+        """
+        while index not in self._done_files:
+            try:
+                done_index, success = done_queue.get(timeout=SHARD_POLL_INTERVAL)
+                self._done_files[done_index] = success
+            except Empty:
+                process = self._workers[shard_index]
+                if not process.is_alive() and done_queue.empty():
+                    log.error('Playback worker exited with code %r', process.exitcode)
+                    self._done_files[index] = False
+
+        return self._done_files.pop(index)
+
+    @staticmethod
+    def keyed_events(shard_index, stream):
+        """
+        Key the events of a shard by particle timestamp for merging.  The order of the events of a shard is kept:
+        a particle older than a previous particle of the shard takes the timestamp of the previous one and events
+        without a timestamp take that of the following particle, or of the previous at the end of the shard.
+        Equal timestamps are ordered by shard, then by their order within the shard.
+        @retval generator of tuples of the timestamp, the shard index, the sequence number, the file name and the event
+        """
+        pending = []
+        timestamp = None
+        sequence = 0
+        for filename, event in stream:
+            pending.append((filename, event))
+            event_time = event_timestamp(event)
+            if event_time is None:
+                continue
+
+            timestamp = event_time if timestamp is None else max(timestamp, event_time)
+            for item in pending:
+                yield (timestamp, shard_index, sequence) + item
+                sequence += 1
+            pending = []
+
+        for item in pending:
+            yield (timestamp, shard_index, sequence) + item
+            sequence += 1
+
     def zplsc_playback(self):
         for index, filename in enumerate(self.reader.read()):
             if filename:
@@ -195,31 +531,46 @@ class PlaybackWrapper(object):
             while remaining >= publisher._max_events:
                 remaining = publisher.publish()
 
+    def flush(self):
+        """
+        Publish all queued events, including partial batches
+        """
+        for publisher in [self.event_publisher, self.particle_publisher]:
+            while publisher.publish():
+                pass
+
     def handle_event(self, event_type, val=None):
         """
         Construct and send an asynchronous driver event.
         @param event_type a DriverAsyncEvent type specifier.
         @param val event value for sample and test result events.
         """
-        event = {
-            'type': event_type,
-            'value': val,
-            'time': time.time()
-        }
-
-        if isinstance(event[EventKeys.VALUE], Exception):
-            event[EventKeys.VALUE] = encode_exception(event[EventKeys.VALUE])
+        event = build_event(event_type, val)
 
         if event[EventKeys.TYPE] == DriverAsyncEvent.ERROR:
             log.error(event)
 
+        self.route_event(event)
+
+    def route_event(self, event):
+        """
+        Queue an event with the particle or the event publisher
+        @param event the driver event
+        """
         if event[EventKeys.TYPE] == DriverAsyncEvent.SAMPLE:
-            if event[EventKeys.VALUE].get('stream_name') != 'raw':
-                # don't publish raw
+            if self.is_published(event[EventKeys.VALUE].get('stream_name')):
                 self.particle_publisher.enqueue(event)
         else:
             self.event_publisher.enqueue(event)
 
+    def is_published(self, stream_name):
+        """
+        Stream filter of the protocol, raw data is never published
+        @param stream_name name of a particle stream
+        @retval True if particles of the stream are published
+        """
+        return stream_name != CommonDataParticleType.RAW and self.particle_publisher.is_allowed(stream_name)
+
 
 class DatalogReader(object):
     def __init__(self, files, callback):
@@ -360,6 +711,8 @@ def main():
         max_events = Publisher.DEFAULT_MAX_EVENTS
     else:
         max_events = int(max_events)
+    workers = int(options.get('--workers') or 1)
+    ordering = options.get('--ordering')
 
     # when running with the profiler, files will be a string
     # coerce to list
@@ -380,7 +733,8 @@ def main():
     else:
         reader = None
 
-    wrapper = PlaybackWrapper(module, refdes, event_url, particle_url, reader, allowed, files, max_events)
+    wrapper = PlaybackWrapper(module, refdes, event_url, particle_url, reader, allowed, files, max_events,
+                              workers=workers, ordering=ordering)
     if zplsc_reader:
         wrapper.zplsc_playback()
     else:
@@ -12,7 +12,10 @@ __author__ = 'Edward Hunter'
 __license__ = 'Apache 2.0'
 
 import re
+import bisect
 import ntplib
+import sre_constants
+import sre_parse
 import time
 import yaml
 import pkg_resources
@@ -27,6 +30,68 @@ from mi.core.log import get_logger ; log = get_logger()
 EGG_PATH = "resource"
 DEFAULT_FILENAME = "strings.yml"
 
+# shortest literal worth indexing a parameter regex on
+MIN_ANCHOR_LENGTH = 2
+
+
+def _collect_literal_runs(items, runs):
+    """
+    Append to runs every run of consecutive literal characters which must
+    appear in any match of the parsed regex items.  Only mandatory
+    constructs are descended into: groups and repeats with a minimum count
+    of at least one.  Branches, optional repeats, classes etc. end a run.
+    """
+    run = []
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            run.append(unichr(av) if av > 255 else chr(av))
+            continue
+
+        if run:
+            runs.append(''.join(run))
+            run = []
+
+        if op == sre_constants.SUBPATTERN:
+            _collect_literal_runs(av[-1], runs)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            _collect_literal_runs(av[2], runs)
+
+    if run:
+        runs.append(''.join(run))
+
+
+def extract_anchor(pattern, regex_flags=0):
+    """
+    Find the longest literal string that every match of a regex must contain.
+    A line which does not contain the anchor can not match the regex, so the
+    anchor can be used to index parameters by the text of a response.
+    @param pattern The regex pattern string (or compiled regex)
+    @param regex_flags Flags the regex is compiled with
+    @retval The anchor string, or None if the regex has no usable anchor
+    """
+    if hasattr(pattern, 'pattern'):
+        regex_flags |= pattern.flags
+        pattern = pattern.pattern
+
+    try:
+        parsed = sre_parse.parse(pattern, regex_flags)
+    except (sre_constants.error, TypeError):
+        return None
+
+    # case insensitive literals can not be used as a case sensitive anchor
+    if (regex_flags | parsed.pattern.flags) & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+
+    runs = []
+    _collect_literal_runs(parsed, runs)
+    if not runs:
+        return None
+
+    anchor = max(runs, key=len)
+    if len(anchor) < MIN_ANCHOR_LENGTH:
+        return None
+    return anchor
+
 class ParameterDictType(BaseEnum):
     BOOL = "bool"
     INT = "int"
@@ -244,7 +309,8 @@ class RegexParameter(Parameter):
                  range=None,
                  type=None,
                  units=None,
-                 value_description=None):
+                 value_description=None,
+                 anchor=None):
         """
         Parameter value constructor.
         @param name The parameter name.
@@ -258,6 +324,8 @@ class RegexParameter(Parameter):
         @param value The parameter value (initializes to None).
         @param regex_flags Flags that should be passed to the regex in this
         parameter. Should comply with regex compile() interface (XORed flags).
+        @param anchor A literal string that every match of the regex contains,
+        used to index the parameter. Extracted from the regex if not supplied.
         @throws TypeError if regex flags are bad
         @see ProtocolParameterDict.add() for details of parameters
         """
@@ -287,6 +355,7 @@ class RegexParameter(Parameter):
 
         self.regex = re.compile(pattern, regex_flags)
         self.f_getval = f_getval
+        self.anchor = anchor if anchor else extract_anchor(pattern, regex_flags)
 
     def update(self, input):
         """
@@ -385,6 +454,93 @@ class FunctionParameter(Parameter):
         else:
             return False
 
+class ParameterIndex(object):
+    """
+    Index of the parameters in a dictionary by the literal anchor of their
+    regex. A single scan of the input with a combined regex of all anchors
+    finds which parameters could possibly match; only those (and parameters
+    without an anchor, which are always tried) are then updated.
+    """
+    def __init__(self, param_dict):
+        self.size = len(param_dict)
+        self.order = {}
+        self.anchors = {}
+        self.unindexed = []
+
+        for position, (name, param) in enumerate(param_dict.iteritems()):
+            self.order[name] = position
+            anchor = getattr(param, 'anchor', None)
+            if anchor:
+                self.anchors.setdefault(anchor, []).append(name)
+            else:
+                self.unindexed.append(name)
+
+        # a matched anchor implies the presence of every anchor it contains
+        self.implied = {}
+        for anchor in self.anchors:
+            self.implied[anchor] = [other for other in self.anchors if other in anchor]
+
+        # a zero width lookahead reports the longest anchor starting at every
+        # position, so overlapping anchors are not missed
+        self.regex = None
+        if self.anchors:
+            alternatives = sorted(self.anchors, key=len, reverse=True)
+            self.regex = re.compile('(?=(%s))' % '|'.join(re.escape(a) for a in alternatives))
+
+    def _names(self, anchors):
+        names = list(self.unindexed)
+        for anchor in anchors:
+            names.extend(self.anchors[anchor])
+        names.sort(key=self.order.__getitem__)
+        return names
+
+    def candidates(self, input):
+        """
+        @param input The string to be matched
+        @retval The names of all parameters which might match the input, in
+        dictionary order
+        """
+        if not isinstance(input, basestring):
+            input = str(input)
+
+        # without lines to locate the anchors in, a substring search for each
+        # anchor is cheaper than scanning with the combined regex
+        return self._names([anchor for anchor in self.anchors if anchor in input])
+
+    def line_candidates(self, lines, input, newline):
+        """
+        Scan a whole block once and return the candidate parameters for each line.
+        @param lines The block, already split on newline
+        @param input The unsplit block
+        @param newline The line separator
+        @retval A list, parallel to lines, of candidate names (None where there
+        are none)
+        """
+        starts = []
+        offset = 0
+        for line in lines:
+            starts.append(offset)
+            offset += len(line) + len(newline)
+
+        found = {}
+        if self.regex is not None:
+            for match in self.regex.finditer(input):
+                number = bisect.bisect_right(starts, match.start()) - 1
+                # an anchor spanning a line break can not match a single line
+                if match.end(1) <= starts[number] + len(lines[number]):
+                    found.setdefault(number, set()).update(self.implied[match.group(1)])
+
+        result = []
+        for number in xrange(len(lines)):
+            if number in found:
+                result.append(self._names(found[number]))
+            elif self.unindexed:
+                result.append(self.unindexed)
+            else:
+                result.append(None)
+        return result
+
+
 class ProtocolParameterDict(InstrumentDict):
     """
     Protocol parameter dictionary. Manages, matches and formats device
@@ -395,6 +551,15 @@ class ProtocolParameterDict(InstrumentDict):
         Constructor.
         """
         self._param_dict = {}
+        self._index = None
+
+    def _get_index(self):
+        """
+        Return the anchor index, rebuilding it if parameters have been added.
+        """
+        if self._index is None or self._index.size != len(self._param_dict):
+            self._index = ParameterIndex(self._param_dict)
+        return self._index
 
     def add(self,
             name,
@@ -421,7 +586,8 @@ class ProtocolParameterDict(InstrumentDict):
             units=None,
             regex_flags=0,
             value_description=None,
-            expiration=None):
+            expiration=None,
+            anchor=None):
         """
         Add a parameter object to the dictionary using a regex for extraction.
         @param name The parameter name.
@@ -459,6 +625,9 @@ class ProtocolParameterDict(InstrumentDict):
         @param expiration The amount of time in seconds before the value
         expires and should not be used. If set to None, the value is always
         valid. If set to 0, the value is never valid from the store.
+        @param anchor A literal string that every match of the pattern
+        contains, used to index the parameter. Extracted from the pattern if
+        not supplied.
         """
         val = RegexParameter(name, pattern, f_getval, f_format,
                              value=value,
@@ -481,9 +650,11 @@ class ProtocolParameterDict(InstrumentDict):
                              type=type,
                              regex_flags=regex_flags,
                              units=units,
-                             value_description=value_description)
+                             value_description=value_description,
+                             anchor=anchor)
 
         self._param_dict[name] = val
+        self._index = None
 
     def add_parameter(self, parameter):
         """
@@ -498,6 +669,7 @@ class ProtocolParameterDict(InstrumentDict):
             raise InstrumentParameterException(
                 "Invalid Parameter added! Attempting to add: %s" % parameter)
         self._param_dict[parameter.name] = parameter
+        self._index = None
 
     def get(self, name, timestamp=None):
         """
@@ -677,7 +849,8 @@ class ProtocolParameterDict(InstrumentDict):
         """
         hit_count = 0
         multi_mode = False
-        for (name, val) in self._param_dict.iteritems():
+        for name in self._get_index().candidates(input):
+            val = self._param_dict[name]
             if multi_mode == True and val.description.multi_match == False:
                 continue
             if val.update(input):
@@ -698,12 +871,33 @@ class ProtocolParameterDict(InstrumentDict):
         @retval A dict with the names and values that were updated
         """
         result = {}
-        for (name, val) in self._param_dict.iteritems():
-            update_result = val.update(input)
+        for name in self._get_index().candidates(input):
+            update_result = self._param_dict[name].update(input)
             if update_result:
                 result[name] = update_result
         return result
 
+    def update_lines(self, input, newline='\n'):
+        """
+        Update the dictionary from a multi-line response, equivalent to calling
+        update() with each line in turn. The response is scanned for parameter
+        anchors once and each line is only matched against the parameters
+        which could match it.
+        @param input The response block
+        @param newline The line separator
+        @retval A dict with the names of the parameters that were updated
+        """
+        result = {}
+        lines = input.split(newline)
+        candidates = self._get_index().line_candidates(lines, input, newline)
+        for line, names in zip(lines, candidates):
+            if names is None:
+                continue
+            for name in names:
+                if self._param_dict[name].update(line):
+                    result[name] = True
+        return result
+
     def update(self, input, target_params=None):
         """
         Update the dictionaray with a line input. Iterate through all objects
@@ -726,7 +920,7 @@ class ProtocolParameterDict(InstrumentDict):
         elif target_params and isinstance(target_params, list):
             params = target_params
         elif target_params is None:
-            params = self._param_dict.keys()
+            params = self._get_index().candidates(input)
         else:
             raise InstrumentParameterException("invalid target_params, must be name or list")
 
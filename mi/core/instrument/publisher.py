@@ -14,9 +14,10 @@ import time
 import urllib
 import urlparse
 from collections import deque
-from threading import Thread
+from threading import Event, Thread
 
 from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.core.instrument.publisher_spool import EventSpool
 from mi.logging import log
 
 
@@ -35,28 +36,107 @@ def extract_param(param, query):
 
 
 class Publisher(object):
+    """
+    Queues events and publishes them in batches from a background thread.
+
+    The thread publishes whenever a full batch is waiting, partial batches wait at most publish_interval.
+    The batch size starts at max_events and adapts to the measured publish latency: it doubles, up to
+    MAX_BATCH_EVENTS, while full batches publish in under half of TARGET_BATCH_LATENCY and falls back towards
+    max_events when they take longer than TARGET_BATCH_LATENCY.  After a failed publish the thread waits
+    publish_interval before retrying.
+
+    With a spool_dir, events are spilled to an EventSpool once spool_threshold events are queued in memory, for
+    example during a broker outage.  Newer events follow them into the spool until it has been replayed, in
+    order, into the in-memory queue as it drains.
+    """
     DEFAULT_MAX_EVENTS = 500
     DEFAULT_PUBLISH_INTERVAL = 5
+    MAX_BATCH_EVENTS = 20000
+    TARGET_BATCH_LATENCY = 1.0
+    RATE_WINDOW = 5
+    DEFAULT_SPOOL_THRESHOLD = 50000
     SOURCE = 'source'
 
-    def __init__(self, allowed, max_events=None, publish_interval=None):
+    def __init__(self, allowed, max_events=None, publish_interval=None, spool_dir=None, spool_threshold=None):
         self._allowed = allowed
         self._deque = deque()
         self._max_events = max_events if max_events else self.DEFAULT_MAX_EVENTS
         self._publish_interval = publish_interval if publish_interval else self.DEFAULT_PUBLISH_INTERVAL
+        self._batch_size = self._max_events
+        self._last_batch_failed = False
+        self._wakeup = Event()
+        self._thread = None
         self._running = False
         self._headers = {}
+        self._spool = EventSpool(spool_dir) if spool_dir else None
+        self._spool_threshold = spool_threshold if spool_threshold else self.DEFAULT_SPOOL_THRESHOLD
+
+        # counters
+        self.published = 0
+        self.filtered = 0
+        self.failed = 0
+        self.batch_latency = 0
+        self.events_per_second = 0
+        self._window_start = time.time()
+        self._window_count = 0
+
         log.info('Publisher: max_events: %d publish_interval: %d', self._max_events, self._publish_interval)
+        if self._spool:
+            log.info('Publisher: spooling to %s above %d events', spool_dir, self._spool_threshold)
 
     def _run(self):
         self._running = True
-        last_publish = time.time()
+        deadline = time.time() + self._publish_interval
         while self._running:
+            self._wakeup.clear()
             now = time.time()
-            if now > last_publish + self._publish_interval:
-                last_publish = now
+            queued = self._queued()
+
+            if queued >= self._batch_size or (queued and now >= deadline):
                 self.publish()
-            time.sleep(.1)
+                deadline = time.time() + self._publish_interval
+                if self._last_batch_failed:
+                    self._flush_spool()
+                    self._sleep(self._publish_interval)
+
+            elif now >= deadline:
+                deadline = now + self._publish_interval
+
+            else:
+                self._flush_spool()
+                # woken early by enqueue when a full batch is waiting or by stop
+                self._wakeup.wait(deadline - now)
+
+        if self._spool:
+            self._close_spool()
+
+    def _close_spool(self):
+        """
+        Return the events in memory to the front of the spool and close it, so they are published
+        after a restart
+        """
+        with self._spool.lock:
+            self._spool.unread([json.dumps(event) for event in self._deque])
+            self._deque.clear()
+            self._spool.close()
+
+    def _flush_spool(self):
+        if self._spool:
+            with self._spool.lock:
+                self._spool.flush()
+
+    def _queued(self):
+        """
+        @retval number of events queued in memory and spooled
+        """
+        if self._spool:
+            return len(self._deque) + self._spool.pending
+        return len(self._deque)
+
+    def _sleep(self, duration):
+        deadline = time.time() + duration
+        while self._running and time.time() < deadline:
+            time.sleep(min(.1, deadline - time.time()))
 
     def _merge_headers(self, headers):
         msg_headers = copy.deepcopy(self._headers)
@@ -71,19 +151,42 @@ class Publisher(object):
         self._headers[self.SOURCE] = source
 
     def start(self):
-        t = Thread(target=self._run)
-        t.setDaemon(True)
-        t.start()
+        self._thread = Thread(target=self._run)
+        self._thread.setDaemon(True)
+        self._thread.start()
 
     def stop(self):
         self._running = False
+        self._wakeup.set()
 
     def enqueue(self, event):
         try:
-            json.dumps(event)
-            self._deque.append(event)
+            encoded = json.dumps(event)
         except Exception as e:
             log.error('Unable to encode event as JSON: %r', e)
+            return
+
+        if self._spool:
+            with self._spool.lock:
+                # once spilling, events go to the spool until it has been replayed to keep them in order
+                if self._spool.pending or len(self._deque) >= self._spool_threshold:
+                    self._spool.append(encoded)
+                else:
+                    self._deque.append(event)
+        else:
+            self._deque.append(event)
+
+        if not self._wakeup.is_set() and self._queued() >= self._batch_size:
+            self._wakeup.set()
+
+    def _replay(self):
+        """
+        Move spooled events to the in-memory queue, up to the spool threshold
+        """
+        with self._spool.lock:
+            room = self._spool_threshold - len(self._deque)
+            if room > 0:
+                self._deque.extend(self._spool.read(room))
 
     def requeue(self, events):
         self._deque.extendleft(reversed(events))
@@ -97,34 +200,101 @@ class Publisher(object):
         return group_dict
 
     def publish(self):
-        events = []
-        for _ in xrange(self._max_events):
-            try:
-                events.append(self._deque.popleft())
-            except IndexError:
-                break
-
-        if events:
+        """
+        Publish a batch of events
+        @retval number of events still queued
+        """
+        if self._spool and self._spool.pending:
+            self._replay()
+
+        # only the publishing thread removes events, so the queue holds at least this many
+        count = min(self._batch_size, len(self._deque))
+        if count:
+            popleft = self._deque.popleft
+            events = [popleft() for _ in xrange(count)]
+
+            start = time.time()
+            failed_count = 0
             events = self.filter_events(events)
+            filtered_count = count - len(events)
             groups = self.group_events(events)
             for instance in groups:
                 if instance is None:
                     failed = self._publish(groups[instance], instance)
-                    if failed:
-                        self.requeue(failed)
                 else:
                     failed = self._publish(groups[instance], {'sensor': instance})
-                    if failed:
-                        self.requeue(failed)
-
-        return len(self._deque)
+                if failed:
+                    self.requeue(failed)
+                    failed_count += len(failed)
+
+            self._update_counters(count, filtered_count, failed_count, time.time() - start)
+
+        return self._queued()
+
+    def _update_counters(self, count, filtered_count, failed_count, latency):
+        """
+        Update the counters and adapt the batch size after publishing a batch
+        @param count number of events taken from the queue
+        @param filtered_count number of events dropped by the allowed stream filter
+        @param failed_count number of events which failed to publish and were requeued
+        @param latency duration of the publish
+        """
+        now = time.time()
+        published_count = count - filtered_count - failed_count
+        self.published += published_count
+        self.filtered += filtered_count
+        self.failed += failed_count
+        self.batch_latency = latency
+        self._last_batch_failed = failed_count > 0
+
+        self._window_count += published_count
+        elapsed = now - self._window_start
+        if elapsed >= self.RATE_WINDOW:
+            self.events_per_second = self._window_count / elapsed
+            self._window_start = now
+            self._window_count = 0
+
+        if latency > self.TARGET_BATCH_LATENCY:
+            self._batch_size = max(self._max_events, int(count * self.TARGET_BATCH_LATENCY / latency))
+        elif not failed_count and count >= self._batch_size and latency < self.TARGET_BATCH_LATENCY / 2:
+            self._batch_size = min(max(self._max_events, self.MAX_BATCH_EVENTS), self._batch_size * 2)
+
+    def get_stats(self):
+        """
+        @retval dictionary of the publisher counters: events queued, published, filtered and failed in total,
+        the publish rate over the last RATE_WINDOW, the current batch size and the latency of the last batch.
+        queued counts the events in memory, spooled the events in the spool, filtered the particles of streams
+        which are not allowed
+        """
+        events_per_second = self.events_per_second
+        elapsed = time.time() - self._window_start
+        if elapsed >= 2 * self.RATE_WINDOW:
+            # nothing was published to complete the window
+            events_per_second = self._window_count / elapsed
+
+        return {
+            'queued': len(self._deque),
+            'spooled': self._spool.pending if self._spool else 0,
+            'published': self.published,
+            'filtered': self.filtered,
+            'failed': self.failed,
+            'events_per_second': events_per_second,
+            'batch_size': self._batch_size,
+            'batch_latency': self.batch_latency,
+        }
 
     def _publish(self, events, headers):
         raise NotImplemented
 
+    def is_allowed(self, stream_name):
+        """
+        @retval True if particles of the stream pass the allowed stream filter
+        """
+        return not isinstance(self._allowed, list) or stream_name in self._allowed
+
     def filter_events(self, events):
         if self._allowed is not None and isinstance(self._allowed, list):
-            log.info('Filtering %d events with: %r', len(events), self._allowed)
+            log.debug('Filtering %d events with: %r', len(events), self._allowed)
             new_events = []
             dropped = 0
             for event in events:
@@ -135,7 +305,7 @@ class Publisher(object):
                         dropped += 1
                 else:
                     new_events.append(event)
-            log.info('Dropped %d unallowed particles', dropped)
+            log.debug('Dropped %d unallowed particles', dropped)
             return new_events
         return events
 
@@ -146,6 +316,9 @@ class Publisher(object):
 
         result = urlparse.urlsplit(url)
         queue, query = extract_param('queue', result.query)
+        spool_dir, query = extract_param('spool', query)
+        if spool_dir:
+            kwargs['spool_dir'] = spool_dir
         url = result.scheme + '://' + result.netloc + result.path
 
         username = password = 'guest'
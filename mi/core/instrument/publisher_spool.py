@@ -0,0 +1,223 @@
+"""
+@package mi.core.instrument.publisher_spool
+@file mi/core/instrument/publisher_spool.py
+@brief Disk-backed spool of queued publisher events
+
+Events are appended as lines of JSON to numbered segment files.  They are read back in order, segments are
+deleted once read and the read position is kept in a cursor file, so events which were spooled and not yet
+read back survive a restart of the process.  Events read back but not yet published are returned to the
+front of the spool with unread when the publisher stops.
+"""
+import io
+import json
+import os
+import re
+import shutil
+from threading import Lock
+
+from mi.logging import log
+
+SEGMENT_FORMAT = 'segment-%010d.jsonl'
+SEGMENT_REGEX = re.compile(r'segment-(\d{10})\.jsonl$')
+CURSOR_FILE = 'cursor'
+
+
+class EventSpool(object):
+    """
+    Append-only spool of events in segmented files.  Appends are buffered until flush, reads flush first.
+    lock is not taken by the spool itself, callers hold it to make appends and reads atomic with their queue.
+    """
+    DEFAULT_SEGMENT_EVENTS = 10000
+
+    def __init__(self, path, segment_events=None):
+        """
+        Open a spool directory, resuming from the cursor of a previous process
+        @param path spool directory, created if it doesn't exist
+        @param segment_events number of events per segment file
+        """
+        self.path = path
+        self.segment_events = segment_events if segment_events else self.DEFAULT_SEGMENT_EVENTS
+        self.lock = Lock()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        segments = self._segments()
+        self._read_segment, self._read_offset = self._load_cursor(segments)
+
+        # segments before the cursor were read before they could be deleted
+        for segment in segments:
+            if segment < self._read_segment:
+                os.remove(self._segment_path(segment))
+        segments = [segment for segment in segments if segment >= self._read_segment]
+
+        # count the complete events left to read
+        self.pending = 0
+        for segment in segments:
+            with io.open(self._segment_path(segment), 'rb') as segment_file:
+                if segment == self._read_segment:
+                    segment_file.seek(self._read_offset)
+                self.pending += segment_file.read().count('\n')
+
+        # never append to a segment of a previous process, its last line may be incomplete
+        self._write_segment = max(segments[-1] + 1 if segments else 0, self._read_segment)
+        self._writer = None
+        self._write_count = 0
+
+        if self.pending:
+            log.info('Resuming %d spooled events from %s', self.pending, path)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, SEGMENT_FORMAT % segment)
+
+    def _segments(self):
+        """
+        @retval sorted list of the numbers of the segment files in the spool directory
+        """
+        segments = []
+        for name in os.listdir(self.path):
+            match = SEGMENT_REGEX.match(name)
+            if match:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def _load_cursor(self, segments):
+        """
+        @retval tuple of the segment and byte offset to read from next
+        """
+        try:
+            with open(os.path.join(self.path, CURSOR_FILE)) as cursor_file:
+                segment, offset = cursor_file.read().split()
+                return int(segment), int(offset)
+        except (IOError, ValueError):
+            return segments[0] if segments else 0, 0
+
+    def _save_cursor(self):
+        cursor_path = os.path.join(self.path, CURSOR_FILE)
+        with open(cursor_path + '.tmp', 'w') as cursor_file:
+            cursor_file.write('%d %d\n' % (self._read_segment, self._read_offset))
+        os.rename(cursor_path + '.tmp', cursor_path)
+
+    def append(self, line):
+        """
+        Append an event
+        @param line the JSON encoded event
+        """
+        if self._writer is None:
+            self._writer = open(self._segment_path(self._write_segment), 'ab')
+            self._write_count = 0
+
+        self._writer.write(line)
+        self._writer.write('\n')
+        self.pending += 1
+        self._write_count += 1
+
+        if self._write_count >= self.segment_events:
+            self._writer.close()
+            self._writer = None
+            self._write_segment += 1
+
+    def read(self, count):
+        """
+        Read the oldest events from the spool, deleting the segments which have been read completely
+        @param count maximum number of events to read
+        @retval list of the decoded events
+        """
+        events = []
+        if not self.pending:
+            return events
+
+        self.flush()
+        remaining = count
+        while remaining and self.pending:
+            segment_path = self._segment_path(self._read_segment)
+            lines = []
+            end_of_segment = True
+            if os.path.exists(segment_path):
+                with io.open(segment_path, 'rb') as segment_file:
+                    segment_file.seek(self._read_offset)
+                    for line in segment_file:
+                        if len(lines) == remaining:
+                            end_of_segment = False
+                            break
+                        # a line without an end was not completely written
+                        if not line.endswith('\n'):
+                            break
+                        lines.append(line)
+                        self._read_offset += len(line)
+
+            for line in lines:
+                try:
+                    events.append(json.loads(line))
+                except ValueError as e:
+                    log.error('Dropping spooled event which could not be decoded: %r', e)
+            self.pending -= len(lines)
+            remaining -= len(lines)
+
+            if end_of_segment and self._read_segment < self._write_segment:
+                # the segment has been read completely and no more will be written to it
+                if os.path.exists(segment_path):
+                    os.remove(segment_path)
+                self._read_segment += 1
+                self._read_offset = 0
+            elif not lines:
+                break
+
+        if not self.pending and self._read_segment == self._write_segment:
+            # caught up with the writer, start a new segment so this one can be deleted
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            segment_path = self._segment_path(self._read_segment)
+            if os.path.exists(segment_path):
+                os.remove(segment_path)
+            self._write_segment += 1
+            self._read_segment = self._write_segment
+            self._read_offset = 0
+
+        self._save_cursor()
+        return events
+
+    def unread(self, lines):
+        """
+        Return events to the front of the spool, they are read again before the events still spooled.
+        The rest of the segment being read is rewritten after them.
+        @param lines the JSON encoded events, oldest first
+        """
+        if not lines:
+            return
+
+        self.flush()
+        if self._read_segment == self._write_segment:
+            # don't rewrite the segment being appended to
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._write_segment += 1
+
+        segment_path = self._segment_path(self._read_segment)
+        with io.open(segment_path + '.tmp', 'wb') as new_file:
+            for line in lines:
+                new_file.write(line)
+                new_file.write('\n')
+            if os.path.exists(segment_path):
+                with io.open(segment_path, 'rb') as segment_file:
+                    segment_file.seek(self._read_offset)
+                    shutil.copyfileobj(segment_file, new_file)
+
+        # rewinding the cursor first, a crash before the rename reads the segment again rather than from
+        # an offset into the rewritten segment
+        self._read_offset = 0
+        self._save_cursor()
+        os.rename(segment_path + '.tmp', segment_path)
+        self.pending += len(lines)
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._save_cursor()
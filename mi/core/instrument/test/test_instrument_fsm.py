@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_instrument_fsm
+@file mi/core/instrument/test/test_instrument_fsm.py
+@brief Test cases for the instrument state machine
+"""
+
+__license__ = 'Apache 2.0'
+
+import timeit
+
+from mock import Mock
+from nose.plugins.attrib import attr
+
+from mi.core.common import BaseEnum
+from mi.core.exceptions import InstrumentStateException
+from mi.core.instrument.instrument_fsm import InstrumentFSM, ThreadSafeFSM
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+from mi.instrument.seabird.sbe16plus_v2.driver import SBE16Protocol, Prompt, NEWLINE
+
+log = get_logger()
+
+
+class State(BaseEnum):
+    COMMAND = 'COMMAND'
+    AUTOSAMPLE = 'AUTOSAMPLE'
+
+
+class Event(BaseEnum):
+    ENTER = 'ENTER'
+    EXIT = 'EXIT'
+    START = 'START'
+    STOP = 'STOP'
+    ACQUIRE = 'ACQUIRE'
+
+
+@attr('UNIT', group='mi')
+class TestInstrumentFSM(MiUnitTest):
+    """
+    Test the state machine dispatch and capability lists
+    """
+    def setUp(self):
+        self.calls = []
+        self.fsm = InstrumentFSM(State, Event, Event.ENTER, Event.EXIT)
+        self.fsm.add_handler(State.COMMAND, Event.ENTER, lambda: self.calls.append('enter command'))
+        self.fsm.add_handler(State.COMMAND, Event.EXIT, lambda: self.calls.append('exit command'))
+        self.fsm.add_handler(State.COMMAND, Event.START, lambda: (State.AUTOSAMPLE, 'started'))
+        self.fsm.add_handler(State.COMMAND, Event.ACQUIRE, lambda: (None, 'sample'))
+        self.fsm.add_handler(State.AUTOSAMPLE, Event.ENTER, lambda: self.calls.append('enter autosample'))
+        self.fsm.add_handler(State.AUTOSAMPLE, Event.STOP, lambda: (State.COMMAND, 'stopped'))
+
+    def test_dispatch(self):
+        """
+        Test events are dispatched to the handlers of the current state
+        """
+        self.assertFalse(self.fsm.add_handler('BOGUS', Event.START, None))
+        self.assertFalse(self.fsm.add_handler(State.COMMAND, 'BOGUS', None))
+
+        self.assertTrue(self.fsm.start(State.COMMAND))
+        self.assertEqual(self.fsm.on_event(Event.ACQUIRE), 'sample')
+        self.assertEqual(self.fsm.on_event(Event.START), 'started')
+        self.assertEqual(self.fsm.get_current_state(), State.AUTOSAMPLE)
+        self.assertEqual(self.fsm.previous_state, State.COMMAND)
+        self.assertRaises(InstrumentStateException, self.fsm.on_event, Event.ACQUIRE)
+        self.assertRaises(InstrumentStateException, self.fsm.on_event, 'BOGUS')
+        self.assertEqual(self.fsm.on_event(Event.STOP), 'stopped')
+        self.assertEqual(self.calls, ['enter command', 'exit command', 'enter autosample', 'enter command'])
+
+        # setting the state directly switches the dispatch map
+        self.fsm.current_state = State.AUTOSAMPLE
+        self.assertEqual(self.fsm.on_event(Event.STOP), 'stopped')
+
+        # handlers added after start are dispatched
+        self.fsm.add_handler(State.COMMAND, Event.STOP, lambda: (None, 'already stopped'))
+        self.assertEqual(self.fsm.on_event(Event.STOP), 'already stopped')
+
+    def test_get_events(self):
+        """
+        Test the capability lists exclude the enter and exit events
+        """
+        self.fsm.start(State.COMMAND)
+        self.assertEqual(sorted(self.fsm.get_events()), [Event.ACQUIRE, Event.START])
+        self.assertEqual(sorted(self.fsm.get_events(False)), [Event.ACQUIRE, Event.START, Event.STOP])
+        self.fsm.get_events().append(Event.STOP)
+        self.assertEqual(sorted(self.fsm.get_events()), [Event.ACQUIRE, Event.START])
+
+
+@attr('BENCHMARK', group='mi')
+class TestInstrumentFSMBenchmark(MiUnitTest):
+    def test_dispatch_rate(self):
+        """
+        Measure the event dispatch rate of the state machine and the capability query
+        rate of a driver protocol.
+        """
+        count = 20000
+        for fsm_class in InstrumentFSM, ThreadSafeFSM:
+            fsm = fsm_class(State, Event, Event.ENTER, Event.EXIT)
+            fsm.add_handler(State.COMMAND, Event.START, lambda: (State.AUTOSAMPLE, None))
+            fsm.add_handler(State.AUTOSAMPLE, Event.STOP, lambda: (State.COMMAND, None))
+            fsm.start(State.COMMAND)
+
+            def transitions():
+                fsm.on_event(Event.START)
+                fsm.on_event(Event.STOP)
+
+            elapsed = timeit.timeit(transitions, number=count / 2)
+            log.info('%s: %d events/s', fsm_class.__name__, count / elapsed)
+
+        protocol = SBE16Protocol(Prompt, NEWLINE, Mock())
+        elapsed = timeit.timeit(protocol.get_resource_capabilities, number=count)
+        log.info('SBE16Protocol.get_resource_capabilities: %d queries/s', count / elapsed)
@@ -25,6 +25,8 @@ from mi.core.instrument.instrument_protocol import MenuInstrumentProtocol
 from mi.core.instrument.instrument_protocol import CommandResponseInstrumentProtocol
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
 from mi.core.instrument.instrument_driver import ConfigMetadataKey
+from mi.core.instrument.data_particle import CommonDataParticleType, DataParticleKey
+from mi.core.instrument.port_agent_client import PortAgentPacket
 from mi.instrument.satlantic.par_ser_600m.driver import SAMPLE_REGEX
 from mi.instrument.satlantic.par_ser_600m.driver import PARParticle
 
@@ -119,6 +121,37 @@ class TestUnitInstrumentProtocol(MiUnitTestCase):
         # Test the format of the result in the individual driver tests. Here,
         # just tests that the result is there.
 
+    def test_extraction_filtered(self):
+        """
+        Test particles of a stream which is not published are not built
+        """
+        built = []
+
+        class CountedParticle(PARParticle):
+            def __init__(self, *args, **kwargs):
+                built.append(self)
+                super(CountedParticle, self).__init__(*args, **kwargs)
+
+        samples = []
+        self.protocol = CommandResponseInstrumentProtocol(None, '\r\n', lambda event, value: samples.append(value))
+        sample_line = "SATPAR0229,10.01,2206748544,234\r\n"
+        ntptime = ntplib.system_to_ntp_time(time.time())
+
+        self.protocol.set_stream_filter(lambda stream_name: stream_name != CountedParticle._data_particle_type)
+        self.assertIsNone(self.protocol._extract_sample(CountedParticle, SAMPLE_REGEX, sample_line, ntptime))
+        self.assertEqual(built, [])
+        self.assertEqual(samples, [])
+
+        # a sample which is returned rather than published is still built
+        result = self.protocol._extract_sample(CountedParticle, SAMPLE_REGEX, sample_line, ntptime, publish=False)
+        self.assertEqual(result['stream_name'], CountedParticle._data_particle_type)
+        self.assertEqual(samples, [])
+
+        self.protocol.set_stream_filter(None)
+        self.protocol._extract_sample(CountedParticle, SAMPLE_REGEX, sample_line, ntptime)
+        self.assertEqual(len(built), 2)
+        self.assertEqual(len(samples), 1)
+
     def test_get_param_list(self):
         """
         verify get_param_list returns correct parameter lists.
@@ -197,20 +230,36 @@ class TestUnitInstrumentProtocol(MiUnitTestCase):
         self.assertEqual(self.protocol._linebuf, "defgh")
         self.assertEqual(self.protocol._promptbuf, "defgh")
 
-    @unittest.skip('Not Written')
     def test_publish_raw(self):
         """
         Tests to see if raw data is appropriately published back out to
-        the InstrumentAgent via the event callback.
-        """
-        # build a packet
-        # have it published by the protocol (force state if needed)
-        # delay?
-        # catch it in the  callback
-        # confirm it came back
-        # compare response to original packet
-        
-        self.assertTrue(False)
+        the InstrumentAgent via the event callback, and that the raw particle
+        is not built when the raw stream is not published.
+        """
+        samples = []
+        self.protocol = CommandResponseInstrumentProtocol(None, '\r\n', lambda event, value: samples.append(value))
+
+        packet = PortAgentPacket()
+        packet.attach_data('SATPAR0229,10.01,2206748544,234\r\n')
+        packet.attach_timestamp(ntplib.system_to_ntp_time(time.time()))
+        packet.pack_header()
+
+        self.protocol.publish_raw(packet)
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0][DataParticleKey.STREAM_NAME], CommonDataParticleType.RAW)
+        self.assertEqual(samples[0][DataParticleKey.PORT_TIMESTAMP], packet.get_timestamp())
+
+        filtered = []
+        self.protocol.set_stream_filter(lambda stream_name: filtered.append(stream_name) or stream_name != 'raw')
+        self.protocol.publish_raw(packet)
+        self.protocol.publish_raw(packet)
+        self.assertEqual(len(samples), 1)
+        # the filter result is cached per stream
+        self.assertEqual(filtered, [CommonDataParticleType.RAW])
+
+        self.protocol.set_stream_filter(None)
+        self.protocol.publish_raw(packet)
+        self.assertEqual(len(samples), 2)
 
     @unittest.skip('Not Written')
     def test_publish_parsed_data(self):
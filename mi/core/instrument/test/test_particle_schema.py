@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_particle_schema
+@file mi/core/instrument/test/test_particle_schema.py
+@brief Test cases for the compiled particle schemas
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from nose.plugins.attrib import attr
+
+from mi.core.exceptions import SampleEncodingException
+from mi.core.instrument.data_particle import DataParticleKey
+from mi.core.instrument.particle_schema import ParticleSchema, SchemaCompiler, ParameterDef, field_from_paramdef, \
+    field_from_param_map, connect_preload, DEFAULT_PRELOAD
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTestCase
+from mi.dataset.dataset_driver import ParticleDataHandler
+from mi.dataset.driver.cspp_eng.dcl import cspp_eng_dcl_driver
+from mi.dataset.driver.cspp_eng.dcl.resource import RESOURCE_PATH as CSPP_ENG_RESOURCE_PATH
+from mi.dataset.driver.nutnr_m import nutnr_m_recovered_driver
+from mi.dataset.driver.nutnr_m.resource import RESOURCE_PATH as NUTNR_M_RESOURCE_PATH
+from mi.dataset.driver.velpt_ab.dcl import velpt_ab_dcl_recovered_driver
+from mi.dataset.driver.velpt_ab.dcl.resource import RESOURCE_PATH as VELPT_AB_DCL_RESOURCE_PATH
+from mi.dataset.parser.nutnr_m import NutnrMDataParticle
+
+log = get_logger()
+
+DRIVER_FILES = [
+    (nutnr_m_recovered_driver, os.path.join(NUTNR_M_RESOURCE_PATH, 'nl181450.bin')),
+    (velpt_ab_dcl_recovered_driver, os.path.join(VELPT_AB_DCL_RESOURCE_PATH, '20140813.velpt.log')),
+    (cspp_eng_dcl_driver, os.path.join(CSPP_ENG_RESOURCE_PATH, 'all_responses.ucspp.log')),
+]
+
+
+def values_dict(particle):
+    return {v[DataParticleKey.VALUE_ID]: v[DataParticleKey.VALUE] for v in particle[DataParticleKey.VALUES]}
+
+
+@attr('UNIT', group='mi')
+class TestParticleSchema(MiUnitTestCase):
+
+    def setUp(self):
+        self.schema = ParticleSchema('test_stream', [
+            field_from_paramdef(ParameterDef(1, 'count', 'quantity', 'uint8')),
+            field_from_paramdef(ParameterDef(2, 'temperature', 'quantity', 'float32')),
+            field_from_paramdef(ParameterDef(3, 'serial', 'quantity', 'string')),
+            field_from_paramdef(ParameterDef(4, 'counts', 'array<quantity>', 'int16')),
+        ])
+
+    def test_header_parameters_skipped(self):
+        self.assertIsNone(field_from_paramdef(ParameterDef(1, 'internal_timestamp', 'quantity', 'float64')))
+        self.assertIsNone(field_from_paramdef(ParameterDef(2, 'density', 'function', 'float32')))
+
+    def test_encode(self):
+        errors = []
+        values = self.schema.encode(('12', '1.5', 7, ['1', '2']), errors)
+        self.assertEqual(values, [{'value_id': 'count', 'value': 12},
+                                  {'value_id': 'temperature', 'value': 1.5},
+                                  {'value_id': 'serial', 'value': '7'},
+                                  {'value_id': 'counts', 'value': [1, 2]}])
+        self.assertEqual(errors, [])
+
+    def test_encode_errors(self):
+        errors = []
+        values = self.schema.encode(('bad', 1.5, 'x', [40000]), errors)
+        self.assertIsNone(values[0][DataParticleKey.VALUE])
+        self.assertEqual(values[3][DataParticleKey.VALUE], [40000])
+        self.assertEqual(errors, [{'count': 'bad'}, {'counts': [40000]}])
+
+        self.assertRaises(SampleEncodingException, self.schema.encode, (1, 2))
+
+    def test_encode_indexed(self):
+        schema = ParticleSchema('test_stream', map(field_from_param_map, [('b', 2, int), ('a', 0, float),
+                                                                         ('c', slice(3, 5), list)]))
+        self.assertEqual(schema.encode(('1.5', 'x', '3', 4, 5)),
+                         [{'value_id': 'b', 'value': 3},
+                          {'value_id': 'a', 'value': 1.5},
+                          {'value_id': 'c', 'value': [4, 5]}])
+
+    def test_encode_columns(self):
+        columns = {
+            'count': [1, 2, 300, 4],
+            'temperature': ['1.0', '2.5', '3', '4'],
+            'serial': ['a', 'b', 'c', 'd'],
+            'counts': [[1, 2], [3, 4], [5, 6], [7, 80000]],
+        }
+        records, errors = self.schema.encode_columns(columns)
+        self.assertEqual(errors, {2: [{'count': 300}], 3: [{'counts': [7, 80000]}]})
+
+        for index, record in enumerate(records):
+            row = [columns[name][index] for name in self.schema.names]
+            self.assertEqual(record, self.schema.encode(row))
+
+    def test_encode_columns_fallback(self):
+        records, errors = self.schema.encode_columns({
+            'count': [1, 'bad'],
+            'temperature': [float('nan'), None],
+            'serial': ['a', 'b'],
+            'counts': [[1], [2, 3]],
+        })
+        self.assertEqual(errors, {1: [{'count': 'bad'}, {'temperature': None}]})
+        self.assertEqual(records[1][3][DataParticleKey.VALUE], [2, 3])
+
+    def test_preload_range(self):
+        compiler = SchemaCompiler()
+        schema = compiler.from_preload('ctdpf_ckl_wfp_instrument', names=['conductivity', 'temperature', 'pressure'])
+        self.assertEqual(schema.names, ('conductivity', 'temperature', 'pressure'))
+        errors = []
+        schema.encode((1, 2 ** 31, 3), errors)
+        self.assertEqual(errors, [{'temperature': 2 ** 31}])
+        self.assertIs(schema, compiler.from_preload('ctdpf_ckl_wfp_instrument',
+                                                    names=['conductivity', 'temperature', 'pressure']))
+
+    def test_missing_preload(self):
+        self.assertTrue(os.path.isfile(DEFAULT_PRELOAD))
+
+        # a missing preload database is not created, the particle class metadata is used unchecked
+        temp_dir = tempfile.mkdtemp()
+        try:
+            preload_path = os.path.join(temp_dir, 'preload.db')
+            compiler = SchemaCompiler(preload_path)
+            self.assertFalse(compiler.has_stream('ctdpf_ckl_wfp_instrument'))
+            self.assertRaises(SampleEncodingException, compiler.from_preload, 'ctdpf_ckl_wfp_instrument')
+            self.assertEqual(len(compiler.for_particle(NutnrMDataParticle)), len(NutnrMDataParticle._param_map))
+            self.assertFalse(os.path.exists(preload_path))
+
+            self.assertRaises(IOError, connect_preload, preload_path)
+            self.assertFalse(os.path.exists(preload_path))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_lazy_import(self):
+        # the schema, numpy and sqlite3 are only imported once a particle is encoded
+        script = ('import sys; import mi.core.instrument.dataset_data_particle; '
+                  'print sorted(set(["mi.core.instrument.particle_schema", "numpy", "sqlite3"]) & set(sys.modules))')
+        out = subprocess.check_output([sys.executable, '-c', script])
+        self.assertEqual(out.strip().splitlines()[-1], '[]')
+
+    def test_particle_class_schema(self):
+        compiler = SchemaCompiler()
+        schema = compiler.for_particle(NutnrMDataParticle)
+        self.assertEqual(len(schema), len(NutnrMDataParticle._param_map))
+        self.assertEqual(schema.fields[0].index, 1)
+
+    def test_dataset_driver_output(self):
+        """
+        Re-encode the particles produced by existing dataset drivers through the preload schema
+        for their stream, record by record and column by column, and verify the output is unchanged.
+        """
+        compiler = SchemaCompiler()
+        for driver, path in DRIVER_FILES:
+            handler = driver.parse(None, path, ParticleDataHandler())
+            self.assertFalse(handler._failure)
+            self.assertTrue(handler._samples)
+
+            for stream, samples in handler._samples.iteritems():
+                particles = [values_dict(json.loads(sample)) for sample in samples]
+                if not compiler.has_stream(stream):
+                    log.warn('Stream %s not defined in preload', stream)
+                    continue
+
+                preload_names = set(compiler.from_preload(stream).names)
+                names = [name for name in particles[0] if name in preload_names]
+                schema = compiler.from_preload(stream, names)
+
+                for particle in particles:
+                    errors = []
+                    encoded = schema.encode_dict(particle, errors)
+                    self.assertEqual(errors, [])
+                    self.assertEqual(values_dict({DataParticleKey.VALUES: encoded}),
+                                     {name: particle[name] for name in names})
+
+                columns = {name: [particle[name] for particle in particles] for name in names}
+                records, errors = schema.encode_columns(columns)
+                self.assertEqual(errors, {})
+                self.assertEqual([values_dict({DataParticleKey.VALUES: r}) for r in records],
+                                 [{name: particle[name] for name in names} for particle in particles])
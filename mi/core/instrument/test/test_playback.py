@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_playback
+@file mi/core/instrument/test/test_playback.py
+@brief Test the sharded playback of datalog files
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from nose.plugins.attrib import attr
+
+from mi.core.instrument.data_particle import DataParticleKey
+from mi.core.instrument.playback import PlaybackWrapper, DatalogReader, PlaybackOrdering, shard_files, \
+    event_timestamp
+from mi.core.instrument.port_agent_client import PortAgentPacket
+from mi.core.instrument.publisher import Publisher
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+MODULE = 'mi.instrument.noaa.botpt.ooicore.driver'
+NANO_SAMPLE = 'NANO,V,%s.000,13.888533,26.147947328\n'
+# 2013-08-22 00:00:00 in seconds since 1900-01-01
+START_TIME = 3586204800
+
+
+class CapturePublisher(Publisher):
+    """
+    Publisher keeping the published events and the source header each was published with
+    """
+    def __init__(self, *args, **kwargs):
+        super(CapturePublisher, self).__init__(*args, **kwargs)
+        self.events = []
+        self.sources = []
+
+    def _publish(self, events, headers):
+        self.events.extend(events)
+        self.sources.extend([self._merge_headers(headers)[self.SOURCE]] * len(events))
+
+
+def nano_sample(timestamp):
+    """
+    @retval NANO sample line of the timestamp
+    """
+    return NANO_SAMPLE % time.strftime('%Y/%m/%d %H:%M:%S', time.gmtime(timestamp - 2208988800))
+
+
+def write_packets(path, packets):
+    """
+    Write a datalog file of data packets
+    @param packets list of tuples of the packet timestamp and data
+    """
+    with open(path, 'wb') as fh:
+        for timestamp, data in packets:
+            packet = PortAgentPacket(PortAgentPacket.DATA_FROM_INSTRUMENT)
+            packet.attach_data(data)
+            packet.attach_timestamp(timestamp)
+            packet.pack_header()
+            fh.write(packet.get_header() + data)
+
+
+def write_datalog(path, times):
+    """
+    Write a datalog file of one NANO sample packet for each timestamp
+    """
+    write_packets(path, [(timestamp, nano_sample(timestamp)) for timestamp in times])
+
+
+class PlaybackTestCase(MiUnitTest):
+    """
+    Base class of the playback tests, writing datalog files to a temporary directory
+    """
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def write_files(self, count, samples, step=1):
+        files = []
+        for index in xrange(count):
+            path = os.path.join(self.data_dir, 'datalog_%03d.dat' % index)
+            start = START_TIME + index * samples * step
+            write_datalog(path, range(start, start + samples * step, step))
+            files.append(path)
+        return files
+
+    def playback_publisher(self, files, workers=1, ordering=None):
+        wrapper = PlaybackWrapper(MODULE, 'TEST-REFDES', 'count://', 'count://', DatalogReader, None, files,
+                                  Publisher.DEFAULT_MAX_EVENTS, workers=workers, ordering=ordering)
+        wrapper.particle_publisher = CapturePublisher(None)
+        wrapper.playback()
+        return wrapper.particle_publisher
+
+    def playback(self, files, workers=1, ordering=None):
+        return [event['value'] for event in self.playback_publisher(files, workers, ordering).events]
+
+    @staticmethod
+    def timestamps(particles):
+        return [particle[DataParticleKey.INTERNAL_TIMESTAMP] for particle in particles]
+
+
+@attr('UNIT', group='mi')
+class TestPlayback(PlaybackTestCase):
+
+    def test_shard_files(self):
+        files = self.write_files(7, 10)
+        shards = shard_files(files, 3)
+        self.assertEqual(len(shards), 3)
+        self.assertEqual([f for shard in shards for f in shard], files)
+        self.assertEqual([len(shard) for shard in shards], [2, 3, 2])
+
+        # no empty shards when there are more workers than files
+        self.assertEqual(shard_files(files[:2], 4), [files[:1], files[1:2]])
+
+    def test_file_ordering(self):
+        files = self.write_files(6, 50)
+        serial = self.playback(files)
+        sharded = self.playback(files, workers=3)
+
+        self.assertEqual(len(serial), 300)
+        self.assertEqual(self.timestamps(sharded), self.timestamps(serial))
+        self.assertEqual(self.timestamps(serial), [float(START_TIME + index) for index in xrange(300)])
+
+    def test_time_ordering(self):
+        # the files of the two halves overlap in time
+        files = self.write_files(4, 50, step=2)
+        for index in (2, 3):
+            write_datalog(files[index], range(START_TIME + 1 + (index - 2) * 100,
+                                              START_TIME + 1 + (index - 1) * 100, 2))
+
+        particles = self.playback(files, workers=2, ordering=PlaybackOrdering.TIME)
+        timestamps = self.timestamps(particles)
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(len(timestamps), 200)
+        self.assertEqual([event_timestamp({'type': 'DRIVER_ASYNC_EVENT_SAMPLE', 'value': particle})
+                          for particle in particles], timestamps)
+
+        # file ordering keeps the order of the files
+        particles = self.playback(files, workers=2)
+        self.assertEqual(self.timestamps(particles), self.timestamps(self.playback(files)))
+
+    def test_split_record(self):
+        # the first sample of each file but the first starts at the end of the previous file
+        samples = [(timestamp, nano_sample(timestamp)) for timestamp in xrange(START_TIME, START_TIME + 200)]
+        file_packets = [samples[index:index + 50] for index in xrange(0, 200, 50)]
+        for previous, packets in zip(file_packets, file_packets[1:]):
+            timestamp, data = packets[0]
+            previous.append((timestamp, data[:20]))
+            packets[0] = (timestamp, data[20:])
+
+        files = []
+        for index, packets in enumerate(file_packets):
+            files.append(os.path.join(self.data_dir, 'datalog_%03d.dat' % index))
+            write_packets(files[-1], packets)
+        self.assertEqual(len(shard_files(files, 4)), 4)
+
+        serial = self.playback(files)
+        self.assertEqual(self.timestamps(serial), [float(timestamp) for timestamp in xrange(START_TIME,
+                                                                                            START_TIME + 200)])
+        for workers in (2, 4):
+            self.assertEqual(self.timestamps(self.playback(files, workers=workers)), self.timestamps(serial))
+
+    def test_source(self):
+        # the files of the two shards overlap in time, each event is published with the file it was read from
+        times = [range(START_TIME, START_TIME + 100, 2), range(START_TIME + 100, START_TIME + 200, 2),
+                 range(START_TIME + 1, START_TIME + 101, 2), range(START_TIME + 101, START_TIME + 201, 2)]
+        files = []
+        expected = {}
+        for index, file_times in enumerate(times):
+            files.append(os.path.join(self.data_dir, 'datalog_%03d.dat' % index))
+            write_datalog(files[-1], file_times)
+            expected.update((float(timestamp), files[-1]) for timestamp in file_times)
+
+        for ordering in PlaybackOrdering.list():
+            publisher = self.playback_publisher(files, workers=2, ordering=ordering)
+            timestamps = self.timestamps(event['value'] for event in publisher.events)
+            self.assertEqual(len(timestamps), 200)
+            self.assertEqual(publisher.sources, [expected[timestamp] for timestamp in timestamps])
+
+
+@attr('BENCHMARK', group='mi')
+class TestPlaybackBenchmark(PlaybackTestCase):
+    def test_benchmark(self):
+        """
+        Compare the playback of datalog files with 1 and 4 workers
+        """
+        files = self.write_files(8, 2000)
+        rates = []
+        for workers in (1, 4):
+            start = time.time()
+            particles = self.playback(files, workers=workers)
+            rates.append(len(particles) / (time.time() - start))
+
+        log.info('playback: %.0f particles/s with 1 worker, %.0f particles/s with 4 workers', *rates)
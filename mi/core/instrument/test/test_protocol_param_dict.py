@@ -7,6 +7,8 @@
 @brief Test cases for the base protocol parameter dictionary module
 """
 import json
+import functools
+import timeit
 
 import re
 from mi.core.exceptions import InstrumentParameterException
@@ -16,11 +18,148 @@ from mi.core.instrument.protocol_param_dict import ParameterDictKey
 from mi.core.instrument.protocol_param_dict import ParameterDictType
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
 from mi.core.instrument.protocol_param_dict import ProtocolParameterDict
+from mi.core.instrument.protocol_param_dict import extract_anchor
 from mi.core.instrument.test.test_strings import TestUnitStringsDict
+from mi.instrument.seabird.sbe16plus_v2.driver import SBE16Protocol, Prompt as SBE16Prompt
+from mi.instrument.seabird.sbe16plus_v2.test.sample_particles import VALID_STATUS_RESPONSE
+from mi.instrument.seabird.sbe26plus.driver import Protocol as SBE26Protocol, Prompt as SBE26Prompt
+from mi.instrument.seabird.sbe26plus.test.sample_data import SAMPLE_DS, SAMPLE_DC
+from mi.instrument.seabird.driver import NEWLINE
+from mi.instrument.teledyne.workhorse.driver import WorkhorseProtocol, WorkhorsePrompt
+from mi.instrument.satlantic.suna_deep.ooicore.driver import Protocol as SunaProtocol, Prompt as SunaPrompt
+from mi.instrument.satlantic.suna_deep.ooicore.test.test_driver import SUNA_ASCII_STATUS
+from mi.instrument.nobska.mavs4.ooicore.driver import mavs4InstrumentProtocol, InstrumentPrompts as Mavs4Prompts
+from mi.core.unit_test import MiUnitTest
 from mi.logging import log
+from mock import Mock
 from nose.plugins.attrib import attr
 
 
+def brute_force_update(param_dict, response, newline):
+    """
+    Update a parameter dictionary trying every parameter on every line
+    """
+    for line in response.split(newline):
+        for param in param_dict._param_dict.itervalues():
+            param.update(line)
+
+
+# Workhorse response to querying all parameters at once
+WORKHORSE_GET_RESPONSE = '\r\n'.join([
+    'CD = 000 000 000 --------------- Serial Data Out {Vel;Cor;Amp  PG;St;P0  P1;P2;P3}',
+    'CF = 11110 --------------------- Flow Ctrl (EnsCyc;PngCyc;Binry;Ser;Rec)',
+    'CH = 0 ------------------------- Suppress Banner',
+    'CI = 000 ----------------------- Instrument ID (0-255)',
+    'CL = 0 ------------------------- Sleep Enable (0 = Disable, 1 = Enable, 2 See Manual)',
+    'CN = 1 ------------------------- Save NVRAM to recorder (0 = ON, 1 = OFF)',
+    'CP = 0 ------------------------- PolledMode (1=ON, 0=OFF;  BREAK resets)',
+    'CQ = 255 ----------------------- Xmt Power (0=Low, 255=High)',
+    'CX = 0 ------------------------- Trigger Enable (0=OFF,1=ON)',
+    'EA = +00000 -------------------- Heading Alignment (1/100 deg)',
+    'EB = +00000 -------------------- Heading Bias (1/100 deg)',
+    'EC = 1485 ---------------------- Speed Of Sound (m/s)',
+    'ED = 00000 --------------------- Transducer Depth (0 - 65535 dm)',
+    'EP = +0000 --------------------- Tilt 1 Sensor (1/100 deg)',
+    'ER = +0000 --------------------- Tilt 2 Sensor (1/100 deg)',
+    'ES = 35 ------------------------ Salinity (0-40 pp thousand)',
+    'EX = 00000 --------------------- Coord Transform (Xform:Type; Tilts; 3Bm; Map)',
+    'EZ = 1111101 ------------------- Sensor Source (C;D;H;P;R;S;T)',
+    'PD = 00 ------------------------ Data Stream Select (0-18)',
+    'TC 00002 ----------------------- Ensembles Per Burst (0-65535)',
+    'TE 01:00:00.00 ----------------- Time per Ensemble (hrs:min:sec.sec/100)',
+    'TG ****/**/**,**:**:** - Time of First Ping (CCYY/MM/DD,hh:mm:ss)',
+    'TP 00:00.00 -------------------- Time per Ping (min:sec.sec/100)',
+    'TT 2014/06/16,16:48:22 - Time Set (CCYY/MM/DD,hh:mm:ss)',
+    'TX 00:00:00 -------------------- Buffer Output Period: (hh:mm:ss)',
+    'WA 050,001 --------------------- False Target Threshold (Max) (0-255),[Start Bin]',
+    'WB 0 --------------------------- Bandwidth Control (0=Wid,1=Nar)',
+    'WC 064 ------------------------- Correlation Threshold',
+    'WD 111 100 000 ----------------- Data Out (Vel;Cor;Amp  PG;St;P0  P1;P2;P3)',
+    'WE 2000 ------------------------ Error Velocity Threshold (0-5000 mm/s)',
+    'WF 0088 ------------------------ Blank After Transmit (cm)',
+    'WI 0 --------------------------- Clip Data Past Bottom (0=OFF,1=ON)',
+    'WJ 1 --------------------------- Rcvr Gain Select (0=Low,1=High)',
+    'WN 022 ------------------------- Number of depth cells (1-255)',
+    'WP 00001 ----------------------- Pings per Ensemble (0-16384)',
+    'WQ 0 --------------------------- Sample Ambient Sound (0=OFF,1=ON)',
+    'WS 0800 ------------------------ Depth Cell Size (cm)',
+    'WT 0000 ------------------------ Transmit Length (cm) [0 = Bin Length]',
+    'WU 0 --------------------------- Ping Weighting (0=Box,1=Triangle)',
+    'WV 175 ------------------------- Mode 1 Ambiguity Vel (cm/s radial)',
+    'SA = 001 ----------------------- Synch Before/After Ping/Ensemble Bottom/Water/Both',
+    'SM = 0 ------------------------- Mode Select (0=OFF,1=MASTER,2=SLAVE,3=NEMO)',
+    'ST = 0000 ---------------------- Slave Timeout (seconds,0=indefinite)',
+    'SW = 00000 --------------------- Synch Delay (1/10 msec)',
+    '>'])
+
+# MAVS4 deploy and system configuration menus
+MAVS4_DEPLOY_MENU = '\r\n'.join([
+    '                 MAVS-4 Deployment Menu',
+    '',
+    'Notes 1| Deployment notes line 1',
+    '      2| Deployment notes line 2',
+    '      3| Deployment notes line 3',
+    'Data  F| Velocity Frame Earth (E, N, W) TTag FSec Axes',
+    '      M| Monitor         Enabled Yes  Yes  Yes  S',
+    '      Q| Query Mode      Disabled',
+    '      4| Measurement Frequency    1.00 [Hz]',
+    '      5| Measurements/Sample        1 [M/S]',
+    '      6| Sample Period             1.00 [sec]',
+    '      7| Samples/Burst             60 [S/B]',
+    '      8| Burst Interval      0 00:01:00',
+    '      G| Go (<CTRL>-<G> skips checks)',
+    '',
+    ''])
+
+MAVS4_SYSTEM_CONFIGURATION_MENU = '\r\n'.join([
+    '                 System Configuration',
+    '',
+    '<C> Binary to SI Conversion   0.107323',
+    '<W> Warm up interval          Fast     ',
+    '<1> 3-Axis Compass            Enabled  ',
+    '<2> Solid State Tilt          Enabled  ',
+    '<3> Thermistor                Enabled  ',
+    '<4> Pressure                  Disabled ',
+    '<5> Auxiliary 1               Disabled ',
+    '<6> Auxiliary 2               Disabled ',
+    '<7> Auxiliary 3               Disabled ',
+    '<O> Sensor Orientation        Vertical/Down',
+    '<S> Serial Number             10266 ',
+    '<X> Save Changes and Exit',
+    ''])
+
+
+def brute_force_update_many(param_dict, response):
+    """
+    Update a parameter dictionary trying every parameter on the whole response
+    """
+    for param in param_dict._param_dict.itervalues():
+        param.update(response)
+
+
+def status_cases():
+    """
+    Parameter dictionaries of instrument protocols with a status response
+    """
+    return [
+        ('sbe16plus', SBE16Protocol(SBE16Prompt, NEWLINE, Mock())._param_dict, VALID_STATUS_RESPONSE),
+        ('sbe26plus', SBE26Protocol(SBE26Prompt, NEWLINE, Mock())._param_dict, SAMPLE_DS + SAMPLE_DC),
+    ]
+
+
+def update_many_cases():
+    """
+    Parameter dictionaries of instrument protocols parsing a whole response at once
+    """
+    mavs4_param_dict = mavs4InstrumentProtocol(Mavs4Prompts, NEWLINE, Mock())._param_dict
+    return [
+        ('workhorse', WorkhorseProtocol(WorkhorsePrompt, NEWLINE, Mock())._param_dict, WORKHORSE_GET_RESPONSE),
+        ('suna', SunaProtocol(SunaPrompt, NEWLINE, Mock())._param_dict, SUNA_ASCII_STATUS),
+        ('mavs4 deploy', mavs4_param_dict, MAVS4_DEPLOY_MENU),
+        ('mavs4 configuration', mavs4_param_dict, MAVS4_SYSTEM_CONFIGURATION_MENU),
+    ]
+
+
 @attr('UNIT', group='mi')
 class TestUnitProtocolParameterDict(TestUnitStringsDict):
     """
@@ -293,6 +432,80 @@ bar=200, baz=300
         self.assertEquals(self.param_dict.get("bar"), 200)
         self.assertEquals(self.param_dict.get("baz"), 300)
 
+    def test_extract_anchor(self):
+        """
+        Test extraction of the literal every match of a regex must contain
+        """
+        self.assertEqual(extract_anchor(r'.*foo=(\d+).*'), 'foo=')
+        self.assertEqual(extract_anchor(r'<Name>(\w+)</Name>'), '</Name>')
+        self.assertEqual(extract_anchor(r'(?:vbatt = )+(\d+)'), 'vbatt = ')
+        self.assertEqual(extract_anchor(re.compile(r'x(abc)?y = (\d+)')), 'y = ')
+        self.assertIsNone(extract_anchor(r'(foo|bar)=(\d+)'))
+        self.assertIsNone(extract_anchor(r'foo=(\d+)', re.IGNORECASE))
+        self.assertIsNone(extract_anchor(r'(?i)foo=(\d+)'))
+        self.assertIsNone(extract_anchor(r'(\d+)'))
+
+    def test_indexed_update(self):
+        """
+        Test that parameters are only matched against lines containing their anchor,
+        including parameters added after the index was built
+        """
+        self.assertTrue(self.param_dict.update("bar=1"))
+        self.assertEqual(self.param_dict.get("bar"), 1)
+
+        self.param_dict.add("anchored", r'value (\d+)',
+                            lambda match: int(match.group(1)),
+                            str,
+                            anchor='ANCHOR')
+        self.assertFalse(self.param_dict.update("value 5"))
+        self.assertTrue(self.param_dict.update("ANCHOR value 5"))
+        self.assertEqual(self.param_dict.get("anchored"), 5)
+
+    def test_update_lines(self):
+        """
+        Test a block update matches updating line by line
+        """
+        response = "foo=1\r\nbar=2 foo=3\r\nqux=4\r\nba\r\nz=5"
+        for line in response.split("\r\n"):
+            self.param_dict.update(line)
+        expected_config = self.param_dict.get_config()
+
+        self.setUp()
+        result = self.param_dict.update_lines(response, "\r\n")
+        self.assertEqual(sorted(result), ["bar", "dil", "foo", "pho", "qux"])
+        self.assertEqual(self.param_dict.get("foo"), 3)
+        self.assertEqual(self.param_dict.get_config(), expected_config)
+
+    def test_status_parse(self):
+        """
+        Test indexed block parsing of instrument status responses matches trying
+        every parameter on every line.
+        """
+        for name, param_dict, response in status_cases():
+            brute_force_update(param_dict, response, NEWLINE)
+            expected = param_dict.get_config()
+
+            for param in param_dict._param_dict.itervalues():
+                param.value.value = None
+            param_dict.update_lines(response, NEWLINE)
+            self.assertEqual(param_dict.get_config(), expected)
+
+    def test_update_many_parse(self):
+        """
+        Test indexed parsing of whole instrument responses matches trying every
+        parameter on the response.
+        """
+        for name, param_dict, response in update_many_cases():
+            for param in param_dict._param_dict.itervalues():
+                param.value.value = None
+            brute_force_update_many(param_dict, response)
+            expected = param_dict.get_all()
+
+            for param in param_dict._param_dict.itervalues():
+                param.value.value = None
+            self.assertTrue(param_dict.update_many(response), name)
+            self.assertEqual(param_dict.get_all(), expected, name)
+
     def test_update_specific_values(self):
         """
         test to verify we can limit update to a specific
@@ -658,3 +871,30 @@ bar=200, baz=300
         self.assertEqual(new_dict["baz"][ParameterDictKey.DISPLAY_NAME], "Baz")
 
         self.assertTrue('extra_param' not in new_dict)
+
+
+@attr('BENCHMARK', group='mi')
+class TestProtocolParameterDictBenchmark(MiUnitTest):
+    def test_status_parse_benchmark(self):
+        """
+        Compare indexed block parsing of instrument status responses against trying
+        every parameter on every line.
+        """
+        count = 100
+        for name, param_dict, response in status_cases():
+            brute = timeit.timeit(functools.partial(brute_force_update, param_dict, response, NEWLINE), number=count)
+            indexed = timeit.timeit(functools.partial(param_dict.update_lines, response, NEWLINE), number=count)
+            log.info('%s %d parameters: brute force %.2f ms, indexed %.2f ms per response',
+                     name, len(param_dict._param_dict), brute * 1000 / count, indexed * 1000 / count)
+
+    def test_update_many_benchmark(self):
+        """
+        Compare indexed parsing of whole instrument responses against trying every
+        parameter on the response.
+        """
+        count = 100
+        for name, param_dict, response in update_many_cases():
+            brute = timeit.timeit(functools.partial(brute_force_update_many, param_dict, response), number=count)
+            indexed = timeit.timeit(functools.partial(param_dict.update_many, response), number=count)
+            log.info('%s %d parameters: brute force %.2f ms, indexed %.2f ms per response',
+                     name, len(param_dict._param_dict), brute * 1000 / count, indexed * 1000 / count)
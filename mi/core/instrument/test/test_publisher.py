@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_publisher
+@file mi/core/instrument/test/test_publisher.py
+@brief Test the batching and draining of the event publisher
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from nose.plugins.attrib import attr
+
+from mi.core.instrument.publisher import CountPublisher, Publisher
+from mi.core.instrument.publisher_spool import EventSpool
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+
+class SlowPublisher(Publisher):
+    """
+    Publisher taking a fixed time per event, failing while fail is set
+    """
+    def __init__(self, *args, **kwargs):
+        super(SlowPublisher, self).__init__(*args, **kwargs)
+        self.event_latency = .0001
+        self.fail = False
+        self.batches = []
+        self.indices = []
+
+    def _publish(self, events, headers):
+        time.sleep(len(events) * self.event_latency)
+        if self.fail:
+            return events
+        self.batches.append(len(events))
+        self.indices.extend(event['value']['index'] for event in events)
+
+
+def make_event(index):
+    return {'type': 'DRIVER_ASYNC_EVENT_SAMPLE', 'value': {'stream_name': 'test', 'index': index}}
+
+
+class PublisherTestCase(MiUnitTest):
+    """
+    Base class of the publisher tests, providing a spool directory
+    """
+    def setUp(self):
+        self.publisher = None
+        self.spool_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if self.publisher:
+            self.publisher.stop()
+            self.publisher._thread.join()
+        shutil.rmtree(self.spool_dir)
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(.01)
+        return condition()
+
+    def drain(self, publisher):
+        while publisher.publish():
+            pass
+
+
+@attr('UNIT', group='mi')
+class TestPublisher(PublisherTestCase):
+    def test_small_batch_wait(self):
+        # a partial batch waits at most publish_interval
+        self.publisher = CountPublisher(None, max_events=100, publish_interval=.5)
+        self.publisher.start()
+        for index in xrange(10):
+            self.publisher.enqueue(make_event(index))
+        self.assertTrue(self.wait_for(lambda: self.publisher.total == 10, 2))
+
+    def test_full_batch(self):
+        # a full batch is published without waiting for publish_interval
+        self.publisher = CountPublisher(None, max_events=100, publish_interval=3600)
+        self.publisher.start()
+        for index in xrange(150):
+            self.publisher.enqueue(make_event(index))
+        self.assertTrue(self.wait_for(lambda: self.publisher.get_stats()['published'] == 100))
+
+        # while the remaining partial batch waits
+        stats = self.publisher.get_stats()
+        self.assertEqual(stats['queued'], 50)
+        self.assertEqual(self.publisher.total, 100)
+
+    def test_adaptive_batch_size(self):
+        publisher = SlowPublisher(None, max_events=10)
+        publisher.TARGET_BATCH_LATENCY = .05
+        for index in xrange(5000):
+            publisher.enqueue(make_event(index))
+
+        # batches double while they publish quickly
+        publisher.event_latency = 0
+        for _ in xrange(4):
+            publisher.publish()
+        self.assertEqual(publisher.batches, [10, 20, 40, 80])
+
+        # and shrink towards the target latency when slow, but not below max_events
+        publisher.event_latency = .001
+        publisher.publish()
+        self.assertLess(publisher.get_stats()['batch_size'], 160)
+        self.assertGreaterEqual(publisher.get_stats()['batch_size'], 10)
+
+        stats = publisher.get_stats()
+        self.assertEqual(stats['published'], sum(publisher.batches))
+        self.assertEqual(stats['queued'], 5000 - sum(publisher.batches))
+        self.assertGreater(stats['batch_latency'], 0)
+
+    def test_failed_publish(self):
+        publisher = SlowPublisher(None, max_events=10)
+        for index in xrange(15):
+            publisher.enqueue(make_event(index))
+        publisher.fail = True
+        self.assertEqual(publisher.publish(), 15)
+        self.assertEqual(publisher.get_stats()['failed'], 10)
+        self.assertEqual(publisher.get_stats()['batch_size'], 10)
+
+        # failed events are requeued in order
+        publisher.fail = False
+        self.assertEqual(publisher.publish(), 5)
+        self.assertEqual([event['value']['index'] for event in publisher._deque], range(10, 15))
+
+    def test_filtered(self):
+        # particles of streams which are not allowed are counted as filtered, not published
+        publisher = SlowPublisher(['test'], max_events=10)
+        publisher.event_latency = 0
+        for index in xrange(10):
+            event = make_event(index)
+            if index % 2:
+                event['value']['stream_name'] = 'other'
+            publisher.enqueue(event)
+        self.assertEqual(publisher.publish(), 0)
+        self.assertEqual(publisher.indices, range(0, 10, 2))
+
+        stats = publisher.get_stats()
+        self.assertEqual(stats['published'], 5)
+        self.assertEqual(stats['filtered'], 5)
+        self.assertEqual(stats['failed'], 0)
+
+    def test_continuous_drain(self):
+        """
+        Verify a sustained stream is drained in growing batches, the publisher was limited to max_events
+        per publish_interval
+        """
+        self.publisher = CountPublisher(None, publish_interval=3600)
+        self.publisher.start()
+        count = 100000
+        start = time.time()
+        for index in xrange(count):
+            self.publisher.enqueue(make_event(index))
+
+        def drained():
+            stats = self.publisher.get_stats()
+            return stats['published'] + stats['queued'] == count and stats['queued'] < stats['batch_size']
+
+        # everything but a partial batch is published without waiting for publish_interval
+        self.assertTrue(self.wait_for(drained, 60))
+        stats = self.publisher.get_stats()
+        rate = stats['published'] / (time.time() - start)
+        log.info('publisher throughput: %.0f events/s, stats: %r', rate, stats)
+        self.assertEqual(stats['published'], self.publisher.total)
+        self.assertGreater(stats['batch_size'], Publisher.DEFAULT_MAX_EVENTS)
+
+    def test_spool(self):
+        publisher = SlowPublisher(None, max_events=10, spool_dir=self.spool_dir, spool_threshold=20)
+        publisher.event_latency = 0
+        publisher.fail = True
+        for index in xrange(100):
+            publisher.enqueue(make_event(index))
+        self.assertEqual(publisher.publish(), 100)
+        self.assertEqual(len(publisher._deque), 20)
+        self.assertEqual(publisher.get_stats()['spooled'], 80)
+
+        # newer events follow the spooled events
+        for index in xrange(100, 150):
+            publisher.enqueue(make_event(index))
+        publisher.fail = False
+        self.drain(publisher)
+        self.assertEqual(publisher.indices, range(150))
+        self.assertEqual(len(publisher._deque), 0)
+        # all segments have been deleted once read
+        self.assertEqual(os.listdir(self.spool_dir), ['cursor'])
+
+    def test_spool_restart(self):
+        publisher = SlowPublisher(None, max_events=10, spool_dir=self.spool_dir, spool_threshold=20)
+        publisher.event_latency = 0
+        for index in xrange(100):
+            publisher.enqueue(make_event(index))
+        # publish part of the events and read more of the spool into memory, then stop as the publisher thread does
+        publisher.publish()
+        publisher._replay()
+        self.assertEqual([event['value']['index'] for event in publisher._deque], range(10, 30))
+        publisher._close_spool()
+        published = publisher.indices
+
+        # the events which were in memory are returned to the spool, all are published by the next process
+        publisher = SlowPublisher(None, max_events=10, spool_dir=self.spool_dir, spool_threshold=20)
+        publisher.event_latency = 0
+        self.assertEqual(publisher.get_stats()['spooled'], 90)
+        self.drain(publisher)
+        self.assertEqual(published + publisher.indices, range(100))
+
+    def test_spool_unread(self):
+        spool = EventSpool(self.spool_dir, segment_events=7)
+        for index in xrange(10):
+            spool.append('%d' % index)
+        self.assertEqual(spool.read(9), range(9))
+
+        # returned events are read before the rest of the spool and survive a restart
+        spool.unread(['5', '6', '7', '8'])
+        spool.append('10')
+        self.assertEqual(spool.pending, 6)
+        spool.close()
+        spool = EventSpool(self.spool_dir, segment_events=7)
+        self.assertEqual(spool.pending, 6)
+        self.assertEqual(spool.read(100), range(5, 11))
+
+        # including to an empty spool
+        spool.unread(['11'])
+        spool.close()
+        spool = EventSpool(self.spool_dir, segment_events=7)
+        self.assertEqual(spool.read(100), [11])
+        self.assertEqual(spool.pending, 0)
+
+    def test_spool_segments(self):
+        spool = EventSpool(self.spool_dir, segment_events=7)
+        for index in xrange(30):
+            spool.append('%d' % index)
+        self.assertEqual(spool.read(10), range(10))
+        self.assertEqual(len(os.listdir(self.spool_dir)), 5)
+
+        # a partially written event is dropped on restart
+        spool.flush()
+        with open(os.path.join(self.spool_dir, 'segment-%010d.jsonl' % 4), 'ab') as segment_file:
+            segment_file.write('3')
+        spool.close()
+        spool = EventSpool(self.spool_dir, segment_events=7)
+        self.assertEqual(spool.pending, 20)
+        spool.append('30')
+        self.assertEqual(spool.read(100), range(10, 31))
+        self.assertEqual(spool.pending, 0)
+
+
+@attr('BENCHMARK', group='mi')
+class TestPublisherBenchmark(PublisherTestCase):
+    def test_spool_benchmark(self):
+        """
+        Measure spilling to the spool while publishing fails and replaying from it once publishing recovers
+        """
+        publisher = SlowPublisher(None, spool_dir=self.spool_dir, spool_threshold=1000)
+        publisher.event_latency = 0
+        publisher.fail = True
+        count = 100000
+        events = [make_event(index) for index in xrange(count)]
+
+        start = time.time()
+        for event in events:
+            publisher.enqueue(event)
+        publisher.publish()
+        spill = count / (time.time() - start)
+        self.assertEqual(publisher.get_stats()['spooled'], count - 1000)
+
+        publisher.fail = False
+        start = time.time()
+        self.drain(publisher)
+        replay = count / (time.time() - start)
+        self.assertEqual(publisher.indices, range(count))
+
+        log.info('publisher spool: spill %.0f events/s, replay %.0f events/s', spill, replay)
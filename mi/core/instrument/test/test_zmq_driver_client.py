@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.instrument.test.test_zmq_driver_client
+@file mi/core/instrument/test/test_zmq_driver_client.py
+@brief Test the ZMQ driver client against an in-process stand-in driver
+"""
+
+import threading
+import time
+
+import zmq
+from nose.plugins.attrib import attr
+
+from mi.core.exceptions import InstrumentCommandException
+from mi.core.instrument.zmq_driver_client import ZmqDriverClient, ClientStoppedException
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+
+class StandInDriver(object):
+    """
+    Serves commands on a REP socket and publishes events on a PUB socket,
+    like ZmqDriverProcess, from a thread in this process.
+    """
+    def __init__(self):
+        self.context = zmq.Context()
+        self.cmd_sock = self.context.socket(zmq.REP)
+        self.cmd_port = self.cmd_sock.bind_to_random_port('tcp://127.0.0.1')
+        self.evt_sock = self.context.socket(zmq.PUB)
+        # queue bursts of events rather than dropping them
+        self.evt_sock.setsockopt(zmq.SNDHWM, 0)
+        self.evt_port = self.evt_sock.bind_to_random_port('tcp://127.0.0.1')
+        self.stop = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while not self.stop:
+            if not self.cmd_sock.poll(100):
+                continue
+            msg = self.cmd_sock.recv_pyobj()
+            cmd = msg['cmd']
+            if cmd == 'test_events':
+                for evt in msg['kwargs']['events']:
+                    self.evt_sock.send_pyobj(evt)
+                reply = cmd
+            elif cmd == 'publish_time':
+                self.evt_sock.send_pyobj(time.time())
+                reply = cmd
+            elif cmd == 'sleep':
+                time.sleep(msg['args'][0])
+                reply = cmd
+            elif cmd == 'fail':
+                reply = InstrumentCommandException('fail')
+            else:
+                reply = msg
+            self.cmd_sock.send_pyobj(reply)
+
+    def close(self):
+        self.stop = True
+        self.thread.join()
+        self.cmd_sock.close(0)
+        self.evt_sock.close(0)
+        self.context.term()
+
+
+class ZmqDriverClientTestCase(MiUnitTest):
+    """
+    Connects a client to a stand-in driver
+    """
+    def setUp(self):
+        self.driver = StandInDriver()
+        self.events = []
+        self.batches = []
+        self.client = ZmqDriverClient('127.0.0.1', self.driver.cmd_port, self.driver.evt_port)
+        self.client.start_messaging(self.events.append, self.batches.append)
+        self.wait_for_subscription()
+
+    def tearDown(self):
+        self.client.stop_messaging()
+        self.driver.close()
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(.001)
+        return condition()
+
+    def wait_for_subscription(self):
+        # events published before the subscription reaches the driver are dropped
+        deadline = time.time() + 5
+        while not self.events and time.time() < deadline:
+            self.client.cmd_dvr('test_events', events=['ping'])
+            self.wait_for(lambda: self.events, .05)
+        self.assertTrue(self.events)
+        time.sleep(.05)
+        del self.events[:]
+        del self.batches[:]
+
+
+@attr('UNIT', group='mi')
+class TestZmqDriverClient(ZmqDriverClientTestCase):
+    def test_cmd_dvr(self):
+        reply = self.client.cmd_dvr('process_echo', 'x', data='test 1 2 3')
+        self.assertEqual(reply, {'cmd': 'process_echo', 'args': ('x',), 'kwargs': {'data': 'test 1 2 3'}})
+        self.assertRaises(InstrumentCommandException, self.client.cmd_dvr, 'fail')
+
+    def test_events(self):
+        events = ['I am event number 1!', 'And I am event number 2!']
+        self.assertEqual(self.client.cmd_dvr('test_events', events=events), 'test_events')
+        self.assertTrue(self.wait_for(lambda: len(self.events) == 2))
+        self.assertEqual(self.events, events)
+        self.assertEqual(sum(self.batches, []), events)
+
+    def test_pipelined(self):
+        requests = [self.client.send_cmd('process_echo', index) for index in xrange(100)]
+        replies = [self.client.get_reply(request, 5) for request in reversed(requests)]
+        self.assertEqual([reply['args'][0] for reply in replies], range(99, -1, -1))
+
+    def test_reply_timeout(self):
+        request = self.client.send_cmd('sleep', .5)
+        self.assertRaises(zmq.Again, self.client.get_reply, request, .01)
+        self.assertEqual(self.client.get_reply(request, 5), 'sleep')
+
+    def test_stop_pending(self):
+        request = self.client.send_cmd('sleep', .5)
+        self.client.stop_messaging()
+        self.assertRaises(ClientStoppedException, self.client.get_reply, request, 1)
+        self.assertRaises(ClientStoppedException, self.client.send_cmd, 'process_echo')
+
+    def test_event_callback_errors(self):
+        def failing_batch_callback(events):
+            raise ValueError('batch')
+
+        def failing_callback(evt):
+            if evt % 10 == 0:
+                raise ValueError(evt)
+            self.events.append(evt)
+
+        self.client.evt_batch_callback = failing_batch_callback
+        self.client.evt_callback = failing_callback
+        self.client.cmd_dvr('test_events', events=range(100))
+
+        # every event, except those the callback failed on, is still handled
+        self.assertTrue(self.wait_for(lambda: len(self.events) == 90))
+        self.assertEqual(self.events, [evt for evt in range(100) if evt % 10])
+
+    def test_event_order(self):
+        events = range(10000)
+        self.client.cmd_dvr('test_events', events=events)
+        self.assertTrue(self.wait_for(lambda: len(self.events) == len(events), 30))
+        self.assertEqual(self.events, events)
+        self.assertEqual(sum(self.batches, []), events)
+        self.assertTrue(all(len(batch) <= self.client.EVENT_BATCH_SIZE for batch in self.batches))
+
+
+@attr('BENCHMARK', group='mi')
+class TestZmqDriverClientBenchmark(ZmqDriverClientTestCase):
+    def test_benchmark(self):
+        """
+        Measure command round trip rate, one at a time and pipelined, and event latency
+        """
+        count = 1000
+        start = time.time()
+        for index in xrange(count):
+            self.client.cmd_dvr('process_echo', index)
+        # each command waited at least half a second when the client polled
+        log.info('driver client commands: %.0f/s', count / (time.time() - start))
+
+        start = time.time()
+        requests = [self.client.send_cmd('process_echo', index) for index in xrange(count)]
+        for request in requests:
+            self.client.get_reply(request, 5)
+        log.info('driver client pipelined commands: %.0f/s', count / (time.time() - start))
+
+        latencies = []
+        self.client.evt_callback = lambda evt: latencies.append(time.time() - evt)
+        for _ in xrange(200):
+            self.client.cmd_dvr('publish_time')
+        self.assertTrue(self.wait_for(lambda: len(latencies) == 200))
+        log.info('driver client event latency: %.1f us', sum(latencies) / len(latencies) * 1e6)
+
+        events = range(100000)
+        self.client.evt_callback = None
+        del self.batches[:]
+        start = time.time()
+        self.client.cmd_dvr('test_events', events=events)
+        self.assertTrue(self.wait_for(lambda: sum(map(len, self.batches)) == len(events), 30))
+        log.info('driver client events: %.0f/s in %d batches', len(events) / (time.time() - start),
+                 len(self.batches))
@@ -29,6 +29,7 @@ from docopt import docopt
 from logging import _levelNames
 from mi.core.common import BaseEnum
 from mi.core.exceptions import UnexpectedError, InstrumentCommandException, InstrumentException
+from mi.core.instrument.data_particle import CommonDataParticleType
 from mi.core.instrument.instrument_driver import DriverAsyncEvent
 from mi.core.instrument.publisher import Publisher
 from mi.core.log import get_logger, get_logging_metaclass
@@ -390,6 +391,7 @@ class DriverWrapper(object):
         driver_class = getattr(module, self.driver_class)
         self.driver = driver_class(self.send_event, self.refdes)
         self.driver.set_init_params(self.init_params)
+        self.driver.set_stream_filter(self.is_published)
         log.info('Imported and created driver from module: %r class: %r driver: %r refdes: %r',
                  module, driver_class, self.driver, self.refdes)
         return True
@@ -405,14 +407,21 @@ class DriverWrapper(object):
             log.error(evt)
 
         if evt[EventKeys.TYPE] == DriverAsyncEvent.SAMPLE:
-            if evt[EventKeys.VALUE].get('stream_name') == 'raw':
-                # don't publish raw
+            if not self.is_published(evt[EventKeys.VALUE].get('stream_name')):
                 return
 
             self.particle_publisher.enqueue(evt)
         else:
             self.event_publisher.enqueue(evt)
 
+    def is_published(self, stream_name):
+        """
+        Stream filter of the driver, raw data is never published
+        @param stream_name name of a particle stream
+        @retval True if particles of the stream are published
+        """
+        return stream_name != CommonDataParticleType.RAW and self.particle_publisher.is_allowed(stream_name)
+
     def run(self):
         """
         Process entry point. Construct driver and start messaging loops.
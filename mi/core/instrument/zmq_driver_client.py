@@ -17,9 +17,9 @@ import ion.services.mi.zmq_driver_client as zdc
 c = zdc.ZmqDriverClient('localhost', 5556, 5557)
 """
 
-import thread
-import logging
-import time
+import itertools
+import threading
+import cPickle as pickle
 
 # We import "regular" zmq, not the patched version because
 # we handle the nonblocking sockets directly as they need to work
@@ -29,13 +29,53 @@ import zmq
 from mi.core.instrument.driver_client import DriverClient
 from mi.core.log import get_logger ; log = get_logger()
 
- 
+
+class ClientStoppedException(Exception):
+    """
+    Raised for commands still awaiting a reply when client messaging is stopped.
+    """
+
+
+class PendingReply(object):
+    """
+    A command sent to the driver process, completed when its reply arrives.
+    """
+    def __init__(self, request_id, msg):
+        self.request_id = request_id
+        self.msg = msg
+        self.reply = None
+        self._done = threading.Event()
+
+    def set(self, reply):
+        self.reply = reply
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Block until the reply arrives.
+        @param timeout Seconds to wait, forever if None.
+        @retval True if the reply arrived.
+        """
+        return self._done.wait(timeout)
+
+
 class ZmqDriverClient(DriverClient):
     """
-    A class for communicating with a ZMQ-based driver process using python
-    thread for catching asynchronous driver events.
+    A class for communicating with a ZMQ-based driver process. A single
+    messaging thread owns the ZMQ sockets and blocks on a poller for
+    command replies, asynchronous driver events and requests from
+    callers. Commands are sent on a DEALER socket with the request id as
+    the routing envelope, which the driver process REP socket returns with
+    the reply, so any number of commands can be in flight at once.
     """
-    
+    # Longest time the messaging thread blocks in the poller, in ms.
+    POLL_TIMEOUT = 1000
+    # Most events received before they are handed to the callbacks.
+    EVENT_BATCH_SIZE = 1000
+
     def __init__(self, host, cmd_port, event_port):
         """
         Initialize members.
@@ -53,116 +93,219 @@ class ZmqDriverClient(DriverClient):
         self.zmq_cmd_socket = None
         self.event_thread = None
         self.stop_event_thread = True
-        
-    def start_messaging(self, evt_callback=None):
+        self.evt_batch_callback = None
+        self._pipe_address = 'inproc://zmq-driver-client-%x' % id(self)
+        self._pipe = None
+        self._pipe_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def start_messaging(self, evt_callback=None, evt_batch_callback=None):
         """
         Initialize and start messaging resources for the driver process client.
-        Initializes command socket for sending requests,
-        and starts event thread that listens for events from the driver
-        process independently of command request-reply.
+        Starts the messaging thread, which connects the command and event
+        sockets and listens for replies and events independently of the
+        threads sending commands.
+        @param evt_callback Called with each driver event.
+        @param evt_batch_callback Called with the list of events received in
+        one pass of the messaging thread.
         """
         self.zmq_context = zmq.Context()
-        self.zmq_cmd_socket = self.zmq_context.socket(zmq.REQ)
-        self.zmq_cmd_socket.connect(self.cmd_host_string)
-        log.info('Driver client cmd socket connected to %s.' %
-                       self.cmd_host_string)        
         self.evt_callback = evt_callback
-        
-        def recv_evt_messages(driver_client):
-            """
-            A looping function that monitors a ZMQ SUB socket for asynchronous
-            driver events. Can be run as a thread or greenlet.
-            @param driver_client The client object that launches the thread.
-            """
-            context = zmq.Context()
-            sock = context.socket(zmq.SUB)
-            sock.connect(driver_client.event_host_string)
-            sock.setsockopt(zmq.SUBSCRIBE, '')
-            log.info('Driver client event thread connected to %s.' %
-                  driver_client.event_host_string)
-
-            driver_client.stop_event_thread = False
-            #last_time = time.time()
-            while not driver_client.stop_event_thread:
-                try:
-                    evt = sock.recv_pyobj(flags=zmq.NOBLOCK)
-                    log.debug('got event: %s' % str(evt))
-                    if driver_client.evt_callback:
-                        driver_client.evt_callback(evt)
-                except zmq.ZMQError:
-                    time.sleep(.5)
-                #cur_time = time.time()
-                #if cur_time - last_time > 5:
-                #    log.info('event thread listening')
-                #    last_time = cur_time
-            sock.close()
-            context.term()
-            log.info('Client event socket closed.')
-        self.event_thread = thread.start_new_thread(recv_evt_messages, (self,))
+        self.evt_batch_callback = evt_batch_callback
+
+        # the messaging thread binds the pipe before any command can be sent on it
+        ready = threading.Event()
+        self.stop_event_thread = False
+        self.event_thread = threading.Thread(target=self._run_messaging, args=(ready,),
+                                             name='zmq-driver-client')
+        self.event_thread.daemon = True
+        self.event_thread.start()
+        ready.wait()
+
+        self._pipe = self.zmq_context.socket(zmq.PUSH)
+        self._pipe.setsockopt(zmq.LINGER, 0)
+        self._pipe.connect(self._pipe_address)
         log.info('Driver client messaging started.')
-        
+
     def stop_messaging(self):
         """
-        Close messaging resources for the driver process client. Close
-        ZMQ command socket and terminate command context. Set flag to
-        cause event thread to close event socket and context and terminate.
-        Await event thread completion and return.
+        Close messaging resources for the driver process client. Signal the
+        messaging thread to close the command and event sockets, await its
+        completion and terminate the context. Commands still awaiting a reply
+        are completed with a ClientStoppedException.
         """
-        
-        self.zmq_cmd_socket.close()
-        self.zmq_cmd_socket = None
-        self.zmq_context.term()
-        self.zmq_context = None
-        self.stop_event_thread = True                    
-        #self.event_thread.join()
-        self.event_thread = None
+        if self.event_thread is not None:
+            self.stop_event_thread = True
+            with self._pipe_lock:
+                # an empty message wakes the messaging thread
+                self._pipe.send('')
+                self._pipe.close()
+                self._pipe = None
+            self.event_thread.join()
+            self.event_thread = None
+            self.zmq_context.term()
+            self.zmq_context = None
+
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for request in pending.itervalues():
+            request.set(ClientStoppedException('Driver client messaging stopped'))
+
         self.evt_callback = None
-        log.info('Driver client messaging closed.')        
-    
-    def cmd_dvr(self, cmd, *args, **kwargs):
+        self.evt_batch_callback = None
+        log.info('Driver client messaging closed.')
+
+    def send_cmd(self, cmd, *args, **kwargs):
         """
-        Command a driver by request-reply messaging. Package command
-        message and send on blocking command socket. Block on same socket
-        to receive the reply. Return the driver reply.
+        Send a command to the driver without waiting for the reply.
         @param cmd The driver command identifier.
         @param args Positional arguments of the command.
         @param kwargs Keyword arguments of the command.
-        @retval Command result.
+        @retval PendingReply for the command, see get_reply.
         """
         # Package command dictionary.
         msg = {'cmd':cmd,'args':args,'kwargs':kwargs}
-        
-        log.debug('Sending command %s.' % str(msg))
+        request = PendingReply(str(next(self._request_ids)), msg)
+        with self._pending_lock:
+            self._pending[request.request_id] = request
+
+        log.debug('Sending command %s.', msg)
+        with self._pipe_lock:
+            if self._pipe is None:
+                with self._pending_lock:
+                    self._pending.pop(request.request_id, None)
+                raise ClientStoppedException('Driver client messaging not started')
+            self._pipe.send_multipart([request.request_id, pickle.dumps(msg, pickle.HIGHEST_PROTOCOL)])
+        return request
+
+    def get_reply(self, request, timeout=None):
+        """
+        Wait for the reply to a command sent with send_cmd.
+        @param request PendingReply returned by send_cmd.
+        @param timeout Seconds to wait, forever if None.
+        @retval Command result.
+        @throws Exception returned by the driver, or ClientStoppedException.
+        @throws zmq.Again if the reply did not arrive before the timeout.
+        """
+        if not request.wait(timeout):
+            raise zmq.Again('No reply to %s within %s seconds' % (request.msg['cmd'], timeout))
+
+        reply = request.reply
+        log.debug('Reply: %s.', reply)
+
+        if isinstance(reply, Exception):
+            raise reply
+        else:
+            return reply
+
+    def cmd_dvr(self, cmd, *args, **kwargs):
+        """
+        Command a driver by request-reply messaging. Send the command and
+        block until the messaging thread receives the reply. Return the
+        driver reply.
+        @param cmd The driver command identifier.
+        @param args Positional arguments of the command.
+        @param kwargs Keyword arguments of the command.
+        @retval Command result.
+        """
+        request = self.send_cmd(cmd, *args, **kwargs)
+        if cmd == 'stop_driver_process':
+            return 'driver stopping'
+
+        log.debug('Awaiting reply.')
+        return self.get_reply(request)
+
+    def _run_messaging(self, ready):
+        """
+        Messaging thread, owns all ZMQ sockets except the sending end of the
+        pipe. Forwards commands from the pipe to the driver process, and
+        dispatches command replies and batches of events as they arrive.
+        @param ready Event set once the pipe is bound.
+        """
+        pipe = self.zmq_context.socket(zmq.PULL)
+        pipe.bind(self._pipe_address)
+        ready.set()
+
+        cmd_sock = self.zmq_context.socket(zmq.DEALER)
+        # give commands sent just before stopping, like stop_driver_process, a chance to go out
+        cmd_sock.setsockopt(zmq.LINGER, 1000)
+        cmd_sock.connect(self.cmd_host_string)
+        log.info('Driver client cmd socket connected to %s.', self.cmd_host_string)
+
+        evt_sock = self.zmq_context.socket(zmq.SUB)
+        evt_sock.setsockopt(zmq.LINGER, 0)
+        evt_sock.connect(self.event_host_string)
+        evt_sock.setsockopt(zmq.SUBSCRIBE, '')
+        log.info('Driver client event thread connected to %s.', self.event_host_string)
+
+        poller = zmq.Poller()
+        poller.register(pipe, zmq.POLLIN)
+        poller.register(cmd_sock, zmq.POLLIN)
+        poller.register(evt_sock, zmq.POLLIN)
+
+        try:
+            while not self.stop_event_thread:
+                ready_socks = dict(poller.poll(self.POLL_TIMEOUT))
+                if pipe in ready_socks:
+                    self._forward_commands(pipe, cmd_sock)
+                if cmd_sock in ready_socks:
+                    self._recv_replies(cmd_sock)
+                if evt_sock in ready_socks:
+                    self._recv_events(evt_sock)
+        finally:
+            pipe.close(0)
+            cmd_sock.close()
+            evt_sock.close()
+            log.info('Client event socket closed.')
+
+    def _forward_commands(self, pipe, cmd_sock):
         while True:
             try:
-                # Attempt command send. Retry if necessary.
-                self.zmq_cmd_socket.send_pyobj(msg)
-                if msg == 'stop_driver_process':
-                    return 'driver stopping'
-
-                # Command sent, break out and wait for reply.
-                break    
-
-            except zmq.ZMQError:
-                # Socket not ready to accept send. Sleep and retry later.
-                time.sleep(.5)
-            
-        log.debug('Awaiting reply.')
+                frames = pipe.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            if len(frames) == 2:
+                # the REP socket returns the frames before the empty delimiter with the reply
+                request_id, payload = frames
+                cmd_sock.send_multipart([request_id, '', payload])
+
+    def _recv_replies(self, cmd_sock):
         while True:
             try:
-                # Attempt reply recv. Retry if necessary.
-                reply = self.zmq_cmd_socket.recv_pyobj(flags=zmq.NOBLOCK)
-                # Reply recieved, break and return.
+                frames = cmd_sock.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            request_id, payload = frames[0], frames[-1]
+            with self._pending_lock:
+                request = self._pending.pop(request_id, None)
+            if request is None:
+                log.debug('Discarding reply to request %s.', request_id)
+                continue
+            try:
+                request.set(pickle.loads(payload))
+            except Exception as e:
+                request.set(e)
+
+    def _recv_events(self, evt_sock):
+        events = []
+        while len(events) < self.EVENT_BATCH_SIZE:
+            try:
+                events.append(evt_sock.recv_pyobj(zmq.NOBLOCK))
+            except zmq.Again:
                 break
+        log.debug('got %d events', len(events))
 
-            except zmq.ZMQError:
-                # Socket not ready with the reply. Sleep and retry later.
-                time.sleep(.5)
-                
-        log.debug('Reply: %s.' % str(reply))
-        
-        if isinstance(reply, Exception):
-            raise reply
-        else:
-            return reply
-    
+        if self.evt_batch_callback:
+            try:
+                self.evt_batch_callback(events)
+            except Exception:
+                log.exception('Error in driver client event batch callback')
+        if self.evt_callback:
+            # an error handling one event must not drop the rest of the batch
+            for evt in events:
+                try:
+                    self.evt_callback(evt)
+                except Exception:
+                    log.exception('Error in driver client event callback')
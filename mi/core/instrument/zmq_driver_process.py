@@ -144,6 +144,9 @@ class ZmqDriverProcess(driver_process.DriverProcess):
             zmq_driver_process.stop_cmd_thread = False
             while not zmq_driver_process.stop_cmd_thread:
                 try:
+                    # block until a command arrives, waking up to check the stop flag
+                    if not sock.poll(100):
+                        continue
                     msg = sock.recv_pyobj(flags=zmq.NOBLOCK)
                     reply = zmq_driver_process.cmd_driver(msg)
                     # send, send, and resend
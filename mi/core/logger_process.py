@@ -11,6 +11,7 @@ and logging.
 __author__ = 'Edward Hunter'
 
 
+import select
 import socket
 import threading
 import time
@@ -47,6 +48,15 @@ class BaseLoggerProcess(DaemonProcess):
     Derived subclasses provide read/write logic for TCP/IP, serial or other
     device hardware.
     """
+    # Size of the reusable receive buffers.
+    RECV_BUFFER_SIZE = 65536
+    # Stop reading from a side while this much data is waiting to be sent to the other.
+    MAX_PENDING = 1048576
+    # Longest the run loop waits for traffic, bounding parent checks and log flushes.
+    POLL_TIMEOUT = 1.0
+    # Poll interval for devices that can't be waited on with select.
+    DEVICE_POLL_INTERVAL = .1
+
     @staticmethod
     def launch_logger(cmd_str):
         """
@@ -81,6 +91,12 @@ class BaseLoggerProcess(DaemonProcess):
         self.ppid = ppid
         self.last_parent_check = None
         self.portfname = workdir + portfname
+        self.last_log_flush = None
+        self.log_dirty = False
+        self.driver_recv_buf = bytearray(self.RECV_BUFFER_SIZE)
+        self.device_recv_buf = bytearray(self.RECV_BUFFER_SIZE)
+        self.driver_pending = bytearray()
+        self.device_pending = bytearray()
         
     def _init_driver_comms(self):
         """
@@ -161,6 +177,7 @@ class BaseLoggerProcess(DaemonProcess):
             self.driver_sock.close()
             self.driver_sock = None
             self.driver_addr = None
+            del self.driver_pending[:]
             self.statusfile.write('_close_driver_comms: closed driver connection.\n')
             self.statusfile.flush()
 
@@ -192,6 +209,15 @@ class BaseLoggerProcess(DaemonProcess):
         """
         return False
 
+    def _device_selectable(self):
+        """
+        Object the run loop can select on for device readiness. Overridden
+        in hardware specific subclasses.
+        @retval An object with a fileno() method, or None if the device
+        must be polled.
+        """
+        return None
+
     def _check_parent(self):
         """
         Check if the original parent is still alive, and fire the shutdown
@@ -213,109 +239,97 @@ class BaseLoggerProcess(DaemonProcess):
                     self.statusfile.flush()
                     self._cleanup()
 
+    def _send_pending(self, sock, pending):
+        """
+        Send as much pending data as the socket accepts without blocking,
+        removing it from the buffer. Data that does not fit in the socket
+        buffer stays pending until the run loop finds the socket writable.
+        @param sock The nonblocking socket to send on.
+        @param pending bytearray of data waiting to be sent.
+        @throws socket.error on errors other than resource temporarily
+        unavailable.
+        """
+        while pending:
+            try:
+                sent = sock.send(pending)
+
+            except socket.error as e:
+                # [Errno 35] Resource temporarily unavailable.
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    # The network write buffer is full, wait for writability.
+                    return
+                raise
+
+            del pending[:sent]
+
     def read_driver(self):
         """
         Read data from driver, if available. Log errors to status file.
         Handles resource unavailable, connection reset by peer, broken pipe
-        and unspecified socket errors.
-        @retval The string of data read from the driver or None.
+        and unspecified socket errors. Closes the driver connection when the
+        driver disconnects.
+        @retval A memoryview of the data read from the driver, valid until
+        the next read, or None.
         """
         data = None
         if self.driver_sock:
             try:
-                data = self.driver_sock.recv(4096)
+                count = self.driver_sock.recv_into(self.driver_recv_buf)
+                if count:
+                    data = memoryview(self.driver_recv_buf)[:count]
 
-            except socket.error as e:                
+                else:
+                    # The driver has disconnected, close socket.
+                    self.statusfile.write('read_driver: driver disconnected.\n')
+                    self.statusfile.flush()
+                    self._close_driver_sock()
+
+            except socket.error as e:
                 # [Errno 35] Resource temporarily unavailable.
-                if e.errno == errno.EAGAIN:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
                     # Nothing to read, proceed out of the function.
                     pass
-                
-                # [Errno 54] Connection reset by peer.
-                elif e.errno == errno.ECONNRESET:
-                    # The client side has disconnected, report and close socket.
-                    self.statusfile.write('read_driver: raised errno %i, %s.\n'
-                                          % (e.errno, str(e)))
-                    self.statusfile.flush()
-                    self.driver_sock.close()
-                    self.driver_sock = None
-                    self.driver_addr = None
-                
-                # [Errno 32] Broken pipe.
-                elif e.errno == errno.EPIPE:
-                    # Broken pipe, report and close socket.
-                    self.statusfile.write('read_driver: raised errno %i, %s.\n'
-                                          % (e.errno, str(e)))
-                    self.statusfile.flush()
-                    self.driver_sock.close()
-                    self.driver_sock = None
-                    self.driver_addr = None
-                
-                # Unspecified socket error, report and close socket.
+
+                # [Errno 54] Connection reset by peer, [Errno 32] Broken pipe
+                # or unspecified socket error, report and close socket.
                 else:
-                    # TBD. Report and close socket.
                     self.statusfile.write('read_driver: raised errno %i, %s.\n'
                                           % (e.errno, str(e)))
                     self.statusfile.flush()
-                    self.driver_sock.close()
-                    self.driver_sock = None
-                    self.driver_addr = None
+                    self._close_driver_sock()
 
         return data
-    
+
     def write_driver(self, data):
         """
-        Write data to driver, retrying until all has been sent. Log errors
-        to status file. Handles resource unavailable, connection reset by peer,
-        broken pipe and unspecified socket errors.
+        Write data to driver. Sends as much as the socket accepts now, the
+        rest is sent by the run loop when the socket becomes writable. Log
+        errors to status file. Handles resource unavailable, connection reset
+        by peer, broken pipe and unspecified socket errors.
         @param data The data string to write to the driver.
         """
         if self.driver_sock:
-            sent = 0
-            while len(data)>0:
-                try:
-                    sent = self.driver_sock.send(data)
-                    data = data[sent:]
+            self.driver_pending += data
+            try:
+                self._send_pending(self.driver_sock, self.driver_pending)
+
+            except socket.error as e:
+                # [Errno 54] Connection reset by peer, [Errno 32] Broken pipe
+                # or unspecified socket error, report and close socket.
+                self.statusfile.write('write_driver: raised errno %i, %s.\n'
+                                      % (e.errno, str(e)))
+                self.statusfile.flush()
+                self._close_driver_sock()
+
+    def _close_driver_sock(self):
+        """
+        Close the driver connection, discarding data not yet sent to it.
+        """
+        self.driver_sock.close()
+        self.driver_sock = None
+        self.driver_addr = None
+        del self.driver_pending[:]
 
-                except socket.error as e:                
-                    # [Errno 35] Resource temporarily unavailable.
-                    if e.errno == errno.EAGAIN:
-                        # Occurs when the network write buffer is full.
-                        # Sleep a short period of time and retry.
-                        time.sleep(.1)
-                    
-                    # [Errno 54] Connection reset by peer.
-                    elif e.errno == errno.ECONNRESET:
-                        # The client side has disconnected, report and close socket.
-                        self.statusfile.write('read_driver: raised errno %i, %s.\n'
-                                              % (e.errno, str(e)))
-                        self.statusfile.flush()
-                        self.driver_sock.close()
-                        self.driver_sock = None
-                        self.driver_addr = None
-                        break
-                    
-                    # [Errno 32] Broken pipe.
-                    elif e.errno == errno.EPIPE:
-                        # Broken pipe, report and close socket.
-                        self.statusfile.write('read_driver: raised errno %i, %s.\n'
-                                              % (e.errno, str(e)))
-                        self.statusfile.flush()
-                        self.driver_sock.close()
-                        self.driver_sock = None
-                        self.driver_addr = None
-                        break
-                    
-                    # Unspecified socket error, report and close socket.
-                    else:
-                        # TBD. Report and close socket.
-                        self.statusfile.write('read_driver: raised errno %i, %s.\n' % (e.errno, str(e)))
-                        self.statusfile.flush()
-                        self.driver_sock.close()
-                        self.driver_sock = None
-                        self.driver_addr = None
-                        break
-                    
     def read_device(self):
         """
         Read from device, if available. Overridden by hardware
@@ -394,24 +408,94 @@ class BaseLoggerProcess(DaemonProcess):
             self._cleanup()
             return
         
-        #last_time = time.time()
+        self._forward()
+
+    def _forward(self):
+        """
+        Forward traffic between driver and device until the device
+        disconnects. Waits in select until a socket is ready, so traffic is
+        forwarded as soon as it arrives. Reading from a side stops while too
+        much of its data is waiting to be sent to the other side.
+        """
+        self.last_log_flush = time.time()
         while self._device_connected():
-            self._accept_driver_comms()
-            driver_data = self.read_driver()
-            if driver_data:
-                self.write_device(driver_data)
-                self.logfile.write(self.delim[0]+repr(driver_data)+self.delim[1])
-                self.logfile.write('\n')
-                self.logfile.flush()
-            device_data = self.read_device()
-            if device_data:
-                self.write_driver(device_data)
-                self.logfile.write(repr(device_data))
-                self.logfile.write('\n')
-                self.logfile.flush()
+            device = self._device_selectable()
+            readers = []
+            writers = []
+            if self.driver_server_sock:
+                readers.append(self.driver_server_sock)
+            if self.driver_sock:
+                if len(self.device_pending) < self.MAX_PENDING:
+                    readers.append(self.driver_sock)
+                if self.driver_pending:
+                    writers.append(self.driver_sock)
+            if device is not None:
+                if len(self.driver_pending) < self.MAX_PENDING:
+                    readers.append(device)
+                if self.device_pending:
+                    writers.append(device)
+                timeout = self.POLL_TIMEOUT
+            else:
+                timeout = self.DEVICE_POLL_INTERVAL
+
+            try:
+                readable, writable, _ = select.select(readers, writers, [], timeout)
+
+            except select.error as e:
+                # Interrupted system call, retry.
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            if self.driver_server_sock in readable:
+                self._accept_driver_comms()
+
+            if self.driver_sock and self.driver_sock in writable:
+                self.write_driver('')
+
+            if device is not None and device in writable:
+                self.write_device('')
+
+            if self.driver_sock and self.driver_sock in readable:
+                driver_data = self.read_driver()
+                if driver_data:
+                    self.write_device(driver_data)
+                    self._log_data(driver_data, self.delim)
+
+            if device is None or device in readable:
+                device_data = self.read_device()
+                if device_data:
+                    self.write_driver(device_data)
+                    self._log_data(device_data)
+
+            if not readable or time.time() - self.last_log_flush > self.POLL_TIMEOUT:
+                self._flush_log()
             self._check_parent()
-            if not driver_data and not device_data:
-                time.sleep(.1)
+
+        self._flush_log()
+
+    def _log_data(self, data, delim=None):
+        """
+        Append traffic to the buffered log file. The log is flushed when the
+        logger is idle or at least once per poll timeout.
+        @param data The data forwarded.
+        @param delim 2-element delimiter written around the data, used to
+        mark traffic from the driver.
+        """
+        if self.logfile:
+            if delim:
+                self.logfile.write(delim[0])
+                self.logfile.write(data)
+                self.logfile.write(delim[1])
+            else:
+                self.logfile.write(data)
+            self.log_dirty = True
+
+    def _flush_log(self):
+        if self.log_dirty and self.logfile:
+            self.logfile.flush()
+        self.log_dirty = False
+        self.last_log_flush = time.time()
 
 class EthernetDeviceLogger(BaseLoggerProcess):
     """
@@ -524,103 +608,84 @@ class EthernetDeviceLogger(BaseLoggerProcess):
         @retval True on success, False otherwise.
         """
         return self.device_sock != None
+
+    def _device_selectable(self):
+        """
+        The device socket, selected on by the run loop.
+        """
+        return self.device_sock
                             
     def read_device(self):
         """
         Read from an ethernet device, if available. Log errors (except
         resource temporarily unavailable, if they occur.) Handles resource
         temporarily unavailable, connection reset by peer, broken pipe,
-        and unspecified socket errors.
-        @retval A data string read from the device, or None.
+        and unspecified socket errors. Closes the device connection (ending
+        the logger) when the device disconnects.
+        @retval A memoryview of the data read from the device, valid until
+        the next read, or None.
         """
         data = None
         if self.device_sock:
             try:
-                data = self.device_sock.recv(4096)
+                count = self.device_sock.recv_into(self.device_recv_buf)
+                if count:
+                    data = memoryview(self.device_recv_buf)[:count]
+
+                else:
+                    # The device has disconnected, close socket (end logger).
+                    self.statusfile.write('read_device: device disconnected.\n')
+                    self.statusfile.flush()
+                    self._close_device_sock()
 
-            except socket.error as e:                
+            except socket.error as e:
                 # [Errno 35] Resource temporarily unavailable.
-                if e.errno == errno.EAGAIN:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
                     # No data to read from device.
                     # Proceed out of the read function.
                     pass
-                
-                # [Errno 54] Connection reset by peer.
-                elif e.errno == errno.ECONNRESET:
-                    # TBD. Report and close socket (end logger).
-                    self.statusfile.write('read_device: raised errno %i, %s.\n' % (e.errno, str(e)))
-                    self.statusfile.flush()
-                    self.device_sock.close()
-                    self.device_sock = None
-                    
-                # [Errno 32] Broken pipe.
-                elif e.errno == errno.EPIPE:
-                    # TBD. Report and close socket (end logger).
-                    self.statusfile.write('read_device: raised errno %i, %s.\n' % (e.errno, str(e)))
-                    self.statusfile.flush()
-                    self.device_sock.close()
-                    self.device_sock = None
-                    
-                # Unspecified socket error.
+
+                # [Errno 54] Connection reset by peer, [Errno 32] Broken pipe
+                # or unspecified socket error.
                 else:
-                    # TBD. Report and close socket (end logger).                    
+                    # TBD. Report and close socket (end logger).
                     self.statusfile.write('read_device: raised errno %i, %s.\n' % (e.errno, str(e)))
                     self.statusfile.flush()
-                    self.device_sock.close()
-                    self.device_sock = None
-            
+                    self._close_device_sock()
+
         return data
-    
+
     def write_device(self, data):
         """
-        Write to an ethernet device, retrying until all sent. Log errors (except
-        resource temporarily unavailable, if they occur.) Handles resource
-        temporarily unavailable, connection reset by peer, broken pipe,
-        and unspecified socket errors.
+        Write to an ethernet device. Sends as much as the socket accepts now,
+        the rest is sent by the run loop when the socket becomes writable.
+        Log errors (except resource temporarily unavailable, if they occur.)
+        Handles resource temporarily unavailable, connection reset by peer,
+        broken pipe, and unspecified socket errors.
         @param data The data string to write to the device.
         """
         if self.device_sock:
-            sent = 0
-            while len(data)>0:
-                try:
-                    sent = self.device_sock.send(data)
-                    data = data[sent:]                    
-                
-                except socket.error as e:                
-                    # [Errno 35] Resource temporarily unavailable.
-                    if e.errno == errno.EAGAIN:
-                        # Occurs when the network write buffer is full.
-                        # Sleep a short period of time and retry.
-                        time.sleep(.1)
-                    
-                    # [Errno 54] Connection reset by peer.
-                    elif e.errno == errno.ECONNRESET:
-                        # TBD. Report and close socket (end logger). 
-                        self.statusfile.write('write_device: raised errno %i, %s.\n' % (e.errno, str(e)))
-                        self.statusfile.flush()
-                        self.device_sock.close()
-                        self.device_sock = None
-                        break
-                    
-                    # [Errno 32] Broken pipe.
-                    elif e.errno == errno.EPIPE:
-                        # TBD. Report and close socket (end logger). 
-                        self.statusfile.write('write_device: raised errno %i, %s.\n' % (e.errno, str(e)))
-                        self.statusfile.flush() 
-                        self.device_sock.close()
-                        self.device_sock = None
-                        break
-                    
-                    # Unspecified socket error, report and close socket.
-                    else:
-                        # TBD. Report and close socket (end logger).
-                        self.statusfile.write('write_device: raised errno %i, %s.\n' % (e.errno, str(e)))
-                        self.statusfile.flush()
-                        self.device_sock.close()
-                        self.device_sock = None
-                        break
+            self.device_pending += data
+            try:
+                self._send_pending(self.device_sock, self.device_pending)
+
+            except socket.error as e:
+                # [Errno 54] Connection reset by peer, [Errno 32] Broken pipe
+                # or unspecified socket error.
+                # TBD. Report and close socket (end logger).
+                self.statusfile.write('write_device: raised errno %i, %s.\n' % (e.errno, str(e)))
+                self.statusfile.flush()
+                self._close_device_sock()
+
+    def _close_device_sock(self):
+        """
+        Close the device socket, discarding data not yet sent to it.
+        """
+        self.device_sock.close()
+        self.device_sock = None
+        del self.device_pending[:]
+
 
-                    
 class SerialDeviceLogger(BaseLoggerProcess):
     """
     A device logger process specialized to read/write to serial devices.
@@ -11,106 +11,369 @@ Release notes: initial version
 __author__ = 'Johnathon Rusk'
 __license__ = 'Apache 2.0'
 
-import psycopg2
+import atexit
 import json
-from threading import RLock
+import sqlite3
+import weakref
+from contextlib import contextmanager
+from threading import RLock, Lock, Thread, Event, BoundedSemaphore
 from collections import MutableMapping
 
-class DatabaseSession(object):
-    def __init__(self, database, user, password, host, port):
+import psycopg2
+import psycopg2.pool
+
+from mi.core.log import get_logger
+log = get_logger()
+
+
+class DatabaseBackend(object):
+    """
+    Base class for the databases a PersistentStoreDict can be kept in. Subclasses provide connections
+    through session() and the SQL statements in the parameter style of their database module.
+    """
+    stmt_upsert = None
+    stmt_delitem = None
+    stmt_load = None
+    stmt_setup = ()
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager yielding a cursor. The transaction is committed on exit, or rolled back if an
+        exception is raised.
+        """
+        raise NotImplementedError
+
+    def setup(self):
+        with self.session() as cur:
+            for stmt in self.stmt_setup:
+                cur.execute(stmt)
+
+    def load(self, driver_name, reference_designator):
+        """
+        @retval A dict of all keys to json values stored for the driver and reference designator
+        """
+        with self.session() as cur:
+            cur.execute(self.stmt_load, [driver_name, reference_designator])
+            return dict(cur.fetchall())
+
+    def write(self, driver_name, reference_designator, upserts=(), deletes=()):
+        """
+        Write a batch of changes in a single transaction.
+        @param upserts (key, json value) pairs to insert or update
+        @param deletes keys to delete
+        """
+        with self.session() as cur:
+            for key, json_value in upserts:
+                self._upsert(cur, self._upsert_params(driver_name, reference_designator, key, json_value))
+            for key in deletes:
+                cur.execute(self.stmt_delitem, [driver_name, reference_designator, key])
+
+    def _upsert(self, cur, params):
+        cur.execute(self.stmt_upsert, params)
+
+    def _upsert_params(self, driver_name, reference_designator, key, json_value):
+        return [driver_name, reference_designator, key, json_value]
+
+
+class PostgresBackend(DatabaseBackend):
+    """
+    PostgreSQL backend. Connections are taken from a pool shared by all stores using the same server.
+    """
+    # one pool per server, shared by all stores, with a semaphore counting its free connections
+    _pools = {}
+    _pools_lock = Lock()
+
+    # times an upsert is attempted when another writer inserts the same key concurrently
+    upsert_attempts = 3
+
+    # Note: "INSERT ... ON CONFLICT" not supported in PostgreSQL 9.2, use a writable CTE to upsert in one statement
+    stmt_upsert = ("WITH updated AS (UPDATE instrument_driver.persistent_store SET json_value = %s "
+                   "WHERE driver_name = %s AND reference_designator = %s AND key = %s RETURNING key) "
+                   "INSERT INTO instrument_driver.persistent_store (driver_name, reference_designator, key, json_value) "
+                   "SELECT %s, %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM updated)")
+    stmt_delitem = "DELETE FROM instrument_driver.persistent_store WHERE driver_name = %s AND reference_designator = %s AND key = %s"
+    stmt_load = "SELECT key, json_value FROM instrument_driver.persistent_store WHERE driver_name = %s AND reference_designator = %s"
+    # Note: "CREATE SCHEMA IF NOT EXISTS" not supported in PostgreSQL 9.2
+    stmt_setupDatabase_checkIfSchemaExists = "SELECT EXISTS(SELECT 1 FROM pg_namespace WHERE nspname = 'instrument_driver')"
+    stmt_setupDatabase_createSchema = "CREATE SCHEMA instrument_driver AUTHORIZATION awips"
+    stmt_setupDatabase_createTableIfNotExists = ("CREATE TABLE IF NOT EXISTS instrument_driver.persistent_store("
+                                                 "driver_name text NOT NULL,"
+                                                 "reference_designator text NOT NULL,"
+                                                 "key text NOT NULL,"
+                                                 "json_value text NOT NULL,"
+                                                 "PRIMARY KEY (driver_name, reference_designator, key))")
+
+    def __init__(self, database="metadata", user="awips", password="awips", host="127.0.0.1", port="5432",
+                 max_connections=4):
         self.database = database
         self.user = user
         self.password = password
         self.host = host
         self.port = port
-        self.reentrantDepth = 0
-
-    def __enter__(self):
-        if self.reentrantDepth == 0:
-            # Connect to an existing database
-            self.conn = psycopg2.connect(database = self.database, user = self.user, password = self.password, host = self.host, port = self.port)
-            # Open a cursor to perform database operations
-            self.cur = self.conn.cursor()
-        self.reentrantDepth = self.reentrantDepth + 1
-        return self.cur
-
-    def __exit__(self, exception_type, exception_value, traceback):
-        self.reentrantDepth = self.reentrantDepth - 1
-        if self.reentrantDepth == 0:
-            # Make the changes to the database persistent
-            self.conn.commit()
-            # Close communication with the database
-            self.cur.close()
-            self.conn.close()
+        self.max_connections = max_connections
+
+    def _get_pool(self):
+        pool_key = (self.database, self.user, self.host, self.port)
+        with self._pools_lock:
+            entry = self._pools.get(pool_key)
+            if entry is None or entry[0].closed:
+                pool = psycopg2.pool.ThreadedConnectionPool(1, self.max_connections, database=self.database,
+                                                            user=self.user, password=self.password,
+                                                            host=self.host, port=self.port)
+                entry = self._pools[pool_key] = (pool, BoundedSemaphore(pool.maxconn))
+            return entry
+
+    @contextmanager
+    def session(self):
+        pool, available = self._get_pool()
+        # the pool raises PoolError instead of waiting when all of its connections are in use
+        with available:
+            conn = pool.getconn()
+            try:
+                cur = conn.cursor()
+                try:
+                    yield cur
+                    conn.commit()
+                finally:
+                    cur.close()
+            except Exception:
+                # the connection may be broken, don't return it to the pool
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+                pool.putconn(conn, close=True)
+                raise
+            pool.putconn(conn)
+
+    def setup(self):
+        with self.session() as cur:
+            cur.execute(self.stmt_setupDatabase_checkIfSchemaExists)
+            result = cur.fetchone()
+            if not result:
+                raise Exception("Program error: Database query for __setupDatabase method failed to return a value.")
+            if not result[0]:
+                cur.execute(self.stmt_setupDatabase_createSchema)
+            cur.execute(self.stmt_setupDatabase_createTableIfNotExists)
+
+    def _upsert(self, cur, params):
+        # a writer inserting the same key between the update and the insert fails the insert with a unique
+        # violation, the key now exists so the update succeeds when retried
+        for attempt in range(self.upsert_attempts):
+            cur.execute("SAVEPOINT upsert")
+            try:
+                cur.execute(self.stmt_upsert, params)
+            except psycopg2.IntegrityError:
+                cur.execute("ROLLBACK TO SAVEPOINT upsert")
+                if attempt == self.upsert_attempts - 1:
+                    raise
+            else:
+                cur.execute("RELEASE SAVEPOINT upsert")
+                return
+
+    def _upsert_params(self, driver_name, reference_designator, key, json_value):
+        return [json_value, driver_name, reference_designator, key, driver_name, reference_designator, key, json_value]
+
+
+class SqliteBackend(DatabaseBackend):
+    """
+    SQLite backend, keeping the store in a local file. Allows drivers to persist data and tests to run
+    without a database server.
+    """
+    stmt_upsert = "INSERT OR REPLACE INTO persistent_store (driver_name, reference_designator, key, json_value) VALUES (?, ?, ?, ?)"
+    stmt_delitem = "DELETE FROM persistent_store WHERE driver_name = ? AND reference_designator = ? AND key = ?"
+    stmt_load = "SELECT key, json_value FROM persistent_store WHERE driver_name = ? AND reference_designator = ?"
+    stmt_setup = ("CREATE TABLE IF NOT EXISTS persistent_store("
+                  "driver_name text NOT NULL,"
+                  "reference_designator text NOT NULL,"
+                  "key text NOT NULL,"
+                  "json_value text NOT NULL,"
+                  "PRIMARY KEY (driver_name, reference_designator, key))",)
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._conn = None
+
+    @contextmanager
+    def session(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            cur = self._conn.cursor()
+            try:
+                yield cur
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+
+def _flush_loop(store_ref, stop_event, interval):
+    """
+    Write the changes of a write-back store on an interval, until the store is closed or garbage collected.
+    Only a weak reference to the store is held between writes.
+    """
+    while not stop_event.wait(interval):
+        store = store_ref()
+        if store is None:
+            return
+        try:
+            store.flush()
+        except Exception:
+            log.exception('Unable to write persistent store %s %s, will retry',
+                          store.driver_name, store.reference_designator)
+        store = None
+
+
+def _close_at_exit(store_ref):
+    store = store_ref()
+    if store is not None:
+        store.close()
 
 
 class PersistentStoreDict(MutableMapping):
-    def __init__(self, driver_name, reference_designator, host = "127.0.0.1", port = "5432"):
+    """
+    Dictionary persisted in a database, keyed by driver name and reference designator. All values are
+    cached in memory when the store is first used, so the store assumes it is the only writer of its
+    keys. In write-back mode changes are batched and written on an interval, on flush() and at shutdown.
+    """
+    def __init__(self, driver_name, reference_designator, host = "127.0.0.1", port = "5432", backend = None,
+                 write_back_interval = None):
+        """
+        @param backend The DatabaseBackend to use, PostgreSQL on host and port by default
+        @param write_back_interval If set, the number of seconds between writes of changed keys.
+        Otherwise every change is written immediately.
+        """
         self.rLock = RLock()
-        self.databaseSession = DatabaseSession("metadata", "awips", "awips", host, port)
+        # serializes writes of the pending changes, so they reach the database in order
+        self._flushLock = Lock()
+        self.backend = backend if backend is not None else PostgresBackend(host=host, port=port)
         self.driver_name = driver_name
         self.reference_designator = reference_designator
-        self.stmt_getitem = "SELECT json_value FROM instrument_driver.persistent_store WHERE driver_name = %s AND reference_designator = %s AND key = %s"
-        self.stmt_setitem_insert = "INSERT INTO instrument_driver.persistent_store (driver_name, reference_designator, key, json_value) VALUES (%s, %s, %s, %s)"
-        self.stmt_setitem_update = "UPDATE instrument_driver.persistent_store SET json_value = %s WHERE driver_name = %s AND reference_designator = %s AND key = %s"
-        self.stmt_delitem = "DELETE FROM instrument_driver.persistent_store WHERE driver_name = %s AND reference_designator = %s AND key = %s"
-        self.stmt_iter = "SELECT key FROM instrument_driver.persistent_store WHERE driver_name = %s AND reference_designator = %s"
-        self.stmt_len = "SELECT COUNT(key) FROM instrument_driver.persistent_store WHERE driver_name = %s AND reference_designator = %s"
-        # Note: "CREATE SCHEMA IF NOT EXISTS" not supported in PostgreSQL 9.2
-        self.stmt_setupDatabase_checkIfSchemaExists = "SELECT EXISTS(SELECT 1 FROM pg_namespace WHERE nspname = 'instrument_driver')"
-        self.stmt_setupDatabase_createSchema = "CREATE SCHEMA instrument_driver AUTHORIZATION awips"
-        self.stmt_setupDatabase_createTableIfNotExists = ("CREATE TABLE IF NOT EXISTS instrument_driver.persistent_store("
-                                                          "driver_name text NOT NULL,"
-                                                          "reference_designator text NOT NULL,"
-                                                          "key text NOT NULL,"
-                                                          "json_value text NOT NULL,"
-                                                          "PRIMARY KEY (driver_name, reference_designator, key))")
+        # key -> json value of every stored key, loaded on first use
+        self._cache = None
+        # key -> json value (None for deleted keys) of the changes not yet written
+        self._dirty = {}
+        self._write_back_interval = write_back_interval
+        self._flush_thread = None
+        self._stop_event = Event()
         self.__setupDatabase()
 
+        if write_back_interval is not None:
+            store_ref = weakref.ref(self)
+            self._flush_thread = Thread(target=_flush_loop, name='persistent-store-flush',
+                                        args=(store_ref, self._stop_event, write_back_interval))
+            self._flush_thread.daemon = True
+            self._flush_thread.start()
+            atexit.register(_close_at_exit, store_ref)
+
     def __getitem__(self, key):
         self.__checkKeyType(key)
         with self.rLock:
-            with self.databaseSession as cur:
-                cur.execute(self.stmt_getitem, [self.driver_name, self.reference_designator, key])
-                result = cur.fetchone()
-                if not result:
-                    raise KeyError("No item found with key: '{0}'".format(key))
-                return json.loads(result[0])
+            json_value = self.__getCache().get(key)
+            if json_value is None:
+                raise KeyError("No item found with key: '{0}'".format(key))
+            return json.loads(json_value)
 
     def __setitem__(self, key, value):
         self.__checkKeyType(key)
         self.__checkValueType(value)
+        json_value = json.dumps(value)
         with self.rLock:
-            with self.databaseSession as cur:
-                if key in self:
-                    cur.execute(self.stmt_setitem_update, [json.dumps(value), self.driver_name, self.reference_designator, key])
-                else:
-                    cur.execute(self.stmt_setitem_insert, [self.driver_name, self.reference_designator, key, json.dumps(value)])
+            cache = self.__getCache()
+            if self._write_back_interval is None:
+                self.backend.write(self.driver_name, self.reference_designator, upserts=[(key, json_value)])
+            else:
+                self._dirty[key] = json_value
+            cache[key] = json_value
 
     def __delitem__(self, key):
         self.__checkKeyType(key)
         with self.rLock:
-            with self.databaseSession as cur:
-                if key not in self:
-                    raise KeyError("No item found with key: '{0}'".format(key))
-                cur.execute(self.stmt_delitem, [self.driver_name, self.reference_designator, key])
-
+            cache = self.__getCache()
+            if key not in cache:
+                raise KeyError("No item found with key: '{0}'".format(key))
+            if self._write_back_interval is None:
+                self.backend.write(self.driver_name, self.reference_designator, deletes=[key])
+            else:
+                self._dirty[key] = None
+            del cache[key]
+
     def __iter__(self):
         with self.rLock:
-            with self.databaseSession as cur:
-                cur.execute(self.stmt_iter, [self.driver_name, self.reference_designator])
-                result = cur.fetchall()
-                for row in result:
-                    yield row[0]
-
+            keys = list(self.__getCache())
+        for key in keys:
+            yield key
+
     def __len__(self):
         with self.rLock:
-            with self.databaseSession as cur:
-                cur.execute(self.stmt_len, [self.driver_name, self.reference_designator])
-                result = cur.fetchone()
-                if not result:
-                    raise Exception("Program error: Database query for __len__ method failed to return a value.")
-                return result[0]
+            return len(self.__getCache())
+
+    def __contains__(self, key):
+        self.__checkKeyType(key)
+        with self.rLock:
+            return key in self.__getCache()
+
+    def flush(self):
+        """
+        Write all pending changes in a single transaction. The changes are taken from the store
+        before writing, so the store can be read and changed while the database is written.
+        """
+        with self._flushLock:
+            self.__writeDirty()
+
+    def refresh(self):
+        """
+        Write pending changes and drop the cache, so values are read from the database again.
+        """
+        with self._flushLock, self.rLock:
+            self.__writeDirty()
+            self._cache = None
+
+    def close(self):
+        """
+        Stop the write-back thread and write pending changes.
+        """
+        self._stop_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        self.flush()
+
+    def __del__(self):
+        # a write-back store dropped without close() still writes its pending changes
+        if getattr(self, '_dirty', None):
+            try:
+                self.flush()
+            except Exception:
+                log.exception('Unable to write persistent store %s %s',
+                              self.driver_name, self.reference_designator)
+
+    def __writeDirty(self):
+        # called with _flushLock held
+        with self.rLock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        upserts = [(key, value) for key, value in dirty.iteritems() if value is not None]
+        deletes = [key for key, value in dirty.iteritems() if value is None]
+        try:
+            self.backend.write(self.driver_name, self.reference_designator, upserts=upserts, deletes=deletes)
+        except Exception:
+            # keep the changes which were not made again during the write for the next flush
+            with self.rLock:
+                for key, value in dirty.iteritems():
+                    self._dirty.setdefault(key, value)
+            raise
+
+    def __getCache(self):
+        if self._cache is None:
+            self._cache = self.backend.load(self.driver_name, self.reference_designator)
+        return self._cache
 
     def __checkKeyType(self, key):
         if type(key) not in [str, unicode]:
@@ -129,12 +392,4 @@ class PersistentStoreDict(MutableMapping):
 
     def __setupDatabase(self):
         with self.rLock:
-            with self.databaseSession as cur:
-                cur.execute(self.stmt_setupDatabase_checkIfSchemaExists)
-                result = cur.fetchone()
-                if not result:
-                    raise Exception("Program error: Database query for __setupDatabase method failed to return a value.")
-                if not result[0]:
-                    cur.execute(self.stmt_setupDatabase_createSchema)
-                cur.execute(self.stmt_setupDatabase_createTableIfNotExists)
-
+            self.backend.setup()
@@ -5,21 +5,27 @@
 @author Peter Cable
 @brief Move messages from rabbitMQ to QPID
 
+Messages are sent to QPID in batches without waiting for each send to complete.  Up to window batches may be
+unconfirmed by QPID at once, messages are only acknowledged to rabbitMQ once QPID has confirmed them, so a
+failure of QPID redelivers the unconfirmed messages rather than losing them.
+
 Usage:
-    shovel <rabbit_url> <rabbit_queue> <rabbit_key> <qpid_url> <qpid_queue>
+    shovel <rabbit_url> <rabbit_queue> <rabbit_key> <qpid_url> <qpid_queue> [options]
 
 Options:
-    -h, --help          Show this screen.
+    -h, --help              Show this screen.
+    --batch-size=<count>    Number of messages sent to QPID in a batch [default: 100]
+    --window=<batches>      Number of batches sent to QPID before waiting for confirmation [default: 10]
 
 """
 import time
+from collections import deque
 from threading import Thread
 
 import qpid.messaging as qm
 from docopt import docopt
 from kombu import Connection, Queue, Exchange
 from kombu.mixins import ConsumerMixin
-from librabbitmq import ChannelError
 from mi.core.log import LoggerManager
 from mi.logging import log
 
@@ -27,11 +33,15 @@ LoggerManager()
 
 
 class QpidProducer(object):
-    def __init__(self, url, queue, username='guest', password='guest'):
+    def __init__(self, url, queue, username='guest', password='guest', capacity=None):
+        """
+        @param capacity number of messages which may be unconfirmed by QPID before send blocks, unlimited if None
+        """
         self.url = url
         self.username = username
         self.password = password
         self.queue = queue
+        self.capacity = capacity
         self.sender = None
 
     def connect(self):
@@ -43,6 +53,8 @@ class QpidProducer(object):
                 connection.open()
                 session = connection.session()
                 self.sender = session.sender('%s; {create: always, node: {type: queue, durable: true}}' % self.queue)
+                if self.capacity:
+                    self.sender.capacity = self.capacity
                 log.info('Shovel connected to QPID')
                 return
             except qm.ConnectError:
@@ -57,13 +69,49 @@ class QpidProducer(object):
                              properties=headers, user_id='guest')
         self.sender.send(message, sync=False)
 
+    def unsettled(self):
+        """
+        @retval number of messages sent which QPID has not yet confirmed
+        """
+        if self.sender is None:
+            return 0
+        return self.sender.unsettled()
+
+    def confirm(self, timeout):
+        """
+        Wait for QPID to confirm all the messages sent
+        @param timeout maximum time to wait in seconds
+        """
+        if self.sender is not None:
+            try:
+                self.sender.sync(timeout=timeout)
+            except qm.Timeout:
+                log.warn('Shovel timed out waiting for QPID to confirm %d messages', self.unsettled())
+
 
 class RabbitConsumer(ConsumerMixin):
-    def __init__(self, url, queue, routing_key, qpid):
+    """
+    Consumes messages from rabbitMQ and sends them to QPID in batches.  Received messages are sent once
+    batch_size have been received, or once flush_interval has passed, and acknowledged once QPID confirms them.
+    """
+    DEFAULT_BATCH_SIZE = 100
+    DEFAULT_WINDOW = 10
+    DEFAULT_FLUSH_INTERVAL = 1.0
+
+    def __init__(self, url, queue, routing_key, qpid, batch_size=None, window=None, flush_interval=None):
         self.connection = Connection(hostname=url)
         self.exchange = Exchange(name='amq.direct', type='direct', channel=self.connection)
         self.qpid = qpid
+        self.batch_size = batch_size if batch_size else self.DEFAULT_BATCH_SIZE
+        self.window = window if window else self.DEFAULT_WINDOW
+        self.flush_interval = flush_interval if flush_interval else self.DEFAULT_FLUSH_INTERVAL
+        # messages confirmed by QPID and acknowledged to rabbitMQ
         self.count = 0
+        self.requeued = 0
+        # (body, message, received time) of the messages not yet sent and of those sent and not yet confirmed
+        self._batch = []
+        self._in_flight = deque()
+        self._last_flush = time.time()
 
         kwargs = {
             'exchange': self.exchange,
@@ -77,30 +125,107 @@ class RabbitConsumer(ConsumerMixin):
         try:
             self.queue = Queue(**kwargs)
             self.queue.queue_declare(passive=True)
-        except ChannelError:
+        except self.connection.channel_errors:
             self.queue = Queue(auto_delete=True, **kwargs)
 
     def get_consumers(self, Consumer, channel):
         c = Consumer([self.queue], callbacks=[self.on_message])
-        c.qos(prefetch_count=100)
+        # room for the batch being received as well as the unconfirmed batches
+        c.qos(prefetch_count=self.batch_size * (self.window + 1))
         return [c]
 
     def on_message(self, body, message):
+        self._batch.append((body, message, time.time()))
+        if len(self._batch) >= self.batch_size:
+            self.send_batch()
+
+    def on_iteration(self):
+        if (self._batch or self._in_flight) and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def send_batch(self):
+        """
+        Send the received messages to QPID without waiting for confirmation, then acknowledge the messages
+        QPID has confirmed so far.  Sending blocks while window batches are unconfirmed.
+        """
+        batch, self._batch = self._batch, []
+        sent = 0
         try:
-            self.qpid.send(str(body), message.headers)
+            for body, message, received in batch:
+                self.qpid.send(str(body), message.headers)
+                self._in_flight.append((body, message, received))
+                sent += 1
+            self.ack_confirmed()
+        except Exception:
+            log.exception('Exception while publishing messages to QPID, requeueing')
+            self.requeue(batch[sent:])
+
+    def flush(self):
+        """
+        Send any partial batch and wait for QPID to confirm all the messages sent
+        """
+        self._last_flush = time.time()
+        if self._batch:
+            self.send_batch()
+        if self._in_flight:
+            try:
+                self.qpid.confirm(self.flush_interval)
+                self.ack_confirmed()
+            except Exception:
+                log.exception('Exception while confirming messages sent to QPID, requeueing')
+                self.requeue([])
+
+    def ack_confirmed(self):
+        """
+        Acknowledge to rabbitMQ the messages QPID has confirmed, which it does in the order they were sent
+        """
+        confirmed = max(len(self._in_flight) - self.qpid.unsettled(), 0)
+        for _ in xrange(confirmed):
+            body, message, received = self._in_flight.popleft()
             message.ack()
-            self.count += 1
-        except Exception as e:
-            log.exception('Exception while publishing message to QPID, requeueing')
+        self.count += confirmed
+
+    def requeue(self, unsent):
+        """
+        Requeue the unconfirmed and the unsent messages, they may already have been received by QPID
+        and will be sent again.  A new QPID connection is made for the next batch.
+        """
+        messages = [message for body, message, received in self._in_flight]
+        messages.extend(message for body, message, received in unsent)
+        self._in_flight.clear()
+        for message in messages:
             message.requeue()
-            self.qpid.sender = None
+        self.requeued += len(messages)
+        self.qpid.sender = None
+
+    def get_stats(self):
+        """
+        @retval dictionary of the message counts, and of the lag, the age in seconds of the oldest message
+        received and not yet confirmed by QPID
+        """
+        # called from the stats reporter thread, the messages may be sent or confirmed meanwhile
+        oldest = None
+        for messages in (self._in_flight, self._batch):
+            try:
+                oldest = messages[0][2]
+                break
+            except IndexError:
+                pass
+
+        return {
+            'confirmed': self.count,
+            'requeued': self.requeued,
+            'unconfirmed': len(self._in_flight),
+            'pending': len(self._batch),
+            'lag': time.time() - oldest if oldest else 0,
+        }
 
     def get_current_queue_depth(self):
         try:
             result = self.queue.queue_declare(passive=True)
             name = result.queue
             count = result.message_count
-        except ChannelError:
+        except self.connection.channel_errors:
             if self.count > 0:
                 log.exception('Exception getting queue count')
             name = 'UNK'
@@ -126,7 +251,10 @@ class StatsReporter(Thread):
                     rate = float(sent_count - self.last_count) / elapsed
                 else:
                     rate = -1
-                log.info('Queue: %s Depth: %d Sent Count: %d Rate: %.2f/s', queue_name, queue_depth, sent_count, rate)
+                stats = self.rabbit.get_stats()
+                log.info('Queue: %s Depth: %d Sent Count: %d Rate: %.2f/s Unconfirmed: %d Requeued: %d Lag: %.1fs',
+                         queue_name, queue_depth, sent_count, rate, stats['unconfirmed'], stats['requeued'],
+                         stats['lag'])
 
             self.last_time = now
             self.last_count = sent_count
@@ -142,10 +270,12 @@ def main():
     rabbit_url = options['<rabbit_url>']
     rabbit_queue = options['<rabbit_queue>']
     rabbit_key = options['<rabbit_key>']
+    batch_size = int(options['--batch-size'])
+    window = int(options['--window'])
     log.info('Starting shovel: %r', options)
 
-    qpid = QpidProducer(qpid_url, qpid_queue)
-    rabbit = RabbitConsumer(rabbit_url, rabbit_queue, rabbit_key, qpid)
+    qpid = QpidProducer(qpid_url, qpid_queue, capacity=batch_size * window)
+    rabbit = RabbitConsumer(rabbit_url, rabbit_queue, rabbit_key, qpid, batch_size=batch_size, window=window)
     reporter = StatsReporter(rabbit)
     reporter.daemon = True
     reporter.start()
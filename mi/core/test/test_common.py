@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+__license__ = 'Apache 2.0'
+
+from mi.core.log import get_logger ; log = get_logger()
+
+from nose.plugins.attrib import attr
+from mi.core.common import BaseEnum
+from mi.core.unit_test import MiUnitTest
+
+
+class Color(BaseEnum):
+    RED = 'red'
+    GREEN = 'green'
+
+
+class MoreColor(Color):
+    GREEN = 'lime'
+    BLUE = 'blue'
+
+
+@attr('UNIT', group='mi')
+class TestBaseEnum(MiUnitTest):
+    """
+    Test the cached enum values
+    """
+    def test_values(self):
+        """
+        Test list, dict and has, including subclasses which add and override values
+        """
+        self.assertEqual(Color.list(), ['green', 'red'])
+        self.assertEqual(Color.dict(), {'RED': 'red', 'GREEN': 'green'})
+        self.assertEqual(MoreColor.list(), ['blue', 'lime', 'red'])
+        self.assertTrue(Color.has('green'))
+        self.assertFalse(Color.has('blue'))
+        self.assertTrue(MoreColor.has('blue'))
+        self.assertFalse(MoreColor.has('green'))
+        self.assertFalse(Color.has(['red']))
+
+        # returned containers are copies
+        Color.list().append('blue')
+        Color.dict()['BLUE'] = 'blue'
+        self.assertFalse(Color.has('blue'))
+
+    def test_subclass_after_cache(self):
+        """
+        Test a subclass defined after its base has cached its values computes its own
+        """
+        class Base(BaseEnum):
+            ONE = 1
+
+        self.assertEqual(Base.list(), [1])
+
+        class Sub(Base):
+            TWO = 2
+
+        self.assertEqual(Sub.list(), [1, 2])
+        self.assertFalse(Base.has(2))
+
+    def test_unhashable(self):
+        """
+        Test enums with unhashable values
+        """
+        class Lists(BaseEnum):
+            A = [1, 2]
+            B = 'b'
+
+        self.assertTrue(Lists.has([1, 2]))
+        self.assertTrue(Lists.has('b'))
+        self.assertFalse(Lists.has({}))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_direct_access_server
+@file mi/core/test/test_direct_access_server.py
+@brief Loopback tests for the direct access server
+"""
+
+import time
+
+import gevent
+import gevent.socket
+from nose.plugins.attrib import attr
+
+from mi.core.direct_access_server import DirectAccessServer, DirectAccessTypes, SessionCloseReasons
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+
+def recv_exactly(sock, count):
+    chunks = []
+    while count > 0:
+        chunk = sock.recv(min(count, 65536))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        count -= len(chunk)
+    return ''.join(chunks)
+
+
+class DirectAccessServerTestCase(MiUnitTest):
+    """
+    Connects a client to a direct access server over loopback
+    """
+    def setUp(self):
+        self.received = []
+        self.closed = []
+        self.server = None
+        self.client = None
+
+    def tearDown(self):
+        if self.client:
+            self.client.close()
+        if self.server:
+            self.server.stop()
+        gevent.sleep(0)
+
+    def callback(self, data):
+        # data from the client is passed as a string, session close reasons as ints
+        if isinstance(data, int):
+            self.closed.append(data)
+        else:
+            self.received.append(data)
+            if self.echo:
+                self.server.send(data)
+
+    def connect(self, echo=False, session_timeout=600, inactivity_timeout=300):
+        self.echo = echo
+        self.server = DirectAccessServer(DirectAccessTypes.vsp, self.callback, '127.0.0.1',
+                                         session_timeout, inactivity_timeout)
+        port, token = self.server.get_connection_info()
+        self.client = gevent.socket.create_connection(('127.0.0.1', port))
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            gevent.sleep(.01)
+        return condition()
+
+
+@attr('UNIT', group='mi')
+class TestDirectAccessServer(DirectAccessServerTestCase):
+    def test_forward(self):
+        self.connect()
+        self.client.sendall('command\r\n')
+        self.assertTrue(self.wait_for(lambda: self.received))
+        self.assertEqual(''.join(self.received), 'command\r\n')
+
+        self.server.send('response\r\n')
+        self.assertEqual(recv_exactly(self.client, 10), 'response\r\n')
+
+        self.client.close()
+        self.client = None
+        self.assertTrue(self.wait_for(lambda: self.closed))
+        self.assertEqual(self.closed, [SessionCloseReasons.client_closed])
+
+    def test_parent_stop(self):
+        # stop wakes the server greenlet blocked on the idle socket, the parent is not called back
+        self.connect()
+        gevent.sleep(.05)
+        self.server.stop()
+        self.assertEqual(recv_exactly(self.client, 1), '')
+        self.assertEqual(self.closed, [])
+        self.server = None
+
+    def test_inactivity_timeout(self):
+        self.connect(inactivity_timeout=.5)
+        gevent.sleep(.3)
+        self.client.sendall('x')
+        self.assertTrue(self.wait_for(lambda: self.received))
+
+        # the deadline was pushed back by the activity, the session is still open after the first deadline
+        gevent.sleep(.3)
+        self.assertEqual(self.closed, [])
+        self.assertTrue(self.wait_for(lambda: self.closed))
+        self.assertEqual(self.closed, [SessionCloseReasons.inactivity_timeout])
+        self.server = None
+
+    def test_session_timeout(self):
+        self.connect(session_timeout=.2)
+        self.assertTrue(self.wait_for(lambda: self.closed))
+        self.assertEqual(self.closed, [SessionCloseReasons.session_timeout])
+        self.server = None
+
+    def test_echo_order(self):
+        """
+        Keystrokes are echoed one at a time and a bulk transfer reaches the client complete and in order
+        """
+        self.connect(echo=True)
+        for index in xrange(200):
+            keystroke = chr(ord('a') + index % 26)
+            self.client.sendall(keystroke)
+            self.assertEqual(recv_exactly(self.client, 1), keystroke)
+
+        self.echo = False
+        blocks = [chr(index % 256) * 65536 for index in xrange(64)]
+        sender = gevent.spawn(lambda: [self.server.send(block) for block in blocks])
+        received = recv_exactly(self.client, 64 * 65536)
+        sender.join()
+        self.assertEqual(received, ''.join(blocks))
+
+
+@attr('BENCHMARK', group='mi')
+class TestDirectAccessServerBenchmark(DirectAccessServerTestCase):
+    def test_loopback_benchmark(self):
+        """
+        Measure keystroke echo latency and bulk throughput to the client over loopback
+        """
+        self.connect(echo=True)
+        count = 500
+        start = time.time()
+        for _ in xrange(count):
+            self.client.sendall('a')
+            self.assertEqual(recv_exactly(self.client, 1), 'a')
+        latency = (time.time() - start) / count
+        # the polling server added up to 100 ms to every echo
+        log.info('direct access echo latency: %.1f us', latency * 1e6)
+
+        self.echo = False
+        size = 16 * 1024 * 1024
+        block = 'x' * 65536
+        sender = gevent.spawn(lambda: [self.server.send(block) for _ in xrange(size / len(block))])
+        start = time.time()
+        received = len(recv_exactly(self.client, size))
+        elapsed = time.time() - start
+        sender.join()
+        self.assertEqual(received, size)
+        log.info('direct access throughput: %.1f MB/s', size / elapsed / 1e6)
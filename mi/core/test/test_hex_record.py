@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_hex_record
+@file mi/core/test/test_hex_record.py
+@brief Test the fixed width ASCII-hex record decoder
+"""
+
+import time
+
+from nose.plugins.attrib import attr
+
+from mi.core.exceptions import SampleException
+from mi.core.hex_record import HexRecordLayout
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+# SAMI2-PCO2 sample record, without the '*' identifier
+PCO2W_RECORD = '542705CEE91CC800400019096206800730074C2CE04274003B0018096106800732074E0D82066124'
+
+PCO2W_LAYOUT = HexRecordLayout([('unique_id', 1),
+                                (None, 1),
+                                ('record_type', 1),
+                                ('record_time', 4),
+                                ('light_measurements', 2, 14),
+                                ('voltage_battery', 2),
+                                ('thermistor_raw', 2),
+                                ('checksum', 1)],
+                               checksum_start=1)
+
+
+@attr('UNIT', group='mi')
+class TestHexRecord(MiUnitTest):
+
+    def test_decode(self):
+        record = PCO2W_LAYOUT.decode(PCO2W_RECORD)
+        self.assertEqual(PCO2W_LAYOUT.hex_length, len(PCO2W_RECORD))
+        self.assertEqual(PCO2W_LAYOUT.names, ['unique_id', 'record_type', 'record_time', 'light_measurements',
+                                              'voltage_battery', 'thermistor_raw', 'checksum'])
+        self.assertEqual(record['unique_id'], 0x54)
+        self.assertEqual(record['record_type'], 0x05)
+        self.assertEqual(record['record_time'], 0xCEE91CC8)
+        self.assertEqual(record['light_measurements'][:3], [0x0040, 0x0019, 0x0962])
+        self.assertEqual(len(record['light_measurements']), 14)
+        self.assertEqual(record['voltage_battery'], 0x0D82)
+        self.assertEqual(record['thermistor_raw'], 0x0661)
+        self.assertEqual(record['checksum'], 0x24)
+        self.assertTrue(record.checksum_valid)
+
+        # lower case digits are accepted
+        self.assertEqual(PCO2W_LAYOUT.decode(PCO2W_RECORD.lower()), record)
+
+    def test_checksum(self):
+        record = PCO2W_LAYOUT.decode(PCO2W_RECORD[:-2] + '25')
+        self.assertFalse(record.checksum_valid)
+
+        # the checksum is only verified when the layout has one
+        layout = HexRecordLayout(PCO2W_LAYOUT.fields)
+        self.assertIsNone(layout.decode(PCO2W_RECORD).checksum_valid)
+
+    def test_three_byte_values(self):
+        layout = HexRecordLayout([('pressure', 3), ('temperature', 2), ('burst', 3, 3)])
+        record = layout.decode('123456ABCD' + '000001FFFFFF800000')
+        self.assertEqual(record, {'pressure': 0x123456,
+                                  'temperature': 0xABCD,
+                                  'burst': [1, 0xFFFFFF, 0x800000]})
+
+    def test_invalid(self):
+        self.assertRaises(SampleException, PCO2W_LAYOUT.decode, PCO2W_RECORD[:-2])
+        self.assertRaises(SampleException, PCO2W_LAYOUT.decode, PCO2W_RECORD + '00')
+        self.assertRaises(SampleException, PCO2W_LAYOUT.decode, 'G' + PCO2W_RECORD[1:])
+
+
+@attr('BENCHMARK', group='mi')
+class TestHexRecordBenchmark(MiUnitTest):
+
+    def test_benchmark(self):
+        """
+        Compare decoding with the layout to converting each field with int(field, 16)
+        """
+        count = 20000
+        records = [PCO2W_RECORD] * count
+
+        start = time.time()
+        for record in records:
+            values = [int(record[0:2], 16), int(record[4:6], 16), int(record[6:14], 16),
+                      [int(record[i:i + 4], 16) for i in xrange(14, 70, 4)],
+                      int(record[70:74], 16), int(record[74:78], 16), int(record[78:80], 16)]
+            data = bytearray.fromhex(record)
+            checksum_valid = sum(data[1:-1]) & 0xff == data[-1]
+        per_field = count / (time.time() - start)
+
+        start = time.time()
+        for record in records:
+            PCO2W_LAYOUT.decode(record)
+        layout = count / (time.time() - start)
+
+        log.info('hex record decoding: %.0f records/s per field, %.0f records/s with layout', per_field, layout)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_import_time
+@file mi/core/test/test_import_time.py
+@brief Test the driver wrapper and the dataset drivers import without the heavy optional dependencies, and the
+time taken by a fresh interpreter to import them
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from nose.plugins.attrib import attr
+
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+MI_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASE_DIR = os.path.dirname(MI_DIR)
+DATASET_DRIVER_DIR = os.path.join(MI_DIR, 'dataset', 'driver')
+
+# Seconds a fresh interpreter may take to import a single module
+IMPORT_TIME_BUDGET = 2.0
+
+# Optional dependencies which are only imported by the functions needing them
+HEAVY_MODULES = ['matplotlib', 'pandas', 'xarray', 'scipy', 'obspy', 'netCDF4', 'modest_image', 'ion_functions']
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.time()
+import %s
+elapsed = time.time() - start
+print json.dumps({'elapsed': elapsed, 'heavy': [name for name in %r if name in sys.modules]})
+'''
+
+# Imports each module in turn, a heavy module is reported for the first module loading it
+HEAVY_IMPORT_SCRIPT = '''
+import json, sys
+results = {}
+for module in %r:
+    before = set(name for name in sys.modules if sys.modules[name] is not None)
+    try:
+        __import__(module)
+    except Exception as e:
+        results[module] = {'error': '%%s: %%s' %% (type(e).__name__, e)}
+        continue
+    loaded = set(name.split('.')[0] for name in sys.modules if sys.modules[name] is not None and name not in before)
+    results[module] = {'heavy': sorted(loaded.intersection(%r))}
+print json.dumps(results)
+'''
+
+
+def dataset_driver_modules():
+    """
+    Find the modules of the dataset driver packages, without the tests
+    """
+    modules = []
+    for path, dirs, files in os.walk(DATASET_DRIVER_DIR):
+        dirs[:] = sorted(d for d in dirs if d != 'test' and os.path.exists(os.path.join(path, d, '__init__.py')))
+        package = os.path.relpath(path, BASE_DIR).replace(os.sep, '.')
+        for name in sorted(files):
+            if name.endswith('.py') and name != '__init__.py':
+                modules.append('%s.%s' % (package, name[:-3]))
+    return modules
+
+
+def run_script(script):
+    """
+    Run a python script in a new interpreter
+    @param script: source of the script, printing its result as JSON on the last line
+    @retval the decoded result, or a dictionary of the error
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [BASE_DIR, env.get('PYTHONPATH')]))
+    process = subprocess.Popen([sys.executable, '-c', script], cwd=BASE_DIR,
+                               env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode:
+        return {'error': err.strip().splitlines()[-1] if err.strip() else 'exit code %d' % process.returncode}
+    # anything logged to stdout while importing precedes the result
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure_import(module):
+    """
+    Import a module in a new interpreter
+    @param module: name of the module
+    @retval dictionary of the elapsed seconds and the heavy modules loaded, or of the error
+    """
+    return run_script(IMPORT_SCRIPT % (module, HEAVY_MODULES))
+
+
+def find_heavy_imports(modules):
+    """
+    Import modules one after another in a single new interpreter
+    @param modules: names of the modules
+    @retval dictionary by module of the heavy modules it loaded or of its import error, or a dictionary of the
+    error if the interpreter failed
+    """
+    return run_script(HEAVY_IMPORT_SCRIPT % (modules, HEAVY_MODULES))
+
+
+@attr('UNIT', group='mi')
+class TestImportTime(MiUnitTest):
+    def check_imports(self, modules):
+        results = find_heavy_imports(modules)
+        self.assertNotIn('error', results, results.get('error'))
+
+        failures = []
+        for module in modules:
+            result = results[module]
+            if 'error' in result:
+                failures.append('%s: %s' % (module, result['error']))
+            elif result['heavy']:
+                failures.append('%s: imports %s' % (module, ', '.join(result['heavy'])))
+
+        self.assertEqual(failures, [], '\n'.join(failures))
+
+    def test_driver_wrapper(self):
+        self.check_imports(['mi.core.instrument.wrapper'])
+
+    def test_dataset_drivers(self):
+        modules = dataset_driver_modules()
+        self.assertGreater(len(modules), 0)
+        self.check_imports(modules)
+
+
+@attr('BENCHMARK', group='mi')
+class TestImportTimeBenchmark(MiUnitTest):
+    def check_import_time(self, modules):
+        results = dict((module, measure_import(module)) for module in modules)
+
+        slowest = sorted((result['elapsed'], module) for module, result in results.iteritems()
+                         if 'elapsed' in result)[::-1]
+        for elapsed, module in slowest[:10]:
+            log.info('import time: %.2f s %s', elapsed, module)
+
+        failures = []
+        for module in modules:
+            result = results[module]
+            if 'error' in result:
+                failures.append('%s: %s' % (module, result['error']))
+            elif result['elapsed'] > IMPORT_TIME_BUDGET:
+                failures.append('%s: %.2f s over the budget of %.2f s' % (module, result['elapsed'],
+                                                                          IMPORT_TIME_BUDGET))
+
+        self.assertEqual(failures, [], '\n'.join(failures))
+
+    def test_driver_wrapper(self):
+        self.check_import_time(['mi.core.instrument.wrapper'])
+
+    def test_dataset_drivers(self):
+        self.check_import_time(dataset_driver_modules())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_logger_process
+@file mi/core/test/test_logger_process.py
+@brief Test the logger process forwarding loop over local socket pairs
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from nose.plugins.attrib import attr
+
+from mi.core.log import get_logger
+from mi.core.logger_process import EthernetDeviceLogger
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+
+def recv_exactly(sock, count):
+    chunks = []
+    while count > 0:
+        chunk = sock.recv(min(count, 65536))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        count -= len(chunk)
+    return ''.join(chunks)
+
+
+class LoggerProcessTestCase(MiUnitTest):
+    """
+    Runs the forwarding loop of a logger in a thread, the test holds the device and driver sockets
+    """
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.logger = EthernetDeviceLogger('localhost', 0, 'pid.txt', 'log.txt', 'status.txt', 'port.txt',
+                                           self.workdir + '/', ['<<', '>>'], None)
+        self.logger.statusfile = open(self.logger.statusfname, 'w')
+        self.logger.logfile = open(self.logger.logfname, 'wb')
+
+        # the test holds the device and driver ends of the socket pairs
+        self.device, self.logger.device_sock = socket.socketpair()
+        self.driver, self.logger.driver_sock = socket.socketpair()
+        self.logger.device_sock.setblocking(0)
+        self.logger.driver_sock.setblocking(0)
+
+        self.thread = threading.Thread(target=self.logger._forward)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        # closing the device ends the forwarding loop
+        self.device.close()
+        self.thread.join(5)
+        self.driver.close()
+        self.logger.statusfile.close()
+        self.logger.logfile.close()
+        shutil.rmtree(self.workdir)
+
+
+@attr('UNIT', group='mi')
+class TestLoggerProcess(LoggerProcessTestCase):
+    def test_forward(self):
+        self.driver.sendall('command\r\n')
+        self.assertEqual(recv_exactly(self.device, 9), 'command\r\n')
+        self.device.sendall('response\r\n')
+        self.assertEqual(recv_exactly(self.driver, 10), 'response\r\n')
+
+        self.device.close()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(self.logger._device_connected())
+
+        self.logger.logfile.close()
+        with open(self.logger.logfname, 'rb') as fh:
+            self.assertEqual(fh.read(), '<<command\r\n>>response\r\n')
+
+    def test_driver_disconnect(self):
+        self.driver.close()
+        self.device.sendall('data')
+        for _ in xrange(50):
+            if self.logger.driver_sock is None:
+                break
+            time.sleep(.01)
+        self.assertIsNone(self.logger.driver_sock)
+        self.assertTrue(self.thread.is_alive())
+
+    def test_forward_order(self):
+        """
+        Round trips and a bulk transfer are forwarded complete and in order
+        """
+        for index in xrange(200):
+            request = 'request %03d\n' % index
+            self.driver.sendall(request)
+            self.assertEqual(recv_exactly(self.device, len(request)), request)
+            response = 'response %03d\n' % index
+            self.device.sendall(response)
+            self.assertEqual(recv_exactly(self.driver, len(response)), response)
+
+        blocks = [chr(index % 256) * 65536 for index in xrange(64)]
+        sender = threading.Thread(target=lambda: [self.device.sendall(block) for block in blocks])
+        sender.start()
+        received = recv_exactly(self.driver, 64 * 65536)
+        sender.join()
+        self.assertEqual(received, ''.join(blocks))
+
+
+@attr('BENCHMARK', group='mi')
+class TestLoggerProcessBenchmark(LoggerProcessTestCase):
+    def test_forward_benchmark(self):
+        """
+        Measure round trip latency and bulk throughput through the forwarding loop
+        """
+        count = 1000
+        start = time.time()
+        for _ in xrange(count):
+            self.driver.sendall('?')
+            recv_exactly(self.device, 1)
+            self.device.sendall('!')
+            recv_exactly(self.driver, 1)
+        latency = (time.time() - start) / count / 2
+        # the previous polling loop slept 100 ms whenever it was idle
+        log.info('forwarding latency: %.1f us', latency * 1e6)
+
+        size = 32 * 1024 * 1024
+        block = 'x' * 65536
+        sender = threading.Thread(target=lambda: [self.device.sendall(block) for _ in xrange(size / len(block))])
+        start = time.time()
+        sender.start()
+        received = len(recv_exactly(self.driver, size))
+        elapsed = time.time() - start
+        sender.join()
+        self.assertEqual(received, size)
+        log.info('forwarding throughput: %.1f MB/s', size / elapsed / 1e6)
@@ -14,9 +14,62 @@ __license__ = 'Apache 2.0'
 
 from nose.plugins.attrib import attr
 from mi.core.unit_test import MiUnitTest
+import gc
+import os
+import shutil
 import sys
-
-from mi.core.persistent_store import PersistentStoreDict
+import tempfile
+import time
+import weakref
+from threading import Event, Lock, Thread
+
+import psycopg2
+from mock import Mock, patch
+
+from mi.core.persistent_store import PersistentStoreDict, SqliteBackend, PostgresBackend
+
+
+class FakeConnectionPool(object):
+    """
+    Connection pool raising PoolError, as psycopg2 does, when more than maxconn connections are taken
+    """
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.maxconn = maxconn
+        self.closed = False
+        self.in_use = 0
+        self.most_in_use = 0
+        self.lock = Lock()
+
+    def getconn(self):
+        with self.lock:
+            if self.in_use == self.maxconn:
+                raise psycopg2.pool.PoolError('connection pool exhausted')
+            self.in_use += 1
+            self.most_in_use = max(self.most_in_use, self.in_use)
+        return Mock()
+
+    def putconn(self, conn, close=False):
+        with self.lock:
+            self.in_use -= 1
+
+
+class BlockingBackend(SqliteBackend):
+    """
+    SqliteBackend whose writes wait for release to be set, or fail while fail is set
+    """
+    def __init__(self, path):
+        super(BlockingBackend, self).__init__(path)
+        self.writing = Event()
+        self.release = Event()
+        self.release.set()
+        self.fail = False
+
+    def write(self, *args, **kwargs):
+        self.writing.set()
+        self.release.wait()
+        if self.fail:
+            raise IOError('write failed')
+        super(BlockingBackend, self).write(*args, **kwargs)
 
 @attr('UNIT', group='mi')
 class TestPersistentStoreDict(MiUnitTest):
@@ -35,7 +88,10 @@ class TestPersistentStoreDict(MiUnitTest):
         self.DICT_VALUES = [{u"KEY_1":1, u"KEY_2":2, u"KEY_3":3}, {u"KEY_4":4, u"KEY_5":5, u"KEY_6":6}]
         self.LIST_KEY = "LIST_KEY" # Test 'str' type key
         self.LIST_VALUES = [[1, 2, 3, 4, 5], [6, 7, 8, 9, 0]]
-        self.persistentStoreDict = PersistentStoreDict("unit_test", "GI01SUMO-00001")
+        self.persistentStoreDict = self.createStore()
+
+    def createStore(self):
+        return PersistentStoreDict("unit_test", "GI01SUMO-00001")
 
     def tearDown(self):
         self.persistentStoreDict.clear() # NOTE: This technically assumes the delete functionality works.
@@ -235,3 +291,154 @@ class TestPersistentStoreDict(MiUnitTest):
             del self.persistentStoreDict[key]
         self.assertEqual(contextManager.exception.args[0], "No item found with key: '{0}'".format(key))
 
+
+@attr('UNIT', group='mi')
+class TestSqlitePersistentStoreDict(TestPersistentStoreDict):
+    """
+    Runs the PersistentStoreDict tests against a SQLite file
+    """
+    def createStore(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.tempDir, "persistent_store.db"))
+        return PersistentStoreDict("unit_test", "GI01SUMO-00001", backend=self.backend)
+
+    def tearDown(self):
+        TestPersistentStoreDict.tearDown(self)
+        shutil.rmtree(self.tempDir)
+
+    def test_persisted(self):
+        self.helper_set(self.DICT_KEY, self.DICT_VALUES[0], dict, True)
+        self.helper_set(self.INT_KEY, self.INT_VALUES[0], int, True)
+        del self.persistentStoreDict[self.INT_KEY]
+        otherStore = PersistentStoreDict("unit_test", "GI01SUMO-00001", backend=self.backend)
+        self.assertEqual(dict(otherStore), {self.DICT_KEY: self.DICT_VALUES[0]})
+        self.assertEqual(len(PersistentStoreDict("unit_test", "GI01SUMO-00002", backend=self.backend)), 0)
+
+    def test_cached_values_are_copies(self):
+        self.helper_set(self.LIST_KEY, self.LIST_VALUES[0], list, True)
+        self.persistentStoreDict[self.LIST_KEY].append(6)
+        self.helper_get(self.LIST_KEY, self.LIST_VALUES[0], list)
+
+    def test_write_back(self):
+        store = PersistentStoreDict("unit_test", "GI01SUMO-00001", backend=self.backend, write_back_interval=3600)
+        store[self.INT_KEY] = self.INT_VALUES[0]
+        store[self.FLOAT_KEY] = self.FLOAT_VALUES[0]
+        self.assertEqual(store[self.INT_KEY], self.INT_VALUES[0])
+        self.assertEqual(self.backend.load("unit_test", "GI01SUMO-00001"), {})
+
+        store.flush()
+        del store[self.FLOAT_KEY]
+        self.assertEqual(set(self.backend.load("unit_test", "GI01SUMO-00001")), {self.INT_KEY, self.FLOAT_KEY})
+
+        store.close()
+        self.assertEqual(self.backend.load("unit_test", "GI01SUMO-00001"), {self.INT_KEY: u'1234'})
+
+    def test_write_back_interval(self):
+        store = PersistentStoreDict("unit_test", "GI01SUMO-00001", backend=self.backend, write_back_interval=0.05)
+        store[self.INT_KEY] = self.INT_VALUES[0]
+        for _ in range(100):
+            if self.backend.load("unit_test", "GI01SUMO-00001"):
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.backend.load("unit_test", "GI01SUMO-00001"), {self.INT_KEY: u'1234'})
+        store.close()
+
+    def test_write_back_released(self):
+        store = PersistentStoreDict("unit_test", "GI01SUMO-00001", backend=self.backend, write_back_interval=3600)
+        store[self.INT_KEY] = self.INT_VALUES[0]
+        store_ref = weakref.ref(store)
+
+        # neither the write-back thread nor the exit hook keep the store alive, its changes are written
+        del store
+        gc.collect()
+        self.assertIsNone(store_ref())
+        self.assertEqual(self.backend.load("unit_test", "GI01SUMO-00001"), {self.INT_KEY: u'1234'})
+
+    def test_flush_outside_lock(self):
+        backend = BlockingBackend(os.path.join(self.tempDir, "blocking.db"))
+        store = PersistentStoreDict("unit_test", "GI01SUMO-00001", backend=backend, write_back_interval=3600)
+        store[self.INT_KEY] = self.INT_VALUES[0]
+
+        backend.release.clear()
+        flush_thread = Thread(target=store.flush)
+        flush_thread.start()
+        self.assertTrue(backend.writing.wait(5))
+
+        # the store is read and changed while the first change is written
+        self.assertEqual(store[self.INT_KEY], self.INT_VALUES[0])
+        store[self.FLOAT_KEY] = self.FLOAT_VALUES[0]
+        backend.release.set()
+        flush_thread.join()
+        self.assertEqual(backend.load("unit_test", "GI01SUMO-00001"), {self.INT_KEY: u'1234'})
+
+        store.close()
+        self.assertEqual(backend.load("unit_test", "GI01SUMO-00001"), {self.INT_KEY: u'1234', self.FLOAT_KEY: u'56.78'})
+
+    def test_flush_failure(self):
+        backend = BlockingBackend(os.path.join(self.tempDir, "blocking.db"))
+        store = PersistentStoreDict("unit_test", "GI01SUMO-00001", backend=backend, write_back_interval=3600)
+        store[self.INT_KEY] = self.INT_VALUES[0]
+        store[self.FLOAT_KEY] = self.FLOAT_VALUES[0]
+
+        backend.fail = True
+        self.assertRaises(IOError, store.flush)
+
+        # the failed changes are written by the next flush, unless made again since
+        store[self.INT_KEY] = self.INT_VALUES[1]
+        backend.fail = False
+        store.close()
+        self.assertEqual(backend.load("unit_test", "GI01SUMO-00001"), {self.INT_KEY: u'5678', self.FLOAT_KEY: u'56.78'})
+
+
+@attr('UNIT', group='mi')
+class TestPostgresBackend(MiUnitTest):
+    """
+    Tests of the PostgreSQL backend which do not need a database server
+    """
+    def setUp(self):
+        self.backend = PostgresBackend(database="unit_test_%d" % id(self), max_connections=2)
+        self.addCleanup(PostgresBackend._pools.pop, ("unit_test_%d" % id(self), "awips", "127.0.0.1", "5432"), None)
+
+    def test_upsert_retry(self):
+        cur = Mock()
+        statements = []
+
+        def execute(stmt, params=None):
+            statements.append(stmt)
+            # another writer inserts the key first
+            if stmt == PostgresBackend.stmt_upsert and statements.count(stmt) == 1:
+                raise psycopg2.IntegrityError('duplicate key value violates unique constraint')
+        cur.execute.side_effect = execute
+
+        self.backend._upsert(cur, self.backend._upsert_params("unit_test", "GI01SUMO-00001", "key", "1"))
+        self.assertEqual(statements, ["SAVEPOINT upsert", PostgresBackend.stmt_upsert, "ROLLBACK TO SAVEPOINT upsert",
+                                      "SAVEPOINT upsert", PostgresBackend.stmt_upsert, "RELEASE SAVEPOINT upsert"])
+
+        cur.execute.side_effect = psycopg2.IntegrityError('duplicate key value violates unique constraint')
+        self.assertRaises(psycopg2.IntegrityError, self.backend._upsert, cur, [])
+
+    @patch('psycopg2.pool.ThreadedConnectionPool', FakeConnectionPool)
+    def test_pool_exhausted(self):
+        release = Event()
+        errors = []
+
+        def hold_session():
+            try:
+                with self.backend.session():
+                    release.wait(5)
+            except Exception as e:
+                errors.append(e)
+
+        # more sessions than connections wait for a connection to be returned
+        threads = [Thread(target=hold_session) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        pool = self.backend._get_pool()[0]
+        self.assertEqual(errors, [])
+        self.assertEqual(pool.most_in_use, 2)
+        self.assertEqual(pool.in_use, 0)
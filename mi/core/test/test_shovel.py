@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+"""
+@package mi.core.test.test_shovel
+@file mi/core/test/test_shovel.py
+@brief Test the batching and confirmation of the rabbitMQ to QPID shovel
+"""
+
+import socket
+import time
+from collections import deque
+
+import qpid.messaging as qm
+from kombu import Connection, Exchange, Producer, Queue
+from nose.plugins.attrib import attr
+
+from mi.core.log import get_logger
+from mi.core.shovel import QpidProducer, RabbitConsumer
+from mi.core.unit_test import MiUnitTest
+
+log = get_logger()
+
+ROUTING_KEY = 'shovel_test_key'
+
+
+class LocalSender(object):
+    """
+    Stand-in for a QPID sender which confirms each message latency seconds after it was sent, unless hold is
+    set.  As with the QPID sender, send blocks while capacity messages are unconfirmed.
+    """
+    def __init__(self, latency=0, capacity=None):
+        self.latency = latency
+        self.capacity = capacity
+        self.hold = False
+        self.fail_after = None
+        self.messages = []
+        self._unsettled = deque()
+
+    def _settle(self):
+        if self.hold:
+            return
+        confirmed = time.time() - self.latency
+        while self._unsettled and self._unsettled[0] <= confirmed:
+            self._unsettled.popleft()
+
+    def unsettled(self):
+        self._settle()
+        return len(self._unsettled)
+
+    def send(self, message, sync=True):
+        if self.fail_after is not None and len(self.messages) >= self.fail_after:
+            raise qm.ConnectionError('local sender failure')
+        while self.capacity and self.unsettled() >= self.capacity:
+            time.sleep(self.latency)
+        self.messages.append(message)
+        self._unsettled.append(time.time())
+
+    def sync(self, timeout=None):
+        if self.hold:
+            raise qm.Timeout('sender sync timed out')
+        time.sleep(self.latency)
+        self._unsettled.clear()
+
+
+class LocalQpidProducer(QpidProducer):
+    """
+    QpidProducer connecting to a new LocalSender each time
+    """
+    def __init__(self, latency=0, capacity=None):
+        super(LocalQpidProducer, self).__init__(None, 'shovel_test', capacity=capacity)
+        self.latency = latency
+        self.senders = []
+
+    def connect(self):
+        self.sender = LocalSender(self.latency, self.capacity)
+        self.senders.append(self.sender)
+
+    def contents(self):
+        return [message.content for sender in self.senders for message in sender.messages]
+
+
+class ShovelTestCase(MiUnitTest):
+    """
+    Base class of the shovel tests, consuming from a queue of the kombu memory transport
+    """
+    def setUp(self):
+        # the memory transport keeps the bindings of deleted queues, use a new queue for each test
+        self.queue_name = 'shovel_%s' % self._testMethodName
+        self.connection = Connection('memory://')
+        self.channel = self.connection.channel()
+        self.exchange = Exchange(name='amq.direct', type='direct')
+        self.queue = Queue(self.queue_name, self.exchange, routing_key=ROUTING_KEY, channel=self.channel)
+        self.queue.declare()
+        self.producer = Producer(self.channel, exchange=self.exchange, routing_key=ROUTING_KEY)
+
+    def tearDown(self):
+        self.queue.delete()
+        self.connection.close()
+
+    def publish(self, count):
+        for index in xrange(count):
+            self.producer.publish('message %d' % index, headers={'index': index})
+        return ['message %d' % index for index in xrange(count)]
+
+    def create_consumer(self, qpid, **kwargs):
+        rabbit = RabbitConsumer('memory://', self.queue_name, ROUTING_KEY, qpid, **kwargs)
+        # don't wait the default polling interval of the memory transport whenever the queue is empty
+        rabbit.connection.transport_options['polling_interval'] = .001
+        return rabbit
+
+    def consume(self, rabbit, connection, until, timeout=10):
+        """
+        Run the consumer loop within its consumer context until a condition is met
+        """
+        deadline = time.time() + timeout
+        while not until() and time.time() < deadline:
+            rabbit.on_iteration()
+            try:
+                connection.drain_events(timeout=.01)
+            except socket.timeout:
+                pass
+
+
+@attr('UNIT', group='mi')
+class TestShovel(ShovelTestCase):
+    def test_batches(self):
+        qpid = LocalQpidProducer()
+        rabbit = self.create_consumer(qpid, batch_size=10, window=2, flush_interval=.05)
+        expected = self.publish(25)
+
+        with rabbit.consumer_context() as (connection, _, _):
+            self.consume(rabbit, connection, lambda: rabbit.count == 25)
+        self.assertEqual(qpid.contents(), expected)
+        self.assertEqual([message.properties['index'] for message in qpid.sender.messages], range(25))
+        self.assertEqual(rabbit.get_stats()['unconfirmed'], 0)
+        self.assertEqual(rabbit.get_current_queue_depth(), (self.queue_name, 0, 25))
+
+    def test_window(self):
+        # with confirmations lagging, every message is still sent once, in order, and confirmed
+        qpid = LocalQpidProducer(.002, capacity=20)
+        rabbit = self.create_consumer(qpid, batch_size=10, window=2, flush_interval=.01)
+        expected = self.publish(100)
+
+        with rabbit.consumer_context() as (connection, _, _):
+            self.consume(rabbit, connection, lambda: rabbit.count == 100)
+        self.assertEqual(qpid.contents(), expected)
+        self.assertEqual(rabbit.count, 100)
+        self.assertEqual(rabbit.get_stats()['unconfirmed'], 0)
+
+    def test_ack_after_confirm(self):
+        qpid = LocalQpidProducer()
+        qpid.connect()
+        qpid.sender.hold = True
+        rabbit = self.create_consumer(qpid, batch_size=10, window=2, flush_interval=60)
+        self.publish(25)
+
+        with rabbit.consumer_context() as (connection, _, _):
+            # two full batches are sent, nothing is acknowledged until QPID confirms
+            self.consume(rabbit, connection, lambda: len(qpid.sender.messages) == 20)
+            self.assertEqual(rabbit.count, 0)
+            stats = rabbit.get_stats()
+            self.assertEqual(stats['unconfirmed'], 20)
+            self.assertGreater(stats['lag'], 0)
+
+            # a confirmation which times out acknowledges nothing
+            self.consume(rabbit, connection, lambda: rabbit.get_stats()['pending'] == 5)
+            rabbit.flush()
+            self.assertEqual(rabbit.count, 0)
+            self.assertEqual(rabbit.get_stats()['unconfirmed'], 25)
+
+            qpid.sender.hold = False
+            rabbit.flush()
+            self.assertEqual(rabbit.count, 25)
+            self.assertEqual(rabbit.get_stats()['unconfirmed'], 0)
+
+    def test_requeue(self):
+        qpid = LocalQpidProducer()
+        qpid.connect()
+        qpid.sender.hold = True
+        qpid.sender.fail_after = 15
+        rabbit = self.create_consumer(qpid, batch_size=10, window=2, flush_interval=.05)
+        expected = self.publish(30)
+
+        # the unconfirmed and unsent messages are requeued and sent again on a new connection
+        with rabbit.consumer_context() as (connection, _, _):
+            self.consume(rabbit, connection, lambda: rabbit.count == 30)
+        self.assertEqual(rabbit.get_stats()['requeued'], 20)
+        self.assertEqual(len(qpid.senders), 2)
+        self.assertEqual(sorted(message.content for message in qpid.senders[1].messages), sorted(expected))
+
+
+@attr('BENCHMARK', group='mi')
+class TestShovelBenchmark(ShovelTestCase):
+    def test_benchmark(self):
+        """
+        Compare sending one message at a time, waiting for each confirmation, with batches and a window
+        """
+        latency = .002
+        count = 1000
+        rates = []
+        for batch_size, window in ((1, 1), (100, 10)):
+            qpid = LocalQpidProducer(latency, capacity=batch_size * window)
+            rabbit = self.create_consumer(qpid, batch_size=batch_size, window=window, flush_interval=.01)
+            self.publish(count)
+
+            start = time.time()
+            with rabbit.consumer_context() as (connection, _, _):
+                self.consume(rabbit, connection, lambda: rabbit.count == count, timeout=60)
+            rates.append(count / (time.time() - start))
+
+            # every message was sent once and confirmed
+            self.assertEqual(len(qpid.contents()), count)
+            self.assertEqual(rabbit.count, count)
+            self.assertEqual(rabbit.get_stats()['unconfirmed'], 0)
+
+        log.info('shovel throughput: %.0f messages/s one at a time, %.0f messages/s in batches', *rates)
@@ -6,10 +6,6 @@ from mi.dataset.dataset_driver import SimpleDatasetDriver
 from mi.dataset.dataset_driver import ProcessingInfoKey
 from mi.core.exceptions import NotImplementedException
 
-from ion_functions.data.ctd_functions import ctd_sbe52mp_preswat
-
-import scipy.interpolate as interpolate
-
 from mi.core.time_tools import ntp_to_string
 from mi.core.log import get_logger
 
@@ -23,6 +19,8 @@ class WfpCFileDriver(SimpleDatasetDriver):
     in the c and e profiles.
     """
     def __init__(self, unused, stream_handle, particle_data_handler, e_file_time_pressure_tuples):
+        from ion_functions.data.ctd_functions import ctd_sbe52mp_preswat
+
         super(WfpCFileDriver, self).__init__(unused, stream_handle, particle_data_handler)
 
         self._e_file_time_pressure_tuples = e_file_time_pressure_tuples
@@ -342,6 +340,9 @@ class WfpSioCFileDriver(SimpleDatasetDriver):
         e_times = [x[0] for x in e_profile_trimmed]
         e_press = [x[1] for x in e_profile_trimmed]
 
+        import scipy.interpolate as interpolate
+        from ion_functions.data.ctd_functions import ctd_sbe52mp_preswat
+
         # Note: we do not use arg fill_value="extrapolate" so the function will throw a
         # value error if pressure is not within the pressure range of e_press
         interpolate_time_from_pressure = interpolate.interp1d(e_press, e_times, kind='linear', axis=0, copy=False)
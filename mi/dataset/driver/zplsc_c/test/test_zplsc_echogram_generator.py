@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+@package mi.dataset.driver.zplsc_c.test.test_zplsc_echogram_generator
+@file mi/dataset/driver/zplsc_c/test/test_zplsc_echogram_generator.py
+@brief Test the generation of the 24-hour echograms from the cached 1-hour volume backscatter
+"""
+
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from nose.plugins.attrib import attr
+
+from mi.core.log import get_logger
+from mi.core.unit_test import MiUnitTest
+from mi.dataset.driver.zplsc_c.resource import RESOURCE_PATH
+from mi.dataset.driver.zplsc_c.zplsc_echogram_generator import ZPLSCEchogramGenerator, CONFIG, SV_CACHE_EXT, \
+    combine_hourly_sv
+from mi.dataset.parser.zplsc_c import ZplscCParser
+
+log = get_logger()
+
+SUBSITES = ['CE01ISSM', 'CE06ISSM']
+SERIAL_NUM = '55075'
+DATA_DIR = 'instrmt/dcl37/ZPLSC_sn%s/%s_zplsc_%s_recovered_2015-11-01/DATA/201510'
+RAW_DATA_FILE = os.path.join(RESOURCE_PATH, '15100520-Test.01A')
+
+
+class ZplscEchogramGeneratorTestCase(MiUnitTest):
+    """
+    Base class of the echogram generator tests, providing a day of raw data files for each subsite
+    """
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.raw_data_dir = os.path.join(self.base_dir, 'OMC')
+
+        # Create the 24 1-hour raw data files of 2015-10-05 of each subsite.
+        self.data_paths = {}
+        for subsite in SUBSITES:
+            data_path = os.path.join(self.raw_data_dir, subsite, 'R00005',
+                                     DATA_DIR % (SERIAL_NUM, subsite.lower(), SERIAL_NUM))
+            os.makedirs(data_path)
+            for hour in range(24):
+                shutil.copyfile(RAW_DATA_FILE, os.path.join(data_path, '151005%02d.01A' % hour))
+            self.data_paths[subsite] = data_path
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def create_generator(self, subsites):
+        generator = ZPLSCEchogramGenerator(subsites, [5], ['2015-10-05'])
+        generator.raw_data_dir = self.raw_data_dir
+        generator.base_echogram_directory = os.path.join(self.base_dir, 'echograms')
+        generator.sv_cache_directory = os.path.join(self.base_dir, 'cache')
+        return generator
+
+    def local_path(self, base, subsite):
+        return os.path.join(self.base_dir, base, os.path.relpath(self.data_paths[subsite], self.raw_data_dir))
+
+    def cache_files(self, subsite):
+        return sorted(glob.glob(os.path.join(self.local_path('cache', subsite), '*' + SV_CACHE_EXT)))
+
+
+@attr('UNIT', group='mi')
+class TestZplscEchogramGenerator(ZplscEchogramGeneratorTestCase):
+    def test_generate_echograms(self):
+        self.create_generator(SUBSITES).generate_zplsc_echograms()
+
+        for subsite in SUBSITES:
+            image_file = '%s-R5-SN%s-151005.png' % (subsite, SERIAL_NUM)
+            self.assertEqual(os.listdir(self.local_path('echograms', subsite)), [image_file])
+            self.assertEqual(len(self.cache_files(subsite)), 24)
+
+    def test_combine_hourly_sv(self):
+        generator = self.create_generator(SUBSITES[:1])
+        data_path = self.data_paths[SUBSITES[0]]
+        sv_cache_path = generator.get_local_directory(generator.sv_cache_directory, data_path)
+
+        # The hours combine to the values of the concatenated raw data files.
+        raw_data_files = sorted(glob.glob(os.path.join(data_path, '*.01A')))
+        concatenated_file = os.path.join(self.base_dir, 'concatenated.01A')
+        with open(concatenated_file, 'wb') as file_handle:
+            for raw_data_file in raw_data_files:
+                with open(raw_data_file, 'rb') as raw_data:
+                    file_handle.write(raw_data.read())
+        with open(concatenated_file, 'rb') as file_handle:
+            expected = ZplscCParser(CONFIG, file_handle, generator.rec_exception_callback).parse_echogram_data()
+
+        for _ in range(2):
+            combined = combine_hourly_sv([generator.get_hourly_sv(raw_data_file, sv_cache_path)
+                                          for raw_data_file in raw_data_files])
+
+            np.testing.assert_array_equal(combined[0], expected[0])
+            self.assertEqual(sorted(combined[1]), sorted(expected[1]))
+            for channel in expected[1]:
+                np.testing.assert_array_equal(combined[1][channel], expected[1][channel])
+            self.assertEqual(combined[2], expected[2])
+            for combined_depth_range, expected_depth_range in zip(combined[3], expected[3]):
+                np.testing.assert_array_equal(combined_depth_range, expected_depth_range)
+
+    def test_changed_hour(self):
+        subsite = SUBSITES[0]
+        generator = self.create_generator([subsite])
+        generator.generate_zplsc_echograms()
+
+        # Only the hour which changed is parsed again.
+        for cache_file in self.cache_files(subsite):
+            os.utime(cache_file, (0, 0))
+        last_hour = os.path.join(self.data_paths[subsite], '15100523.01A')
+        os.utime(last_hour, (time.time(), time.time() + 10))
+        generator.generate_zplsc_echograms()
+
+        updated = [os.path.basename(cache_file) for cache_file in self.cache_files(subsite)
+                   if os.path.getmtime(cache_file) != 0]
+        self.assertEqual(updated, ['15100523.01A' + SV_CACHE_EXT])
+
+
+@attr('BENCHMARK', group='mi')
+class TestZplscEchogramGeneratorBenchmark(ZplscEchogramGeneratorTestCase):
+    def test_benchmark(self):
+        """
+        Compare generating a daily echogram from the raw data files with regenerating it after one hour changed
+        """
+        subsite = SUBSITES[0]
+        generator = self.create_generator([subsite])
+
+        start = time.time()
+        generator.generate_zplsc_echograms()
+        cold = time.time() - start
+
+        last_hour = os.path.join(self.data_paths[subsite], '15100523.01A')
+        os.utime(last_hour, (time.time(), time.time() + 10))
+        start = time.time()
+        generator.generate_zplsc_echograms()
+        cached = time.time() - start
+
+        log.info('daily echogram: %.2f s from the raw data files, %.2f s with 23 cached hours', cold, cached)
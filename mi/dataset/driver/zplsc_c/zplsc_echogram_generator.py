@@ -8,6 +8,12 @@ the echogram in a local directory specified in the configuration file.
 The application will run once and generate the echograms based on the arguments
 passed in.
 
+The 1-hour raw data files are read in place.  The volume backscatter of each
+1-hour file is cached in the local directory specified in the configuration
+file, so the echogram of a day is built from the cached hours and only the
+1-hour files which are new or have changed are parsed again.  The subsites
+are processed in parallel.
+
 Usage:
     zplsc_echogram <subsites> [<deployments>] [<dates>] [--keep]
     zplsc_echogram (-p | --process) [--keep]
@@ -29,24 +35,26 @@ Options:
     -a --all        Generates echograms for all of the subsites in the configuration file.
     -f --file       Create a ZPLSC Echogram from the file given in the command.
     -h --help       Print this help message
-    --keep          Keeps the temporary files after the echogram has been created."""
+    --keep          Deprecated: the raw data files are no longer copied to temporary files."""
 
 import docopt
 import yaml
 import types
 import string
-import shutil
 import re
 import calendar
 import threading
+import multiprocessing
 import errno
 import os
 import os.path
 from datetime import date, timedelta
 
+import numpy as np
+
 from mi.logging import log
 from mi.core.versioning import version
-from mi.dataset.parser.zplsc_c import ZplscCParser
+from mi.dataset.parser.zplsc_c import ZplscCParser, generate_echogram, generate_image_file_path
 from mi.dataset.dataset_parser import DataSetDriverConfigKeys
 from mi.dataset.parser.common_regexes import DATE2_YYYY_MM_DD_REGEX
 
@@ -68,11 +76,14 @@ RECOVERED_DATE_FMT = r'YYYY-MM-DD'
 
 SECONDS_IN_DAY = 86400
 
+# Number of subsites processed in parallel
+POOL_SIZE = 4
+
 RAW_FILE_EXT = r'.01A'
 PNG_FILE_EXT = r'.png'
-USER_HOME = r'~'
+SV_CACHE_EXT = r'.npz'
 BASE_ECHOGRAM_DIRECTORY = r'~/ZPLSC_ECHOGRAMS/'
-TEMP_DIR = r'TEMP_ZPLSC_DATA'
+BASE_SV_CACHE_DIRECTORY = r'~/ZPLSC_SV_CACHE/'
 
 DATE_YYYY_MM_DD_REGEX_MATCHER = re.compile(DATE2_YYYY_MM_DD_REGEX + '$')
 
@@ -114,8 +125,8 @@ class ZPLSCEchogramGenerator(object):
         self.process_mode = False
         self.zplsc_24_datafile_prefix = ''
         self.serial_num = ''
-        self.temp_directory = ''
         self.base_echogram_directory = ''
+        self.sv_cache_directory = ''
         self.raw_data_dir = ''
         self.zplsc_datafile = _zplsc_datafile
         self.process_mode = _process_mode
@@ -266,6 +277,7 @@ class ZPLSCEchogramGenerator(object):
 
         if valid_input:
             self.base_echogram_directory = zplsc_config.get('zplsc_echogram_directory', BASE_ECHOGRAM_DIRECTORY)
+            self.sv_cache_directory = zplsc_config.get('zplsc_sv_cache_directory', BASE_SV_CACHE_DIRECTORY)
 
         return valid_input
 
@@ -297,68 +309,107 @@ class ZPLSCEchogramGenerator(object):
 
         return filenames_list, raw_data_path, raw_datafile_prefix
 
-    def aggregate_raw_data(self, date_dirs_path, data_date):
+    def get_local_directory(self, base_directory, raw_data_path):
         """
-        This method will aggregate the 24 1-hour files residing at the path
-        passed in for the date passed in.  It will copy the 24 files to a
-        temporary directory and then aggregate them and store the single file
-        in the temporary directory.  It will return the file name of the
-        aggregated file and the file name of the echogram file that will be
-        generated.
+        This method will return the local directory, under the base directory
+        passed in, which mirrors the structure of the raw data path passed in.
+        The directory is created if it doesn't exist.
 
         Exceptions raised This method will raise an exception if there is an
-        issue creating the local ZPLSC Echogram directory.
+        issue creating the local directory.
+
+        :param base_directory: The base local directory.
+        :param raw_data_path: The path of the raw data server where the 1-hour files reside.
+        :return: local_directory: The local directory for the raw data path.
+        """
+
+        local_directory = os.path.expanduser(base_directory)
+        path_idx = string.find(raw_data_path, self.raw_data_dir)
+        if path_idx >= 0:
+            path_structure = raw_data_path[path_idx+len(self.raw_data_dir)+1:]
+            local_directory = os.path.join(local_directory, path_structure)
+
+        # Create the local directory structure if it doesn't exist.
+        try:
+            os.makedirs(local_directory)
+        except OSError as ex:
+            if ex.errno == errno.EEXIST and os.path.isdir(local_directory):
+                pass
+            else:
+                log.error('Error creating local ZPLSC storage directory: %s', ex.message)
+                raise
+
+        return local_directory
+
+    def get_hourly_sv(self, raw_data_file, sv_cache_path):
+        """
+        This method will return the volume backscatter of a 1-hour raw data
+        file.  The values are read from the cache if they were computed from
+        the current version of the raw data file, otherwise the raw data file
+        is parsed and its values are cached.
+
+        :param raw_data_file: The path of the 1-hour raw data file.
+        :param sv_cache_path: The local directory of the cached values.
+        :return: hourly_sv: The data times, volume backscatter, frequencies and depth range
+                            of the 1-hour raw data file, or None if it could not be read.
+        """
+
+        cache_file = os.path.join(sv_cache_path, os.path.basename(raw_data_file)) + SV_CACHE_EXT
+        try:
+            raw_data_stat = os.stat(raw_data_file)
+        except OSError as ex:
+            log.error('Error reading raw data file: %s: %s', raw_data_file, ex)
+            return None
+
+        hourly_sv = read_sv_cache(cache_file, raw_data_stat)
+        if hourly_sv is None:
+            with open(raw_data_file, 'rb') as file_handle:
+                parser = ZplscCParser(CONFIG, file_handle, self.rec_exception_callback)
+                hourly_sv = parser.parse_echogram_data()
+
+            if hourly_sv is not None:
+                write_sv_cache(cache_file, raw_data_stat, hourly_sv)
+
+        return hourly_sv
+
+    def create_daily_echogram(self, date_dirs_path, data_date):
+        """
+        This method will create the 24-hour echogram of the 24 1-hour files
+        residing at the path passed in for the date passed in, from the
+        cached volume backscatter of each hour.
 
         :param date_dirs_path: The path of the raw data server where the 24 1-hour files reside.
         :param data_date: The date of the raw data for the echogram to be generated.
-        :return: zplsc_24_datafile: The 24-hour concatenated raw data file
-                 zplsc_echogram_file_path: The file path for the echogram to be generated.
+        :return: echogram_created: Boolean indicating whether the echogram was created.
         """
 
-        zplsc_echogram_file_path = None
-
         try:
             filenames_list, raw_data_path, raw_datafile_prefix = self.get_data_filenames(date_dirs_path, data_date)
         except OSError:
-            return '', None
+            return False
 
         if len(filenames_list) != 24:
-            return '', None
+            return False
 
-        # Copy the 24 1-hour raw data files to a temporary local directory.
-        for raw_data_file in filenames_list:
-            remote_raw_data_file = os.path.join(raw_data_path, raw_data_file)
-            local_raw_data = os.path.join(self.temp_directory, raw_data_file)
-            try:
-                shutil.copyfile(remote_raw_data_file, local_raw_data)
-            except OSError as ex:
-                log.error('Error copying data file to temporary directory: %s: %s', remote_raw_data_file, ex.message)
-                continue
+        zplsc_echogram_file_path = self.get_local_directory(self.base_echogram_directory, raw_data_path)
+        sv_cache_path = self.get_local_directory(self.sv_cache_directory, raw_data_path)
 
-        # Concatenate the 24 1-hour raw data files to 1 24-hour raw data file and return the filename.
-        zplsc_24_datafilename = self.zplsc_24_datafile_prefix + raw_datafile_prefix
-        zplsc_24_datafile = os.path.join(self.temp_directory, zplsc_24_datafilename) + RAW_FILE_EXT
-        raw_data_glob = os.path.join(raw_data_path, raw_datafile_prefix) + '*' + RAW_FILE_EXT
-        os.system('cat ' + raw_data_glob + ' > ' + zplsc_24_datafile)
+        # Name the echogram after the 24-hour raw data file the 1-hour files used to be concatenated into.
+        zplsc_24_datafilename = self.zplsc_24_datafile_prefix + raw_datafile_prefix + RAW_FILE_EXT
+        image_path = generate_image_file_path(zplsc_24_datafilename, zplsc_echogram_file_path)
 
-        # Generate the ZPLSC Echogram filename.
-        echogram_path_idx = string.find(raw_data_path, self.raw_data_dir)
-        if echogram_path_idx >= 0:
-            base_directory = os.path.expanduser(self.base_echogram_directory)
-            path_structure = raw_data_path[echogram_path_idx+len(self.raw_data_dir)+1:]
-            zplsc_echogram_file_path = os.path.join(base_directory, path_structure)
+        log.info('Begin processing echogram data: %r', image_path)
+        hourly_svs = [self.get_hourly_sv(os.path.join(raw_data_path, raw_data_file), sv_cache_path)
+                      for raw_data_file in filenames_list if raw_data_file.endswith(RAW_FILE_EXT)]
+        echogram_data = combine_hourly_sv(hourly_svs)
+        if echogram_data is None:
+            log.warning('No echogram data for %s under %s', data_date, raw_data_path)
+            return False
 
-            # Create the ZPLSC Echogram directory structure if it doesn't exist.
-            try:
-                os.makedirs(zplsc_echogram_file_path)
-            except OSError as ex:
-                if ex.errno == errno.EEXIST and os.path.isdir(zplsc_echogram_file_path):
-                    pass
-                else:
-                    log.error('Error creating local ZPLSC Echogram storage directory: %s', ex.message)
-                    raise
+        log.info('Completed processing all data: %r', image_path)
+        generate_echogram(image_path, *echogram_data)
 
-        return zplsc_24_datafile, zplsc_echogram_file_path
+        return True
 
     def get_latest_echogram_date(self, date_dirs_path, date_dirs):
         """
@@ -522,15 +573,42 @@ class ZPLSCEchogramGenerator(object):
 
         return deployments
 
-    def purge_temporary_files(self):
+    def generate_subsite_echograms(self, subsite):
         """
-        This method will purge the temporary directory of the temporary files.
+        This method will generate the 24-hour echograms of the deployments and
+        dates of the subsite passed in.
+
+        :param subsite: The subsite of the ZPLSC instrument.
+        :return:
         """
 
-        # If the temporary directory exists, purge it.
-        if os.path.exists(self.temp_directory):
-            for temp_file in os.listdir(self.temp_directory):
-                os.remove(os.path.join(self.temp_directory, temp_file))
+        zplsc_24_subsite_prefix = subsite + '-'
+
+        try:
+            deployments = self.get_deployment_dirs(subsite)
+        except OSError:
+            return
+
+        for deployment in deployments:
+            zplsc_24_deployment_prefix = zplsc_24_subsite_prefix + 'R' + str(deployment) + '-'
+
+            try:
+                echogram_dates, date_dirs_path = self.get_date_dirs(subsite, deployment)
+            except OSError:
+                continue
+
+            for date_dir, entire_month in echogram_dates.items():
+                self.zplsc_24_datafile_prefix = zplsc_24_deployment_prefix + 'sn' + self.serial_num + '-'
+
+                if entire_month:
+                    number_of_days_in_the_month = calendar.monthrange(date_dir.year, date_dir.month)[1]
+                    echogram_days = [date_dir + timedelta(days=day) for day in range(number_of_days_in_the_month)]
+                else:
+                    echogram_days = [date_dir]
+
+                for echogram_date in echogram_days:
+                    if not self.create_daily_echogram(date_dirs_path, echogram_date):
+                        log.warning('Unable to create the echogram for %s under %s', echogram_date, date_dirs_path)
 
     def generate_zplsc_echograms(self):
         """
@@ -572,77 +650,137 @@ class ZPLSCEchogramGenerator(object):
                     log.warning('The subsite is not one of the subsites containing a ZPLSC-C instrument.')
 
         else:  # We are creating 24-hour echograms ...
-            # Create the temporary data file directory.
-            self.temp_directory = os.path.join(os.path.expanduser(USER_HOME), TEMP_DIR)
-            if not os.path.exists(self.temp_directory):
-                os.mkdir(self.temp_directory)
-
-            # Create the echograms for the zplsc instruments of each subsite.
-            for subsite in self.subsites:
-                zplsc_24_subsite_prefix = subsite + '-'
-
+            # Create the echograms for the zplsc instruments of each subsite, in parallel.
+            if len(self.subsites) > 1:
+                processing_pool = multiprocessing.Pool(min(POOL_SIZE, len(self.subsites)),
+                                                       init_echogram_worker, (self,))
                 try:
-                    deployments = self.get_deployment_dirs(subsite)
-                except OSError:
-                    continue
-
-                for deployment in deployments:
-                    zplsc_24_deployment_prefix = zplsc_24_subsite_prefix + 'R' + str(deployment) + '-'
-
-                    try:
-                        echogram_dates, date_dirs_path = self.get_date_dirs(subsite, deployment)
-                    except OSError:
-                        continue
-
-                    for date_dir, entire_month in echogram_dates.items():
-                        self.zplsc_24_datafile_prefix = zplsc_24_deployment_prefix + 'sn' + self.serial_num + '-'
-
-                        if entire_month:
-                            number_of_days_in_the_month = calendar.monthrange(date_dir.year, date_dir.month)[1]
-                            for day in range(number_of_days_in_the_month):
-                                echogram_date = date_dir + timedelta(days=day)
-
-                                # Aggregate the 24 raw data files for the given instrument to 1 24-hour data file.
-                                zplsc_24_datafile, zplsc_echogram_file_path = self.aggregate_raw_data(date_dirs_path,
-                                                                                                      echogram_date)
-                                if not zplsc_24_datafile:
-                                    log.warning('Unable to aggregate raw data files for %s under %s',
-                                                echogram_date, date_dirs_path)
-                                    continue
-
-                                # Send the 24-hour raw data file to the zplsc C Series parser to generate the echogram.
-                                with open(zplsc_24_datafile) as file_handle:
-                                    parser = ZplscCParser(CONFIG, file_handle, self.rec_exception_callback)
-                                    parser.create_echogram(zplsc_echogram_file_path)
-
-                                if not self.keep_temp_files:
-                                    self.purge_temporary_files()
-
-                        else:
-                            # Aggregate the 24 raw data files for the given instrument to 1 24-hour data file.
-                            zplsc_24_datafile, zplsc_echogram_file_path = self.aggregate_raw_data(date_dirs_path, date_dir)
-
-                            if not zplsc_24_datafile:
-                                log.warning('Unable to aggregate raw data files for %s under %s', date_dir, date_dirs_path)
-                                continue
-
-                            # Send the 24-hour raw data file to the zplsc C Series parser to generate the echogram.
-                            with open(zplsc_24_datafile) as file_handle:
-                                parser = ZplscCParser(CONFIG, file_handle, self.rec_exception_callback)
-                                parser.create_echogram(zplsc_echogram_file_path)
-
-                            if not self.keep_temp_files:
-                                self.purge_temporary_files()
-
-            # Remove the temporary data file directory and its content.
-            if not self.keep_temp_files:
-                shutil.rmtree(self.temp_directory)
+                    results = [processing_pool.apply_async(generate_subsite_echograms, (subsite,))
+                               for subsite in self.subsites]
+                    for result in results:
+                        result.get()
+                finally:
+                    processing_pool.close()
+                    processing_pool.join()
+            else:
+                for subsite in self.subsites:
+                    self.generate_subsite_echograms(subsite)
 
             # If it's running as a daily process, wait 24 hours and re-run this method
             if self.process_mode:
                 threading.Timer(SECONDS_IN_DAY, self.generate_zplsc_echograms).start()
 
 
+# The ZPLSC Echogram Generator of a worker process of the processing pool
+_echogram_generator = None
+
+
+def init_echogram_worker(echogram_generator):
+    """
+    Initialize a worker process of the processing pool.  The versioned generator
+    class can't be pickled, the worker processes inherit it when they are forked.
+
+    :param echogram_generator: The ZPLSC Echogram Generator.
+    :return:
+    """
+
+    global _echogram_generator
+    _echogram_generator = echogram_generator
+
+
+def generate_subsite_echograms(subsite):
+    """
+    Generate the echograms of a subsite in a worker process of the processing pool.
+
+    :param subsite: The subsite of the ZPLSC instrument.
+    :return:
+    """
+
+    _echogram_generator.generate_subsite_echograms(subsite)
+
+
+def read_sv_cache(cache_file, raw_data_stat):
+    """
+    Read the cached volume backscatter of a 1-hour raw data file.
+
+    :param cache_file: The path of the cache file.
+    :param raw_data_stat: The os.stat result of the 1-hour raw data file.
+    :return: hourly_sv: The data times, volume backscatter, frequencies and depth range, or None if they
+                        are not cached or were cached from a different version of the raw data file.
+    """
+
+    try:
+        with np.load(cache_file) as cached:
+            if cached['raw_data_file'].tolist() != [raw_data_stat.st_size, raw_data_stat.st_mtime]:
+                return None
+
+            channels = sorted(int(name[len('sv_'):]) for name in cached.files if name.startswith('sv_'))
+            sv_dict = {channel: cached['sv_%d' % channel] for channel in channels}
+            frequencies = {channel: float(cached['frequency_%d' % channel]) for channel in channels}
+            depth_range = [cached['depth_range_%d' % index] for index in range(int(cached['num_depth_ranges']))]
+
+            return cached['data_times'], sv_dict, frequencies, depth_range
+
+    except (IOError, ValueError, KeyError):
+        return None
+
+
+def write_sv_cache(cache_file, raw_data_stat, hourly_sv):
+    """
+    Cache the volume backscatter of a 1-hour raw data file.
+
+    :param cache_file: The path of the cache file.
+    :param raw_data_stat: The os.stat result of the 1-hour raw data file.
+    :param hourly_sv: The data times, volume backscatter, frequencies and depth range of the raw data file.
+    :return:
+    """
+
+    data_times, sv_dict, frequencies, depth_range = hourly_sv
+
+    arrays = {'raw_data_file': np.array([raw_data_stat.st_size, raw_data_stat.st_mtime]),
+              'data_times': data_times,
+              'num_depth_ranges': len(depth_range)}
+    for channel in sv_dict:
+        arrays['sv_%d' % channel] = sv_dict[channel]
+        arrays['frequency_%d' % channel] = frequencies[channel]
+    for index, channel_depth_range in enumerate(depth_range):
+        arrays['depth_range_%d' % index] = channel_depth_range
+
+    # Write to a temporary file first so an interrupted write is never read as a valid cache file.
+    temp_cache_file = cache_file + '.tmp'
+    try:
+        with open(temp_cache_file, 'wb') as file_handle:
+            np.savez(file_handle, **arrays)
+        os.rename(temp_cache_file, cache_file)
+    except (IOError, OSError) as ex:
+        log.warning('Error caching the volume backscatter: %s: %s', cache_file, ex)
+
+
+def combine_hourly_sv(hourly_svs):
+    """
+    Combine the volume backscatter of consecutive 1-hour raw data files, as if
+    the raw data files had been concatenated and parsed as one file.
+
+    :param hourly_svs: List of the data times, volume backscatter, frequencies and depth range of each hour.
+    :return: echogram_data: The combined data times, volume backscatter, frequencies and depth range,
+                            or None if there are no data.
+    """
+
+    hourly_svs = [hourly_sv for hourly_sv in hourly_svs if hourly_sv is not None and len(hourly_sv[0])]
+    if not hourly_svs:
+        return None
+
+    # The channels and frequencies are those of the first profile, the depth range that of the last profile.
+    _, first_sv_dict, frequencies, _ = hourly_svs[0]
+    depth_range = hourly_svs[-1][3]
+
+    data_times = np.concatenate([hourly_sv[0] for hourly_sv in hourly_svs])
+    sv_dict = {channel: np.concatenate([hourly_sv[1][channel] for hourly_sv in hourly_svs])
+               for channel in first_sv_dict}
+
+    return data_times, sv_dict, frequencies, depth_range
+
+
 def main():
     # Get the command line arguments
     options = docopt.docopt(__doc__)
@@ -13,7 +13,6 @@ Initial Release
 
 import os
 import re
-import netCDF4
 from datetime import datetime, timedelta
 
 from mi.core.versioning import version
@@ -285,6 +284,8 @@ class ZplscEchogramUploadParser(SimpleParser):
             self._record_buffer.append(particle)
 
     def set_provenance_from_hourly_files(self, first_hourly_file, last_hourly_file):
+        import netCDF4
+
         nc4_dataset = netCDF4.Dataset(first_hourly_file)
         self.provenance[ZplscProvenanceKey.DATA_FILE_NAME] = nc4_dataset.groups['Provenance'].variables['source_filenames'][0]
         self.provenance[ZplscProvenanceKey.CONVERSION_SOFTWARE_NAME] = nc4_dataset.groups['Provenance'].conversion_software_name
@@ -299,6 +300,8 @@ class ZplscEchogramUploadParser(SimpleParser):
             nc4_dataset.close()
 
     def get_first_ping_time_from_echogram(self, echogram_type):
+        import netCDF4
+
         nc4_dataset = netCDF4.Dataset(self._echogram_filepath)
         if echogram_type == ZplscEchogramType.HOURLY:
             first_ping_time = nc4_dataset.groups['Vendor_specific'].variables['ping_time'][0]
@@ -34,6 +34,8 @@ import numpy
 import re
 import os
 import struct
+from collections import namedtuple
+
 from mi.core.exceptions import RecoverableSampleException, SampleEncodingException
 from mi.dataset.dataset_parser import BufferLoadingParser
 
@@ -213,12 +215,6 @@ FILE_NAME_MATCHER = re.compile(r"""(?x)
     %(UINT)s_(?P<%(SEQUENCE_NUMBER)s> %(UINT)s)_TS(?P<%(FILE_TIME)s> %(UINT)s).*?\.WVS
     """ % common_matches, re.VERBOSE | re.DOTALL)
 
-# Regex used by the sieve_function
-# Header data: ie. \x7f\x7a followed by 10 bytes of binary data
-HEADER_MATCHER = re.compile(r"""(?x)
-    %(HEADER)s(?P<Spare1> (.){2}) (?P<Record_Size> (.{4})) (?P<Spare2_4> (.){3}) (?P<NumDataTypes> (.))
-    """ % common_matches, re.VERBOSE | re.DOTALL)
-
 
 def make_null_parameters(rules):
     """
@@ -393,7 +389,50 @@ HPR_TIME_SERIES_UNPACKING_RULES = [
 
 NULL_HPR_TIME_SERIES = make_null_parameters(HPR_TIME_SERIES_UNPACKING_RULES)
 
+
+# A data type's unpacking rules compiled into numpy dtypes: the fixed size fields as one packed
+# record and, for data types ending in a counted array, the array element
+DataTypeLayout = namedtuple('DataTypeLayout', 'rules, fields, element')
+
+
+def compile_unpacking_rules(rules, array=False):
+    """
+    Compile an encoding rules list into a DataTypeLayout, so a data type is decoded with a single
+    numpy view of the record rather than one struct call per parameter. Spare values are left as
+    gaps in the packed record and repeated formats, ie. '8B', become sub-arrays.
+    @param rules encoding rules list
+    @param array True if the last rule is the element of an array following the fixed size fields
+    @retval DataTypeLayout
+    """
+    names, formats, offsets = [], [], []
+    position = 0
+
+    for key, formatter in (rules[:-1] if array else rules):
+        if AdcptMWVSParticleKey.SPARE not in key:
+            count, code = re.match(r'(\d*)(\w)$', formatter).groups()
+            names.append(key)
+            formats.append(('<' + code, int(count)) if count else '<' + code)
+            offsets.append(position)
+        position += struct.calcsize('<' + formatter)
+
+    fields = numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': position})
+    element = numpy.dtype('<' + rules[-1][1]) if array else None
+
+    return DataTypeLayout(rules, fields, element)
+
+
+FIXED_LEADER_LAYOUT = compile_unpacking_rules(FIXED_LEADER_UNPACKING_RULES)
+VARIABLE_LEADER_LAYOUT = compile_unpacking_rules(VARIABLE_LEADER_UNPACKING_RULES)
+VELOCITY_SPECTRUM_LAYOUT = compile_unpacking_rules(VELOCITY_SPECTRUM_UNPACKING_RULES, array=True)
+SURFACE_TRACK_SPECTRUM_LAYOUT = compile_unpacking_rules(SURFACE_TRACK_SPECTRUM_UNPACKING_RULES, array=True)
+PRESSURE_SPECTRUM_LAYOUT = compile_unpacking_rules(PRESSURE_SPECTRUM_UNPACKING_RULES, array=True)
+DIRECTIONAL_SPECTRUM_LAYOUT = compile_unpacking_rules(DIRECTIONAL_SPECTRUM_UNPACKING_RULES, array=True)
+WAVE_PARAMETER_LAYOUT = compile_unpacking_rules(WAVE_PARAMETER_UNPACKING_RULES)
+HPR_TIME_SERIES_LAYOUT = compile_unpacking_rules(HPR_TIME_SERIES_UNPACKING_RULES, array=True)
+
 # Offsets for reading a record and its header
+HEADER_SIZE = 12
+HEADER_RECORD_SIZE_OFFSET = 4
 HEADER_NUM_DATA_TYPES_OFFSET = 11
 HEADER_OFFSETS_OFFSET = 12
 ID_TYPE_SIZE = 2
@@ -405,7 +444,7 @@ PITCH_TIME_SERIES_IDX = 1
 ROLL_TIME_SERIES_IDX = 2
 
 # Indices into an encoding rules list
-UNPACK_RULES = 0
+LAYOUT = 0
 ENCODE_FUNC = 1
 ENCODE_NULL = 2
 
@@ -429,23 +468,23 @@ class AdcptMWVSInstrumentDataParticle(DataParticle):
         self._sequence_number = sequence_number
         self._file_time = file_time
 
-        # Data Type ID: [Unpacking Rules, Encoding Function, NULL Filler]
+        # Data Type ID: [Layout, Encoding Function, NULL Filler]
         self.encoding_func_dict = {
-            FIXED_LEADER: [FIXED_LEADER_UNPACKING_RULES,
+            FIXED_LEADER: [FIXED_LEADER_LAYOUT,
                            self._parse_values, NULL_FIXED_LEADER],
-            VARIABLE_LEADER: [VARIABLE_LEADER_UNPACKING_RULES,
+            VARIABLE_LEADER: [VARIABLE_LEADER_LAYOUT,
                               self._parse_values, NULL_VARIABLE_LEADER],
-            VELOCITY_SPECTRUM: [VELOCITY_SPECTRUM_UNPACKING_RULES,
+            VELOCITY_SPECTRUM: [VELOCITY_SPECTRUM_LAYOUT,
                                 self._parse_values_with_array, NULL_VELOCITY_SPECTRUM],
-            SURFACE_TRACK_SPECTRUM: [SURFACE_TRACK_SPECTRUM_UNPACKING_RULES,
+            SURFACE_TRACK_SPECTRUM: [SURFACE_TRACK_SPECTRUM_LAYOUT,
                                      self._parse_values_with_array, NULL_SURFACE_TRACK_SPECTRUM],
-            PRESSURE_SPECTRUM: [PRESSURE_SPECTRUM_UNPACKING_RULES,
+            PRESSURE_SPECTRUM: [PRESSURE_SPECTRUM_LAYOUT,
                                 self._parse_values_with_array, NULL_PRESSURE_SPECTRUM],
-            DIRECTIONAL_SPECTRUM: [DIRECTIONAL_SPECTRUM_UNPACKING_RULES,
+            DIRECTIONAL_SPECTRUM: [DIRECTIONAL_SPECTRUM_LAYOUT,
                                    self._parse_directional_spectrum, NULL_DIRECTIONAL_SPECTRUM],
-            WAVE_PARAMETERS: [WAVE_PARAMETER_UNPACKING_RULES,
+            WAVE_PARAMETERS: [WAVE_PARAMETER_LAYOUT,
                               self._parse_values, NULL_WAVE_PARAMETER],
-            HEADING_PITCH_ROLL_TIME_SERIES: [HPR_TIME_SERIES_UNPACKING_RULES,
+            HEADING_PITCH_ROLL_TIME_SERIES: [HPR_TIME_SERIES_LAYOUT,
                                              self._parse_hpr_time_series, NULL_HPR_TIME_SERIES]
         }
 
@@ -489,7 +528,7 @@ class AdcptMWVSInstrumentDataParticle(DataParticle):
             # Feed the data through the corresponding encoding function and unpacking rules
             try:
                 self.encoding_func_dict[data_type_id][ENCODE_FUNC](
-                    offset + ID_TYPE_SIZE, self.encoding_func_dict[data_type_id][UNPACK_RULES])
+                    offset + ID_TYPE_SIZE, self.encoding_func_dict[data_type_id][LAYOUT])
             except KeyError:
                 log.debug("Skipping unsupported data type ID: %s at offset: %s",
                           data_type_id, offset)
@@ -510,58 +549,53 @@ class AdcptMWVSInstrumentDataParticle(DataParticle):
 
         return self.final_result
 
-    def _parse_directional_spectrum(self, offset, rules):
+    def _unpack_fields(self, offset, layout):
+        """
+        Decode the fixed size fields of a data type with a view of its packed record
+        @retval list of the field values, sub-arrays converted to lists
+        """
+        values = numpy.frombuffer(self.raw_data, layout.fields, 1, offset)[0].tolist()
+        return [value.tolist() if isinstance(value, numpy.ndarray) else value for value in values]
+
+    def _unpack_array(self, offset, layout, count):
+        """
+        View the array of count elements following the fixed size fields of a data type
+        @retval numpy array
+        """
+        return numpy.frombuffer(self.raw_data, layout.element, count, offset + layout.fields.itemsize)
+
+    def _parse_directional_spectrum(self, offset, layout):
         """
         Convert the binary data into particle data for the Directional Spectrum Data Type
         """
-        # Unpack the unpacking rules
-        (num_freq_name, num_dir_name, good_name, dat_name),\
-        (num_freq_fmt, num_dir_fmt, good_fmt, dat_fmt) = zip(*rules)
-
-        # First unpack the array lengths and single length values
-        (num_freq_data, num_dir_data, dspec_good_data) = struct.unpack_from(
-            '<%s%s%s' % (num_freq_fmt, num_dir_fmt, good_fmt), self.raw_data, offset)
-
-        # Then unpack the array using the retrieved lengths values
-        next_offset = offset + struct.calcsize(num_freq_fmt) + struct.calcsize(num_dir_fmt) + \
-                      struct.calcsize(good_fmt)
-        dspec_dat_list_data = struct.unpack_from(
-            '<%s%s' % (num_freq_data * num_dir_data, dat_fmt), self.raw_data, next_offset)
-
-        # convert to numpy array and reshape the data per IDD spec
-        transformed_dat_data = numpy.array(dspec_dat_list_data).reshape(
+        # Unpack the array lengths and single length values
+        num_freq_data, num_dir_data, dspec_good_data = self._unpack_fields(offset, layout)
+
+        # Then view the array using the retrieved lengths values and reshape the data per IDD spec
+        transformed_dat_data = self._unpack_array(offset, layout, num_freq_data * num_dir_data).reshape(
             (num_freq_data, num_dir_data)).tolist()
 
         # Add to the collected parameter data
+        (num_freq_name, num_dir_name, good_name, dat_name), _ = zip(*layout.rules)
         self.final_result.extend(
             ({DataParticleKey.VALUE_ID: num_freq_name, DataParticleKey.VALUE: num_freq_data},
              {DataParticleKey.VALUE_ID: num_dir_name, DataParticleKey.VALUE: num_dir_data},
              {DataParticleKey.VALUE_ID: good_name, DataParticleKey.VALUE: dspec_good_data},
              {DataParticleKey.VALUE_ID: dat_name, DataParticleKey.VALUE: transformed_dat_data}))
 
-    def _parse_hpr_time_series(self, offset, rules):
+    def _parse_hpr_time_series(self, offset, layout):
         """
         Convert the binary data into particle data for the Heading, Pitch, Time Series Data Type
         """
-        # Unpack the unpacking rules
-        (hpr_num_name, beam_angle_name, spare_name, hpr_time_names),\
-        (hpr_num_fmt, beam_angle_fmt, spare_fmt, hpr_time_fmt) = zip(*rules)
-
-        # First unpack the array length and single length value, no need to unpack spare
-        (hpr_num_data, beam_angle_data) = struct.unpack_from(
-            '<%s%s' % (hpr_num_fmt, beam_angle_fmt), self.raw_data, offset)
-
-        # Then unpack the array using the retrieved lengths value
-        next_offset = offset + struct.calcsize(hpr_num_fmt) + struct.calcsize(beam_angle_fmt) + \
-                      struct.calcsize(spare_fmt)
-        hpr_time_list_data = struct.unpack_from(
-            '<%s%s' % (hpr_num_data * HPR_TIME_SERIES_ARRAY_SIZE, hpr_time_fmt), self.raw_data, next_offset)
+        # Unpack the array length and single length value, the spare is skipped by the layout
+        hpr_num_data, beam_angle_data = self._unpack_fields(offset, layout)
 
-        # convert to numpy array and reshape the data to a 2d array per IDD spec
-        transformed_hpr_time_data = numpy.array(hpr_time_list_data).reshape(
-            (hpr_num_data, HPR_TIME_SERIES_ARRAY_SIZE)).transpose().tolist()
+        # Then view the array using the retrieved length value and reshape the data to a 2d array per IDD spec
+        transformed_hpr_time_data = self._unpack_array(offset, layout, hpr_num_data * HPR_TIME_SERIES_ARRAY_SIZE)\
+            .reshape((hpr_num_data, HPR_TIME_SERIES_ARRAY_SIZE)).transpose().tolist()
 
         # Add to the collected parameter data
+        (hpr_num_name, beam_angle_name, spare_name, hpr_time_names), _ = zip(*layout.rules)
         self.final_result.extend(
             ({DataParticleKey.VALUE_ID: hpr_num_name, DataParticleKey.VALUE: hpr_num_data},
              {DataParticleKey.VALUE_ID: beam_angle_name, DataParticleKey.VALUE: beam_angle_data},
@@ -572,50 +606,36 @@ class AdcptMWVSInstrumentDataParticle(DataParticle):
              {DataParticleKey.VALUE_ID: hpr_time_names[ROLL_TIME_SERIES_IDX],
               DataParticleKey.VALUE: transformed_hpr_time_data[ROLL_TIME_SERIES_IDX]}))
 
-    def _parse_values(self, offset, rules):
+    def _parse_values(self, offset, layout):
         """
-        Convert the binary data into particle data for the given rules
+        Convert the binary data into particle data for the given layout
         """
-        position = offset
-
-        # Iterate through the unpacking rules and append the retrieved values with its corresponding
-        # particle name
-        for key, formatter in rules:
-            # Skip over spare values
-            if AdcptMWVSParticleKey.SPARE in key:
-                position += struct.calcsize(formatter)
-                continue
-            value = list(struct.unpack_from('<%s' % formatter, self.raw_data, position))
-            # Support unpacking single values and lists
-            if len(value) == 1:
-                value = value[0]
+        # Append the retrieved values with its corresponding particle name, spare values are
+        # not part of the layout
+        for key, value in zip(layout.fields.names, self._unpack_fields(offset, layout)):
             if AdcptMWVSParticleKey.START_TIME in key:
                 timestamp = ((value[0]*100 + value[1]), value[2], value[3], value[4],
                              value[5], value[6], value[7], 0, 0)
                 log.trace("TIMESTAMP: %s", timestamp)
                 elapsed_seconds = calendar.timegm(timestamp)
                 self.set_internal_timestamp(unix_time=elapsed_seconds)
-            log.trace("DATA: %s:%s @ %s", key, value, position)
-            position += struct.calcsize(formatter)
+            log.trace("DATA: %s:%s", key, value)
             self.final_result.append({DataParticleKey.VALUE_ID: key,
                                       DataParticleKey.VALUE: value})
 
-    def _parse_values_with_array(self, offset, rules):
+    def _parse_values_with_array(self, offset, layout):
         """
-        Convert the binary data into particle data for the given rules
+        Convert the binary data into particle data for the given layout
         Assumes first value to unpack contains the size of the array for the second value to unpack
         """
-        # Unpack the unpacking rules
-        (param_size_name, param_list_name), (param_size_fmt, param_list_fmt) = zip(*rules)
-
         # First unpack the array length value
-        num_data, = struct.unpack_from('<%s' % param_size_fmt, self.raw_data, offset)
+        num_data, = self._unpack_fields(offset, layout)
+
+        # Then view the array using the retrieved length value, converting it to a list
+        param_list_data = self._unpack_array(offset, layout, num_data).tolist()
 
-        # Then unpack the array using the retrieved length value, casting from a tuple to a list
-        param_list_data = list(
-            struct.unpack_from('<%s%s' % (num_data, param_list_fmt),
-                               self.raw_data, offset + struct.calcsize(param_size_fmt)))
         # Add to the collected parameter data
+        (param_size_name, param_list_name), _ = zip(*layout.rules)
         self.final_result.extend(
             ({DataParticleKey.VALUE_ID: param_size_name, DataParticleKey.VALUE: num_data},
              {DataParticleKey.VALUE_ID: param_list_name, DataParticleKey.VALUE: param_list_data}))
@@ -658,17 +678,17 @@ class AdcptMWVSParser(BufferLoadingParser):
         # File is being read 1024 bytes at a time
         # Match a Header up to the "number of data types" value
 
-        #find all occurrences of the record header sentinel
-        header_iter = HEADER_MATCHER.finditer(input_buffer)
-        for match in header_iter:
+        # find all occurrences of the record header sentinel, str.find skips through the binary
+        # data much faster than matching the header regex
+        record_start = input_buffer.find(HEADER)
+        while record_start != -1 and record_start + HEADER_SIZE <= len(input_buffer):
 
-            record_start = match.start()
-            record_size, = struct.unpack('I', match.group('Record_Size'))
+            record_size, = struct.unpack_from('<I', input_buffer, record_start + HEADER_RECORD_SIZE_OFFSET)
             record_end = record_start + record_size
-            num_data, = struct.unpack('B', match.group('NumDataTypes'))
+            num_data = ord(input_buffer[record_start + HEADER_NUM_DATA_TYPES_OFFSET])
 
             # Get a whole record based on meeting the expected size and matching the next sentinel
-            if len(input_buffer) - match.start() >= record_size + ID_TYPE_SIZE \
+            if len(input_buffer) - record_start >= record_size + ID_TYPE_SIZE \
                     and HEADER == input_buffer[record_end:record_end + ID_TYPE_SIZE]:
 
                 self.particle_count += 1
@@ -687,6 +707,8 @@ class AdcptMWVSParser(BufferLoadingParser):
                           self._stream_handle.tell(), num_data, len(input_buffer))
             # else record does not contain enough bytes or is misaligned
 
+            record_start = input_buffer.find(HEADER, record_start + HEADER_SIZE)
+
         return indices_list
 
     def handle_non_data(self, non_data, non_end, start):
@@ -784,14 +806,15 @@ class AdcptMWVSParser(BufferLoadingParser):
 
                 # need to actually parse the particle fields to find out if there are errors
                 particle_dict = particle.generate_dict()
-                log.trace('Parsed particle: %s\n\n' % particle_dict)
+                log.trace('Parsed particle: %s\n\n', particle_dict)
                 encoding_errors = particle.get_encoding_errors()
                 if encoding_errors:
                     log.warn("Failed to encode: %s", encoding_errors)
                     raise SampleEncodingException("Failed to encode: %s" % encoding_errors)
 
-        # Also catch any possible exceptions thrown from unpacking data
-        except (RecoverableSampleException, SampleEncodingException, struct.error) as e:
+        # Also catch any possible exceptions thrown from unpacking data, numpy raises a ValueError
+        # when a view extends past the end of the record
+        except (RecoverableSampleException, SampleEncodingException, struct.error, ValueError) as e:
             log.error("Sample exception detected: %s raw data: %r", e, raw_data)
             if self._exception_callback:
                 self._exception_callback(e)
@@ -11,16 +11,22 @@ initial release
 """
 
 import copy
+import functools
 import re
 import string
+from collections import namedtuple
+
+import ntplib
+import numpy as np
 
 from mi.core.log import get_logger
 
 from mi.core.common import BaseEnum
 from mi.core.exceptions import DatasetParserException, \
     RecoverableSampleException, \
-    ConfigurationException
-from mi.core.instrument.dataset_data_particle import DataParticle
+    ConfigurationException, \
+    NotImplementedException
+from mi.core.instrument.dataset_data_particle import DataParticle, DataParticleKey
 from mi.dataset.dataset_parser import DataSetDriverConfigKeys
 from mi.dataset.dataset_parser import SimpleParser
 from mi.dataset.parser.common_regexes import END_OF_LINE_REGEX, \
@@ -59,6 +65,12 @@ METADATA_PARTICLE_CLASS_KEY = 'metadata_particle_class'
 # The key for the data particle class
 DATA_PARTICLE_CLASS_KEY = 'data_particle_class'
 
+# The number of data records loaded together into columns
+COLUMN_BATCH_SIZE = 1000
+
+# The column dtype of a suspect timestamp flag, loaded as 1 for y and 0 for n
+Y_OR_N_DTYPE = 'y_or_n'
+
 
 def encode_y_or_n(val):
     if val == 'y' or val == 'Y':
@@ -190,6 +202,210 @@ class CsppMetadataDataParticle(DataParticle):
         return results
 
 
+class CsppColumn(namedtuple('CsppColumn', 'key, position, dtype, encoding')):
+    """
+    A parameter of a cspp data record loaded into a column.  position is the index of the value among the
+    tab separated values of the record, or a slice of them for a spectrum, which is loaded into a 2-D array.
+    dtype is the numpy dtype the values are loaded as, or Y_OR_N_DTYPE.  encoding is the particle encoding
+    function of a loaded value.
+    """
+
+
+class CsppColumnLoader(object):
+    """
+    Loads a batch of cspp data records into per-parameter arrays in one step.  An instrument particle class
+    enables bulk loading by setting its _column_loader attribute to a loader.  Records must already have
+    matched the parser's data record regex, so all records of a batch have the same layout.
+    """
+
+    def __init__(self, columns, timestamp_key):
+        """
+        @param columns list of CsppColumn, in particle parameter order
+        @param timestamp_key the key of the column holding the unix time used as the internal timestamp
+        """
+        self.columns = columns
+        self.timestamp_key = timestamp_key
+        self._plans = {}
+
+    def load(self, rows):
+        """
+        Load a batch of data records.
+        @param rows list holding the list of string values of each record
+        @return a tuple of (dict of particle key to array, list of the indices of rows which could not be loaded)
+        """
+        return self._load_table(rows, self.columns)
+
+    def _load_table(self, rows, columns):
+        """
+        Load rows which all have the same layout.  If the rows can't be loaded as a whole they are loaded
+        one at a time to find the ones which fail.
+        """
+        try:
+            return self._load_columns(rows, columns), []
+        except (ValueError, TypeError, IndexError):
+            if len(rows) == 1:
+                return {}, [0]
+
+        loaded = []
+        failed = []
+        for index, row in enumerate(rows):
+            row_columns, row_failed = self._load_table([row], columns)
+            if row_failed:
+                failed.append(index)
+            else:
+                loaded.append(row_columns)
+
+        if not loaded:
+            return {}, failed
+        return {column.key: np.concatenate([row_columns[column.key] for row_columns in loaded])
+                for column in columns}, failed
+
+    def _load_columns(self, rows, columns):
+        """
+        Load the columns of all rows.  The numeric values of each dtype are joined and parsed by numpy in a
+        single call, then split into columns.
+        @throws ValueError if a value can't be loaded
+        """
+        loaded = {}
+        for dtype, runs, dtype_columns in self._plan(columns):
+            if runs is None:
+                for column in dtype_columns:
+                    loaded[column.key] = self._load_column(np.array([row[column.position] for row in rows]),
+                                                           dtype)
+                continue
+
+            width = sum(run.stop - run.start for run in runs)
+            text = ' '.join([' '.join(row[run]) for row in rows for run in runs])
+            values = np.fromstring(text, dtype=dtype, sep=' ')
+            if values.size != len(rows) * width:
+                raise ValueError('Unable to load %s values' % np.dtype(dtype).name)
+            if values.dtype.kind == 'i' and len(values) and \
+                    (values.max() == np.iinfo(dtype).max or values.min() == np.iinfo(dtype).min):
+                # numpy saturates integers which don't fit the dtype
+                raise ValueError('Unable to load %s values' % np.dtype(dtype).name)
+
+            table = values.reshape(len(rows), width)
+            for column, table_position in dtype_columns:
+                loaded[column.key] = table[:, table_position]
+
+        return loaded
+
+    def _plan(self, columns):
+        """
+        Return how to load a layout, as a list of (dtype, runs, columns) tuples.  For numeric dtypes runs are
+        the slices of the record values to parse and columns are (column, position in the parsed values)
+        pairs, for other dtypes runs is None and each column is loaded separately.
+        """
+        plan = self._plans.get(id(columns))
+        if plan is not None:
+            return plan[1]
+
+        by_dtype = {}
+        for column in columns:
+            by_dtype.setdefault(column.dtype, []).append(column)
+
+        plan = []
+        for dtype, dtype_columns in by_dtype.iteritems():
+            if dtype == Y_OR_N_DTYPE or np.dtype(dtype).kind not in 'iuf':
+                plan.append((dtype, None, dtype_columns))
+                continue
+
+            positions = set()
+            for column in dtype_columns:
+                position = column.position
+                if isinstance(position, slice):
+                    positions.update(xrange(position.start, position.stop))
+                else:
+                    positions.add(position)
+            positions = sorted(positions)
+            table_positions = {position: index for index, position in enumerate(positions)}
+
+            # merge the positions into runs of consecutive values
+            runs = []
+            for position in positions:
+                if runs and runs[-1][1] == position:
+                    runs[-1][1] = position + 1
+                else:
+                    runs.append([position, position + 1])
+
+            mapped = []
+            for column in dtype_columns:
+                position = column.position
+                if isinstance(position, slice):
+                    start = table_positions.get(position.start, 0)
+                    mapped.append((column, slice(start, start + position.stop - position.start)))
+                else:
+                    mapped.append((column, table_positions[position]))
+            plan.append((dtype, [slice(start, stop) for start, stop in runs], mapped))
+
+        # keep the layout referenced so its id is not reused
+        self._plans[id(columns)] = (columns, plan)
+        return plan
+
+    @staticmethod
+    def _load_column(values, dtype):
+        if dtype == Y_OR_N_DTYPE:
+            return ((values == 'y') | (values == 'Y')).astype(np.int8)
+        return values.astype(dtype)
+
+    def particle_params(self, columns, index):
+        """
+        Return the particle parameters of one loaded record.
+        @param columns the dict of columns returned by load
+        @param index the index of the record in the batch
+        @return a list of (key, value, encoding function) tuples, in particle parameter order
+        """
+        return [(column.key, columns[column.key][index].tolist(),
+                 int if column.dtype == Y_OR_N_DTYPE else column.encoding)
+                for column in self.columns]
+
+
+class CsppColumnBatch(object):
+    """
+    A batch of cspp data records loaded into per-parameter arrays.  Scalar parameters are 1-D arrays with
+    one element per record, spectra are 2-D arrays with one row per record.
+    """
+
+    def __init__(self, matches, columns):
+        """
+        @param matches the data record matches of the batch
+        @param columns dict of particle key to array
+        """
+        self.matches = matches
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.matches)
+
+
+class CsppDataParticle(DataParticle):
+    """
+    Base class for cspp instrument data particles which can be built either from a data record match or
+    from parameters already loaded by the class's column loader.
+    """
+
+    # set by subclasses which support bulk loading to a CsppColumnLoader
+    _column_loader = None
+
+    def __init__(self, raw_data, decoded_params=None, decoded_timestamp=None, **kwargs):
+        """
+        @param raw_data the data record match
+        @param decoded_params the particle parameters already loaded by the column loader, as a list
+        of (key, value, encoding function) tuples
+        @param decoded_timestamp the unix time of the internal timestamp of the loaded parameters
+        """
+        super(CsppDataParticle, self).__init__(raw_data, **kwargs)
+        self._decoded_params = decoded_params
+        self._decoded_timestamp = decoded_timestamp
+
+    def _build_decoded_parsed_values(self):
+        """
+        Encode the parameters loaded by the column loader and set the internal timestamp.
+        """
+        self.set_internal_timestamp(unix_time=self._decoded_timestamp)
+        return [self._encode_value(key, value, encoding) for key, value, encoding in self._decoded_params]
+
+
 class CsppParser(SimpleParser):
     """
     Class for a common cspp data file parser
@@ -201,7 +417,8 @@ class CsppParser(SimpleParser):
                  exception_callback,
                  data_record_regex,
                  header_key_list=None,
-                 ignore_matcher=None):
+                 ignore_matcher=None,
+                 columnar=True):
         """
         This method is a constructor that will instantiate an CsppParser object.
         @param config The configuration for this CsppParser parser
@@ -210,11 +427,14 @@ class CsppParser(SimpleParser):
         @param data_record_regex The data regex that should be used to obtain data records
         @param header_key_list The list of header keys expected within a header
         @param ignore_matcher A matcher from a regex to use to ignore expected junk lines
+        @param columnar load data records in batches into columns when the data particle class has a
+        column loader, otherwise build each particle from its data record match
         """
 
         self._data_record_matcher = None
         self._header_and_first_data_record_matcher = None
         self._ignore_matcher = ignore_matcher
+        self._columnar = columnar
 
         # Ensure that we have a data regex
         if data_record_regex is None:
@@ -262,17 +482,19 @@ class CsppParser(SimpleParser):
                                          stream_handle,
                                          exception_callback)
 
-    def _process_data_match(self, data_match, result_particles):
+    def _process_data_match(self, data_match, result_particles, data_particle_class=None):
         """
         This method processes a data match.  It will extract a metadata particle and insert it into
          result_particles when we have not already extracted the metadata and all header values exist.
          This method will also extract a data particle and append it to the result_particles.
         @param data_match A regular expression match object for a cspp data record
         @param result_particles A list which should be updated to include any particles extracted
+        @param data_particle_class The class to build the data particle with, the configured data
+        particle class by default
         """
 
         # Extract the data record particle
-        data_particle = self._extract_sample(self._data_particle_class,
+        data_particle = self._extract_sample(data_particle_class or self._data_particle_class,
                                              None,
                                              data_match)
 
@@ -351,10 +573,10 @@ class CsppParser(SimpleParser):
             log.warn('got unrecognized row %r', line)
             self._exception_callback(RecoverableSampleException("Found an invalid line: %s" % line))
 
-    def parse_file(self):
+    def _iter_data_matches(self):
         """
-        Parse through the file, pulling single lines and comparing to the established patterns,
-        generating particles for data lines
+        Generator of the data record matches of the file.  Header lines update the header state, other
+        lines are reported to the exception callback unless they are expected to be ignored.
         """
 
         for line in self._stream_handle:
@@ -363,7 +585,7 @@ class CsppParser(SimpleParser):
 
             # If we found a data match, let's process it
             if data_match is not None:
-                self._process_data_match(data_match, self._record_buffer)
+                yield data_match
 
             else:
                 # Check for head part match
@@ -375,3 +597,84 @@ class CsppParser(SimpleParser):
                 else:
                     self._process_line_not_containing_data_record_or_header_part(line)
 
+    def _match_batches(self, batch_size):
+        """
+        Generator of lists of at most batch_size data record matches.
+        """
+        matches = []
+        for data_match in self._iter_data_matches():
+            matches.append(data_match)
+            if len(matches) == batch_size:
+                yield matches
+                matches = []
+        if matches:
+            yield matches
+
+    def _load_batch(self, matches, loader):
+        """
+        Load a batch of data records into columns.
+        @param matches list of data record matches
+        @param loader the CsppColumnLoader of the data particle class
+        @return a tuple of the CsppColumnBatch and the list of indices of records which could not be loaded
+        """
+        columns, failed = loader.load([data_match.string.split() for data_match in matches])
+        if loader.timestamp_key in columns:
+            columns[DataParticleKey.INTERNAL_TIMESTAMP] = columns[loader.timestamp_key] + ntplib.NTP.NTP_DELTA
+
+        if failed:
+            keep = np.ones(len(matches), dtype=bool)
+            keep[failed] = False
+            matches = [data_match for data_match, ok in zip(matches, keep) if ok]
+
+        return CsppColumnBatch(matches, columns), failed
+
+    def iter_column_batches(self, batch_size=COLUMN_BATCH_SIZE):
+        """
+        Generator of CsppColumnBatch, loading the data records of the file into per-parameter arrays without
+        building particles.  The header is read into the header state along the way.  Records which can not
+        be loaded are reported to the exception callback one at a time and left out of the batches.
+        @param batch_size the maximum number of records in a batch
+        @throws NotImplementedException if the data particle class has no column loader
+        """
+        loader = getattr(self._data_particle_class, '_column_loader', None)
+        if loader is None:
+            raise NotImplementedException('%s has no column loader' % self._data_particle_class.__name__)
+
+        for matches in self._match_batches(batch_size):
+            batch, failed = self._load_batch(matches, loader)
+            for index in failed:
+                log.warn('unable to load data record %r', matches[index].string)
+                self._exception_callback(RecoverableSampleException(
+                    'Unable to load data record: %s' % matches[index].string))
+            yield batch
+
+    def parse_file(self):
+        """
+        Parse through the file, pulling single lines and comparing to the established patterns,
+        generating particles for data lines
+        """
+        # only particle classes derived from CsppDataParticle can have a column loader
+        loader = getattr(self._data_particle_class, '_column_loader', None) if self._columnar else None
+
+        if loader is None:
+            for data_match in self._iter_data_matches():
+                self._process_data_match(data_match, self._record_buffer)
+            return
+
+        for matches in self._match_batches(COLUMN_BATCH_SIZE):
+            batch, failed = self._load_batch(matches, loader)
+            failed = set(failed)
+            timestamps = batch.columns.get(loader.timestamp_key)
+
+            loaded_index = 0
+            for index, data_match in enumerate(matches):
+                if index in failed:
+                    # let the particle decode the record, and report the error
+                    self._process_data_match(data_match, self._record_buffer)
+                else:
+                    particle_class = functools.partial(
+                        self._data_particle_class,
+                        decoded_params=loader.particle_params(batch.columns, loaded_index),
+                        decoded_timestamp=timestamps[loaded_index].item())
+                    self._process_data_match(data_match, self._record_buffer, particle_class)
+                    loaded_index += 1
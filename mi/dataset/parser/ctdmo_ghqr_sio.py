@@ -25,9 +25,13 @@ __author__ = 'Emily Hahn'
 __license__ = 'Apache 2.0'
 
 import binascii
+import functools
 import re
 import struct
 
+import ntplib
+import numpy
+
 from mi.dataset.parser.utilities import zulu_timestamp_to_ntp_time
 
 from mi.core.log import get_logger
@@ -127,6 +131,37 @@ CO_MATCHER = re.compile(CO_REGEX)
 CO_GROUP_ID = 1
 CO_GROUP_TIME_OFFSET = 2
 
+# Values of the record separator byte which end a CO record
+CO_RECORD_ENDS = [ord(b'\x13'), ord(b'|'), ord(b'\x0D')]
+
+# The temperature and conductivity are 5 hex digits each, packed into 5 bytes
+TEMPERATURE_CONDUCTIVITY_BYTES = 5
+
+# Telemetered CT Data record, decoded as a structured array
+TEL_CT_SAMPLE_DTYPE = numpy.dtype([
+    ('inductive_id', 'u1'),
+    ('temperature_conductivity', 'u1', (TEMPERATURE_CONDUCTIVITY_BYTES,)),
+    ('pressure', '<u2'),
+    ('ctd_time', '<u4'),
+    ('record_end', 'u1')])
+
+# Recovered and Telemetered CO Data record, decoded as a structured array
+CO_SAMPLE_DTYPE = numpy.dtype([
+    ('inductive_id', 'u1'),
+    ('time_offset', '>i4'),
+    ('record_end', 'u1')])
+
+# Recovered host CT Data record (hex ascii), decoded as a structured array once unhexlified
+REC_HOST_CT_SAMPLE_DTYPE = numpy.dtype([
+    ('temperature_conductivity', 'u1', (TEMPERATURE_CONDUCTIVITY_BYTES,)),
+    ('pressure', '<u2'),
+    ('ctd_time', '<u4')])
+REC_HOST_CT_SAMPLE_HEX_BYTES = REC_HOST_CT_SAMPLE_DTYPE.itemsize * 2
+
+# Seconds from the epoch of the CT time, Jan 1 2000, to the NTP epoch
+NTP_EPOCH_2000 = zulu_timestamp_to_ntp_time("2000-01-01T00:00:00.00Z")
+SECONDS_1900_TO_2000 = (datetime.datetime(2000, 1, 1) - datetime.datetime(1900, 1, 1)).total_seconds()
+
 # Indices into raw_data tuples for recovered CT data
 RAW_INDEX_REC_CT_ID = 0
 RAW_INDEX_REC_CT_SERIAL = 1
@@ -166,7 +201,46 @@ def generate_particle_timestamp(time_2000):
     Returns:
       number of seconds since Jan 1, 1900
     """
-    return int(time_2000, 16) + zulu_timestamp_to_ntp_time("2000-01-01T00:00:00.00Z")
+    return int(time_2000, 16) + NTP_EPOCH_2000
+
+
+def split_temperature_conductivity(samples):
+    """
+    Split the 5 packed bytes of the temperature and conductivity of samples
+    into the two 5 hex digit values.
+    Parameter:
+      samples - structured array with a temperature_conductivity field
+    Returns:
+      tuple of the temperature and conductivity arrays
+    """
+    packed = samples['temperature_conductivity'].astype(numpy.int64)
+    temperature = (packed[:, 0] << 12) | (packed[:, 1] << 4) | (packed[:, 2] >> 4)
+    conductivity = ((packed[:, 2] & 0x0F) << 16) | (packed[:, 3] << 8) | packed[:, 4]
+    return temperature, conductivity
+
+
+def find_binary_samples(chunk, dtype, record_ends):
+    """
+    Locate all the fixed size binary samples of a chunk at once.
+    Parameters:
+      chunk - the samples of an SIO block
+      dtype - structured dtype of a sample, ending with a record_end byte
+      record_ends - the values of the record_end byte of a valid sample
+    Returns:
+      tuple of the structured array of the samples up to the first sample which
+      is not valid or is cut short, and the index of that sample in the chunk,
+      None if all the samples are valid
+    """
+    count = len(chunk) // dtype.itemsize
+    samples = numpy.frombuffer(chunk, dtype=dtype, count=count)
+
+    invalid = numpy.flatnonzero(~numpy.in1d(samples['record_end'], record_ends))
+    if len(invalid):
+        count = invalid[0]
+    elif count * dtype.itemsize == len(chunk):
+        return samples, None
+
+    return samples[:count], count * dtype.itemsize
 
 
 class DataParticleType(BaseEnum):
@@ -193,6 +267,22 @@ class CtdmoInstrumentDataParticleKey(BaseEnum):
     CTD_TIME = "ctd_time"
 
 
+class CtdmoGhqrSioDecodedDataParticle(DataParticle):
+    """
+    Base class for SIO particles which can be built either from the sample
+    raw data or from the parameters of the sample already decoded by column.
+    """
+
+    def __init__(self, raw_data, decoded_params=None, **kwargs):
+        """
+        @param raw_data the sample raw data
+        @param decoded_params tuple of the sample parameters already decoded by column,
+        the internal timestamp is then given by the internal_timestamp argument
+        """
+        super(CtdmoGhqrSioDecodedDataParticle, self).__init__(raw_data, **kwargs)
+        self._decoded_params = decoded_params
+
+
 class CtdmoGhqrRecoveredInstrumentDataParticle(DataParticle):
     """
     Class for generating Instrument Data Particles from Recovered data.
@@ -250,7 +340,7 @@ class CtdmoGhqrRecoveredInstrumentDataParticle(DataParticle):
         return particle
 
 
-class CtdmoGhqrSioTelemeteredInstrumentDataParticle(DataParticle):
+class CtdmoGhqrSioTelemeteredInstrumentDataParticle(CtdmoGhqrSioDecodedDataParticle):
     """
     Class for generating Instrument Data Particles from Telemetered data.
     """
@@ -263,6 +353,18 @@ class CtdmoGhqrSioTelemeteredInstrumentDataParticle(DataParticle):
         particle with the appropriate tag.
         @throws SampleException If there is a problem with sample creation
         """
+        if self._decoded_params is not None:
+            inductive_id, temperature, conductivity, pressure, ctd_time = self._decoded_params
+            return [
+                self._encode_value(CtdmoInstrumentDataParticleKey.CONTROLLER_TIMESTAMP,
+                                   self.raw_data[RAW_INDEX_TEL_CT_SIO_TIMESTAMP],
+                                   convert_hex_ascii_to_int),
+                self._encode_value(CtdmoInstrumentDataParticleKey.INDUCTIVE_ID, inductive_id, int),
+                self._encode_value(CtdmoInstrumentDataParticleKey.TEMPERATURE, temperature, int),
+                self._encode_value(CtdmoInstrumentDataParticleKey.CONDUCTIVITY, conductivity, int),
+                self._encode_value(CtdmoInstrumentDataParticleKey.PRESSURE, pressure, int),
+                self._encode_value(CtdmoInstrumentDataParticleKey.CTD_TIME, ctd_time, int)
+            ]
 
         #
         # Convert science data time to hex ascii.
@@ -314,7 +416,7 @@ class CtdmoGhqrSioTelemeteredInstrumentDataParticle(DataParticle):
         return particle
 
 
-class CtdmoGhqrRecoveredHostInstrumentDataParticle(DataParticle):
+class CtdmoGhqrRecoveredHostInstrumentDataParticle(CtdmoGhqrSioDecodedDataParticle):
     """
     Class for generating Instrument Data Particles from Recovered data.
     """
@@ -327,14 +429,15 @@ class CtdmoGhqrRecoveredHostInstrumentDataParticle(DataParticle):
         particle with the appropriate tag.
         @throws SampleException If there is a problem with sample creation
         """
-        SECONDS_1900_TO_2000 = (datetime.datetime(2000, 1, 1) - datetime.datetime(1900, 1, 1)).total_seconds()
-
         header_timestamp, inductive_id, data = self.raw_data
 
-        temp = int(data[:5], 16)
-        cond = int(data[5:10], 16)
-        pressure, secs = struct.unpack('<HI', binascii.a2b_hex(data[10:22]))
-        self.set_internal_timestamp(timestamp=secs + SECONDS_1900_TO_2000)
+        if self._decoded_params is None:
+            temp = int(data[:5], 16)
+            cond = int(data[5:10], 16)
+            pressure, secs = struct.unpack('<HI', binascii.a2b_hex(data[10:22]))
+            self.set_internal_timestamp(timestamp=secs + SECONDS_1900_TO_2000)
+        else:
+            temp, cond, pressure, secs = self._decoded_params
         port_timestamp = float (convert_hex_ascii_to_int(header_timestamp))
         self.set_port_timestamp(unix_time = port_timestamp)
 
@@ -371,7 +474,7 @@ class CtdmoOffsetDataParticleKey(BaseEnum):
     CTD_OFFSET = "ctd_time_offset"
 
 
-class CtdmoGhqrSioOffsetDataParticle(DataParticle):
+class CtdmoGhqrSioOffsetDataParticle(CtdmoGhqrSioDecodedDataParticle):
     """
     Class for generating the Offset Data Particle from the CTDMO instrument
     on a MSFM platform node
@@ -384,6 +487,15 @@ class CtdmoGhqrSioOffsetDataParticle(DataParticle):
         particle with the appropriate tag.
         @throws SampleException If there is a problem with sample creation
         """
+        if self._decoded_params is not None:
+            inductive_id, time_offset = self._decoded_params
+            return [
+                self._encode_value(CtdmoOffsetDataParticleKey.CONTROLLER_TIMESTAMP,
+                                   self.raw_data[RAW_INDEX_CO_SIO_TIMESTAMP],
+                                   convert_hex_ascii_to_int),
+                self._encode_value(CtdmoOffsetDataParticleKey.INDUCTIVE_ID, inductive_id, int),
+                self._encode_value(CtdmoOffsetDataParticleKey.CTD_OFFSET, time_offset, int)
+            ]
 
         #
         # The particle timestamp for CO data is the SIO header timestamp.
@@ -425,50 +537,38 @@ def parse_co_data(particle_class, chunk, sio_header_timestamp, extract_sample):
     """
     This function parses a CO record and returns a list of samples.
     The CO input record is the same for both recovered and telemetered data.
+    All the samples of the record are located and decoded at once, the
+    particles are built from the decoded samples.
     """
     particles = []
-    last_index = len(chunk)
-    start_index = 0
-    had_error = (False, 0)
+    samples, error_index = find_binary_samples(chunk, CO_SAMPLE_DTYPE, CO_RECORD_ENDS)
+    had_error = (False, 0) if error_index is None else (True, error_index)
 
-    while start_index < last_index:
+    #
+    # The particle timestamp for CO data is the SIO header timestamp.
+    #
+    time_stamp = float(ntplib.system_to_ntp_time(convert_hex_ascii_to_int(sio_header_timestamp)))
+
+    for index, decoded_params in enumerate(zip(samples['inductive_id'].tolist(),
+                                               samples['time_offset'].tolist())):
+        start_index = index * CO_SAMPLE_BYTES
         #
-        # Look for a match in the next group of bytes
+        # Generate the data particle.
+        # Data stored for each particle is a tuple of the following:
+        #   SIO header timestamp (input parameter)
+        #   inductive ID (from chunk)
+        #   Time Offset (from chunk)
         #
-        co_match = CO_MATCHER.match(
-            chunk[start_index:start_index+CO_SAMPLE_BYTES])
-
-        if co_match is not None:
-            #
-            # If the inductive ID is the one we're looking for,
-            # generate a data particle.
-            # The ID needs to be converted from a byte string to an integer
-            # for the comparison.
+        sample = extract_sample(functools.partial(particle_class, decoded_params=decoded_params), None,
+                                (sio_header_timestamp, chunk[start_index],
+                                 chunk[start_index + 1:start_index + CO_SAMPLE_BYTES - 1]),
+                                None, internal_timestamp=time_stamp)
+        if sample is not None:
             #
-            inductive_id = co_match.group(CO_GROUP_ID)
+            # Add this particle to the list of particles generated
+            # so far for this chunk of input data.
             #
-            # Generate the data particle.
-            # Data stored for each particle is a tuple of the following:
-            #   SIO header timestamp (input parameter)
-            #   inductive ID (from chunk)
-            #   Time Offset (from chunk)
-            #
-            sample = extract_sample(particle_class, None, (sio_header_timestamp, inductive_id,
-                                    co_match.group(CO_GROUP_TIME_OFFSET)), None)
-            if sample is not None:
-                #
-                # Add this particle to the list of particles generated
-                # so far for this chunk of input data.
-                #
-                particles.append(sample)
-
-            start_index += CO_SAMPLE_BYTES
-        #
-        # If there wasn't a match, the input data is messed up.
-        #
-        else:
-            had_error = (True, start_index)
-            break
+            particles.append(sample)
 
     #
     # Once we reach the end of the input data,
@@ -477,6 +577,48 @@ def parse_co_data(particle_class, chunk, sio_header_timestamp, extract_sample):
     return particles, had_error
 
 
+def decode_ct_hex_samples(sample_list):
+    """
+    This function decodes the hex ASCII CT samples of an SIO controller record
+    with a single unhexlify into a structured array.
+    Samples which are not the expected size or are not hex ASCII are not
+    decoded, the particles of those samples decode their own raw data.
+    Parameter:
+      sample_list - the hex ASCII samples of the record
+    Returns:
+      dictionary of the index in sample_list of each decoded sample to a tuple
+      of its parameters (temperature, conductivity, pressure, time) and its
+      internal timestamp
+    """
+    indices = [index for index, item in enumerate(sample_list) if len(item) == REC_HOST_CT_SAMPLE_HEX_BYTES]
+
+    try:
+        data = binascii.a2b_hex(''.join([sample_list[index] for index in indices]))
+    except TypeError:
+        indices = [index for index in indices if is_hex_ascii(sample_list[index])]
+        data = binascii.a2b_hex(''.join([sample_list[index] for index in indices]))
+
+    samples = numpy.frombuffer(data, dtype=REC_HOST_CT_SAMPLE_DTYPE)
+    temperature, conductivity = split_temperature_conductivity(samples)
+    ctd_time = samples['ctd_time']
+    time_stamps = (ctd_time + SECONDS_1900_TO_2000).tolist()
+
+    decoded_params = zip(temperature.tolist(), conductivity.tolist(),
+                         samples['pressure'].tolist(), ctd_time.tolist())
+    return dict(zip(indices, zip(decoded_params, time_stamps)))
+
+
+def is_hex_ascii(item):
+    """
+    Return True if item is an even number of hex ASCII digits
+    """
+    try:
+        binascii.a2b_hex(item)
+    except TypeError:
+        return False
+    return True
+
+
 def parse_ct_data(particle_class, chunk, sio_header_timestamp, extract_sample, inductive_id):
     """
     This function parses a CT record and returns a list of samples.
@@ -486,7 +628,17 @@ def parse_ct_data(particle_class, chunk, sio_header_timestamp, extract_sample, i
     had_error = (False, 0)
 
     sample_list = chunk.split()
-    for item in sample_list:
+    decoded_samples = decode_ct_hex_samples(sample_list)
+
+    for index, item in enumerate(sample_list):
+        if index in decoded_samples:
+            decoded_params, time_stamp = decoded_samples[index]
+            sample = extract_sample(functools.partial(particle_class, decoded_params=decoded_params), None,
+                                    (sio_header_timestamp, inductive_id, item), None,
+                                    internal_timestamp=time_stamp)
+            particles.append(sample)
+            continue
+
         try:
             binascii.a2b_hex(item)
             sample = extract_sample(particle_class, None, (sio_header_timestamp, inductive_id, item), None)
@@ -762,53 +914,55 @@ class CtdmoGhqrSioTelemeteredParser(SioParser):
         """
         This function parses a Telemetered CT record and
         returns a list of data particles.
+        All the samples of the record are located and decoded at once,
+        the particles are built from the decoded samples.
         Parameters:
           chunk - the input which is being parsed
           sio_header_timestamp - required for particle, passed through
         """
         particles = []
-        last_index = len(ct_record)
-        start_index = 0
+        samples, error_index = find_binary_samples(ct_record, TEL_CT_SAMPLE_DTYPE,
+                                                   [ord(TEL_CT_RECORD_END)])
+
+        temperature, conductivity = split_temperature_conductivity(samples)
+        ctd_time = samples['ctd_time']
+        time_stamps = (ctd_time + NTP_EPOCH_2000).tolist()
+        decoded_samples = zip(samples['inductive_id'].tolist(), temperature.tolist(), conductivity.tolist(),
+                              samples['pressure'].tolist(), ctd_time.tolist())
 
-        while start_index < last_index:
+        for index, (decoded_params, time_stamp) in enumerate(zip(decoded_samples, time_stamps)):
+            start_index = index * TEL_CT_SAMPLE_BYTES
             #
-            # Look for a match in the next group of bytes
+            # Generate the data particle.
+            # Data stored for each particle is a tuple of the following:
+            #   SIO header timestamp (input parameter)
+            #   inductive ID
+            #   science data (temperature, conductivity, pressure)
+            #   time of science data
             #
-            ct_match = TEL_CT_MATCHER.match(
-                ct_record[start_index:start_index+TEL_CT_SAMPLE_BYTES])
-
-            if ct_match is not None:
+            sample = self._extract_sample(
+                functools.partial(CtdmoGhqrSioTelemeteredInstrumentDataParticle, decoded_params=decoded_params),
+                None,
+                (sio_header_timestamp,
+                 ct_record[start_index],
+                 ct_record[start_index + 1:start_index + 8],
+                 ct_record[start_index + 8:start_index + TEL_CT_SAMPLE_BYTES - 1]),
+                internal_timestamp=time_stamp)
+            if sample is not None:
                 #
-                # Generate the data particle.
-                # Data stored for each particle is a tuple of the following:
-                #   SIO header timestamp (input parameter)
-                #   inductive ID
-                #   science data (temperature, conductivity, pressure)
-                #   time of science data
+                # Add this particle to the list of particles generated
+                # so far for this chunk of input data.
                 #
-                sample = self._extract_sample(CtdmoGhqrSioTelemeteredInstrumentDataParticle, None,
-                                              (sio_header_timestamp,
-                                               ct_match.group(TEL_CT_GROUP_ID),
-                                               ct_match.group(TEL_CT_GROUP_SCIENCE_DATA),
-                                               ct_match.group(TEL_CT_GROUP_TIME)))
-                if sample is not None:
-                    #
-                    # Add this particle to the list of particles generated
-                    # so far for this chunk of input data.
-                    #
-                    particles.append(sample)
-
-                start_index += TEL_CT_SAMPLE_BYTES
+                particles.append(sample)
 
-            #
-            # If there wasn't a match, the input data is messed up.
-            #
-            else:
-                log.error('unknown data found in CT record %s at %d, leaving out the rest',
-                          binascii.b2a_hex(ct_record), start_index)
-                self._exception_callback(SampleException(
-                    'unknown data found in CT record at %d, leaving out the rest' % start_index))
-                break
+        #
+        # If a sample didn't match, the input data is messed up.
+        #
+        if error_index is not None:
+            log.error('unknown data found in CT record %s at %d, leaving out the rest',
+                      binascii.b2a_hex(ct_record), error_index)
+            self._exception_callback(SampleException(
+                'unknown data found in CT record at %d, leaving out the rest' % error_index))
 
         #
         # Once we reach the end of the input data,
@@ -19,12 +19,15 @@ import numpy
 from mi.core.log import get_logger
 log = get_logger()
 from mi.core.common import BaseEnum
-from mi.core.instrument.dataset_data_particle import DataParticle
 from mi.core.exceptions import RecoverableSampleException
 from mi.dataset.parser.common_regexes import END_OF_LINE_REGEX, \
     FLOAT_REGEX, MULTIPLE_TAB_REGEX
 from mi.dataset.parser.cspp_base import CsppParser, \
     Y_OR_N_REGEX, \
+    Y_OR_N_DTYPE, \
+    CsppColumn, \
+    CsppColumnLoader, \
+    CsppDataParticle, \
     CsppMetadataDataParticle, \
     MetadataRawDataKey, \
     encode_y_or_n
@@ -126,11 +129,30 @@ class CtdpfJCsppMetadataTelemeteredDataParticle(CtdpfJCsppMetadataDataParticle):
     _data_particle_type = DataParticleType.METADATA_TELEMETERED
 
 
-class CtdpfJCsppInstrumentDataParticle(DataParticle):
+# The instrument particle parameters loaded in bulk, each record value is the value of its match group
+COLUMN_LOADER = CsppColumnLoader([
+    CsppColumn(CtdpfJCsppParserDataParticleKey.PROFILER_TIMESTAMP,
+               DataMatchesGroupNumber.PROFILER_TIMESTAMP - 1, numpy.float64, numpy.float),
+    CsppColumn(CtdpfJCsppParserDataParticleKey.SUSPECT_TIMESTAMP,
+               DataMatchesGroupNumber.SUSPECT_TIMESTAMP - 1, Y_OR_N_DTYPE, encode_y_or_n),
+    CsppColumn(CtdpfJCsppParserDataParticleKey.TEMPERATURE,
+               DataMatchesGroupNumber.TEMPERATURE - 1, numpy.float64, float),
+    CsppColumn(CtdpfJCsppParserDataParticleKey.CONDUCTIVITY,
+               DataMatchesGroupNumber.CONDUCTIVITY - 1, numpy.float64, float),
+    CsppColumn(CtdpfJCsppParserDataParticleKey.PRESSURE,
+               DataMatchesGroupNumber.PRESSURE - 1, numpy.float64, float),
+    CsppColumn(CtdpfJCsppParserDataParticleKey.SALINITY,
+               DataMatchesGroupNumber.SALINITY - 1, numpy.float64, float),
+], CtdpfJCsppParserDataParticleKey.PROFILER_TIMESTAMP)
+
+
+class CtdpfJCsppInstrumentDataParticle(CsppDataParticle):
     """
     Base Class for building a ctdpf_j_cspp instrument data particle
     """
 
+    _column_loader = COLUMN_LOADER
+
     def _build_parsed_values(self):
         """
         Take something in the data format and turn it into
@@ -138,6 +160,9 @@ class CtdpfJCsppInstrumentDataParticle(DataParticle):
         with the appropriate tag.
         @throws RecoverableSampleException If there is a problem with sample creation
         """
+        if self._decoded_params is not None:
+            return self._build_decoded_parsed_values()
+
         results = []
 
         try:
@@ -200,12 +225,14 @@ class CtdpfJCsppParser(CsppParser):
     def __init__(self,
                  config,
                  stream_handle,
-                 exception_callback):
+                 exception_callback,
+                 columnar=True):
         """
         This method is a constructor that will instantiate an CtdpfJCsppParser object.
         @param config The configuration for this CtdpfJCsppParser parser
         @param stream_handle The handle to the data stream containing the ctdpf_j_cspp data
         @param exception_callback The function to call to report exceptions
+        @param columnar load the data records in bulk
         """
 
         # Call the superclass constructor
@@ -213,4 +240,5 @@ class CtdpfJCsppParser(CsppParser):
                                                stream_handle,
                                                exception_callback,
                                                DATA_REGEX,
-                                               ignore_matcher=None)
+                                               ignore_matcher=None,
+                                               columnar=columnar)
@@ -8,7 +8,6 @@
 import re
 import ntplib
 from math import copysign, isnan
-import scipy.interpolate as interpolate
 from mi.core.log import get_logger
 from mi.core.common import BaseEnum
 from mi.core.exceptions import SampleException, \
@@ -1260,6 +1259,8 @@ class GpsInterpolator(object):
 
     # Interpolate the buffered objects, then return them
     def process_and_get_objects(self):
+        import scipy.interpolate as interpolate
+
         self._set_start_and_end_gps_position_entries()
         # if the set of entries lacks gps lat/lon data, return it as-is
         if self._lacks_interpolate_entry_positions():
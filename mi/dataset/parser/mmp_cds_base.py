@@ -11,12 +11,15 @@ Release notes:
 initial release
 """
 
+import functools
+
 import msgpack
 import ntplib
+import numpy as np
 
 from mi.core.log import get_logger
 from mi.core.common import BaseEnum
-from mi.core.instrument.dataset_data_particle import DataParticle
+from mi.core.instrument.dataset_data_particle import DataParticle, DataParticleKey
 from mi.core.exceptions import SampleException, NotImplementedException
 from mi.dataset.dataset_parser import SimpleParser
 
@@ -32,6 +35,9 @@ NUM_MMP_CDS_UNPACKED_ITEMS = 3
 # The maximum map length value used to override the default of 32k
 MAX_MAP_LEN = 65536 # 64K
 
+# The number of records decoded together into columns
+COLUMN_BATCH_SIZE = 1000
+
 # A message to be reported when the state provided to the parser is missing PARTICLES_RETURNED
 PARTICLES_RETURNED_MISSING_ERROR_MSG = "PARTICLES_RETURNED missing from state"
 
@@ -54,12 +60,67 @@ class MmpCdsParserDataParticleKey(BaseEnum):
     RAW_TIME_MICROSECONDS = 'raw_time_microseconds'
 
 
+class MmpCdsColumnDecoder(object):
+    """
+    Base class for decoding the subclass specific item of a batch of McLane Moored Profiler cabled docking
+    station records into per-field arrays.  A particle class enables columnar decoding by setting its
+    _column_decoder attribute to an instance of a subclass.
+    """
+
+    def decode(self, items):
+        """
+        Decode the subclass specific items of a batch of records.
+        @param items list of the third element of each unpacked record
+        @return a tuple of (dict of column name to array, list of the indices of items which could not be decoded)
+        """
+        raise NotImplementedException
+
+    def particle_params(self, columns, index):
+        """
+        Return the subclass particle parameters of one decoded record.
+        @param columns the dict of columns returned by decode
+        @param index the index of the record in the batch
+        @return a list of (key, value, encoding function) tuples, in particle parameter order
+        """
+        raise NotImplementedException
+
+
+class MmpCdsColumnBatch(object):
+    """
+    A batch of McLane Moored Profiler cabled docking station records decoded into per-field arrays.  Scalar
+    fields are 1-D arrays with one element per record, spectra are 2-D arrays with one row per record.
+    """
+
+    def __init__(self, records, columns):
+        """
+        @param records the unpacked msgpack records of the batch
+        @param columns dict of column name to array
+        """
+        self.records = records
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.records)
+
+
 class MmpCdsParserDataParticle(DataParticle):
     """
     Class for building a data particle given parsed data as received from a McLane Moored Profiler connected to
     a cabled docking station.
     """
 
+    # set by subclasses which support columnar decoding to an MmpCdsColumnDecoder
+    _column_decoder = None
+
+    def __init__(self, raw_data, decoded_params=None, **kwargs):
+        """
+        @param raw_data the unpacked msgpack record
+        @param decoded_params the subclass particle parameters already decoded by the column decoder, as a list
+        of (key, value, encoding function) tuples
+        """
+        super(MmpCdsParserDataParticle, self).__init__(raw_data, **kwargs)
+        self._decoded_params = decoded_params
+
     def _get_mmp_cds_subclass_particle_params(self, subclass_specific_msgpack_unpacked_data):
         """
         This method is expected to be implemented by subclasses.  It is okay to let the implemented method to
@@ -96,7 +157,11 @@ class MmpCdsParserDataParticle(DataParticle):
 
             self.set_internal_timestamp(ntp_timestamp)
 
-            subclass_particle_params = self._get_mmp_cds_subclass_particle_params(self.raw_data[2])
+            if self._decoded_params is None:
+                subclass_particle_params = self._get_mmp_cds_subclass_particle_params(self.raw_data[2])
+            else:
+                subclass_particle_params = [self._encode_value(key, value, encoding)
+                                            for key, value, encoding in self._decoded_params]
 
         except (ValueError, TypeError, IndexError, KeyError) as ex:
             log.warn(UNABLE_TO_PARSE_MSGPACK_DATA_MSG)
@@ -115,11 +180,18 @@ class MmpCdsParser(SimpleParser):
     Class for parsing data as received from a McLane Moored Profiler connected to a cabled docking station.
     """
 
-    def parse_file(self):
+    def __init__(self, config, stream_handle, exception_callback, columnar=True):
         """
-        This method parses each chunk and attempts to extract samples to return.
-        @return for each discovered sample, a list of tuples containing each particle and associated state position
-        # information
+        @param columnar decode records in batches into columns when the particle class has a column decoder,
+        otherwise decode each record separately
+        """
+        super(MmpCdsParser, self).__init__(config, stream_handle, exception_callback)
+        self._columnar = columnar
+
+    def _unpack_records(self):
+        """
+        Generator of the records unpacked from the msgpack stream which have the expected format.  Records
+        with an unexpected format are reported to the exception callback.
         """
 
         # We need to put the following in a try block just in case the data provided is malformed
@@ -131,16 +203,7 @@ class MmpCdsParser(SimpleParser):
                 # docking station data chunk consists of a list of three items
                 if isinstance(unpacked_data, tuple) or isinstance(unpacked_data, list) and \
                         len(unpacked_data) == NUM_MMP_CDS_UNPACKED_ITEMS:
-
-                    # Extract the sample an provide the particle class which could be different for each
-                    # derived MmpCdsParser
-
-                    try:
-                        data_particle = self._extract_sample(self._particle_class, None, unpacked_data)
-                        self._record_buffer.append(data_particle)
-                    except SampleException:
-                        log.debug(UNEXPECTED_UNPACKED_MSGPACK_FORMAT_MSG)
-                        self._exception_callback(SampleException(UNEXPECTED_UNPACKED_MSGPACK_FORMAT_MSG))
+                    yield unpacked_data
 
                 else:
                     log.debug(UNEXPECTED_UNPACKED_MSGPACK_FORMAT_MSG)
@@ -149,3 +212,98 @@ class MmpCdsParser(SimpleParser):
         except TypeError:
             log.warn(UNABLE_TO_ITERATE_THROUGH_UNPACKED_MSGPACK_MSG)
             self._exception_callback( SampleException(UNABLE_TO_ITERATE_THROUGH_UNPACKED_MSGPACK_MSG))
+
+    def _decode_batch(self, records, decoder):
+        """
+        Decode a batch of records into columns.
+        @param records list of unpacked records
+        @param decoder the MmpCdsColumnDecoder of the particle class
+        @return a tuple of the MmpCdsColumnBatch and the list of indices of records which could not be decoded
+        """
+        try:
+            seconds = np.array([record[0] for record in records], dtype=np.int64)
+            microseconds = np.array([record[1] for record in records], dtype=np.int64)
+        except (ValueError, TypeError, OverflowError):
+            # leave records with bad times to the particle, which reports them
+            return MmpCdsColumnBatch(records, {}), range(len(records))
+
+        columns, failed = decoder.decode([record[2] for record in records])
+        columns[MmpCdsParserDataParticleKey.RAW_TIME_SECONDS] = seconds
+        columns[MmpCdsParserDataParticleKey.RAW_TIME_MICROSECONDS] = microseconds
+        columns[DataParticleKey.INTERNAL_TIMESTAMP] = (seconds + microseconds / 1000000.0) + ntplib.NTP.NTP_DELTA
+
+        return MmpCdsColumnBatch(records, columns), failed
+
+    def iter_column_batches(self, batch_size=COLUMN_BATCH_SIZE):
+        """
+        Generator of MmpCdsColumnBatch, decoding the records of the file into per-field arrays without
+        building particles.  Records which can not be decoded into columns are reported to the exception
+        callback and left out of the batches.
+        @param batch_size the maximum number of records in a batch
+        @throws NotImplementedException if the particle class has no column decoder
+        """
+        decoder = self._particle_class._column_decoder
+        if decoder is None:
+            raise NotImplementedException('%s has no column decoder' % self._particle_class.__name__)
+
+        for records in self._record_batches(batch_size):
+            batch, failed = self._decode_batch(records, decoder)
+            if failed:
+                for _ in failed:
+                    log.debug(UNABLE_TO_PARSE_MSGPACK_DATA_MSG)
+                    self._exception_callback(SampleException(UNABLE_TO_PARSE_MSGPACK_DATA_MSG))
+                keep = np.ones(len(records), dtype=bool)
+                keep[failed] = False
+                batch = MmpCdsColumnBatch([record for record, ok in zip(records, keep) if ok],
+                                          {name: column[keep] for name, column in batch.columns.iteritems()})
+            yield batch
+
+    def _record_batches(self, batch_size):
+        """
+        Generator of lists of at most batch_size unpacked records.
+        """
+        records = []
+        for unpacked_data in self._unpack_records():
+            records.append(unpacked_data)
+            if len(records) == batch_size:
+                yield records
+                records = []
+        if records:
+            yield records
+
+    def parse_file(self):
+        """
+        This method parses each chunk and attempts to extract samples to return.
+        @return for each discovered sample, a list of tuples containing each particle and associated state position
+        # information
+        """
+        decoder = self._particle_class._column_decoder if self._columnar else None
+
+        if decoder is None:
+            for unpacked_data in self._unpack_records():
+                self._append_sample(self._particle_class, unpacked_data)
+            return
+
+        for records in self._record_batches(COLUMN_BATCH_SIZE):
+            batch, failed = self._decode_batch(records, decoder)
+            failed = set(failed)
+
+            for index, unpacked_data in enumerate(records):
+                if index in failed:
+                    # let the particle decode the record, and report the error
+                    self._append_sample(self._particle_class, unpacked_data)
+                else:
+                    particle_class = functools.partial(self._particle_class,
+                                                       decoded_params=decoder.particle_params(batch.columns, index))
+                    self._append_sample(particle_class, unpacked_data)
+
+    def _append_sample(self, particle_class, unpacked_data):
+        """
+        Extract the sample an provide the particle class which could be different for each derived MmpCdsParser
+        """
+        try:
+            data_particle = self._extract_sample(particle_class, None, unpacked_data)
+            self._record_buffer.append(data_particle)
+        except SampleException:
+            log.debug(UNEXPECTED_UNPACKED_MSGPACK_FORMAT_MSG)
+            self._exception_callback(SampleException(UNEXPECTED_UNPACKED_MSGPACK_FORMAT_MSG))
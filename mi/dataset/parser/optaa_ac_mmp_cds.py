@@ -12,10 +12,12 @@ initial release
 
 import struct
 
+import numpy as np
+
 from mi.core.log import get_logger
 
 from mi.core.common import BaseEnum
-from mi.dataset.parser.mmp_cds_base import MmpCdsParserDataParticle
+from mi.dataset.parser.mmp_cds_base import MmpCdsParserDataParticle, MmpCdsColumnDecoder
 log = get_logger()
 
 
@@ -89,12 +91,108 @@ ENCODING_PARAMS = [
     EncodingParams(OptaaAcMmpCdsParserDataParticleKey.NUM_WAVELENGTHS, 'B', NUM_WAVELENGTHS_DATA_OFFSET, int)]
 
 
+# numpy equivalents of the struct unpack codes, in native byte order like struct
+UNPACK_CODE_DTYPES = {'B': np.uint8, 'H': np.uint16, 'I': np.uint32}
+
+# The count lists in the order they are interleaved for each wavelength
+COUNTS_KEYS = [OptaaAcMmpCdsParserDataParticleKey.C_REFERENCE_COUNTS,
+               OptaaAcMmpCdsParserDataParticleKey.A_REFERENCE_COUNTS,
+               OptaaAcMmpCdsParserDataParticleKey.C_SIGNAL_COUNTS,
+               OptaaAcMmpCdsParserDataParticleKey.A_SIGNAL_COUNTS]
+
+
+class OptaaAcMmpCdsColumnDecoder(MmpCdsColumnDecoder):
+    """
+    Decodes batches of optaa_ac_mmp_cds binary records into columns.  Records are grouped by length and
+    number of wavelengths, and each group is decoded in one step with a numpy structured dtype.  The four
+    count spectra are 2-D arrays padded with zeros to the largest number of wavelengths in the batch.
+    """
+
+    def _record_dtype(self, length, num_wavelengths):
+        """
+        Return the structured dtype of a binary record of the given length and number of wavelengths.
+        """
+        names = [param.key for param in ENCODING_PARAMS]
+        formats = [UNPACK_CODE_DTYPES[param.unpack_code] for param in ENCODING_PARAMS]
+        offsets = [param.unpack_from_offset for param in ENCODING_PARAMS]
+
+        names.append(OptaaAcMmpCdsParserDataParticleKey.SERIAL_NUMBER)
+        formats.append((np.uint8, 3))
+        offsets.append(SERIAL_NUMBER_DATA_OFFSET)
+
+        names.append('counts')
+        formats.append((np.uint16, (num_wavelengths, len(COUNTS_KEYS))))
+        offsets.append(RAW_REF_AND_SIGNAL_COUNTS_BASE_OFFSET)
+
+        return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': length})
+
+    def decode(self, items):
+        """
+        Decode the binary records of a batch.
+        @param items list of binary records
+        @return a tuple of (dict of column name to array, list of the indices of records which could not be decoded)
+        """
+        groups = {}
+        failed = []
+        for index, item in enumerate(items):
+            if not isinstance(item, str) or len(item) < RAW_REF_AND_SIGNAL_COUNTS_BASE_OFFSET:
+                failed.append(index)
+                continue
+            num_wavelengths = ord(item[NUM_WAVELENGTHS_DATA_OFFSET])
+            if len(item) < RAW_REF_AND_SIGNAL_COUNTS_BASE_OFFSET + num_wavelengths * 2 * len(COUNTS_KEYS):
+                failed.append(index)
+                continue
+            groups.setdefault((len(item), num_wavelengths), []).append(index)
+
+        count = len(items)
+        max_wavelengths = max([num_wavelengths for _, num_wavelengths in groups] or [0])
+        columns = {param.key: np.zeros(count, dtype=UNPACK_CODE_DTYPES[param.unpack_code])
+                   for param in ENCODING_PARAMS}
+        columns[OptaaAcMmpCdsParserDataParticleKey.SERIAL_NUMBER] = np.zeros(count, dtype=np.uint32)
+        for key in COUNTS_KEYS:
+            columns[key] = np.zeros((count, max_wavelengths), dtype=np.uint16)
+
+        for (length, num_wavelengths), indices in groups.iteritems():
+            records = np.frombuffer(''.join([items[index] for index in indices]),
+                                    dtype=self._record_dtype(length, num_wavelengths))
+
+            for param in ENCODING_PARAMS:
+                columns[param.key][indices] = records[param.key]
+
+            serial_number = records[OptaaAcMmpCdsParserDataParticleKey.SERIAL_NUMBER].astype(np.uint32)
+            columns[OptaaAcMmpCdsParserDataParticleKey.SERIAL_NUMBER][indices] = \
+                (serial_number[:, 0] << 16) + (serial_number[:, 1] << 8) + serial_number[:, 2]
+
+            for position, key in enumerate(COUNTS_KEYS):
+                columns[key][indices, :num_wavelengths] = records['counts'][:, :, position]
+
+        return columns, failed
+
+    def particle_params(self, columns, index):
+        """
+        Return the particle parameters of one decoded record, in the order produced by
+        OptaaAcMmpCdsParserDataParticle._get_mmp_cds_subclass_particle_params.
+        """
+        params = [(param.key, columns[param.key][index].item(), param.encode_type) for param in ENCODING_PARAMS]
+
+        params.append((OptaaAcMmpCdsParserDataParticleKey.SERIAL_NUMBER,
+                       columns[OptaaAcMmpCdsParserDataParticleKey.SERIAL_NUMBER][index].item(),
+                       str))
+
+        num_wavelengths = columns[OptaaAcMmpCdsParserDataParticleKey.NUM_WAVELENGTHS][index]
+        for key in COUNTS_KEYS:
+            params.append((key, columns[key][index, :num_wavelengths].tolist(), list))
+
+        return params
+
+
 class OptaaAcMmpCdsParserDataParticle(MmpCdsParserDataParticle):
     """
     Class for parsing data from the optaa_ac_mmp_cds data set
     """
 
     _data_particle_type = DataParticleType.INSTRUMENT
+    _column_decoder = OptaaAcMmpCdsColumnDecoder()
     
     def _get_mmp_cds_subclass_particle_params(self, subclass_specific_msgpack_unpacked_data):
         """
@@ -14,7 +14,6 @@ import re
 
 from mi.core.common import BaseEnum
 from mi.core.exceptions import RecoverableSampleException
-from mi.core.instrument.dataset_data_particle import DataParticle
 from mi.core.log import get_logger
 from mi.dataset.parser.common_regexes import \
     END_OF_LINE_REGEX, \
@@ -25,6 +24,10 @@ from mi.dataset.parser.cspp_base import \
     CsppParser, \
     HEADER_PART_MATCHER, \
     Y_OR_N_REGEX, \
+    Y_OR_N_DTYPE, \
+    CsppColumn, \
+    CsppColumnLoader, \
+    CsppDataParticle, \
     CsppMetadataDataParticle, \
     MetadataRawDataKey, \
     encode_y_or_n
@@ -132,6 +135,14 @@ INSTRUMENT_PARTICLE_ENCODING_RULES_END = [
     (OptaaDjCsppParserDataParticleKey.PRESSURE_COUNTS, DataMatchesGroupNumber.PRESSURE_COUNTS, int)
 ]
 
+# The dark count and spectrum parameters, in the order they appear in a record
+SPECTRA_KEYS = [
+    (OptaaDjCsppParserDataParticleKey.C_REFERENCE_DARK_COUNTS, OptaaDjCsppParserDataParticleKey.C_REFERENCE_COUNTS),
+    (OptaaDjCsppParserDataParticleKey.C_SIGNAL_DARK_COUNTS, OptaaDjCsppParserDataParticleKey.C_SIGNAL_COUNTS),
+    (OptaaDjCsppParserDataParticleKey.A_REFERENCE_DARK_COUNTS, OptaaDjCsppParserDataParticleKey.A_REFERENCE_COUNTS),
+    (OptaaDjCsppParserDataParticleKey.A_SIGNAL_DARK_COUNTS, OptaaDjCsppParserDataParticleKey.A_SIGNAL_COUNTS),
+]
+
 
 class OptaaDjCsppMetadataDataParticle(CsppMetadataDataParticle):
     """
@@ -184,11 +195,124 @@ class OptaaDjCsppMetadataTelemeteredDataParticle(OptaaDjCsppMetadataDataParticle
     _data_particle_type = DataParticleType.METADATA_TELEMETERED
 
 
-class OptaaDjCsppInstrumentDataParticle(DataParticle):
+# The dtypes the instrument particle parameters are loaded as
+COLUMN_DTYPES = {
+    numpy.float: numpy.float64,
+    float: numpy.float64,
+    int: numpy.int64,
+    encode_y_or_n: Y_OR_N_DTYPE,
+}
+
+
+class OptaaDjCsppColumnLoader(CsppColumnLoader):
+    """
+    Loads optaa_dj_cspp data records, whose layout depends on the number of wavelengths.  Records are
+    grouped by number of wavelengths and each group is loaded in one step.  The four count spectra are 2-D
+    arrays padded with zeros to the largest number of wavelengths in the batch.
+    """
+
+    def __init__(self):
+        self._layouts = {}
+        super(OptaaDjCsppColumnLoader, self).__init__(self._layout(0),
+                                                      OptaaDjCsppParserDataParticleKey.PROFILER_TIMESTAMP)
+
+    def _layout(self, num_wavelengths):
+        """
+        Return the columns of a record with the given number of wavelengths, in particle parameter order.
+        """
+        layout = self._layouts.get(num_wavelengths)
+        if layout is not None:
+            return layout
+
+        layout = [CsppColumn(name, group - 1, COLUMN_DTYPES[encoding], encoding)
+                  for name, group, encoding in INSTRUMENT_PARTICLE_ENCODING_RULES_BEGIN]
+
+        # each dark count is followed by its spectrum
+        position = DataMatchesGroupNumber.C_REF_DARK - 1
+        for dark_key, counts_key in SPECTRA_KEYS:
+            layout.append(CsppColumn(dark_key, position, numpy.int64, int))
+            layout.append(CsppColumn(counts_key, slice(position + 1, position + 1 + num_wavelengths),
+                                     numpy.int64, list))
+            position += 1 + num_wavelengths
+
+        for offset, (name, _, encoding) in enumerate(INSTRUMENT_PARTICLE_ENCODING_RULES_END):
+            layout.append(CsppColumn(name, position + offset, COLUMN_DTYPES[encoding], encoding))
+
+        self._layouts[num_wavelengths] = layout
+        return layout
+
+    def load(self, rows):
+        """
+        Load a batch of data records.
+        @param rows list holding the list of string values of each record
+        @return a tuple of (dict of particle key to array, list of the indices of rows which could not be loaded)
+        """
+        groups = {}
+        failed = []
+        for index, row in enumerate(rows):
+            try:
+                num_wavelengths = int(row[DataMatchesGroupNumber.NUM_WAVELENGTHS - 1])
+            except (ValueError, IndexError):
+                failed.append(index)
+                continue
+            groups.setdefault(num_wavelengths, []).append(index)
+
+        loaded = {}
+        for num_wavelengths, indices in groups.iteritems():
+            columns, group_failed = self._load_table([rows[index] for index in indices],
+                                                     self._layout(num_wavelengths))
+            if group_failed:
+                failed.extend(indices[i] for i in group_failed)
+                group_failed = set(group_failed)
+                indices = [index for i, index in enumerate(indices) if i not in group_failed]
+            if indices:
+                loaded[num_wavelengths] = (indices, columns)
+
+        # the columns hold the loaded records in their original order
+        order = sorted(index for indices, _ in loaded.itervalues() for index in indices)
+        positions = {index: position for position, index in enumerate(order)}
+        max_wavelengths = max(loaded) if loaded else 0
+
+        merged = {}
+        for column in self._layout(max_wavelengths):
+            dtype = numpy.int8 if column.dtype == Y_OR_N_DTYPE else column.dtype
+            if isinstance(column.position, slice):
+                merged[column.key] = numpy.zeros((len(order), max_wavelengths), dtype=dtype)
+            else:
+                merged[column.key] = numpy.zeros(len(order), dtype=dtype)
+
+        for num_wavelengths, (indices, columns) in loaded.iteritems():
+            rows_at = [positions[index] for index in indices]
+            for column in self._layout(num_wavelengths):
+                if isinstance(column.position, slice):
+                    merged[column.key][rows_at, :num_wavelengths] = columns[column.key]
+                else:
+                    merged[column.key][rows_at] = columns[column.key]
+
+        return merged, sorted(failed)
+
+    def particle_params(self, columns, index):
+        """
+        Return the particle parameters of one loaded record, with the spectra trimmed to its number of
+        wavelengths.
+        """
+        num_wavelengths = columns[OptaaDjCsppParserDataParticleKey.NUM_WAVELENGTHS][index]
+        params = []
+        for column in self.columns:
+            value = columns[column.key][index]
+            if isinstance(column.position, slice):
+                value = value[:num_wavelengths]
+            params.append((column.key, value.tolist(), int if column.dtype == Y_OR_N_DTYPE else column.encoding))
+        return params
+
+
+class OptaaDjCsppInstrumentDataParticle(CsppDataParticle):
     """
     Base Class for building a instrument data particle
     """
 
+    _column_loader = OptaaDjCsppColumnLoader()
+
     def _build_parsed_values(self):
         """
         Take something in the data format and turn it into
@@ -196,6 +320,8 @@ class OptaaDjCsppInstrumentDataParticle(DataParticle):
         with the appropriate tag.
         @throws RecoverableSampleException If there is a problem with sample creation
         """
+        if self._decoded_params is not None:
+            return self._build_decoded_parsed_values()
 
         results = []
 
@@ -294,19 +420,22 @@ class OptaaDjCsppParser(CsppParser):
     def __init__(self,
                  config,
                  stream_handle,
-                 exception_callback):
+                 exception_callback,
+                 columnar=True):
         """
         This method is a constructor that will instantiate an OptaaDjCsppParser object.
         @param config The configuration for this OptaaDjCsppParser parser
         @param stream_handle The handle to the data stream containing the optaa_dj_cspp data
         @param exception_callback The function to call to report exceptions
+        @param columnar load the data records in bulk
         """
 
         # Call the superclass constructor
         super(OptaaDjCsppParser, self).__init__(config,
                                                 stream_handle,
                                                 exception_callback,
-                                                BEGIN_REGEX)
+                                                BEGIN_REGEX,
+                                                columnar=columnar)
 
     @staticmethod
     def _build_data_regex(regex, count):
@@ -339,10 +468,10 @@ class OptaaDjCsppParser(CsppParser):
 
         return data_regex
 
-    def parse_file(self):
+    def _iter_data_matches(self):
         """
-        Parse through the file, pulling single lines and comparing to the established patterns,
-        generating particles for data lines
+        Generator of the data record matches of the file.  The data record regex depends on the number of
+        wavelengths of each record.
         """
 
         for line in self._stream_handle:
@@ -358,7 +487,7 @@ class OptaaDjCsppParser(CsppParser):
                 fields = re.match(data_regex, line)
 
                 if fields is not None:
-                    self._process_data_match(fields, self._record_buffer)
+                    yield fields
                 else:  # did not match the regex
                     log.warn("line did not match regex %s", line)
                     self._exception_callback(RecoverableSampleException("Found an invalid line: %s" % line))
@@ -17,7 +17,6 @@ import numpy
 from mi.core.log import get_logger
 log = get_logger()
 from mi.core.common import BaseEnum
-from mi.core.instrument.dataset_data_particle import DataParticle
 from mi.core.exceptions import RecoverableSampleException
 
 from mi.dataset.parser.common_regexes import \
@@ -29,6 +28,10 @@ from mi.dataset.parser.common_regexes import \
 from mi.dataset.parser.cspp_base import \
     CsppParser, \
     Y_OR_N_REGEX, \
+    Y_OR_N_DTYPE, \
+    CsppColumn, \
+    CsppColumnLoader, \
+    CsppDataParticle, \
     CsppMetadataDataParticle, \
     MetadataRawDataKey, \
     encode_y_or_n
@@ -146,11 +149,30 @@ class ParadJCsppMetadataTelemeteredDataParticle(ParadJCsppMetadataDataParticle):
     _data_particle_type = DataParticleType.METADATA_TELEMETERED
 
 
-class ParadJCsppInstrumentDataParticle(DataParticle):
+# The instrument particle parameters loaded in bulk, each record value is the value of its match group
+COLUMN_LOADER = CsppColumnLoader([
+    CsppColumn(ParadJCsppParserDataParticleKey.PROFILER_TIMESTAMP,
+               DataMatchesGroupNumber.PROFILER_TIMESTAMP - 1, numpy.float64, numpy.float),
+    CsppColumn(ParadJCsppParserDataParticleKey.PRESSURE_DEPTH,
+               DataMatchesGroupNumber.DEPTH - 1, numpy.float64, float),
+    CsppColumn(ParadJCsppParserDataParticleKey.SUSPECT_TIMESTAMP,
+               DataMatchesGroupNumber.SUSPECT_TIMESTAMP - 1, Y_OR_N_DTYPE, encode_y_or_n),
+    CsppColumn(ParadJCsppParserDataParticleKey.DATE_STRING,
+               DataMatchesGroupNumber.DATE - 1, str, str),
+    CsppColumn(ParadJCsppParserDataParticleKey.TIME_STRING,
+               DataMatchesGroupNumber.TIME - 1, str, str),
+    CsppColumn(ParadJCsppParserDataParticleKey.PAR,
+               DataMatchesGroupNumber.PAR - 1, numpy.int64, int),
+], ParadJCsppParserDataParticleKey.PROFILER_TIMESTAMP)
+
+
+class ParadJCsppInstrumentDataParticle(CsppDataParticle):
     """
     Base Class for building a parad_j_cspp instrument data particle
     """
 
+    _column_loader = COLUMN_LOADER
+
     def _build_parsed_values(self):
         """
         Take something in the data format and turn it into
@@ -158,6 +180,9 @@ class ParadJCsppInstrumentDataParticle(DataParticle):
         with the appropriate tag.
         @throws SampleException If there is a problem with sample creation
         """
+        if self._decoded_params is not None:
+            return self._build_decoded_parsed_values()
+
         results = []
 
         try:
@@ -220,12 +245,14 @@ class ParadJCsppParser(CsppParser):
     def __init__(self,
                  config,
                  stream_handle,
-                 exception_callback):
+                 exception_callback,
+                 columnar=True):
         """
         This method is a constructor that will instantiate an ParadJCsppParser object.
         @param config The configuration for this ParadJCsppParser parser
         @param stream_handle The handle to the data stream containing the parad_j_cspp data
         @param exception_callback The function to call to report exceptions
+        @param columnar load the data records in bulk
         """
 
         # Call the superclass constructor
@@ -233,4 +260,5 @@ class ParadJCsppParser(CsppParser):
                                                stream_handle,
                                                exception_callback,
                                                DATA_REGEX,
-                                               ignore_matcher=IGNORE_MATCHER)
\ No newline at end of file
+                                               ignore_matcher=IGNORE_MATCHER,
+                                               columnar=columnar)
\ No newline at end of file
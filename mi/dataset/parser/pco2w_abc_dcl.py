@@ -16,6 +16,7 @@ from mi.dataset.parser.utilities import \
     dcl_time_to_ntp
 
 from mi.core.exceptions import RecoverableSampleException
+from mi.core.hex_record import HexRecordLayout
 from mi.core.log import get_logger
 from mi.dataset.parser.pco2w_abc import Pco2wAbcParser
 
@@ -102,9 +103,19 @@ ID_GROUP_INDEX = 2
 LENGTH_GROUP_INDEX = 3
 RECORD_TYPE_GROUP_INDEX = 4
 RECORD_TIME_GROUP_INDEX = 5
-LIGHT_MEASUREMENTS_GROUP_INDEX = 6
-CO2_BATTERY_VOLTAGE_GROUP_INDEX = 7
-THERMISTOR_GROUP_INDEX = 8
+
+# Layout of the ascii-hex CO2 (normal) and CO2 (blank measurements) records, from the ID to the checksum.
+# The checksum covers the record from the length.
+CO2_RECORD_LAYOUT = HexRecordLayout([
+    (Pco2wAbcDataParticleKey.UNIQUE_ID, 1),
+    (None, 1),  # length
+    (Pco2wAbcDataParticleKey.RECORD_TYPE, 1),
+    (Pco2wAbcDataParticleKey.RECORD_TIME, 4),
+    (Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS, 2, 14),
+    (Pco2wAbcDataParticleKey.VOLTAGE_BATTERY, 2),
+    (Pco2wAbcDataParticleKey.THERMISTOR_RAW, 2),
+    (None, 1)  # checksum
+], checksum_start=1)
 
 """
 *** END definition of regular expressions, matchers and group indices for CO2 (normal) and
@@ -245,30 +256,28 @@ class Pco2wAbcDclParser(Pco2wAbcParser):
         return common_dict
 
     @staticmethod
-    def _populate_light_measurements(light_measurements, instrument_dict, dict_key):
+    def _populate_co2_dict(co2_match, co2_dict, light_measurements_key):
         """
-        Helper method for filling in the light measurements (either normal or blank)
-        :param light_measurements: normal or blank light measurements
-        :param instrument_dict: instrument_dict or instrument_blank_dict
-        :param dict_key: either Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS or
+        Helper method for filling in the fields of a CO2 record (either normal or blank), the
+        ascii-hex record is decoded and its checksum verified in one pass
+        :param co2_match: the match of the CO2 record
+        :param co2_dict: instrument_dict or instrument_blank_dict
+        :param light_measurements_key: either Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS or
                         Pco2wAbcDataParticleKey.BLANK_LIGHT_MEASUREMENTS
-        :return: dict filled in normal or blank light measurements
+        :return: the populated dict
         """
+        co2_dict[Pco2wAbcDataParticleKey.DCL_CONTROLLER_TIMESTAMP] = \
+            co2_match.group(DATE_TIME_GROUP_INDEX)
 
-        end_range = num_chars = 4
-        last_light_measurement_start_index = len(light_measurements)-3
-        for x in range(0, last_light_measurement_start_index, num_chars):
-            light_measurement = light_measurements[x: end_range]
-            log.trace("ascii-hex light_measurement: %s", light_measurement)
-            # convert to int
-            int_light_measurement = int(light_measurement, 16)
-
-            # append int value to instrument_dict
-            instrument_dict[dict_key].append(int_light_measurement)
+        record = CO2_RECORD_LAYOUT.decode(
+            co2_match.string[co2_match.start(ID_GROUP_INDEX):co2_match.end(co2_match.lastindex)])
+        log.trace("CO2 record: %s", record)
 
-            end_range += num_chars
+        co2_dict[light_measurements_key] = record.pop(Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS)
+        co2_dict.update(record)
+        co2_dict[Pco2wAbcDataParticleKey.PASSED_CHECKSUM] = int(record.checksum_valid)
 
-        return instrument_dict[dict_key]
+        return co2_dict
 
     @staticmethod
     def _calculate_passed_checksum(line, record_checksum):
@@ -460,68 +469,24 @@ class Pco2wAbcDclParser(Pco2wAbcParser):
         power_dict[Pco2wAbcDataParticleKey.PASSED_CHECKSUM] = passed_checksum
 
     @staticmethod
-    def _populate_instrument_dict(instrument_record_match, instrument_dict, line):
+    def _populate_instrument_dict(instrument_record_match, instrument_dict):
         """
         Fields from the CO2 (normal) record are used to populate
         the instrument dictionary.
         """
 
-        common_dict = Pco2wAbcDclParser._populate_common_dict(instrument_record_match, instrument_dict)
-        instrument_dict.update(common_dict)
-
-        # Light measurements array
-        light_measurements = instrument_record_match.group(LIGHT_MEASUREMENTS_GROUP_INDEX)
-        log.trace("light_measurements: %s", light_measurements)
-        instrument_dict[Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS] = []
-
-        instrument_dict[Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS] \
-            = Pco2wAbcDclParser._populate_light_measurements(light_measurements,
-                                                             instrument_dict,
-                                                             Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS)
-
-        battery_voltage = instrument_record_match.group(CO2_BATTERY_VOLTAGE_GROUP_INDEX)
-        instrument_dict[Pco2wAbcDataParticleKey.VOLTAGE_BATTERY] = int(battery_voltage, 16)
-
-        raw_thermistor = instrument_record_match.group(THERMISTOR_GROUP_INDEX)
-        instrument_dict[Pco2wAbcDataParticleKey.THERMISTOR_RAW] = int(raw_thermistor, 16)
-
-        # Checksum will always be the last group
-        passed_checksum = Pco2wAbcDclParser._calculate_passed_checksum(
-            line,
-            int(instrument_record_match.group(instrument_record_match.lastindex), 16))
-
-        instrument_dict[Pco2wAbcDataParticleKey.PASSED_CHECKSUM] = passed_checksum
+        Pco2wAbcDclParser._populate_co2_dict(instrument_record_match, instrument_dict,
+                                             Pco2wAbcDataParticleKey.LIGHT_MEASUREMENTS)
 
     @staticmethod
-    def _populate_instrument_blank_dict(instrument_blank_record_match, instrument_blank_dict, line):
+    def _populate_instrument_blank_dict(instrument_blank_record_match, instrument_blank_dict):
         """
         Fields from the CO2 (blank) record are used to populate
         the instrument blank dictionary.
         """
 
-        common_dict = Pco2wAbcDclParser._populate_common_dict(instrument_blank_record_match, instrument_blank_dict)
-        instrument_blank_dict.update(common_dict)
-
-        # Blank light measurements array
-        light_measurements = instrument_blank_record_match.group(LIGHT_MEASUREMENTS_GROUP_INDEX)
-        instrument_blank_dict[Pco2wAbcDataParticleKey.BLANK_LIGHT_MEASUREMENTS] = []
-
-        instrument_blank_dict[Pco2wAbcDataParticleKey.BLANK_LIGHT_MEASUREMENTS] \
-            = Pco2wAbcDclParser._populate_light_measurements(light_measurements,
-                                                             instrument_blank_dict,
-                                                             Pco2wAbcDataParticleKey.BLANK_LIGHT_MEASUREMENTS)
-
-        battery_voltage = instrument_blank_record_match.group(CO2_BATTERY_VOLTAGE_GROUP_INDEX)
-        instrument_blank_dict[Pco2wAbcDataParticleKey.VOLTAGE_BATTERY] = int(battery_voltage, 16)
-
-        raw_thermistor = instrument_blank_record_match.group(THERMISTOR_GROUP_INDEX)
-        instrument_blank_dict[Pco2wAbcDataParticleKey.THERMISTOR_RAW] = int(raw_thermistor, 16)
-
-        # Checksum will always be the last group
-        passed_checksum = Pco2wAbcDclParser._calculate_passed_checksum(
-            line,
-            int(instrument_blank_record_match.group(instrument_blank_record_match.lastindex), 16))
-        instrument_blank_dict[Pco2wAbcDataParticleKey.PASSED_CHECKSUM] = passed_checksum
+        Pco2wAbcDclParser._populate_co2_dict(instrument_blank_record_match, instrument_blank_dict,
+                                             Pco2wAbcDataParticleKey.BLANK_LIGHT_MEASUREMENTS)
 
     def parse_file(self):
         """
@@ -607,7 +572,7 @@ class Pco2wAbcDclParser(Pco2wAbcParser):
             elif instrument_match:
                 log.debug("Found instrument record, line: %s", line)
                 log.debug("instrument groups %s", instrument_match.groups())
-                self._populate_instrument_dict(instrument_match, instrument_dict, line)
+                self._populate_instrument_dict(instrument_match, instrument_dict)
 
                 particle = self._extract_sample(self._instrument_class,
                                                 None,
@@ -624,7 +589,7 @@ class Pco2wAbcDclParser(Pco2wAbcParser):
             elif instrument_blank_match:
                 log.debug("Found instrument blank record, line: %s", line)
                 log.debug("instrument blank groups %s", instrument_blank_match.groups())
-                self._populate_instrument_blank_dict(instrument_blank_match, instrument_blank_dict, line)
+                self._populate_instrument_blank_dict(instrument_blank_match, instrument_blank_dict)
 
                 particle = self._extract_sample(self._instrument_blank_class,
                                                 None,
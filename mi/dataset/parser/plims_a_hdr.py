@@ -19,8 +19,6 @@ Mal-formed sensor data records and all metadata records produce no particles.
 import re
 from calendar import timegm
 
-import pandas as pd
-
 from mi.core.exceptions import RecoverableSampleException
 from mi.core.log import get_logger, get_logging_metaclass
 
@@ -175,6 +173,8 @@ class PlimsAHdrParser(SimpleParser):
         generating particles for data lines
         """
 
+        import pandas as pd
+
         file = self._stream_handle
 
         match = FNAME_DATE_REGEX.match(file.name)
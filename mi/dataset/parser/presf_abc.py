@@ -44,6 +44,7 @@ from mi.core.instrument.dataset_data_particle import \
     DataParticleValue
 
 from mi.core.exceptions import RecoverableSampleException
+from mi.core.hex_record import HexRecordLayout
 
 from mi.dataset.dataset_parser import SimpleParser
 
@@ -125,21 +126,12 @@ SESSION_GROUP_SAMPLE_TIME = 1
 SESSION_GROUP_TIDE_INTERVAL = 1
 SESSION_GROUP_WAVE_PERIOD = 2
 
-# TIDE_DATA_MATCHER produces the following groups:
-TIDE_GROUP_PRESSURE_NUM = 1
-TIDE_GROUP_TEMPERATURE_NUM = 2
-TIDE_GROUP_START_TIME = 3
-
 # WAVE_DATA_MATCHER produces the following groups:
 WAVE_GROUP_START_TIME = 1
 WAVE_GROUP_NUM_SAMPLES_MSB = 2
 WAVE_GROUP_PRESS_TEMP_COMP_NUM = 1
 WAVE_GROUP_NUM_SAMPLES_LSB = 2
 
-# WAVE_BURST_DATA_MATCHER produces the following groups:
-WAVE_BURST_GROUP_PRESSURE_NUM_1 = 1
-WAVE_BURST_GROUP_PRESSURE_NUM_2 = 2
-
 
 class PresfAbcSessionKey(BaseEnum):
     TIDE_SAMPLE_START_TIME = 'tide_sample_start_timestamp'
@@ -160,6 +152,16 @@ class PresfAbcWaveParticleKey(BaseEnum):
     WM_NUM_BURST_SAMPLES = 'wm_num_burst_samples'
 
 
+# Layouts of the tide data and wave burst data records, which are decoded in one pass once matched
+TIDE_DATA_LAYOUT = HexRecordLayout([
+    (PresfAbcTideParticleKey.TM_PRESSURE_NUM, 3),
+    (PresfAbcTideParticleKey.TM_TEMPERATURE_NUM, 2),
+    (PresfAbcTideParticleKey.TM_START_TIME, 4)])
+
+WAVE_BURST_DATA_LAYOUT = HexRecordLayout([
+    (PresfAbcWaveParticleKey.WM_BURST_PRESSURE_NUM, 3, 2)])
+
+
 class DataParticleType(BaseEnum):
     TIDE_RECOVERED = 'presf_abc_tide_measurement_recovered'
     WAVE_RECOVERED = 'presf_abc_wave_burst_recovered'
@@ -258,7 +260,7 @@ class PresfAbcWaveDataParticle(DataParticle):
         result.append(self._encode_value(
             PresfAbcWaveParticleKey.WM_BURST_PRESSURE_NUM,
             self.raw_data[PresfAbcWaveParticleKey.WM_BURST_PRESSURE_NUM],
-            lambda x: [int(y) for y in x]))
+            list))
 
         # The particle timestamp is the time of the start fo the wave burst.
         wm_start_time = self.raw_data[PresfAbcWaveParticleKey.WM_START_TIME]
@@ -379,23 +381,10 @@ class PresfAbcParser(SimpleParser):
 
         tide_data_re = TIDE_DATA_MATCHER.match(line)
         if tide_data_re:
-            # Parse the tide measurement start time
-            tm_start_time =\
-                int(tide_data_re.group(TIDE_GROUP_START_TIME), 16)
-            tide_data[PresfAbcTideParticleKey.TM_START_TIME] =\
-                tm_start_time
-
-            # Parse the tide measurement pressure count.
-            p_dec_tide =\
-                int(tide_data_re.group(TIDE_GROUP_PRESSURE_NUM), 16)
-            tide_data[PresfAbcTideParticleKey.TM_PRESSURE_NUM] =\
-                p_dec_tide
-
-            # Parse the timde measurement temperature count
-            t_dec_tide =\
-                int(tide_data_re.group(TIDE_GROUP_TEMPERATURE_NUM), 16)
-            tide_data[PresfAbcTideParticleKey.TM_TEMPERATURE_NUM] =\
-                t_dec_tide
+            # Parse the tide measurement pressure count, temperature count
+            # and start time
+            tide_data.update(
+                TIDE_DATA_LAYOUT.decode(line[:TIDE_DATA_LAYOUT.hex_length]))
 
             particle = self._extract_sample(self._tide_particle_class,
                                             None,
@@ -455,17 +444,12 @@ class PresfAbcParser(SimpleParser):
 
         # Check if the record is a wave burst record.
         elif wave_burst_data_re:
-            # Parse the first pressure measurement from the record
-            p_dec_wave = int(wave_burst_data_re.
-                             group(WAVE_BURST_GROUP_PRESSURE_NUM_1), 16)
-            wave_data[PresfAbcWaveParticleKey.WM_BURST_PRESSURE_NUM].\
-                append(p_dec_wave)
-
-            # Parse the second pressure measurement from the record
-            p_dec_wave = int(wave_burst_data_re.
-                             group(WAVE_BURST_GROUP_PRESSURE_NUM_2), 16)
+            # Parse both pressure measurements from the record
+            wave_burst_data = WAVE_BURST_DATA_LAYOUT.decode(
+                line[:WAVE_BURST_DATA_LAYOUT.hex_length])
             wave_data[PresfAbcWaveParticleKey.WM_BURST_PRESSURE_NUM].\
-                append(p_dec_wave)
+                extend(wave_burst_data[
+                    PresfAbcWaveParticleKey.WM_BURST_PRESSURE_NUM])
 
         # Check if the record is the end wave burst record.
         elif wave_data_end_re:
@@ -19,12 +19,15 @@ from mi.core.log import get_logger
 log = get_logger()
 
 from mi.core.common import BaseEnum
-from mi.core.instrument.dataset_data_particle import DataParticle
 from mi.core.exceptions import RecoverableSampleException
 
 from mi.dataset.parser.cspp_base import \
     CsppParser, \
     Y_OR_N_REGEX, \
+    Y_OR_N_DTYPE, \
+    CsppColumn, \
+    CsppColumnLoader, \
+    CsppDataParticle, \
     CsppMetadataDataParticle, \
     MetadataRawDataKey, \
     PARTICLE_KEY_INDEX, \
@@ -210,11 +213,39 @@ class SpkirAbjCsppMetadataTelemeteredDataParticle(SpkirAbjCsppMetadataDataPartic
     _data_particle_type = DataParticleType.METADATA_TELEMETERED
 
 
-class SpkirAbjCsppInstrumentDataParticle(DataParticle):
+# The instrument particle parameters loaded in bulk, each record value is the value of its match group
+COLUMN_LOADER = CsppColumnLoader([
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.PROFILER_TIMESTAMP,
+               DataMatchesGroupNumber.PROFILER_TIMESTAMP - 1, numpy.float64, numpy.float),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.PRESSURE,
+               DataMatchesGroupNumber.PRESSURE - 1, numpy.float64, float),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.SUSPECT_TIMESTAMP,
+               DataMatchesGroupNumber.SUSPECT_TIMESTAMP - 1, Y_OR_N_DTYPE, encode_y_or_n),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.TIMER,
+               DataMatchesGroupNumber.TIMER - 1, numpy.float64, numpy.float),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.SAMPLE_DELAY,
+               DataMatchesGroupNumber.SAMPLE_DELAY - 1, numpy.int64, int),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.CHANNEL_ARRAY,
+               slice(DataMatchesGroupNumber.CHANNEL_1 - 1, DataMatchesGroupNumber.CHANNEL_7), numpy.int64, list),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.VIN_SENSE,
+               DataMatchesGroupNumber.VIN - 1, numpy.int64, int),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.VA_SENSE,
+               DataMatchesGroupNumber.VA - 1, numpy.int64, int),
+    # the internal temperature has always been taken from the Va group
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.INTERNAL_TEMPERATURE,
+               DataMatchesGroupNumber.VA - 1, numpy.int64, int),
+    CsppColumn(SpkirAbjCsppParserDataParticleKey.FRAME_COUNTER,
+               DataMatchesGroupNumber.FRAME_COUNTER - 1, numpy.int64, int),
+], SpkirAbjCsppParserDataParticleKey.PROFILER_TIMESTAMP)
+
+
+class SpkirAbjCsppInstrumentDataParticle(CsppDataParticle):
     """
     Base Class for building a spkir_abj_cspp instrument data particle
     """
 
+    _column_loader = COLUMN_LOADER
+
     def _build_parsed_values(self):
         """
         Take something in the data format and turn it into
@@ -222,6 +253,9 @@ class SpkirAbjCsppInstrumentDataParticle(DataParticle):
         with the appropriate tag.
         @throws SampleException If there is a problem with sample creation
         """
+        if self._decoded_params is not None:
+            return self._build_decoded_parsed_values()
+
         results = []
 
         results.append(self._encode_value(SpkirAbjCsppParserDataParticleKey.PROFILER_TIMESTAMP,
@@ -301,12 +335,14 @@ class SpkirAbjCsppParser(CsppParser):
     def __init__(self,
                  config,
                  stream_handle,
-                 exception_callback):
+                 exception_callback,
+                 columnar=True):
         """
         This method is a constructor that will instantiate an SpkirAbjCsppParser object.
         @param config The configuration for this SpkirAbjCsppParser parser
         @param stream_handle The handle to the data stream containing the spkir_abj_cspp data
         @param exception_callback The function to call to report exceptions
+        @param columnar load the data records in bulk
         """
 
         # Call the superclass constructor
@@ -314,4 +350,5 @@ class SpkirAbjCsppParser(CsppParser):
                                                  stream_handle,
                                                  exception_callback,
                                                  DATA_REGEX,
-                                                 ignore_matcher=IGNORE_MATCHER)
+                                                 ignore_matcher=IGNORE_MATCHER,
+                                                 columnar=columnar)
@@ -93,8 +93,7 @@ class SunaDataParticle(DataParticle):
                       self._encode_value('day_of_year', day_of_year, int)]
 
         # the rest of the parameters are covered by the parameter map
-        for name, index, encode in self._param_map:
-            parameters.append(self._encode_value(name, self.raw_data[index], encode))
+        parameters.extend(self._encode_values(self.raw_data))
 
         return parameters
 
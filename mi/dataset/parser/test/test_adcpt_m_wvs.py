@@ -9,6 +9,7 @@
 
 from nose.plugins.attrib import attr
 import os
+import time
 
 from mi.core.log import get_logger
 log = get_logger()
@@ -20,6 +21,9 @@ from mi.dataset.dataset_parser import DataSetDriverConfigKeys
 from mi.dataset.driver.adcpt_m.wvs.resource import RESOURCE_PATH
 from mi.dataset.parser.adcpt_m_wvs import AdcptMWVSParser
 
+PARSER_CONFIG = {DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.adcpt_m_wvs',
+                 DataSetDriverConfigKeys.PARTICLE_CLASS: 'AdcptMWVSInstrumentDataParticle'}
+
 
 @attr('UNIT', group='mi')
 class AdcptMWVSParserUnitTestCase(ParserUnitTestCase):
@@ -31,11 +35,7 @@ class AdcptMWVSParserUnitTestCase(ParserUnitTestCase):
         """
         This function creates a AdcptMWVS parser for recovered data.
         """
-        parser = AdcptMWVSParser(
-            {DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.adcpt_m_wvs',
-             DataSetDriverConfigKeys.PARTICLE_CLASS: 'AdcptMWVSInstrumentDataParticle'},
-            file_handle,
-            self.exception_callback)
+        parser = AdcptMWVSParser(PARSER_CONFIG, file_handle, self.exception_callback)
         return parser
 
     def open_file(self, filename, mode='rb'):
@@ -225,4 +225,34 @@ class AdcptMWVSParserUnitTestCase(ParserUnitTestCase):
             self.assert_(isinstance(self.exception_callback_value[i], RecoverableSampleException))
             log.debug('Exception: %s', self.exception_callback_value[i])
 
-        fid.close()
\ No newline at end of file
+        fid.close()
+
+
+@attr('BENCHMARK', group='mi')
+class AdcptMWVSParserBenchmark(ParserUnitTestCase):
+    """
+    Adcpt_M_WVS Parser benchmark
+    """
+
+    def test_benchmark(self):
+        """
+        Measure the rate whole wave files are parsed at, using the WVS resource files
+        """
+        file_names = ['CE01ISSM-ADCPT_20140418_000_TS1404180021 - corrupt.WVS',
+                      'CE01ISSM-ADCPT_20140418_000_TS1404180021 - excerpt.WVS',
+                      'CE01ISSM-ADCPT_20140418_000_TS1404180021 - mod.WVS']
+        repeats = 10
+        num_bytes = 0
+        num_particles = 0
+
+        start = time.time()
+        for _ in xrange(repeats):
+            for file_name in file_names:
+                with open(os.path.join(RESOURCE_PATH, file_name), 'rb') as fid:
+                    parser = AdcptMWVSParser(PARSER_CONFIG, fid, self.exception_callback)
+                    num_particles += len(parser.get_records(100))
+                    num_bytes += fid.tell()
+        elapsed = time.time() - start
+
+        log.info('adcpt_m_wvs: %d particles from %.1f MB in %.2f s, %.1f MB/s',
+                 num_particles, num_bytes / 1e6, elapsed, num_bytes / 1e6 / elapsed)
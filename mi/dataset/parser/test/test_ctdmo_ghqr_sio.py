@@ -36,23 +36,42 @@ Recovered CT files:
   SBE37-IM_20141231_2014_12_31.hex - 99 CT records
 """
 
+import binascii
 import os
+import struct
+import time
+from StringIO import StringIO
+
 from nose.plugins.attrib import attr
 
 from mi.core.log import get_logger
 log = get_logger()
 
+from mi.core.instrument.dataset_data_particle import DataParticleKey
 from mi.dataset.test.test_parser import ParserUnitTestCase
 from mi.dataset.driver.ctdmo_ghqr.sio.resource import RESOURCE_PATH
 from mi.dataset.parser.ctdmo_ghqr_sio import \
     CtdmoGhqrSioRecoveredCoAndCtParser, \
     CtdmoGhqrRecoveredCtParser, \
     CtdmoGhqrSioTelemeteredParser, \
+    CtdmoGhqrSioTelemeteredInstrumentDataParticle, \
+    CtdmoGhqrSioTelemeteredOffsetDataParticle, \
+    CtdmoGhqrRecoveredHostInstrumentDataParticle, \
+    parse_co_data, \
+    parse_ct_data, \
     INDUCTIVE_ID_KEY, \
     DataParticleType
 
 from mi.dataset.dataset_parser import DataSetDriverConfigKeys
-from mi.core.exceptions import DatasetParserException, UnexpectedDataException
+from mi.core.exceptions import DatasetParserException, SampleException, UnexpectedDataException
+
+TELEMETERED_CONFIG = {
+    DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.ctdmo_ghqr_sio',
+    DataSetDriverConfigKeys.PARTICLE_CLASS: [
+        'CtdmoGhqrSioTelemeteredInstrumentDataParticle',
+        'CtdmoGhqrSioTelemeteredOffsetDataParticle'
+    ]
+}
 
 
 @attr('UNIT', group='mi')
@@ -60,13 +79,7 @@ class CtdmoGhqrSioParserUnitTestCase(ParserUnitTestCase):
 
     def setUp(self):
         ParserUnitTestCase.setUp(self)
-        self.config = {
-            DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.ctdmo_ghqr_sio',
-            DataSetDriverConfigKeys.PARTICLE_CLASS: [
-                'CtdmoGhqrSioTelemeteredInstrumentDataParticle',
-                'CtdmoGhqrSioTelemeteredOffsetDataParticle'
-            ]
-        }
+        self.config = TELEMETERED_CONFIG
 
         self.config_rec_co = {
             DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.ctdmo_ghqr_sio',
@@ -447,3 +460,69 @@ class CtdmoGhqrSioParserUnitTestCase(ParserUnitTestCase):
             self.assertEqual(len(particles), 482)
 
             self.assertEqual(self.exception_callback_value, [])
+
+    def assert_decoded_particles(self, particles, particle_class):
+        """
+        Assert that particles built from decoded samples match particles built from their raw data
+        """
+        for particle in particles:
+            expected = particle_class(particle.raw_data, preferred_timestamp=DataParticleKey.INTERNAL_TIMESTAMP)
+            self.assertEqual(particle.generate_dict()['values'], expected.generate_dict()['values'])
+            self.assertEqual(particle.get_value(DataParticleKey.INTERNAL_TIMESTAMP),
+                             expected.get_value(DataParticleKey.INTERNAL_TIMESTAMP))
+
+    def test_decode_samples(self):
+        """
+        Verify the samples of a record decoded at once match the samples decoded one at a time,
+        and that a bad sample ends the record at the same position.
+        """
+        parser = CtdmoGhqrSioTelemeteredParser(self.config, StringIO(''), self.exception_callback)
+        header_timestamp = '51F0C096'
+
+        ct_record = ''.join(chr(0x30 + index) + '\x1e\x0b\x85\x8a\x57\xf1\x68' +
+                            struct.pack('<I', 450000000 + index) + '\r' for index in range(3))
+        particles = parser.parse_ct_record(ct_record + '\x33' + '\x00' * 11 + '\x13' + ct_record,
+                                           header_timestamp)
+        self.assertEqual(len(particles), 3)
+        self.assert_decoded_particles(particles, CtdmoGhqrSioTelemeteredInstrumentDataParticle)
+        self.assertEqual([value['value'] for value in particles[1].generate_dict()['values'][2:]],
+                         [0x1e0b8, 0x58a57, 0x68f1, 450000001])
+        self.assertEqual(len(self.exception_callback_value), 1)
+        self.assert_(isinstance(self.exception_callback_value[0], SampleException))
+        self.assertIn('at 39', self.exception_callback_value[0].msg)
+
+        co_record = ''.join(chr(0x30 + index) + struct.pack('>i', index - 2) + end
+                            for index, end in enumerate('\x13|\r'))
+        particles, had_error = parse_co_data(CtdmoGhqrSioTelemeteredOffsetDataParticle, co_record + '\x33\x00',
+                                             header_timestamp, parser._extract_sample)
+        self.assertEqual(len(particles), 3)
+        self.assertEqual(had_error, (True, 18))
+        self.assert_decoded_particles(particles, CtdmoGhqrSioTelemeteredOffsetDataParticle)
+
+        # samples which are not hex ASCII, or not the expected size, are left to the particles
+        samples = ['1e0b858a57f1680ba2a61a', '1e0b858a57f1680ba2a61a00', '1e0b858a57f1680ba2a6zz',
+                   '1e0b858a57f1680ba2a61', '140b858a57f1680ba2a61a']
+        particles, had_error = parse_ct_data(CtdmoGhqrRecoveredHostInstrumentDataParticle, '\n'.join(samples),
+                                             header_timestamp, parser._extract_sample, '55')
+        self.assertEqual([particle.raw_data[2] for particle in particles], samples[:2] + samples[4:])
+        self.assertEqual(had_error, (True, 0))
+        self.assert_decoded_particles(particles, CtdmoGhqrRecoveredHostInstrumentDataParticle)
+
+
+@attr('BENCHMARK', group='mi')
+class CtdmoGhqrSioParserBenchmark(ParserUnitTestCase):
+
+    def test_decode_benchmark(self):
+        """
+        Time decoding a CT record with many samples
+        """
+        parser = CtdmoGhqrSioTelemeteredParser(TELEMETERED_CONFIG, StringIO(''), self.exception_callback)
+        count = 12000
+        ct_record = ''.join(chr(index % 12 + 0x30) + binascii.a2b_hex('1e0b858a57f168') +
+                            struct.pack('<I', 450000000 + index) + '\r' for index in xrange(count))
+
+        start = time.time()
+        particles = parser.parse_ct_record(ct_record, '51F0C096')
+        elapsed = time.time() - start
+
+        log.info('ctdmo_ghqr_sio: decoded %d CT samples in %.3f s', count, elapsed)
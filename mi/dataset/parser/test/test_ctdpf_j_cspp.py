@@ -13,6 +13,7 @@ base parser.  That level of testing is omitted from this test suite
 
 import os
 
+import numpy
 from nose.plugins.attrib import attr
 from mi.core.common import BaseEnum
 from mi.core.log import get_logger
@@ -27,7 +28,9 @@ from mi.dataset.parser.cspp_base import \
     DATA_PARTICLE_CLASS_KEY
 
 from mi.dataset.parser.ctdpf_j_cspp import \
+    COLUMN_LOADER, \
     CtdpfJCsppParser, \
+    CtdpfJCsppParserDataParticleKey, \
     CtdpfJCsppInstrumentTelemeteredDataParticle, \
     CtdpfJCsppMetadataTelemeteredDataParticle, \
     CtdpfJCsppInstrumentRecoveredDataParticle, \
@@ -226,3 +229,42 @@ class CtdpfJCsppParserUnitTestCase(ParserUnitTestCase):
 
         self.assertEqual(len(self.exception_callback_value), 12)
         stream_handle.close()
+
+    def test_columnar(self):
+        """
+        Verify the particles built from bulk loaded records match those built record by record, including
+        for the bad data file.
+        """
+        for filename in [RECOVERED_SAMPLE_DATA, '11079364_BAD_PPB_CTD.txt']:
+            results = []
+            for columnar in [True, False]:
+                self.exception_callback_value = []
+                with open(os.path.join(RESOURCE_PATH, filename), 'rU') as stream_handle:
+                    parser = CtdpfJCsppParser(self.config.get(DataTypeKey.CTDPF_J_CSPP_RECOVERED),
+                                              stream_handle,
+                                              self.exception_callback,
+                                              columnar=columnar)
+                    particles = parser.get_records(5000)
+                values = []
+                for particle in particles:
+                    particle_dict = particle.generate_dict()
+                    del particle_dict['driver_timestamp']
+                    values.append(particle_dict)
+                results.append((values, len(self.exception_callback_value)))
+
+            self.assertEqual(results[0], results[1])
+
+    def test_load_bad_rows(self):
+        """
+        Verify rows which can not be loaded are returned individually and the others are still loaded.
+        """
+        rows = [['1399830012.345', 'n', '7.5', '3.25', '10.0', '33.1'],
+                ['1399830013.345', 'y', '7.5x', '3.25', '10.0', '33.1'],
+                ['1399830014.345', 'Y', '7.6', '3.26', '10.1', '33.2']]
+        columns, failed = COLUMN_LOADER.load(rows)
+
+        self.assertEqual(failed, [1])
+        numpy.testing.assert_array_equal(columns[CtdpfJCsppParserDataParticleKey.TEMPERATURE], [7.5, 7.6])
+        numpy.testing.assert_array_equal(columns[CtdpfJCsppParserDataParticleKey.SUSPECT_TIMESTAMP], [0, 1])
+        self.assertEqual(COLUMN_LOADER.particle_params(columns, 1)[1],
+                         (CtdpfJCsppParserDataParticleKey.SUSPECT_TIMESTAMP, 1, int))
@@ -8,18 +8,38 @@
 """
 
 import os
+import timeit
 
 from nose.plugins.attrib import attr
 
 from mi.core.exceptions import SampleException
+from mi.core.instrument.dataset_data_particle import DataParticleKey
 from mi.core.log import get_logger
 from mi.dataset.dataset_parser import DataSetDriverConfigKeys
 from mi.dataset.driver.optaa_ac.mmp_cds.resource import RESOURCE_PATH
 from mi.dataset.parser.mmp_cds_base import MmpCdsParser
+from mi.dataset.parser.optaa_ac_mmp_cds import OptaaAcMmpCdsParserDataParticleKey
 from mi.dataset.test.test_parser import ParserUnitTestCase
 
 log = get_logger()
 
+CONFIG = {
+    DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.optaa_ac_mmp_cds',
+    DataSetDriverConfigKeys.PARTICLE_CLASS: 'OptaaAcMmpCdsParserDataParticle'
+}
+
+
+def parse_large_import(exception_callback, columnar=True):
+    with open(os.path.join(RESOURCE_PATH, 'large_import.mpk'), 'rb') as stream_handle:
+        parser = MmpCdsParser(CONFIG, stream_handle, exception_callback, columnar=columnar)
+        return parser.get_records(1000)
+
+
+def column_batches_large_import(exception_callback, batch_size):
+    with open(os.path.join(RESOURCE_PATH, 'large_import.mpk'), 'rb') as stream_handle:
+        parser = MmpCdsParser(CONFIG, stream_handle, exception_callback)
+        return list(parser.iter_column_batches(batch_size))
+
 
 @attr('UNIT', group='mi')
 class OptaaAcMmpCdsParserUnitTestCase(ParserUnitTestCase):
@@ -116,3 +136,59 @@ class OptaaAcMmpCdsParserUnitTestCase(ParserUnitTestCase):
 
             self.assertTrue(len(self.exception_callback_value) >= 1)
             self.assert_(isinstance(self.exception_callback_value[0], SampleException))
+
+    def test_column_batches(self):
+        """
+        This test verifies the columns decoded from the large import match the particles decoded record by record.
+        """
+        particles = parse_large_import(self.exception_callback, columnar=False)
+        batches = column_batches_large_import(self.exception_callback, 300)
+
+        self.assertEqual([len(batch) for batch in batches], [300, 300, 300, 100])
+        self.assertEqual(self.exception_callback_value, [])
+
+        index = 0
+        for batch in batches:
+            counts = batch.columns[OptaaAcMmpCdsParserDataParticleKey.C_REFERENCE_COUNTS]
+            self.assertEqual(counts.ndim, 2)
+            self.assertEqual(counts.shape[0], len(batch))
+
+            for row in xrange(len(batch)):
+                particle = particles[index].generate_dict()
+                values = {value[DataParticleKey.VALUE_ID]: value[DataParticleKey.VALUE]
+                          for value in particle[DataParticleKey.VALUES]}
+                num_wavelengths = values[OptaaAcMmpCdsParserDataParticleKey.NUM_WAVELENGTHS]
+
+                for name, column in batch.columns.iteritems():
+                    if name == DataParticleKey.INTERNAL_TIMESTAMP:
+                        self.assertEqual(column[row], particle[name])
+                    elif column.ndim == 2:
+                        self.assertEqual(column[row, :num_wavelengths].tolist(), values[name])
+                    else:
+                        self.assertEqual(str(column[row]), str(values[name]))
+                index += 1
+
+        self.assertEqual(index, len(particles))
+
+    def test_columnar_particles(self):
+        """
+        This test verifies the particles built from the columns match the particles decoded record by record.
+        """
+        self.assertEqual(parse_large_import(self.exception_callback),
+                         parse_large_import(self.exception_callback, columnar=False))
+        self.assertEqual(self.exception_callback_value, [])
+
+
+@attr('BENCHMARK', group='mi')
+class OptaaAcMmpCdsParserBenchmark(ParserUnitTestCase):
+    def test_columnar_benchmark(self):
+        """
+        This test compares decoding the large import record by record, in columns with particles built from the
+        columns, and in columns only.
+        """
+        callback = self.exception_callback
+        log.info('record by record: %.3f s', timeit.timeit(lambda: parse_large_import(callback, columnar=False),
+                                                           number=1))
+        log.info('columnar particles: %.3f s', timeit.timeit(lambda: parse_large_import(callback), number=1))
+        log.info('columns only: %.3f s', timeit.timeit(lambda: column_batches_large_import(callback, 1000),
+                                                       number=1))
@@ -14,10 +14,12 @@ are modified versions of 11079364_ACS_ACS.txt.
 """
 
 import os
+import timeit
 
 from nose.plugins.attrib import attr
 
 from mi.core.exceptions import RecoverableSampleException
+from mi.core.instrument.dataset_data_particle import DataParticleKey
 from mi.core.log import get_logger
 from mi.dataset.dataset_parser import DataSetDriverConfigKeys
 from mi.dataset.driver.optaa_dj.cspp.resource import RESOURCE_PATH
@@ -27,6 +29,7 @@ from mi.dataset.parser.cspp_base import \
 
 from mi.dataset.parser.optaa_dj_cspp import \
     OptaaDjCsppParser, \
+    OptaaDjCsppParserDataParticleKey, \
     OptaaDjCsppInstrumentTelemeteredDataParticle, \
     OptaaDjCsppMetadataTelemeteredDataParticle, \
     OptaaDjCsppInstrumentRecoveredDataParticle, \
@@ -42,6 +45,27 @@ TELEMETERED_SAMPLE_DATA = '11079364_ACD_ACS.txt'
 
 O_MODE = 'rU'
 
+RECOVERED_PARSER_CONFIG = {
+    DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.optaa_dj_cspp',
+    DataSetDriverConfigKeys.PARTICLE_CLASS: None,
+    DataSetDriverConfigKeys.PARTICLE_CLASSES_DICT: {
+        METADATA_PARTICLE_CLASS_KEY: OptaaDjCsppMetadataRecoveredDataParticle,
+        DATA_PARTICLE_CLASS_KEY: OptaaDjCsppInstrumentRecoveredDataParticle
+    }
+}
+
+
+def parse_file(filename, exception_callback, columnar=True):
+    with open(os.path.join(RESOURCE_PATH, filename), O_MODE) as stream_handle:
+        parser = OptaaDjCsppParser(RECOVERED_PARSER_CONFIG, stream_handle, exception_callback, columnar=columnar)
+        return parser.get_records(100000)
+
+
+def column_batches(filename, exception_callback, batch_size=1000):
+    with open(os.path.join(RESOURCE_PATH, filename), O_MODE) as stream_handle:
+        parser = OptaaDjCsppParser(RECOVERED_PARSER_CONFIG, stream_handle, exception_callback)
+        return list(parser.iter_column_batches(batch_size))
+
 
 @attr('UNIT', group='mi')
 class OptaaDjCsppParserUnitTestCase(ParserUnitTestCase):
@@ -61,14 +85,7 @@ class OptaaDjCsppParserUnitTestCase(ParserUnitTestCase):
             }
         }
 
-        self._recovered_parser_config = {
-            DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.optaa_dj_cspp',
-            DataSetDriverConfigKeys.PARTICLE_CLASS: None,
-            DataSetDriverConfigKeys.PARTICLE_CLASSES_DICT: {
-                METADATA_PARTICLE_CLASS_KEY: OptaaDjCsppMetadataRecoveredDataParticle,
-                DATA_PARTICLE_CLASS_KEY: OptaaDjCsppInstrumentRecoveredDataParticle
-            }
-        }
+        self._recovered_parser_config = RECOVERED_PARSER_CONFIG
 
     def particle_to_yml(self, particles, filename, mode='w'):
         """
@@ -424,3 +441,76 @@ class OptaaDjCsppParserUnitTestCase(ParserUnitTestCase):
         stream_handle.close()
 
         log.debug('===== END TEST NO TRAILING TAB =====')
+
+    @staticmethod
+    def particle_values(particles):
+        """
+        Return the generated particles without the driver timestamp, which is the time they were generated.
+        """
+        values = []
+        for particle in particles:
+            particle_dict = particle.generate_dict()
+            del particle_dict[DataParticleKey.DRIVER_TIMESTAMP]
+            values.append(particle_dict)
+        return values
+
+    def test_column_batches(self):
+        """
+        Verify the columns loaded from the bad data file match the particles built record by record, and
+        that the bad records are reported one at a time.
+        """
+        particles = parse_file('11079364_BAD_ACS_ACS.txt', self.exception_callback, columnar=False)
+        errors = len(self.exception_callback_value)
+        batches = column_batches('11079364_BAD_ACS_ACS.txt', self.exception_callback, batch_size=5)
+
+        self.assertEqual(len(self.exception_callback_value), 2 * errors)
+        # the first particle is the metadata
+        self.assertEqual(sum(len(batch) for batch in batches), len(particles) - 1)
+
+        index = 1
+        for batch in batches:
+            counts = batch.columns[OptaaDjCsppParserDataParticleKey.A_SIGNAL_COUNTS]
+            self.assertEqual(counts.shape[0], len(batch))
+
+            for row in xrange(len(batch)):
+                particle = particles[index].generate_dict()
+                values = {value[DataParticleKey.VALUE_ID]: value[DataParticleKey.VALUE]
+                          for value in particle[DataParticleKey.VALUES]}
+                num_wavelengths = values[OptaaDjCsppParserDataParticleKey.NUM_WAVELENGTHS]
+
+                for name, column in batch.columns.iteritems():
+                    if name == DataParticleKey.INTERNAL_TIMESTAMP:
+                        self.assertAlmostEqual(column[row], particle[name], places=6)
+                    elif column.ndim == 2:
+                        self.assertEqual(column[row, :num_wavelengths].tolist(), values[name])
+                    else:
+                        self.assertEqual(column[row].item(), values[name])
+                index += 1
+
+    def test_columnar_particles(self):
+        """
+        Verify parsing a recovered file in bulk, with particles built from the columns, matches parsing it
+        record by record.
+        """
+        filename = RECOVERED_SAMPLE_DATA
+        self.assertEqual(self.particle_values(parse_file(filename, self.exception_callback)),
+                         self.particle_values(parse_file(filename, self.exception_callback, columnar=False)))
+
+        batches = column_batches(filename, self.exception_callback)
+        self.assertEqual(batches[0].columns[OptaaDjCsppParserDataParticleKey.C_REFERENCE_COUNTS].ndim, 2)
+        self.assertEqual(self.exception_callback_value, [])
+
+
+@attr('BENCHMARK', group='mi')
+class OptaaDjCsppParserBenchmark(ParserUnitTestCase):
+    def test_columnar_benchmark(self):
+        """
+        Compare parsing a recovered file record by record, in bulk with particles built from the columns,
+        and in bulk without particles.
+        """
+        filename = RECOVERED_SAMPLE_DATA
+        callback = self.exception_callback
+        log.info('record by record: %.3f s', timeit.timeit(lambda: parse_file(filename, callback, columnar=False),
+                                                           number=1))
+        log.info('columnar particles: %.3f s', timeit.timeit(lambda: parse_file(filename, callback), number=1))
+        log.info('columns only: %.3f s', timeit.timeit(lambda: column_batches(filename, callback), number=1))
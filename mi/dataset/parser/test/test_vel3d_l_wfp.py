@@ -9,7 +9,12 @@
 
 from StringIO import StringIO
 
+import calendar
 import os
+import time
+
+import ntplib
+import numpy
 from nose.plugins.attrib import attr
 
 from mi.core.exceptions import SampleException
@@ -18,6 +23,7 @@ from mi.core.log import get_logger
 from mi.dataset.dataset_parser import DataSetDriverConfigKeys
 from mi.dataset.driver.vel3d_l.wfp.resource import RESOURCE_PATH
 from mi.dataset.parser.vel3d_l_wfp import \
+    FSI_RECORD_DTYPE, \
     Vel3dLWfpParser, \
     Vel3dLWfpSioParser, \
     Vel3dLWfpInstrumentParticle, \
@@ -1006,6 +1012,14 @@ REC_JSON_FILE_1 = 'A0000001.json'
 REC_LOG_FILE_2 = 'A0000001_PAPA14.dat'
 REC_JSON_FILE_2 = 'A0000001_PAPA14.json'
 
+REC_PARSER_CONFIG = {
+    DataSetDriverConfigKeys.PARTICLE_MODULE:
+        'mi.dataset.parser.vel3d_l_wfp',
+    DataSetDriverConfigKeys.PARTICLE_CLASS:
+        ['Vel3dLWfpInstrumentRecoveredParticle',
+         'Vel3dLWfpMetadataRecoveredParticle']
+}
+
 # END NEW STUFF DEFS
 
 
@@ -1394,13 +1408,7 @@ class Vel3dLWfpParserUnitTestCase(ParserUnitTestCase):
 
     def setUp(self):
         ParserUnitTestCase.setUp(self)
-        self.rec_config = {
-            DataSetDriverConfigKeys.PARTICLE_MODULE:
-                'mi.dataset.parser.vel3d_l_wfp',
-            DataSetDriverConfigKeys.PARTICLE_CLASS:
-                ['Vel3dLWfpInstrumentRecoveredParticle',
-                 'Vel3dLWfpMetadataRecoveredParticle']
-        }
+        self.rec_config = REC_PARSER_CONFIG
 
         self.tel_config = {
             DataSetDriverConfigKeys.PARTICLE_MODULE:
@@ -1763,6 +1771,27 @@ class Vel3dLWfpParserUnitTestCase(ParserUnitTestCase):
 
         log.debug('===== END MIX TEST =====')
 
+    def test_fsi_record_timestamps(self):
+        """
+        Verify the timestamps derived by column match those of calendar.timegm,
+        and that records with an invalid date get no timestamp.
+        """
+        records = numpy.zeros(4, dtype=FSI_RECORD_DTYPE)
+        dates = [(2014, 1, 1, 0, 0, 0),
+                 (2000, 2, 29, 23, 59, 59),
+                 (1969, 12, 31, 12, 30, 15),
+                 (2014, 13, 1, 0, 0, 0)]
+        for record, date in zip(records, dates):
+            record['year'], record['month'], record['day'], \
+                record['hour'], record['minute'], record['second'] = date
+
+        timestamps = Vel3dLWfpParser.fsi_record_timestamps(records)
+
+        for timestamp, date in zip(timestamps[:3], dates[:3]):
+            expected = float(ntplib.system_to_ntp_time(calendar.timegm(date)))
+            self.assertEqual(timestamp, expected)
+        self.assertIsNone(timestamps[3])
+
     def create_rec_yml_file(self):
         """
         Create a yml file corresponding to an actual recovered dataset. This is not an actual test - it allows
@@ -1817,3 +1846,24 @@ class Vel3dLWfpParserUnitTestCase(ParserUnitTestCase):
                 else:
                     fid.write('    %s: %s\n' % (val.get('value_id'), val.get('value')))
         fid.close()
+
+
+@attr('BENCHMARK', group='mi')
+class Vel3dLWfpParserBenchmark(ParserUnitTestCase):
+    """
+    vel3d_l_wfp Parser benchmark
+    """
+
+    def test_benchmark(self):
+        """
+        Time parsing a large recovered file.
+        """
+        in_file = open(os.path.join(RESOURCE_PATH, REC_LOG_FILE_2), mode='rb')
+        parser = Vel3dLWfpParser(REC_PARSER_CONFIG, in_file, self.exception_callback)
+
+        start = time.time()
+        result = parser.get_records(25000)
+        elapsed = time.time() - start
+
+        in_file.close()
+        log.info('vel3d_l_wfp: parsed %d particles in %.3f s', len(result), elapsed)
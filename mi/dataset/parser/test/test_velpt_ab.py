@@ -11,6 +11,8 @@ __author__ = 'Chris Goodrich'
 
 import os
 import re
+import time
+from StringIO import StringIO
 
 from nose.plugins.attrib import attr
 
@@ -21,9 +23,34 @@ from mi.dataset.parser.common_regexes import FLOAT_REGEX, END_OF_LINE_REGEX
 from mi.dataset.parser.velpt_ab import VelptAbParser, VelptAbParticleClassKey
 from mi.dataset.parser.velpt_ab_particles import VelptAbInstrumentDataParticle,\
     VelptAbDiagnosticsHeaderParticle, VelptAbDiagnosticsDataParticle, VelptAbInstrumentMetadataParticle
+from mi.dataset.parser.velpt_ab_records import VelptAbScanStatus, scan_records, calculate_checksums
 from mi.dataset.test.test_parser import ParserUnitTestCase
 from mi.logging import log
 
+PARSER_CONFIG = {
+    DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.velpt_ab_particles',
+    DataSetDriverConfigKeys.PARTICLE_CLASS: None,
+    DataSetDriverConfigKeys.PARTICLE_CLASSES_DICT: {
+        VelptAbParticleClassKey.METADATA_PARTICLE_CLASS: VelptAbDiagnosticsHeaderParticle,
+        VelptAbParticleClassKey.DIAGNOSTICS_PARTICLE_CLASS: VelptAbDiagnosticsDataParticle,
+        VelptAbParticleClassKey.INSTRUMENT_METADATA_PARTICLE_CLASS: VelptAbInstrumentMetadataParticle,
+        VelptAbParticleClassKey.INSTRUMENT_PARTICLE_CLASS: VelptAbInstrumentDataParticle
+    }
+}
+
+
+def repeated_records(repeats):
+    """
+    Read the velocity and diagnostics records of a resource file, repeated after its configuration records
+    @param repeats number of times the records are repeated
+    @retval file contents
+    """
+    with open(os.path.join(RESOURCE_PATH, 'VELPT_SN_11402_2014-07-02.aqd'), 'rb') as file_handle:
+        data = file_handle.read()
+
+    first = data.find(VelptAbParser.SYNC_MARKER + VelptAbParser.VELOCITY_DATA_ID)
+    return data[:first] + data[first:] * repeats
+
 
 @attr('UNIT', group='mi')
 class VelptAbParserUnitTestCase(ParserUnitTestCase):
@@ -35,16 +62,7 @@ class VelptAbParserUnitTestCase(ParserUnitTestCase):
 
         ParserUnitTestCase.setUp(self)
 
-        self._parser_config = {
-            DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.velpt_ab_particles',
-            DataSetDriverConfigKeys.PARTICLE_CLASS: None,
-            DataSetDriverConfigKeys.PARTICLE_CLASSES_DICT: {
-                VelptAbParticleClassKey.METADATA_PARTICLE_CLASS: VelptAbDiagnosticsHeaderParticle,
-                VelptAbParticleClassKey.DIAGNOSTICS_PARTICLE_CLASS: VelptAbDiagnosticsDataParticle,
-                VelptAbParticleClassKey.INSTRUMENT_METADATA_PARTICLE_CLASS: VelptAbInstrumentMetadataParticle,
-                VelptAbParticleClassKey.INSTRUMENT_PARTICLE_CLASS: VelptAbInstrumentDataParticle
-            }
-        }
+        self._parser_config = PARSER_CONFIG
 
         self._incomplete_parser_config = {
             DataSetDriverConfigKeys.PARTICLE_MODULE: 'mi.dataset.parser.velpt_ab_dcl_particles',
@@ -632,6 +650,63 @@ class VelptAbParserUnitTestCase(ParserUnitTestCase):
 
         log.debug('===== END TEST FOUND BAD DIAG HDR CHECKSUM AND TOO MANY RECS =====')
 
+    def test_sync_at_end_of_file(self):
+        """
+        The file used in this test ends with the sync and ID bytes of a record
+        which was cut off before its size. All the other records are processed.
+        """
+        log.debug('===== START TEST SYNC AT END OF FILE =====')
+
+        with open(os.path.join(RESOURCE_PATH, 'VELPT_SN_11402_2014-07-02.aqd'), 'rb') as file_handle:
+            data = file_handle.read()
+
+        parser = VelptAbParser(self._parser_config,
+                               StringIO(data + VelptAbParser.SYNC_MARKER + VelptAbParser.VELOCITY_DATA_ID),
+                               self.exception_callback)
+
+        particles = parser.get_records(72)
+
+        self.assertEquals(len(particles), 72)
+        self.assertEquals(len(self.exception_callback_value), 1)
+
+        self.assert_particles(particles, 'VELPT_SN_11402_2014-07-02.yml', RESOURCE_PATH)
+
+        log.debug('===== END TEST SYNC AT END OF FILE =====')
+
+    def test_scan_records(self):
+        """
+        Scan a file for records, skipping invalid bytes and IDs, and validate the checksums.
+        """
+        with open(os.path.join(RESOURCE_PATH, 'VELPT_SN_11402_2014-07-02.aqd'), 'rb') as file_handle:
+            data = file_handle.read()
+
+        velocity = data.find(VelptAbParser.SYNC_MARKER + VelptAbParser.VELOCITY_DATA_ID)
+        record = data[velocity:velocity + 42]
+        corrupt = record[:30] + '\x00\x00' + record[32:]
+
+        records = scan_records('\x01\x02' + record + '\xa5\x07' + corrupt + record[:10], VelptAbParser.RECORD_IDS)
+
+        self.assertEquals([(scanned.status, scanned.offset, scanned.length) for scanned in records],
+                          [(VelptAbScanStatus.INVALID_SYNC, 0, 2),
+                           (VelptAbScanStatus.RECORD, 2, 42),
+                           (VelptAbScanStatus.INVALID_ID, 44, 2),
+                           (VelptAbScanStatus.RECORD, 46, 42),
+                           (VelptAbScanStatus.MALFORMED, 88, 10)])
+
+        stored, calculated = calculate_checksums('\x01\x02' + record + '\xa5\x07' + corrupt, records[1:4:2])
+        self.assertEquals(stored[0], calculated[0])
+        self.assertNotEquals(stored[1], calculated[1])
+
+    def test_repeated_records(self):
+        """
+        Parse the records of a file repeated several times, each record producing a particle.
+        """
+        parser = VelptAbParser(self._parser_config, StringIO(repeated_records(3)), self.exception_callback)
+        particles = parser.get_records(1000)
+
+        self.assertEquals(len(particles), 71 * 3 + 1)
+        self.assertEquals(self.exception_callback_value, [])
+
     def fix_yml_pressure_params(self):
         """
         This helper tool was used to modify the yml files in response to ticket #4341
@@ -707,3 +782,23 @@ class VelptAbParserUnitTestCase(ParserUnitTestCase):
                         out_file_id.write(new_line)
 
                     out_file_id.close()
+
+
+@attr('BENCHMARK', group='mi')
+class VelptAbParserBenchmark(ParserUnitTestCase):
+    """
+    velpt_ab Parser benchmark
+    """
+
+    def test_benchmark(self):
+        """
+        Measure parsing a large file of velocity and diagnostics records.
+        """
+        data = repeated_records(200)
+
+        start = time.time()
+        parser = VelptAbParser(PARSER_CONFIG, StringIO(data), self.exception_callback)
+        particles = parser.get_records(100000)
+        elapsed = time.time() - start
+
+        log.info('velpt_ab parser: %d particles from %d bytes in %.2f s', len(particles), len(data), elapsed)
@@ -15,7 +15,6 @@ import os
 import binascii
 import base64
 import ntplib
-import pandas as pd
 from mi.core.log import get_logger
 log = get_logger()
 from mi.core.common import BaseEnum
@@ -714,6 +713,8 @@ class Vel3dCdDclParser(SimpleParser):
         Derive instrument startup time from the datetime extracted from file name rounded to the nearest half hour.
         :return: Approximate NTP time of instrument startup
         """
+        import pandas as pd
+
         source_file_dir, source_file_name = os.path.split(self.source_file_path)
         m = re.match('^[0-9]{8}_[0-9]{6}', source_file_name)
         if not m:
@@ -16,8 +16,12 @@ __author__ = 'Steve Myerson (Raytheon)'
 __license__ = 'Apache 2.0'
 
 import calendar
+import itertools
 import struct
 
+import ntplib
+import numpy
+
 from mi.core.log import get_logger
 log = get_logger()
 
@@ -76,6 +80,25 @@ FSI_HEADER_SERIAL_NUMBER_SIZE = 4      # bytes in the serial number field
 #
 FSI_RECORD_FORMAT = '<5BH10f'  # format for unpacking data from FSI records
 
+# The same FSI Record Format, used to decode all the FSI records of a profile at once
+FSI_RECORD_DTYPE = numpy.dtype([
+    ('hour', 'u1'),
+    ('minute', 'u1'),
+    ('second', 'u1'),
+    ('month', 'u1'),
+    ('day', 'u1'),
+    ('year', '<u2'),
+    ('heading', '<f4'),
+    ('tx', '<f4'),
+    ('ty', '<f4'),
+    ('hx', '<f4'),
+    ('hy', '<f4'),
+    ('hz', '<f4'),
+    ('vp1', '<f4'),
+    ('vp2', '<f4'),
+    ('vp3', '<f4'),
+    ('vp4', '<f4')])
+
 # Keys to be used when generating particles.
 # Instrument values are extracted from the FSI Record.
 # Metadata values are extracted from the Time Record and the FSI Header.
@@ -174,50 +197,31 @@ class Vel3dLWfpInstrumentDataParticle(DataParticle):
         # Note that raw_data already contains the individual fields
         # extracted and unpacked from the data record.
         #
-        particle = []
-        field_index = 0
         fields = self.raw_data
 
-        for x in range(0, len(INSTRUMENT_PARTICLE_KEYS)):
-            key = INSTRUMENT_PARTICLE_KEYS[x][INDEX_PARTICLE_KEY]
-            data_type = INSTRUMENT_PARTICLE_KEYS[x][INDEX_VALUE_TYPE]
-
-            #
-            # The date time array data must be special-cased since multiple
-            # values from the parsed values are used for a single particle value.
-            #
-            if key == DATE_TIME_ARRAY:
-                #
-                # When generating the date time array field in the instrument particle,
-                # use these same values to generate the timestamp for this particle.
-                #
-                hour = fields[field_index]
-                minute = fields[field_index + 1]
-                second = fields[field_index + 2]
-                month = fields[field_index + 3]
-                day = fields[field_index + 4]
-                year = fields[field_index + 5]
-
-                timestamp = (year, month, day, hour, minute, second, 0, 0, 0)
-                elapsed_seconds = calendar.timegm(timestamp)
-                self.set_internal_timestamp(unix_time=elapsed_seconds)
+        #
+        # The date time array data must be special-cased since multiple
+        # values from the parsed values are used for a single particle value.
+        # When generating the date time array field in the instrument particle,
+        # use these same values to generate the timestamp for this particle,
+        # unless the parser already derived it with the rest of the profile.
+        #
+        hour, minute, second, month, day, year = fields[:DATE_TIME_SIZE]
 
-                #
-                # Generate the date time array to be stored in the particle.
-                #
-                date_time_array = [year, month, day, hour, minute, second]
-                particle_value = self._encode_value(key, date_time_array, data_type)
-                field_index += DATE_TIME_SIZE
+        if self.contents[DataParticleKey.INTERNAL_TIMESTAMP] is None:
+            timestamp = (year, month, day, hour, minute, second, 0, 0, 0)
+            elapsed_seconds = calendar.timegm(timestamp)
+            self.set_internal_timestamp(unix_time=elapsed_seconds)
 
-            else:
-                #
-                # Other particle values are extracted directly from the
-                # previously parsed fields.
-                #
-                particle_value = self._encode_value(key, fields[field_index], data_type)
-                field_index += 1
+        date_time_array = [year, month, day, hour, minute, second]
+        particle = [self._encode_value(DATE_TIME_ARRAY, date_time_array, list)]
 
-            particle.append(particle_value)
+        #
+        # Other particle values are extracted directly from the
+        # previously parsed fields.
+        #
+        for (key, data_type), value in zip(INSTRUMENT_PARTICLE_KEYS[1:], fields[DATE_TIME_SIZE:]):
+            particle.append(self._encode_value(key, value, data_type))
 
         return particle
 
@@ -338,7 +342,8 @@ class Vel3dLParser(Parser):
         """
         Given a list of groups of particle fields, generate particles for each group.
         Parameters:
-            fields - (particle type, (parsed values to be put into output particles))
+            fields - (particle type, (parsed values to be put into output particles),
+                internal timestamp or None)
         Returns:
             sample_count - number of samples found
             samples - list of samples found
@@ -362,10 +367,10 @@ class Vel3dLParser(Parser):
                 # Since the record has already been parsed,
                 # the individual fields are passed to be stored and used
                 # when generating the particle key/value pairs.
-                # Timestamp is None since the particle generation handles that.
+                # If the timestamp is None the particle generation handles that.
 
                 sample = self._extract_sample(particle_class, None,
-                                              fields[x][1])
+                                              fields[x][1], internal_timestamp=fields[x][2])
                 if sample:
                     # Add the particle to the list of particles
                     samples.append(sample)
@@ -413,88 +418,101 @@ class Vel3dLParser(Parser):
 
         records_expected = bytes_remaining / FSI_RECORD_SIZE
 
-        # As long as there is more data in the data_buffer.
+        if bytes_remaining <= 0:
+            return particle_fields
 
-        records_processed = 0
-        metadata_found = False
-        while bytes_remaining > 0:
-            fields = []
+        # Decode all the FSI records in one step.
+        # The fields of each record are in the order of FSI_RECORD_FORMAT.
 
-            # If there are enough bytes to comprise an FSI record and
-            # we haven't yet processed the expected number of FSI records,
-            # extract the fields from the FSI record.
+        records = numpy.frombuffer(data_buffer, dtype=FSI_RECORD_DTYPE,
+                                   count=records_expected, offset=start_index)
+        timestamps = self.fsi_record_timestamps(records)
 
-            if bytes_remaining >= FSI_RECORD_SIZE and \
-               records_processed != records_expected:
-                particle_type = instrument_particle_type
-                fields.append(particle_type)
+        particle_fields.extend(zip(itertools.repeat(instrument_particle_type), records.tolist(), timestamps))
 
-                fields.append(struct.unpack(FSI_RECORD_FORMAT,
-                              data_buffer[start_index: start_index + FSI_RECORD_SIZE]))
-                bytes_remaining -= FSI_RECORD_SIZE
-                start_index += FSI_RECORD_SIZE
-                records_processed += 1
+        records_processed = records_expected
+        start_index += records_expected * FSI_RECORD_SIZE
+        bytes_remaining -= records_expected * FSI_RECORD_SIZE
 
-            # Once all the FSI records have been processed,
-            # check for a decimation or time record (Metadata).
-            # If there are enough bytes to comprise a decimation record
-            # or a time record, extract the fields from the record.
+        # Once all the FSI records have been processed,
+        # check for a decimation or time record (Metadata).
+        # If there are enough bytes to comprise a decimation record
+        # or a time record, extract the fields from the record.
 
-            elif records_processed == records_expected and \
-                    not metadata_found and \
-                    (bytes_remaining == DECIMATION_RECORD_SIZE or
-                     bytes_remaining == TIME_RECORD_SIZE):
+        if bytes_remaining == DECIMATION_RECORD_SIZE or \
+                bytes_remaining == TIME_RECORD_SIZE:
 
-                # If it's a decimation record, extract time on, time off
-                # and the decimation factor.
+            # If it's a decimation record, extract time on, time off
+            # and the decimation factor.
 
-                particle_type = metadata_particle_type
-                fields.append(particle_type)
+            particle_type = metadata_particle_type
 
-                if bytes_remaining == DECIMATION_RECORD_SIZE:
+            if bytes_remaining == DECIMATION_RECORD_SIZE:
 
-                    (time_on, time_off, decimation) = \
-                        struct.unpack(DECIMATION_FORMAT, data_buffer[start_index: start_index + bytes_remaining])
+                (time_on, time_off, decimation) = \
+                    struct.unpack(DECIMATION_FORMAT, data_buffer[start_index: start_index + bytes_remaining])
 
-                    bytes_remaining -= DECIMATION_RECORD_SIZE
+            # If it's a time record, extract time on and time off,
+            # and set decimation to None.
 
-                # If it's a time record, extract time on and time off,
-                # and set decimation to None.
+            else:
+                (time_on, time_off) = \
+                    struct.unpack(TIME_FORMAT, data_buffer[start_index: start_index + bytes_remaining])
 
-                else:
-                    (time_on, time_off) = \
-                        struct.unpack(TIME_FORMAT, data_buffer[start_index: start_index + bytes_remaining])
+                decimation = None
 
-                    decimation = None
-                    bytes_remaining -= TIME_RECORD_SIZE
+            # Create the metadata fields depending on which metadata
+            # particle type is being created.
+            # The fields must be in the same order as the Particle Keys tables.
 
-                # Create the metadata fields depending on which metadata
-                # particle type is being created.
-                # The fields must be in the same order as the Particle Keys tables.
+            if particle_type == PARTICLE_TYPE_SIO_METADATA:
+                metadata = (time_stamp, time_on, time_off, serial_number,
+                            records_processed, decimation, time_stamp)
+            else:
+                metadata = (time_off, time_on, time_off, serial_number,
+                            records_processed)
 
-                if particle_type == PARTICLE_TYPE_SIO_METADATA:
-                    metadata = (time_stamp, time_on, time_off, serial_number,
-                                records_processed, decimation, time_stamp)
-                else:
-                    metadata = (time_off, time_on, time_off, serial_number,
-                                records_processed)
+            # The metadata particle sets its own timestamp.
+            particle_fields.append((particle_type, metadata, None))
 
-                fields.append(metadata)
-                metadata_found = True
+        # It's an error if we don't recognize any type of record
+        # of if we've processed everything we expected to and there's
+        # still more bytes remaining.
 
-            # It's an error if we don't recognize any type of record
-            # of if we've processed everything we expected to and there's
-            # still more bytes remaining.
+        elif bytes_remaining > 0:
+            self.report_error(SampleException, 'Improperly formatted input file')
 
-            else:
-                self.report_error(SampleException, 'Improperly formatted input file')
-                bytes_remaining = 0
-                particle_type = None
+        return particle_fields
 
-            if particle_type is not None:
-                particle_fields.append(fields)
+    @staticmethod
+    def fsi_record_timestamps(records):
+        """
+        Derive the internal timestamps of FSI records by column.
+        Parameters:
+            records - structured array of FSI_RECORD_DTYPE
+        Returns:
+            list of NTP timestamps, None for records whose date is not valid.
+            The particles of those records derive their own timestamp,
+            which reports the error.
+        """
+        years = records['year'].astype(numpy.int64)
+        months = records['month'].astype(numpy.int64)
+        valid = (months >= 1) & (months <= 12) & (years >= 1) & (years <= 9999)
 
-        return particle_fields
+        # days from the epoch to the first of the month, as calendar.timegm
+        month_days = ((years - 1970) * 12 + months - 1).astype('datetime64[M]').\
+            astype('datetime64[D]').astype(numpy.int64)
+
+        elapsed_seconds = (month_days + records['day'] - 1) * 86400 + \
+            records['hour'].astype(numpy.int64) * 3600 + \
+            records['minute'].astype(numpy.int64) * 60 + \
+            records['second']
+
+        timestamps = (elapsed_seconds + ntplib.NTP.NTP_DELTA).astype(numpy.float64).tolist()
+        for index in numpy.flatnonzero(~valid).tolist():
+            timestamps[index] = None
+
+        return timestamps
 
     def report_error(self, exception_class, error_message):
         """
@@ -12,12 +12,12 @@ initial release
 __author__ = 'Chris Goodrich'
 __license__ = 'Apache 2.0'
 
-import struct
-
 from mi.core.exceptions import RecoverableSampleException
 from mi.core.log import get_logger
 log = get_logger()
-from mi.dataset.parser.velpt_ab_particles import VelptAbDataParticle
+from mi.dataset.parser.velpt_ab_particles import VelptAbDataParticle, VelptAbDataParticleKey
+from mi.dataset.parser.velpt_ab_records import VelptAbScanStatus, scan_records, calculate_checksums, \
+    decode_data_records, DATA_RECORD_DTYPE
 from mi.dataset.dataset_parser import SimpleParser
 from mi.dataset.dataset_parser import DataSetDriverConfigKeys
 from mi.core.common import BaseEnum
@@ -146,6 +146,9 @@ class VelptAbParser(SimpleParser):
     HEAD_CONFIGURATION_ID = b'\x04'
     USER_CONFIGURATION_ID = b'\x00'
 
+    RECORD_IDS = (VELOCITY_DATA_ID, DIAGNOSTIC_HEADER_ID, DIAGNOSTIC_DATA_ID,
+                  HARDWARE_CONFIGURATION_ID, HEAD_CONFIGURATION_ID, USER_CONFIGURATION_ID)
+
     # This is used if the Diagnostics Header record is
     # bad or not present. The number of diagnostics records
     # expected is defaulted to 20 as that number seems common
@@ -164,6 +167,7 @@ class VelptAbParser(SimpleParser):
         self._record_buffer = []
         self._calculated_checksum = 0
         self._current_record = ''
+        self._current_data = None
         self._velocity_data = False
         self._diagnostic_header = False
         self._diagnostic_header_published = False
@@ -258,118 +262,68 @@ class VelptAbParser(SimpleParser):
 
         return status
 
-    def _bad_checksum(self, record, length, checksum):
-        """
-        Calculate the record checksum and compare it to
-        the checksum stored in the record. A bad checksum
-        will cause the record to be ignored. A warning
-        will be issued. Parsing continues.
-        :param record: the read-in record
-        :record_checksum: the checksum from the record
-        :return: boolean
+    def load_record(self, data, record, stored_checksum=None, calculated_checksum=None):
         """
-        # 46476 is the base value of the checksum given in the IDD as 0xB58C
-        self._calculated_checksum = 46476
-
-        for x in range(0, length-3, 2):
-            self._calculated_checksum += struct.unpack('<H', record[x:x+2])[0]
-
-        # Modulo 65536 is applied to the checksum to keep it a 16 bit value
-        self._calculated_checksum %= 65536
-
-        if self._calculated_checksum != checksum:
-            return True
-        else:
-            return False
-
-    def load_record(self, fh):
-        """
-        Attempt to load a data record.
-        :param fh: The file handle
+        Load a record found by the scan of the file, reporting
+        invalid bytes, malformed records and bad checksums.
+        :param data: The contents of the file
+        :param record: The ScannedRecord to load
+        :param stored_checksum: The checksum stored in a complete record
+        :param calculated_checksum: The checksum calculated from a complete record
         :return: boolean indicating success or failure
         """
-        record_start = 0
-
-        # Assume the operation will be successful
-        status = True
-
-        # Read the Sync byte
-        sync_byte = fh.read(1)
-
-        # If the first byte is a valid sync byte
-        # determine the record type and the record length.
-        if sync_byte == self.SYNC_MARKER:
-
-            # Need to capture the record start address for reading the entire record later
-            record_start = fh.tell() - 1
-
-            # Get the ID byte and see if it's a valid record
-            id_byte = fh.read(1)
-
-            if not self.good_record_type(id_byte):
-                status = False
-                log.warning('Found invalid ID byte: %d, at %d skipping to next byte',
-                            struct.unpack('B', id_byte)[0], fh.tell()-1)
+        if record.status == VelptAbScanStatus.INVALID_SYNC:
+            for position in xrange(record.offset, record.offset + record.length):
+                log.warning('Found invalid sync byte: %d at %d , skipping to next byte',
+                            ord(data[position]), position)
                 self._exception_callback(
-                    RecoverableSampleException('Found Invalid ID Byte, skipping to next byte'))
+                    RecoverableSampleException('Found Invalid Sync Byte, skipping to next byte'))
+            return False
 
-        elif sync_byte == '':  # Found the end of the file
-            self._end_of_file = True
-            status = False
-        else:
-            status = False
-            log.warning('Found invalid sync byte: %d at %d , skipping to next byte',
-                        struct.unpack('B', sync_byte)[0], fh.tell()-1)
+        if record.id_byte is not None and not self.good_record_type(record.id_byte):
+            log.warning('Found invalid ID byte: %d, at %d skipping to next byte',
+                        ord(record.id_byte), record.offset + 1)
             self._exception_callback(
-                RecoverableSampleException('Found Invalid Sync Byte, skipping to next byte'))
+                RecoverableSampleException('Found Invalid ID Byte, skipping to next byte'))
+            return False
 
-        # If the record is valid, read it
-        if status:
-            record_length = struct.unpack('<H', fh.read(2))[0]*2
-            fh.seek(record_start, 0)
-            self._current_record = fh.read(record_length)
+        if record.status == VelptAbScanStatus.MALFORMED:
+            # Found a malformed record at the end of the file.
+            self._end_of_file = True
+            log.warning('Last record in file was malformed')
+            self._exception_callback(
+                RecoverableSampleException('Last record in file malformed, no particle generated'))
+            return False
 
-            # If the length of what was read matches what we asked for,
-            # update the next record start position. Otherwise we found
-            # a malformed record at the end of the file. 
-            if len(self._current_record) == record_length:
+        self._current_record = data[record.offset:record.offset + record.length]
+        self._calculated_checksum = calculated_checksum
 
-                # Check that the checksum of this record is good
-                stored_checksum = struct.unpack('<H', self._current_record[(record_length-2):record_length])[0]
+        if stored_checksum != self._calculated_checksum:
 
-                if self._bad_checksum(self._current_record, record_length, stored_checksum):
+            # Did the checksum fail on a config record?
+            # If so, don't try to generate that part of
+            # the instrument metadata particle
+            self._build_hardware_config_data = False
+            self._build_head_config_data = False
+            self._build_user_config_data = False
 
-                    # Did the checksum fail on a config record?
-                    # If so, don't try to generate that part of
-                    # the instrument metadata particle
-                    self._build_hardware_config_data = False
-                    self._build_head_config_data = False
-                    self._build_user_config_data = False
-
-                    # Did the checksum fail on a diagnostic header record?
-                    if self._diagnostic_header:
-                        self._total_diagnostic_records = self.DEFAULT_DIAGNOSTICS_COUNT  # Use the default diag count
-                        self._bad_diagnostic_header = True
-                        self._sending_diagnostics = True  # The header is bad, the records may be okay
-                        log.warning('Diagnostic Header Invalid')
-                        self._exception_callback(
-                            RecoverableSampleException('Diagnostic Header Invalid, no particle generated'))
-
-                    log.warning('Invalid checksum: %d, expected %d - record will not be processed',
-                                stored_checksum, self._calculated_checksum)
-                    self._exception_callback(
-                        RecoverableSampleException('Invalid checksum, no particle generated'))
+            # Did the checksum fail on a diagnostic header record?
+            if self._diagnostic_header:
+                self._total_diagnostic_records = self.DEFAULT_DIAGNOSTICS_COUNT  # Use the default diag count
+                self._bad_diagnostic_header = True
+                self._sending_diagnostics = True  # The header is bad, the records may be okay
+                log.warning('Diagnostic Header Invalid')
+                self._exception_callback(
+                    RecoverableSampleException('Diagnostic Header Invalid, no particle generated'))
 
-                    status = False
+            log.warning('Invalid checksum: %d, expected %d - record will not be processed',
+                        stored_checksum, self._calculated_checksum)
+            self._exception_callback(
+                RecoverableSampleException('Invalid checksum, no particle generated'))
 
-            else:
-                self._end_of_file = True
-                status = False
-                log.warning('Last record in file was malformed')
-                self._exception_callback(
-                    RecoverableSampleException('Last record in file malformed, no particle generated'))
+            return False
 
-        return status
+        return True
 
     def build_instrument_metadata_particle(self, timestamp):
         """
@@ -432,7 +386,7 @@ class VelptAbParser(SimpleParser):
         which should have occurred prior to receiving a velocity record did not happen.
         """
         # Get the timestamp of the velocity record in case we need it for the metadata particle.
-        timestamp = VelptAbDataParticle.get_timestamp(self._current_record)
+        timestamp, velocity_data_dict = self._current_data
 
         # Check to see if the instrument metadata particle has been produced yet
         # If not, produce it now as this is the first velocity record. This assumes
@@ -471,8 +425,6 @@ class VelptAbParser(SimpleParser):
                     self._diagnostics_count = 0
                     self._total_diagnostic_records = 0
 
-        velocity_data_dict = VelptAbDataParticle.generate_data_dict(self._current_record)
-
         particle = self._extract_sample(self._velocity_data_class,
                                         None,
                                         velocity_data_dict,
@@ -488,10 +440,8 @@ class VelptAbParser(SimpleParser):
         # As diagnostics records have the same format as velocity records
         # you can use the same routine used to break down the velocity data
 
-        timestamp = VelptAbDataParticle.get_timestamp(self._current_record)
-        date_time_group = VelptAbDataParticle.get_date_time_string(self._current_record)
-
-        self._diagnostics_data_dict = VelptAbDataParticle.generate_data_dict(self._current_record)
+        timestamp, self._diagnostics_data_dict = self._current_data
+        date_time_group = self._diagnostics_data_dict[VelptAbDataParticleKey.DATE_TIME_STRING]
 
         # Check to see if the instrument metadata particle has been produced yet
         # If not, produce it now as this is the first diagnostics record. This assumes
@@ -537,16 +487,37 @@ class VelptAbParser(SimpleParser):
 
     def parse_file(self):
         """
-        Parser for velpt_ab data.
+        Parser for velpt_ab data. The whole file is scanned for records and
+        the checksums of all records are validated before any are processed.
         """
-        while not self._end_of_file:
+        data = self._file_handle.read()
+        records = scan_records(data, self.RECORD_IDS)
+
+        complete = [record for record in records if record.status == VelptAbScanStatus.RECORD]
+        stored_checksums, calculated_checksums = calculate_checksums(data, complete)
+        checksums = dict((record.offset, checksum) for record, checksum in
+                         zip(complete, zip(stored_checksums, calculated_checksums)))
+
+        # Decode all the good velocity and diagnostics data records at once
+        data_offsets = [record.offset for record in complete
+                        if record.id_byte in (self.VELOCITY_DATA_ID, self.DIAGNOSTIC_DATA_ID) and
+                        record.length >= DATA_RECORD_DTYPE.itemsize and
+                        checksums[record.offset][0] == checksums[record.offset][1]]
+        decoded = dict(zip(data_offsets, decode_data_records(data, data_offsets)))
+
+        for record in records:
 
             # Determine the type of record and load it for processing.
-            good_record = self.load_record(self._file_handle)
+            good_record = self.load_record(data, record, *checksums.get(record.offset, (None, None)))
 
             # Sequence through the various expected record types
             if good_record:
 
+                if self._velocity_data or self._diagnostic_data:
+                    self._current_data = decoded.get(record.offset) or \
+                        (VelptAbDataParticle.get_timestamp(self._current_record),
+                         VelptAbDataParticle.generate_data_dict(self._current_record))
+
                 if self._velocity_data:
                     self.process_velocity_data()
 
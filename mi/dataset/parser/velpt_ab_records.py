@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+"""
+@package mi.dataset.parser
+@file /mi/dataset/parser/velpt_ab_records.py
+@brief Block scanning of the binary Aquadopp records of the velpt_ab and velpt_ab_dcl data sets
+
+The whole file is scanned once for record boundaries, skipping over the bytes
+between records with str.find rather than reading them one at a time. The
+checksums of all records are then calculated with numpy over the 16 bit words
+of the records, grouped by record length, and the velocity and diagnostics data
+records are decoded from a structured numpy dtype.
+"""
+
+import calendar
+import struct
+from collections import namedtuple
+
+import ntplib
+import numpy
+
+from mi.core.common import BaseEnum
+from mi.dataset.parser.velpt_ab_particles import VelptAbDataParticleKey
+
+# This marks the first byte in all record types.
+SYNC_MARKER = b'\xA5'
+
+# Sync byte, ID byte and the record size in 16 bit words
+HEADER_SIZE = 4
+CHECKSUM_SIZE = 2
+
+# The base value of the checksum given in the IDD
+CHECKSUM_BASE = 0xB58C
+
+# Number of records gathered into one numpy array when calculating checksums or decoding
+BLOCK_RECORDS = 4096
+
+# Sample Aquadopp Velocity Data Record (42 bytes), diagnostics data records share the layout
+DATA_RECORD_DTYPE = numpy.dtype([
+    ('sync', 'u1'),
+    ('id', 'u1'),
+    ('size', '<u2'),
+    ('minute', 'u1'),
+    ('second', 'u1'),
+    ('day', 'u1'),
+    ('hour', 'u1'),
+    ('year', 'u1'),
+    ('month', 'u1'),
+    (VelptAbDataParticleKey.ERROR_CODE, '<u2'),
+    (VelptAbDataParticleKey.ANALOG1, '<u2'),
+    (VelptAbDataParticleKey.BATTERY_VOLTAGE_DV, '<u2'),
+    (VelptAbDataParticleKey.SOUND_SPEED_DMS, '<u2'),
+    (VelptAbDataParticleKey.HEADING_DECIDEGREE, '<i2'),
+    (VelptAbDataParticleKey.PITCH_DECIDEGREE, '<i2'),
+    (VelptAbDataParticleKey.ROLL_DECIDEGREE, '<i2'),
+    ('pressure_msb', 'u1'),
+    (VelptAbDataParticleKey.STATUS, 'u1'),
+    ('pressure_lsw', '<u2'),
+    (VelptAbDataParticleKey.TEMPERATURE_CENTIDEGREE, '<i2'),
+    (VelptAbDataParticleKey.VELOCITY_BEAM1, '<i2'),
+    (VelptAbDataParticleKey.VELOCITY_BEAM2, '<i2'),
+    (VelptAbDataParticleKey.VELOCITY_BEAM3, '<i2'),
+    (VelptAbDataParticleKey.AMPLITUDE_BEAM1, 'u1'),
+    (VelptAbDataParticleKey.AMPLITUDE_BEAM2, 'u1'),
+    (VelptAbDataParticleKey.AMPLITUDE_BEAM3, 'u1'),
+    ('fill', 'u1'),
+    ('checksum', '<u2')])
+
+# Fields of the data record copied to the particle unchanged
+DATA_RECORD_VALUES = [VelptAbDataParticleKey.ERROR_CODE,
+                      VelptAbDataParticleKey.ANALOG1,
+                      VelptAbDataParticleKey.BATTERY_VOLTAGE_DV,
+                      VelptAbDataParticleKey.SOUND_SPEED_DMS,
+                      VelptAbDataParticleKey.HEADING_DECIDEGREE,
+                      VelptAbDataParticleKey.PITCH_DECIDEGREE,
+                      VelptAbDataParticleKey.ROLL_DECIDEGREE,
+                      VelptAbDataParticleKey.STATUS,
+                      VelptAbDataParticleKey.TEMPERATURE_CENTIDEGREE,
+                      VelptAbDataParticleKey.VELOCITY_BEAM1,
+                      VelptAbDataParticleKey.VELOCITY_BEAM2,
+                      VelptAbDataParticleKey.VELOCITY_BEAM3,
+                      VelptAbDataParticleKey.AMPLITUDE_BEAM1,
+                      VelptAbDataParticleKey.AMPLITUDE_BEAM2,
+                      VelptAbDataParticleKey.AMPLITUDE_BEAM3]
+
+# Binary Coded Decimal bytes as a value and as two digit characters, matching
+# the conversions of the particle classes for bytes which are not valid BCD
+BCD_VALUES = [(value >> 4) * 10 + (value & 0x0F) for value in range(256)]
+BCD_STRINGS = [chr((value >> 4) + 48) + chr((value & 0x0F) + 48) for value in range(256)]
+
+RECORD_SIZE = struct.Struct('<H')
+
+
+class VelptAbScanStatus(BaseEnum):
+    """
+    What was found at a position of the file
+    """
+    RECORD = 'record'              # a complete record with a known ID
+    INVALID_SYNC = 'invalid_sync'  # a run of bytes which are not a sync byte
+    INVALID_ID = 'invalid_id'      # a sync byte followed by an unknown ID byte
+    MALFORMED = 'malformed'        # a record cut short by the end of the file
+
+
+ScannedRecord = namedtuple('ScannedRecord', 'status, offset, id_byte, length')
+
+
+def scan_records(data, record_ids):
+    """
+    Find the boundaries of all the records in a file in one pass
+    :param data: The contents of the file
+    :param record_ids: The ID bytes of the known record types
+    :return: List of ScannedRecord in file order. Each run of bytes between
+     records is a single INVALID_SYNC entry with the length of the run.
+    """
+    records = []
+    position = 0
+    end = len(data)
+
+    while position < end:
+        sync = data.find(SYNC_MARKER, position)
+        if sync == -1:
+            sync = end
+
+        if sync > position:
+            records.append(ScannedRecord(VelptAbScanStatus.INVALID_SYNC, position, None, sync - position))
+            position = sync
+            continue
+
+        if position + 1 == end:
+            records.append(ScannedRecord(VelptAbScanStatus.MALFORMED, position, None, 1))
+            break
+
+        id_byte = data[position + 1]
+        if id_byte not in record_ids:
+            records.append(ScannedRecord(VelptAbScanStatus.INVALID_ID, position, id_byte, 2))
+            position += 2
+            continue
+
+        if position + HEADER_SIZE > end:
+            records.append(ScannedRecord(VelptAbScanStatus.MALFORMED, position, id_byte, end - position))
+            break
+
+        # A record always covers its own header, even if the size is corrupt
+        length = max(RECORD_SIZE.unpack_from(data, position + 2)[0] * 2, HEADER_SIZE)
+        if position + length > end:
+            records.append(ScannedRecord(VelptAbScanStatus.MALFORMED, position, id_byte, end - position))
+            break
+
+        records.append(ScannedRecord(VelptAbScanStatus.RECORD, position, id_byte, length))
+        position += length
+
+    return records
+
+
+def calculate_checksums(data, records):
+    """
+    Calculate the checksums of records, the modulo 65536 sum of the
+    16 bit words of the record before the stored checksum plus the base value
+    :param data: The contents of the file
+    :param records: The ScannedRecord entries of complete records
+    :return: Tuple of the lists of the stored and the calculated checksums
+    """
+    stored = [0] * len(records)
+    calculated = [0] * len(records)
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+
+    by_length = {}
+    for index, record in enumerate(records):
+        by_length.setdefault(record.length, []).append(index)
+
+    for length, indices in by_length.iteritems():
+        summed = length - CHECKSUM_SIZE
+        columns = numpy.arange(length)
+
+        for start in xrange(0, len(indices), BLOCK_RECORDS):
+            chunk = indices[start:start + BLOCK_RECORDS]
+            offsets = numpy.array([records[index].offset for index in chunk], dtype=numpy.int64)
+            words = buf[offsets[:, None] + columns].view('<u2')
+
+            sums = (words[:, :summed / 2].sum(axis=1, dtype=numpy.int64) + CHECKSUM_BASE) % 65536
+            for index, stored_checksum, calculated_checksum in zip(chunk, words[:, -1].tolist(), sums.tolist()):
+                stored[index] = stored_checksum
+                calculated[index] = calculated_checksum
+
+    return stored, calculated
+
+
+def decode_data_records(data, offsets):
+    """
+    Decode velocity or diagnostics data records
+    :param data: The contents of the file
+    :param offsets: The offsets of the records in the file, each record at
+     least DATA_RECORD_DTYPE.itemsize bytes long
+    :return: List of tuples of the record timestamp and the dictionary of the
+     particle values, as built by generate_data_dict of the particle classes
+    """
+    decoded = []
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    columns = numpy.arange(DATA_RECORD_DTYPE.itemsize)
+
+    for start in xrange(0, len(offsets), BLOCK_RECORDS):
+        index = numpy.array(offsets[start:start + BLOCK_RECORDS], dtype=numpy.int64)[:, None] + columns
+        decoded.extend(_decode_data_block(buf[index].view(DATA_RECORD_DTYPE)[:, 0]))
+
+    return decoded
+
+
+def _decode_data_block(records):
+    """
+    Convert a structured array of data records to particle values
+    """
+    years = records['year'].tolist()
+    months = records['month'].tolist()
+    days = records['day'].tolist()
+    hours = records['hour'].tolist()
+    minutes = records['minute'].tolist()
+    seconds = records['second'].tolist()
+    pressures = ((records['pressure_msb'].astype(numpy.int64) << 16) + records['pressure_lsw']).tolist()
+    columns = [records[name].tolist() for name in DATA_RECORD_VALUES]
+
+    decoded = []
+    for i in xrange(len(records)):
+        date_time_string = '20%s/%s/%s %s:%s:%s' % (BCD_STRINGS[years[i]], BCD_STRINGS[months[i]],
+                                                    BCD_STRINGS[days[i]], BCD_STRINGS[hours[i]],
+                                                    BCD_STRINGS[minutes[i]], BCD_STRINGS[seconds[i]])
+        elapsed_seconds = calendar.timegm((2000 + BCD_VALUES[years[i]], BCD_VALUES[months[i]],
+                                           BCD_VALUES[days[i]], BCD_VALUES[hours[i]],
+                                           BCD_VALUES[minutes[i]], BCD_VALUES[seconds[i]], 0, 0, 0))
+
+        values = dict(zip(DATA_RECORD_VALUES, [column[i] for column in columns]))
+        values[VelptAbDataParticleKey.DATE_TIME_STRING] = date_time_string
+        values[VelptAbDataParticleKey.PRESSURE_MBAR] = pressures[i]
+
+        decoded.append((float(ntplib.system_to_ntp_time(elapsed_seconds)), values))
+
+    return decoded
@@ -48,7 +48,6 @@ from mi.core.log import get_logger, get_logging_metaclass
 from mi.dataset.dataset_parser import SimpleParser
 from mi.core.common import BaseEnum
 from datetime import datetime
-from mi.common.zpls_plot import ZPLSPlot
 from mi.dataset.driver.zplsc_c.zplsc_c_echogram import ZPLSCCEchogram
 
 log = get_logger()
@@ -323,12 +322,15 @@ class ZplscCParser(SimpleParser):
             self.ph = AzfpProfileHeader()
             self.find_next_record()
 
-    def create_echogram(self, echogram_file_path=None):
+    def parse_echogram_data(self):
         """
-        Parse the *.O1A zplsc_c data file and create the echogram from this data.
+        Parse the *.O1A zplsc_c data and compute the volume backscatter of each profile.
 
-        :param echogram_file_path: Path to store the echogram locally.
-        :return:
+        :return: data_times: Array of the profile timestamps (seconds since 01-01-1900)
+                 sv_dict: Mapping of the channel number to the array of the profile Sv values.
+                 frequencies: Mapping of the channel number to the channel frequency.
+                 depth_range: Depth range of each channel of the last profile.
+                 None is returned if the stream could not be read.
         """
 
         sv_dict = {}
@@ -336,10 +338,6 @@ class ZplscCParser(SimpleParser):
         frequencies = {}
         depth_range = []
 
-        input_file_path = self._stream_handle.name
-        log.info('Begin processing echogram data: %r', input_file_path)
-        image_path = generate_image_file_path(input_file_path, echogram_file_path)
-
         self.ph = AzfpProfileHeader()
         self.find_next_record()
         while self._stream_handle.readinto(self.ph):
@@ -358,7 +356,7 @@ class ZplscCParser(SimpleParser):
 
             except (IOError, OSError) as ex:
                 self._exception_callback(ex)
-                return
+                return None
             except struct.error as ex:
                 self._exception_callback(ex)
             except exceptions.ValueError as ex:
@@ -370,17 +368,51 @@ class ZplscCParser(SimpleParser):
             self.ph = AzfpProfileHeader()
             self.find_next_record()
 
-        log.info('Completed processing all data: %r', input_file_path)
-
         data_times = np.array(data_times)
 
         for channel in sv_dict:
             sv_dict[channel] = np.array(sv_dict[channel])
 
-        log.info('Begin generating echogram: %r', image_path)
+        return data_times, sv_dict, frequencies, depth_range
+
+    def create_echogram(self, echogram_file_path=None):
+        """
+        Parse the *.O1A zplsc_c data file and create the echogram from this data.
+
+        :param echogram_file_path: Path to store the echogram locally.
+        :return:
+        """
+
+        input_file_path = self._stream_handle.name
+        log.info('Begin processing echogram data: %r', input_file_path)
+        image_path = generate_image_file_path(input_file_path, echogram_file_path)
+
+        echogram_data = self.parse_echogram_data()
+        if echogram_data is None:
+            return
+
+        log.info('Completed processing all data: %r', input_file_path)
+
+        generate_echogram(image_path, *echogram_data)
+
+
+def generate_echogram(image_path, data_times, sv_dict, frequencies, depth_range):
+    """
+    Plot the volume backscatter of the zplsc_c profiles and write the echogram image.
+
+    :param image_path: File path of the echogram image.
+    :param data_times: Array of the profile timestamps (seconds since 01-01-1900)
+    :param sv_dict: Mapping of the channel number to the array of the profile Sv values.
+    :param frequencies: Mapping of the channel number to the channel frequency.
+    :param depth_range: Depth range of each channel.
+    :return:
+    """
+
+    log.info('Begin generating echogram: %r', image_path)
 
-        plot = ZPLSPlot(data_times, sv_dict, frequencies, depth_range[0][-1], depth_range[0][0])
-        plot.generate_plots()
-        plot.write_image(image_path)
+    from mi.common.zpls_plot import ZPLSPlot
+    plot = ZPLSPlot(data_times, sv_dict, frequencies, depth_range[0][-1], depth_range[0][0])
+    plot.generate_plots()
+    plot.write_image(image_path)
 
-        log.info('Completed generating echogram: %r', image_path)
+    log.info('Completed generating echogram: %r', image_path)
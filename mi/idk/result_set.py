@@ -69,9 +69,19 @@ data:
      pressure: 161.16
      oxygen: 2693.1
 
+Result set files are compiled once: validated, with timestamp strings converted to ntp and rounding
+applied to the expected values, and the compiled result set is cached in memory and pickled to
+RESULT_SET_CACHE_DIR keyed by the hash of the file contents, so an unchanged file is not parsed again.
+The cache directory is private to the user, and cached files not owned by the user are not unpickled.
 """
 
+import cPickle as pickle
+import hashlib
 import json
+import os
+import stat
+import tempfile
+
 import yaml
 import numpy
 
@@ -93,6 +103,29 @@ TYPE_KEY = 'particle_type'
 MULTIPLE = 'MULTIPLE'
 INDEX = '_index'
 
+# keys of an expected particle which are not compared with the particle values
+IGNORE_KEYS = [INDEX, DataParticleKey.NEW_SEQUENCE,
+               DataParticleKey.INTERNAL_TIMESTAMP,
+               DataParticleKey.PORT_TIMESTAMP,
+               OBJECT_KEY, TYPE_KEY]
+
+# value types compared with a simple equality test
+SIMPLE_TYPES = (int, long, bool, str, unicode, type(None))
+
+# bump when the compiled form changes to ignore previously cached result sets
+COMPILED_VERSION = 1
+# per user cache directory, following the XDG base directory convention
+RESULT_SET_CACHE_DIR = os.environ.get('MI_RESULT_SET_CACHE',
+                                      os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                                                  os.path.expanduser(os.path.join('~', '.cache'))),
+                                                   'mi_result_set'))
+
+# compiled result sets by content hash
+_compiled_result_sets = {}
+
+# use the libyaml loader when available
+YAML_LOADER = getattr(yaml, 'CLoader', yaml.Loader)
+
 
 class ResultSet(object):
     """
@@ -105,29 +138,99 @@ class ResultSet(object):
         :param result_file_path: The file path of the .yml file
         """
         log.debug("read result file: %s" % result_file_path)
-        stream = file(result_file_path, 'r')
+        self._result_set_header, self._result_set_data = ResultSet._load(result_file_path)
+
+    @staticmethod
+    def _load(result_file_path):
+        """
+        Get the compiled result set of a file from the memory or disk cache, compiling and caching it if
+        it is not cached
+        :param result_file_path: The file path of the .yml file
+        :return: tuple of the result set header and the dictionary of particles by index
+        """
+        with open(result_file_path, 'rb') as stream:
+            contents = stream.read()
+
+        # the extension selects the format the contents are parsed with
+        extension = os.path.splitext(result_file_path)[1]
+        key = '%s-%d' % (hashlib.sha1(extension + contents).hexdigest(), COMPILED_VERSION)
+        compiled = _compiled_result_sets.get(key)
+        if compiled is not None:
+            return compiled
 
+        cache_path = os.path.join(RESULT_SET_CACHE_DIR, key + '.pickle')
+        compiled = ResultSet._read_cache(cache_path)
+        if compiled is None:
+            compiled = ResultSet._compile(result_file_path, contents)
+            ResultSet._write_cache(cache_path, compiled)
+
+        _compiled_result_sets[key] = compiled
+        return compiled
+
+    @staticmethod
+    def _read_cache(cache_path):
+        """
+        Unpickle a compiled result set from the disk cache.  Only files owned by the user and not writable
+        by other users are unpickled.
+        :param cache_path: The file path of the pickled result set
+        :return: tuple of the result set header and the dictionary of particles by index, None if not cached
+        """
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                status = os.fstat(cache_file.fileno())
+                if status.st_uid != os.getuid() or status.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                    log.warn("ignoring cached result set %s, it is not private to the user", cache_path)
+                    return None
+                return pickle.load(cache_file)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+
+    @staticmethod
+    def _write_cache(cache_path, compiled):
+        """
+        Pickle a compiled result set to the disk cache, failures to write are not errors
+        """
+        try:
+            if not os.path.isdir(RESULT_SET_CACHE_DIR):
+                os.makedirs(RESULT_SET_CACHE_DIR, 0700)
+            # write to a temporary file and rename so readers never see a partial file
+            handle, temp_path = tempfile.mkstemp(dir=RESULT_SET_CACHE_DIR)
+            with os.fdopen(handle, 'wb') as cache_file:
+                pickle.dump(compiled, cache_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, cache_path)
+        except (IOError, OSError) as e:
+            log.debug("unable to cache result set %s: %s", cache_path, e)
+
+    @staticmethod
+    def _compile(result_file_path, contents):
+        """
+        Parse the result set file contents, confirm it is formatted as expected and prepare the expected
+        values for comparison
+        :param result_file_path: The file path of the .yml file
+        :param contents: The contents of the file
+        :return: tuple of the result set header and the dictionary of particles by index
+        """
         if result_file_path.endswith('.yml') or result_file_path.endswith('.yaml'):
-            result_set = yaml.load(stream)
+            result_set = yaml.load(contents, Loader=YAML_LOADER)
         elif result_file_path.endswith('json'):
-            result_set = json.load(stream)
+            result_set = json.loads(contents)
         else:
             result_set = {}
 
         # confirm the yml has a 'header' section
-        self._result_set_header = result_set.get("header")
-        if not self._result_set_header:
+        result_set_header = result_set.get("header")
+        if not result_set_header:
             ResultSet.log_and_raise_ioerror("Missing result set header")
 
         # check for required particle object and particle type fields, if not present raise error
-        if self._result_set_header.get(OBJECT_KEY) is None:
+        if result_set_header.get(OBJECT_KEY) is None:
             ResultSet.log_and_raise_ioerror("header particle_object not defined")
 
-        if self._result_set_header.get(TYPE_KEY) is None:
+        if result_set_header.get(TYPE_KEY) is None:
             ResultSet.log_and_raise_ioerror("header particle_type not defined")
 
         # confirm the yml has a 'data' section
-        self._result_set_data = {}
+        result_set_data = {}
         data = result_set.get("data")
         if not data:
             ResultSet.log_and_raise_ioerror("Missing 'data' section from yml file")
@@ -139,7 +242,7 @@ class ResultSet(object):
                 if index is None:
                     ResultSet.log_and_raise_ioerror("Particle definition missing _index: %s" % particle)
 
-                if self._result_set_data.get(index) is not None:
+                if result_set_data.get(index) is not None:
                     ResultSet.log_and_raise_ioerror("Duplicate particle definition for _index %s: %s" %
                                                     (index, particle))
 
@@ -147,7 +250,38 @@ class ResultSet(object):
                 ResultSet.log_and_raise_ioerror("Yml not formatted properly to make a particle dictionary")
 
             # store the particle by its index for comparison
-            self._result_set_data[index] = particle
+            result_set_data[index] = ResultSet._compile_particle(particle)
+
+        return result_set_header, result_set_data
+
+    @staticmethod
+    def _compile_particle(particle):
+        """
+        Convert timestamp strings to ntp and round the expected values requesting it, so this is not
+        repeated for each verification.  Values which would fail to convert are left for verification
+        to report.
+        :param particle: The expected particle dictionary from the yml
+        :return: The expected particle dictionary
+        """
+        for timestamp_key in [DataParticleKey.INTERNAL_TIMESTAMP, DataParticleKey.PORT_TIMESTAMP]:
+            timestamp = particle.get(timestamp_key)
+            if isinstance(timestamp, str):
+                try:
+                    timestamp = string_to_ntp_date_time(timestamp)
+                except (IOError, ValueError):
+                    continue
+                # a zero timestamp would be treated as missing
+                if timestamp:
+                    particle[timestamp_key] = timestamp
+
+        for key, value in particle.iteritems():
+            if key not in IGNORE_KEYS and isinstance(value, dict) and DataParticleKey.VALUE in value:
+                value = ResultSet._perform_round(value[DataParticleKey.VALUE], value.get('round'))
+                # a None expected value would be ignored rather than compared
+                if value is not None:
+                    particle[key] = value
+
+        return particle
 
     @staticmethod
     def log_and_raise_ioerror(message):
@@ -209,19 +343,104 @@ class ResultSet(object):
         - Verify order based on _index
         - Verify parameter data values
         - Verify there are extra or missing parameters
+        The parameter values of all particles are compared column by column first, particles with
+        differing values are compared again one value at a time to report the errors.
         :param particles: All particles to compare
         """
+        particle_dicts = [ResultSet._particle_as_dict(particle) for particle in particles]
+        expected_particles = [self._result_set_data.get(index) for index in xrange(1, len(particles) + 1)]
+        values_equal = ResultSet._are_columns_equal(particle_dicts, expected_particles)
+
         result = True
-        index = 1
-        for particle in particles:
+        for particle, particle_dict, particle_expected, particle_values_equal in \
+                zip(particles, particle_dicts, expected_particles, values_equal):
             # find any errors in comparing this particle to the yml at this index
-            if not self._get_particle_data_errors(particle, self._result_set_data.get(index)):
+            if not self._get_particle_data_errors(particle, particle_expected, particle_dict, particle_values_equal):
                 result = False
 
-            index += 1
-
         return result
 
+    @staticmethod
+    def _are_columns_equal(particle_dicts, expected_particles):
+        """
+        Compare the parameter values of all particles in bulk, by parameter.  Float values and lists of
+        floats are compared as arrays with the tolerance and nan handling of _are_values_equal, other
+        scalar values with a simple compare.  Nothing is logged here.
+        :param particle_dicts: The received particles as dictionaries
+        :param expected_particles: The expected particle dictionaries from the yml
+        :return: list with True for each particle whose values all match, False if any value does not
+        match or could not be compared in bulk
+        """
+        values_equal = [False] * len(particle_dicts)
+        columns = {}
+
+        for index, (received_dict, particle_expected) in enumerate(zip(particle_dicts, expected_particles)):
+            if particle_expected is None or DataParticleKey.VALUES not in received_dict:
+                continue
+
+            received_values = [(value[DataParticleKey.VALUE_ID], value[DataParticleKey.VALUE])
+                               for value in received_dict[DataParticleKey.VALUES]]
+            expected_keys = [key for key in particle_expected if key not in IGNORE_KEYS]
+            if sorted(expected_keys) != sorted(key for key, _ in received_values):
+                continue
+
+            values_equal[index] = True
+            for key, value in received_values:
+                columns.setdefault(key, []).append((index, particle_expected[key], value))
+
+        for column in columns.itervalues():
+            floats = []
+            float_lists = {}
+            for index, expected, received in column:
+                if expected is None:
+                    continue
+                elif type(expected) is float and type(received) is float:
+                    floats.append((index, expected, received))
+                elif type(expected) in SIMPLE_TYPES or type(received) in SIMPLE_TYPES:
+                    if expected != received:
+                        values_equal[index] = False
+                elif ResultSet._is_float_list(expected) and ResultSet._is_float_list(received) and \
+                        len(expected) == len(received):
+                    float_lists.setdefault(len(expected), []).append((index, expected, received))
+                else:
+                    values_equal[index] = False
+
+            for rows in [floats] + float_lists.values():
+                if not rows:
+                    continue
+                indices, expected, received = zip(*rows)
+                for index, equal in zip(indices, ResultSet._are_floats_equal(expected, received)):
+                    if not equal:
+                        values_equal[index] = False
+
+        return values_equal
+
+    @staticmethod
+    def _is_float_list(value):
+        """
+        :return: True if the value is a non-empty list of floats
+        """
+        return type(value) is list and len(value) > 0 and all(type(item) is float for item in value)
+
+    @staticmethod
+    def _are_floats_equal(expected, received):
+        """
+        Compare floats or equal length lists of floats, nans must occur in the same locations and other
+        values must be within FLOAT_ALLOWED_DIFF
+        :param expected: sequence of expected floats or lists of floats
+        :param received: sequence of received floats or lists of floats
+        :return: boolean array, True for each pair which matches
+        """
+        expected_array = numpy.array(expected)
+        received_array = numpy.array(received)
+        with numpy.errstate(invalid='ignore'):
+            # differences involving nans are never greater than the allowed difference
+            equal = (numpy.isnan(expected_array) == numpy.isnan(received_array)) & \
+                ~(numpy.abs(expected_array - received_array) > FLOAT_ALLOWED_DIFF)
+        if equal.ndim > 1:
+            equal = equal.all(axis=1)
+        return equal
+
     @staticmethod
     def _are_classes_equal(particle, expected_object):
         """
@@ -294,15 +513,19 @@ class ResultSet(object):
 
         return True
 
-    def _get_particle_data_errors(self, particle_received, particle_expected):
+    def _get_particle_data_errors(self, particle_received, particle_expected, received_dict=None,
+                                  values_equal=False):
         """
         Verify that all data parameters are present and have the
         expected value
         :param: particle_received
         :param: particle_expected
+        :param: received_dict particle_received as a dictionary, if already converted
+        :param: values_equal True if the values are already known to match
         :returns: List of error strings
         """
-        received_dict = ResultSet._particle_as_dict(particle_received)
+        if received_dict is None:
+            received_dict = ResultSet._particle_as_dict(particle_received)
         log.debug("Particle to test: %s", received_dict)
         log.debug("Particle definition: %s", particle_expected)
 
@@ -326,16 +549,16 @@ class ResultSet(object):
             if not ResultSet._are_classes_equal(particle_received, particle_expected.get(OBJECT_KEY)):
                 return False
 
-            if not ResultSet._are_streams_equal(particle_received, particle_expected.get(TYPE_KEY, None)):
+            if not ResultSet._are_streams_equal(received_dict, particle_expected.get(TYPE_KEY, None)):
                 return False
 
+        # the keys and values were compared in bulk
+        if values_equal:
+            return True
+
         expected_keys = particle_expected.keys()
-        ignore_list = [INDEX, DataParticleKey.NEW_SEQUENCE,
-                       DataParticleKey.INTERNAL_TIMESTAMP,
-                       DataParticleKey.PORT_TIMESTAMP,
-                       OBJECT_KEY, TYPE_KEY]
         # remove keys in ignore list from expected_keys, these are specifically ignored or were already handled
-        expected_keys = filter(lambda x: x not in ignore_list, expected_keys)
+        expected_keys = filter(lambda x: x not in IGNORE_KEYS, expected_keys)
 
         # the received dictionary contains an array of dictionaries {value_id: KEY, value: VALUE}
         # reformat into a list of value keys
@@ -9,8 +9,15 @@
 __author__ = 'Emily Hahn'
 __license__ = 'Apache 2.0'
 
+import os
+import shutil
+import tempfile
+
 import numpy
+from mock import patch
 from mi.core.unit_test import MiUnitTest
+from mi.core.time_tools import string_to_ntp_date_time
+from mi.idk import result_set
 from mi.idk.result_set import ResultSet
 from mi.core.instrument.dataset_data_particle import DataParticleKey
 
@@ -264,6 +271,87 @@ class ResultSetUnitTest(MiUnitTest):
         if not rs.verify([fdp_dict]):
             self.fail("Failed particle verification")
 
+    def test_compiled_cache(self):
+        """
+        Test that compiled result sets are cached in memory and on disk and match the compiled file
+        """
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with patch.object(result_set, 'RESULT_SET_CACHE_DIR', cache_dir), \
+                    patch.object(result_set, '_compiled_result_sets', {}):
+                rs = ResultSet(TEST_PATH + 'column_compare.yml')
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                # timestamp strings are converted and rounding is applied when compiled
+                self.assertEqual(rs._result_set_data[1]['internal_timestamp'],
+                                 string_to_ntp_date_time('2014-01-01T00:00:00.0Z'))
+                self.assertEqual(rs._result_set_data[1]['param_4'], 1.23)
+
+                # loaded from the pickle once the memory cache is cleared
+                result_set._compiled_result_sets.clear()
+                with patch.object(ResultSet, '_compile') as compile_mock:
+                    cached = ResultSet(TEST_PATH + 'column_compare.yml')
+                    self.assertFalse(compile_mock.called)
+                self.assertEqual(cached._result_set_header, rs._result_set_header)
+                # compared as strings as nan != nan
+                self.assertEqual(str(sorted((index, sorted(particle.items()))
+                                            for index, particle in cached._result_set_data.items())),
+                                 str(sorted((index, sorted(particle.items()))
+                                            for index, particle in rs._result_set_data.items())))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_untrusted_cache(self):
+        """
+        Test that a cached result set writable by other users is compiled again rather than unpickled
+        """
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with patch.object(result_set, 'RESULT_SET_CACHE_DIR', cache_dir), \
+                    patch.object(result_set, '_compiled_result_sets', {}):
+                ResultSet(TEST_PATH + 'column_compare.yml')
+                cache_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+                os.chmod(cache_path, 0666)
+
+                result_set._compiled_result_sets.clear()
+                with patch.object(result_set.pickle, 'load') as load_mock:
+                    rs = ResultSet(TEST_PATH + 'column_compare.yml')
+                    self.assertFalse(load_mock.called)
+                self.assertEqual(rs._result_set_data[1]['param_4'], 1.23)
+
+                # the compiled result set replaces the untrusted file
+                self.assertEqual(os.stat(cache_path).st_mode & 0777, 0600)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_column_compare(self):
+        """
+        Test that particles compared in bulk pass, and that a mismatch is reported for the particle it is in
+        """
+        rs = ResultSet(TEST_PATH + 'column_compare.yml')
+        particles = [fake_particle_dict('2014-01-01T00:00:00.0Z', 'ABC', 3.2, [1.5, numpy.nan], 1.23),
+                     fake_particle_dict('2014-01-01T00:00:01.0Z', 'DEF', 4.2, [2.5, 3.5], 2.35),
+                     fake_particle_dict('2014-01-01T00:00:02.0Z', 'GHI', 5.2000001, [3.5, 4.5], 3.46)]
+        self.assertTrue(rs.verify(particles))
+
+        # mismatches in a float, a list of floats and a string
+        particles[0]['values'][1]['value'] = 3.3
+        particles[1]['values'][2]['value'] = [2.5, numpy.nan]
+        particles[2]['values'][0]['value'] = 'XYZ'
+        with patch.object(result_set.log, 'error') as error_mock:
+            self.assertFalse(rs.verify(particles))
+        self.assertEqual([call[0][1] for call in error_mock.call_args_list], ['param_2', 'param_3', 'param_1'])
+
+
+def fake_particle_dict(timestamp, param_1, param_2, param_3, param_4):
+    """
+    Create a particle dictionary as generated by a particle of the fake particle stream
+    """
+    return {DataParticleKey.STREAM_NAME: 'fake_particle_stream',
+            DataParticleKey.INTERNAL_TIMESTAMP: string_to_ntp_date_time(timestamp),
+            DataParticleKey.VALUES: [{DataParticleKey.VALUE_ID: 'param_1', DataParticleKey.VALUE: param_1},
+                                     {DataParticleKey.VALUE_ID: 'param_2', DataParticleKey.VALUE: param_2},
+                                     {DataParticleKey.VALUE_ID: 'param_3', DataParticleKey.VALUE: param_3},
+                                     {DataParticleKey.VALUE_ID: 'param_4', DataParticleKey.VALUE: param_4}]}
 
 
 # create a fake data particle class for testing with
@@ -1,5 +1,7 @@
 import ntplib
 import cPickle as pickle
+from collections import deque
+from functools import partial
 from threading import Lock
 
 from mi.core.driver_scheduler import DriverSchedulerConfigKey, TriggerType
@@ -10,7 +12,7 @@ from mi.core.instrument.port_agent_client import PortAgentPacket
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility, ParameterDictType
 from mi.core.log import get_logger, get_logging_metaclass
 from mi.core.service_registry import ConsulPersistentStore
-from mi.instrument.antelope.orb.ooicore.packet_log import PacketLog, GapException
+from mi.instrument.antelope.orb.ooicore.packet_log import PacketLog, PacketLogWriter, GapException
 from mi.core.common import BaseEnum, Units
 from mi.core.instrument.instrument_driver import SingleConnectionInstrumentDriver, DriverConfigKey
 from mi.core.instrument.instrument_driver import DriverProtocolState
@@ -104,6 +106,16 @@ class AntelopeMetadataParticle(DataParticle):
         ]
 
 
+class FlushBatch(object):
+    """
+    The writes submitted by one flush, and the ORB packet id of the last packet binned before it
+    """
+    def __init__(self, pktid):
+        self.pktid = pktid
+        self.pending = 0
+        self.failed = False
+
+
 class InstrumentDriver(SingleConnectionInstrumentDriver):
     """
     Generic antelope instrument driver
@@ -169,6 +181,13 @@ class Protocol(InstrumentProtocol):
         self._lock = Lock()
         self._pktid = None
 
+        # files are written in the background, the pktid checkpoint is only advanced
+        # once every batch up to and including it has been written
+        self._writer = PacketLogWriter()
+        self._checkpoints = deque()
+        self._checkpoint_lock = Lock()
+        self._write_error = None
+
     def _filter_capabilities(self, events):
         """
         Filter a list of events to only include valid capabilities
@@ -285,43 +304,84 @@ class Protocol(InstrumentProtocol):
         PacketLog.is_diverted = self._param_dict.get(Parameter.IS_DIVERTED)
 
     def _flush(self):
-        particles = []
+        """
+        Hand every bin with new data to the background writer. Binning continues while the files
+        are written, metadata particles are emitted and the pktid checkpoint advanced as the
+        writes complete.
+        """
+        with self._checkpoint_lock:
+            error = self._write_error
+
+        if error is not None:
+            # Ensure the current logs are clear to prevent residual data from being flushed.
+            self._driver_event(DriverAsyncEvent.ERROR, error)
+            with self._lock:
+                self._logs = {}
+                self._filled_logs = []
+            return ProtocolState.WRITE_ERROR, (ProtocolState.WRITE_ERROR, None)
+
+        writes = []
         with self._lock:
-            for _log in self._logs.itervalues():
-                try:
-                    _log.flush()
-                except InstrumentProtocolException as ex:
-                    # Ensure the current logs are clear to prevent residual data from being flushed.
-                    self._driver_event(DriverAsyncEvent.ERROR, ex)
-                    self._logs = {}
-                    self._filled_logs = []
-                    return ProtocolState.WRITE_ERROR, (ProtocolState.WRITE_ERROR, None)
-
-                particles.append(AntelopeMetadataParticle(_log, preferred_timestamp=DataParticleKey.INTERNAL_TIMESTAMP))
-
-            for _log in self._filled_logs:
-                try:
-                    _log.flush()
-                except InstrumentProtocolException as ex:
-                    # Ensure the current logs are clear to prevent residual data from being flushed.
-                    self._driver_event(DriverAsyncEvent.ERROR, ex)
-                    self._logs = {}
-                    self._filled_logs = []
-                    return ProtocolState.WRITE_ERROR, (ProtocolState.WRITE_ERROR, None)
-
-                particles.append(AntelopeMetadataParticle(_log, preferred_timestamp=DataParticleKey.INTERNAL_TIMESTAMP))
-                _log.data = []
-
+            batch = FlushBatch(self._pktid)
+            for _log in self._filled_logs + self._logs.values():
+                if _log.needs_flush:
+                    particle = AntelopeMetadataParticle(_log, preferred_timestamp=DataParticleKey.INTERNAL_TIMESTAMP)
+                    writes.append((_log.absname, _log.snapshot(), particle.generate()))
             self._filled_logs = []
-            if self._pktid is not None:
-                log.info('updating persistent store')
-                self._persistent_store['pktid'] = self._pktid
+            batch.pending = len(writes)
 
-        for particle in particles:
-            self._driver_event(DriverAsyncEvent.SAMPLE, particle.generate())
+        with self._checkpoint_lock:
+            self._checkpoints.append(batch)
 
+        # submit outside the lock, a full writer queue must not block binning
+        for absname, traces, sample in writes:
+            self._writer.submit(absname, traces, partial(self._write_complete, batch, sample))
+
+        self._advance_checkpoint()
         return None, (None, None)
 
+    def _write_complete(self, batch, sample, error):
+        """
+        Writer callback, emit the metadata particle for a written file or record the write error
+        """
+        with self._checkpoint_lock:
+            batch.pending -= 1
+            if error is not None:
+                batch.failed = True
+                self._write_error = InstrumentProtocolException('Error writing antelope data file: %s' % error)
+
+        if error is None:
+            self._driver_event(DriverAsyncEvent.SAMPLE, sample)
+            self._advance_checkpoint()
+
+    def _advance_checkpoint(self):
+        """
+        Store the pktid of the newest batch for which it and all earlier batches have been written
+        """
+        with self._checkpoint_lock:
+            pktid = None
+            while self._checkpoints and self._checkpoints[0].pending == 0:
+                if self._checkpoints[0].failed:
+                    # the data in this batch was lost, never checkpoint past it
+                    break
+                batch = self._checkpoints.popleft()
+                if batch.pktid is not None:
+                    pktid = batch.pktid
+
+            if pktid is not None:
+                log.info('updating persistent store')
+                self._persistent_store['pktid'] = pktid
+
+    def shutdown(self):
+        """
+        Write the data binned since the last flush and wait for all the files to be written
+        before the protocol is destroyed. The writer threads are daemons, any write still
+        queued when the driver process exits would be lost.
+        """
+        self._flush()
+        self._writer.stop()
+        super(Protocol, self).shutdown()
+
     # noinspection PyProtectedMember
     def _orbstart(self):
         self._connection._command_port_agent('orbselect %s' % self._param_dict.get(Parameter.SOURCE_REGEX))
@@ -2,17 +2,15 @@ import os
 import math
 import uuid
 from datetime import datetime
-from decimal import Decimal, getcontext
+from Queue import Queue
+from threading import Lock, Thread
 
-from obspy.core import Stats
 import numpy as np
-from obspy import Trace, Stream
 
 from mi.core.log import get_logger
 from mi.core.exceptions import InstrumentProtocolException
 
 log = get_logger()
-getcontext().prec = 7
 
 
 class Vector(object):
@@ -37,9 +35,14 @@ class Vector(object):
         self.index = new_index
 
     def _realloc(self, new_index):
+        if new_index < self.length:
+            return
         while new_index >= self.length:
-            self.length = int(self.length * self.factor)
-            self.backing_store.resize((self.length,))
+            self.length = max(int(self.length * self.factor), self.length + 1)
+        # copy rather than resize in place, views of the old store may still be referenced
+        backing_store = np.zeros(self.length, dtype=self.dtype)
+        backing_store[:self.index] = self.backing_store[:self.index]
+        self.backing_store = backing_store
 
     def get(self):
         return self.backing_store[:self.index]
@@ -49,6 +52,38 @@ class GapException(Exception):
     pass
 
 
+def write_traces(absname, traces):
+    """
+    Write traces to a MiniSEED file. The data is written to a temporary file and synced to disk
+    before replacing absname, so the file is complete once this returns.
+    @param absname: path of the file to write
+    @param traces: list of obspy Traces
+    """
+    from obspy import Stream
+
+    tmpname = absname + '.tmp'
+    with open(tmpname, 'wb') as fh:
+        Stream(traces).write(fh, format='MSEED')
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.rename(tmpname, absname)
+
+
+class Segment(object):
+    """
+    A run of contiguous samples in a PacketLog's sample buffer
+    """
+    __slots__ = ('starttime', 'offset', 'count')
+
+    def __init__(self, starttime, offset):
+        self.starttime = starttime
+        self.offset = offset
+        self.count = 0
+
+    def __repr__(self):
+        return 'Segment(%r, %d, %d)' % (self.starttime, self.offset, self.count)
+
+
 class PacketLogHeader(object):
     def __init__(self, net, location, station, channel, starttime, mintime, maxtime, rate, calib, calper, refdes):
         self.net = net
@@ -92,6 +127,7 @@ class PacketLogHeader(object):
 
     @property
     def stats(self):
+        from obspy.core import Stats
         return Stats({
             'network': self.net,
             'location': self.location,
@@ -117,6 +153,7 @@ class PacketLogHeader(object):
 
 
 class PacketLog(object):
+    # packets starting within this percentage of a sample period of the expected time are contiguous
     TIME_FUDGE_PCNT = 10
     base_dir = './antelope_data'
     is_diverted = False
@@ -125,7 +162,8 @@ class PacketLog(object):
         self.header = None
         self.needs_flush = False
         self.closed = False
-        self.data = Stream([])
+        self.data = None
+        self.segments = []
         self._relpath = None
 
         # Generate a UUID for this PacketLog
@@ -133,6 +171,9 @@ class PacketLog(object):
 
     def create(self, net, location, station, channel, start, mintime, maxtime, rate, calib, calper, refdes):
         self.header = PacketLogHeader(net, location, station, channel, start, mintime, maxtime, rate, calib, calper, refdes)
+        # preallocate room for every sample from the start time to the end of the bin
+        self.data = Vector(max(int(math.ceil((maxtime - start) * rate)), 0) + 1, 'i')
+        self.segments = []
         if not os.path.exists(self.abspath):
             try:
                 os.makedirs(self.abspath)
@@ -140,7 +181,6 @@ class PacketLog(object):
                 raise InstrumentProtocolException('OSError occurred while creating file path: ' + self.abspath)
         elif os.path.isfile(self.abspath):
             raise InstrumentProtocolException('Error creating file path: File exists with same name: ' + self.abspath)
-
     @staticmethod
     def from_packet(packet, bin_start, bin_end, refdes):
         packet_log = PacketLog()
@@ -186,66 +226,91 @@ class PacketLog(object):
         return os.path.join(self.base_dir, self.header.refdes, self.relname)
 
     def add_packet(self, packet):
+        """
+        Append the samples of a packet to this log. Samples are kept in a single buffer, packets
+        continuing the current segment are merged into it and a new segment is started at gaps.
+        @param packet: ORB packet dictionary
+        @retval None if the packet fit in this log, otherwise the packet holding the samples
+        past the end of the bin
+        @throws GapException if the packet does not start within this bin
+        """
+        time = packet['time']
         # If the current packet is not within the 5 min file, then move to the next 5 minute file
-        if self.header.mintime > packet['time'] or packet['time'] >= self.header.maxtime:
+        if self.header.mintime > time or time >= self.header.maxtime:
             log.info('******** GAP EXCEPTION ABOUT TO BE RAISED ********')
-            log.info('packet[\'time\']: %s' % str(packet['time']))
+            log.info('packet[\'time\']: %s' % str(time))
             log.info('starttime: %s' % str(self.header.starttime))
             log.info('mintime: %s' % str(self.header.mintime))
             log.info('maxtime: %s' % str(self.header.maxtime))
             log.info('num_samples: %s' % str(self.header.num_samples))
             raise GapException()
 
-        # Check that the packet is fully contained in the 5m file
-        packet_endtime = float(Decimal(str(packet['time'])) + (Decimal(self.header.delta) * Decimal(str(packet['nsamp']))))
-        if self.header.maxtime >= packet_endtime:
-            self._write_data(packet['data'], float(Decimal(str(packet['time']))))
+        rate = self.header.rate
+        fudge = self.TIME_FUDGE_PCNT / 100.0
+        data = packet['data']
+
+        # sample index of the packet relative to the start of the current segment
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or abs((time - segment.starttime) * rate - segment.count) > fudge:
+            segment = Segment(time, self.data.index)
+            self.segments.append(segment)
+            if len(self.segments) == 1:
+                self.header.starttime = time
+
+        # Number of samples between the packet start time and the end of the bin
+        room = max(int(math.ceil((self.header.maxtime - time) * rate - fudge)), 1)
+        if len(data) <= room:
+            self._write_data(data, segment)
             return None
 
-        # Check the time delta between the current 5m max time and packet start time
-        # Used to tell whether we are on a boundary
-        diff = Decimal(str(self.header.maxtime)) - Decimal(str(packet['time']))
-        # Check if diff is > 0
-        if float(diff) > 0:
-            log.info('maxtime: %s' % str(self.header.maxtime))
-            log.info('packet[\'time\']: %s' % str(packet['time']))
-            log.info('diff: %s' % str(diff))
-
-            # Number of samples between the packet start time and 5 min mark
-            # The maximum number of samples can be 19,200,000 for a 5 minute file, need to check this condition
-            nsamps = int(math.ceil(diff * Decimal(str(self.header.rate))))
-            log.info('nsamps before: %s' % str(nsamps))
-
-            # Write the data up to the current 5m mark
-            data_before = packet['data'][:nsamps]
-            self._write_data(data_before, float(Decimal(str(packet['time']))))
-
-            # Prepare the remaining data in the packet and send back for the next 5m file
-            packet['data'] = packet['data'][nsamps:]
-            packet['nsamp'] = len(packet['data'])
-
-            packet['time'] = float(Decimal(str(packet['time'])) + (Decimal(self.header.delta) * Decimal(str(len(data_before)))))
-            log.info('nsamps after: %s' % str(packet['nsamp']))
-            log.info('packet[\'time\'] after: %s' % str(packet['time']))
-            return packet
-        else:
-            return None
-
-    def _write_data(self, data, mintime):
-        # Append Trace to Stream
-        count = len(data)
-        # Set the number of data points in the Trace metadata
-        self.header.num_samples = count
-        # Set the Trace metadata starttime to the packet's first data point time
-        self.header.starttime = float(Decimal(str(mintime)))
-        self.data.append(Trace(np.asarray(data, dtype='i'), self.header.stats))
+        # Write the data up to the end of the bin
+        self._write_data(data[:room], segment)
+
+        # Prepare the remaining data in the packet and send back for the next bin
+        packet['data'] = data[room:]
+        packet['nsamp'] = len(packet['data'])
+        packet['time'] = segment.starttime + float(segment.count) / rate
+        log.debug('split packet at %s, %d samples remaining', packet['time'], packet['nsamp'])
+        return packet
+
+    def _write_data(self, data, segment):
+        # Append samples to the buffer, extending the segment
+        self.data.extend(np.asarray(data, dtype='i'))
+        segment.count += len(data)
+        self.header.num_samples += len(data)
         self.needs_flush = True
 
+    def _segment_traces(self):
+        from obspy import Trace
+
+        store = self.data.backing_store
+        traces = []
+        for segment in self.segments:
+            stats = self.header.stats
+            stats.starttime = segment.starttime
+            stats.npts = segment.count
+            traces.append(Trace(store[segment.offset:segment.offset + segment.count], stats))
+        return traces
+
+    def snapshot(self):
+        """
+        Capture the samples binned so far. The returned traces share this log's sample buffer,
+        which is only ever appended to, so they can be written while more packets are added.
+        @retval list of Traces, one per segment
+        """
+        self.needs_flush = False
+        return self._segment_traces()
+
     def _write_trace(self):
-        # Write multi-trace Stream to MSEED
+        # Write one Trace per contiguous segment to MSEED
+        from obspy import Stream
+
         log.info('_write_trace: Hydrophone data rate: %s' % str(self.header.rate))
-        stream = self.data
-        stream.write(self.absname, format='MSEED')
+        traces = self._segment_traces()
+        if len(traces) == 1:
+            traces[0].write(self.absname, format='MSEED')
+        else:
+            Stream(traces).write(self.absname, format='MSEED')
 
     def flush(self):
         if self.needs_flush:
@@ -253,3 +318,84 @@ class PacketLog(object):
             self._write_trace()
 
             self.needs_flush = False
+
+
+class PacketLogWriter(object):
+    """
+    Bounded pool of threads writing PacketLog snapshots to MiniSEED. Writes to the same file are
+    always handled by the same thread, so they complete in the order they were submitted. The
+    threads are started by the first write and run until stop().
+    """
+    def __init__(self, workers=2, max_pending=16):
+        """
+        @param workers: number of writer threads
+        @param max_pending: number of writes queued per thread before submit blocks
+        """
+        self._workers = workers
+        self._max_pending = max_pending
+        self._queues = []
+        self._threads = []
+        self._lock = Lock()
+
+    def _start(self):
+        self._queues = [Queue(self._max_pending) for _ in xrange(self._workers)]
+        for index, queue in enumerate(self._queues):
+            thread = Thread(target=self._run, args=(queue,), name='packet-log-writer-%d' % index)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, absname, traces, callback):
+        """
+        Queue traces to be written to absname
+        @param callback: called from the writer thread with None once the file is written,
+        or with the exception raised while writing it
+        """
+        with self._lock:
+            if not self._threads:
+                self._start()
+            queues = self._queues
+        queues[hash(absname) % len(queues)].put((absname, traces, callback))
+
+    def join(self):
+        """
+        Wait until all submitted writes have completed
+        """
+        for queue in self._queues:
+            queue.join()
+
+    def stop(self):
+        """
+        Complete the submitted writes and stop the writer threads
+        """
+        with self._lock:
+            queues, threads = self._queues, self._threads
+            self._queues, self._threads = [], []
+        for queue in queues:
+            queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def _run(queue):
+        while True:
+            item = queue.get()
+            try:
+                if item is None:
+                    return
+
+                absname, traces, callback = item
+                log.info('write: %-40s', absname)
+                error = None
+                try:
+                    write_traces(absname, traces)
+                except Exception as ex:
+                    log.exception('Error writing %s', absname)
+                    error = ex
+
+                try:
+                    callback(error)
+                except Exception:
+                    log.exception('Error in write callback for %s', absname)
+            finally:
+                queue.task_done()
@@ -1,8 +1,19 @@
+import cPickle as pickle
+import os
+import shutil
+import tempfile
+import threading
+import timeit
+
 import mock
+import numpy as np
+from obspy import read
 
 from io import BytesIO
 from unittest import TestCase
 from nose.plugins.attrib import attr
+from mi.core.instrument.instrument_driver import DriverAsyncEvent
+from mi.instrument.antelope.orb.ooicore.driver import Protocol, Parameter, ProtocolState
 from mi.instrument.antelope.orb.ooicore.packet_log import PacketLogHeader, PacketLog, GapException
 from collections import namedtuple
 
@@ -11,8 +22,9 @@ log = get_logger()
 
 __author__ = 'petercable'
 
-HeaderTuple = namedtuple('HeaderTuple', 'net, location, station, channel, starttime, maxtime, rate, calib, calper refdes')
-header_values = HeaderTuple('OO', 'XX', 'AXAS1', 'EHE', 1.0, 100.0, 200.0, 1.0, 0.0, 'refdes')
+HeaderTuple = namedtuple('HeaderTuple',
+                         'net, location, station, channel, starttime, mintime, maxtime, rate, calib, calper refdes')
+header_values = HeaderTuple('OO', 'XX', 'AXAS1', 'EHE', 1.0, 1.0, 100.0, 200.0, 1.0, 0.0, 'refdes')
 
 PacketTuple = namedtuple('PacketTuple',
                          'net, loc, sta, chan, time, rate, calib, calper, nsamp, data')
@@ -31,11 +43,11 @@ class PacketLogUnitTest(TestCase):
     def test_header_properties(self):
         header = PacketLogHeader(*header_values)
 
-        self.assertEqual(header.time, '1970-01-01T00:00:01.000000')
+        self.assertEqual(header.time, '1970-01-01T00:00:01.000000Z')
         self.assertEqual(header.delta, 1.0 / header_values.rate)
         self.assertEqual(header.name, 'OO-AXAS1-XX-EHE')
         self.assertEqual(header.endtime, header.starttime)
-        self.assertEqual(header.fname, 'OO-AXAS1-XX-EHE-1970-01-01T00:00:01.000000.mseed')
+        self.assertEqual(header.fname, 'OO-AXAS1-XX-EHE-1970-01-01T00:00:01.000000Z.mseed')
 
         # add some samples, verify the endtime advances
         header.num_samples = 200
@@ -53,7 +65,7 @@ class PacketLogUnitTest(TestCase):
         log.create(*header_values)
 
         self.assertEqual(log.absname, './antelope_data/refdes/1970/01/01/'
-                                      'OO-AXAS1-XX-EHE-1970-01-01T00:00:01.000000.mseed')
+                                      'OO-AXAS1-XX-EHE-1970-01-01T00:00:01.000000Z.mseed')
 
     def test_log_add_packet(self):
         packet_log = PacketLog()
@@ -83,15 +95,50 @@ class PacketLogUnitTest(TestCase):
             # assert Trace.write was called
             mocked_write.assert_called_once_with(packet_log.absname, format='MSEED')
 
-    def test_packet_gap_exception(self):
+    def test_packet_gap_segment(self):
         log = PacketLog()
-        log.filehandle = BytesIO()
         log.create(*header_values)
 
         log.add_packet(packet_values._asdict())
+        log.add_packet(gap_packet_values._asdict())
 
-        with self.assertRaises(GapException):
+        self.assertEqual([(seg.starttime, seg.offset, seg.count) for seg in log.segments],
+                         [(1.0, 0, 5), (50.0, 5, 5)])
+        self.assertEqual(log.header.num_samples, 10)
+
+    def test_contiguous_packets(self):
+        log = PacketLog()
+        log.create(*header_values)
+
+        # consecutive packets, with timestamps jittered by less than the fudge factor
+        for i, jitter in enumerate([0, 0.0001, -0.0002, 0.0003]):
+            packet = packet_values._replace(time=1.0 + i * 5 / 200.0 + jitter, data=range(i * 5, i * 5 + 5))
+            self.assertIsNone(log.add_packet(packet._asdict()))
+
+        self.assertEqual(len(log.segments), 1)
+        self.assertEqual(log.segments[0].count, 20)
+        self.assertEqual(list(log.data.get()), range(20))
+
+    def test_flush_segments(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            PacketLog.base_dir = tempdir
+            log = PacketLog()
+            log.create(*header_values)
+            log.add_packet(packet_values._asdict())
+            log.add_packet(packet_values._replace(time=1.025)._asdict())
             log.add_packet(gap_packet_values._asdict())
+            log.flush()
+
+            stream = read(log.absname)
+            self.assertEqual(len(stream), 2)
+            self.assertEqual(list(stream[0].data), [1, 2, 3, 4, 5] * 2)
+            self.assertEqual(stream[0].stats.starttime.timestamp, 1.0)
+            self.assertEqual(stream[1].stats.starttime.timestamp, 50.0)
+            self.assertEqual(stream[1].stats.npts, 5)
+        finally:
+            PacketLog.base_dir = './antelope_data'
+            shutil.rmtree(tempdir)
 
     def test_packet_range_exceptions(self):
         log = PacketLog()
@@ -128,3 +175,157 @@ class PacketLogUnitTest(TestCase):
         # assert our container is full
         self.assertEqual(log.header.num_samples, 200 * 99)
         self.assertEqual(log.header.endtime, 100.0)
+
+
+class PacketBinningTestCase(TestCase):
+    """
+    Replays ORB packets through the driver protocol, writing to a temporary directory
+    """
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.protocol = Protocol(mock.Mock())
+        self.thread_count = threading.active_count()
+        self.protocol._param_dict.set_value(Parameter.REFDES, 'refdes')
+        self.protocol._persistent_store = {}
+        PacketLog.base_dir = self.tempdir
+
+    def tearDown(self):
+        self.protocol._writer.stop()
+        PacketLog.base_dir = './antelope_data'
+        shutil.rmtree(self.tempdir)
+
+    @staticmethod
+    def make_packets(rate, nsamp, count, start=1400000000.0, gaps=()):
+        """
+        Build pickled ORB packets of consecutive samples, skipping the packet numbers in gaps
+        """
+        packets = []
+        for i in xrange(count):
+            if i in gaps:
+                continue
+            packets.append(pickle.dumps({
+                'net': 'OO', 'loc': '', 'sta': 'HYEA1', 'chan': 'HDH', 'pktid': i,
+                'time': start + float(i * nsamp) / rate, 'samprate': rate, 'calib': 1.0, 'calper': 1.0,
+                'nsamp': nsamp, 'data': range(i * nsamp, (i + 1) * nsamp),
+            }, pickle.HIGHEST_PROTOCOL))
+        return packets
+
+    def replay(self, packets):
+        for packet in packets:
+            self.protocol._bin_data(pickle.loads(packet))
+        result = self.protocol._flush()
+        self.protocol._writer.join()
+        return result
+
+    def samples(self):
+        return [c[0][1] for c in self.protocol._driver_event.call_args_list
+                if c[0][0] == DriverAsyncEvent.SAMPLE]
+
+    def read_contiguous(self):
+        return read(os.path.join(self.tempdir, 'refdes', '2014', '05', '13',
+                                 'OO-HYEA1--HDH-2014-05-13T16:50:00.000000Z.mseed'))
+
+
+@attr('UNIT', group='mi')
+class PacketBinningUnitTest(PacketBinningTestCase):
+    def test_bin_boundary(self):
+        # 200 Hz bins are one day long, start 2 seconds before midnight
+        start = 86400 * 16204 - 2.0
+        self.replay(self.make_packets(200.0, 100, 8, start=start, gaps=(6,)))
+
+        self.assertEqual(len(self.samples()), 2)
+
+        first = read(os.path.join(self.tempdir, 'refdes', '2014', '05', '13',
+                                  'OO-HYEA1--HDH-2014-05-13T00:00:00.000000Z.mseed'))
+        self.assertEqual(len(first), 1)
+        self.assertEqual(list(first[0].data), range(400))
+
+        second = read(os.path.join(self.tempdir, 'refdes', '2014', '05', '14',
+                                   'OO-HYEA1--HDH-2014-05-14T00:00:00.000000Z.mseed'))
+        self.assertEqual(len(second), 2)
+        self.assertEqual(list(second[0].data), range(400, 600))
+        self.assertEqual(second[0].stats.starttime.timestamp, start + 2.0)
+        self.assertEqual(list(second[1].data), range(700, 800))
+        self.assertEqual(self.protocol._persistent_store['pktid'], 7)
+
+    def test_background_write(self):
+        packets = self.make_packets(200.0, 100, 4)
+        release = threading.Event()
+        written = []
+
+        def blocked_write(absname, traces):
+            release.wait(5)
+            written.append(absname)
+
+        with mock.patch('mi.instrument.antelope.orb.ooicore.packet_log.write_traces', blocked_write):
+            for packet in packets[:2]:
+                self.protocol._bin_data(pickle.loads(packet))
+            self.assertEqual(self.protocol._flush(), (None, (None, None)))
+
+            # binning continues while the writer is busy, nothing is published until the file is written
+            for packet in packets[2:]:
+                self.protocol._bin_data(pickle.loads(packet))
+            self.assertEqual(self.samples(), [])
+            self.assertNotIn('pktid', self.protocol._persistent_store)
+
+            release.set()
+            self.protocol._writer.join()
+            self.assertEqual(len(written), 1)
+            self.assertEqual(len(self.samples()), 1)
+            self.assertEqual(self.protocol._persistent_store['pktid'], 1)
+
+            self.protocol._flush()
+            self.protocol._writer.join()
+            self.assertEqual(len(self.samples()), 2)
+            self.assertEqual(self.protocol._persistent_store['pktid'], 3)
+
+    def test_write_error(self):
+        with mock.patch('mi.instrument.antelope.orb.ooicore.packet_log.write_traces',
+                        mock.Mock(side_effect=IOError('disk full'))):
+            self.assertEqual(self.replay(self.make_packets(200.0, 100, 4)), (None, (None, None)))
+
+        self.assertEqual(self.samples(), [])
+        self.assertNotIn('pktid', self.protocol._persistent_store)
+        self.assertEqual(self.protocol._flush(), (ProtocolState.WRITE_ERROR, (ProtocolState.WRITE_ERROR, None)))
+        self.assertEqual(self.protocol._logs, {})
+
+    def test_shutdown(self):
+        """
+        Shutting down the protocol writes the binned data and stops the writer threads
+        """
+        for packet in self.make_packets(200.0, 100, 4):
+            self.protocol._bin_data(pickle.loads(packet))
+        self.assertEqual(threading.active_count(), self.thread_count)
+
+        self.protocol.shutdown()
+        self.assertEqual(threading.active_count(), self.thread_count)
+        self.assertEqual(len(self.samples()), 1)
+        self.assertEqual(self.protocol._persistent_store['pktid'], 3)
+
+        written = [name for _, _, files in os.walk(self.tempdir) for name in files]
+        self.assertEqual(len(written), 1)
+        self.assertTrue(written[0].endswith('.mseed'))
+
+    def test_contiguous_packets(self):
+        """
+        Replay 64 kHz hydrophone packets through the driver, they are written as a single trace
+        """
+        nsamp, count = 1280, 50
+        self.replay(self.make_packets(64000.0, nsamp, count))
+
+        stream = self.read_contiguous()
+        self.assertEqual(len(stream), 1)
+        self.assertTrue(np.array_equal(stream[0].data, np.arange(count * nsamp)))
+
+
+@attr('BENCHMARK', group='mi')
+class PacketBinningBenchmark(PacketBinningTestCase):
+    def test_binning_benchmark(self):
+        """
+        Replay 64 kHz hydrophone packets through the driver and flush them to disk
+        """
+        rate, nsamp, count = 64000.0, 1280, 500
+        packets = self.make_packets(rate, nsamp, count)
+        elapsed = timeit.timeit(lambda: self.replay(packets), number=1)
+        log.info('binned and flushed %d packets (%d samples) in %.3f s', count, count * nsamp, elapsed)
+        self.assertEqual(len(self.read_contiguous()), 1)
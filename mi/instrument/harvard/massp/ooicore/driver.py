@@ -217,6 +217,9 @@ class InstrumentDriver(SingleConnectionInstrumentDriver):
 
     def _handler_inst_disconnected_connect(self, *args, **kwargs):
         self._build_protocol()
+        self._protocol.set_stream_filter(self._stream_filter)
+        for protocol in self._slave_protocols.values():
+            protocol.set_stream_filter(self._stream_filter)
         self.set_init_params({})
         for name, connection in self._connection.items():
             self._slave_protocols[name]._connection = connection
@@ -45,7 +45,6 @@ from mi.instrument.kut.ek60.ooicore.zplsc_echogram import SAMPLE_MATCHER, \
     CONFIG_HEADER_SIZE,\
     CONFIG_TRANSDUCER_SIZE, \
     read_config_header
-from mi.common.zpls_plot import ZPLSPlot
 
 log = get_logger()
 __author__ = 'Ronald Ronquillo'
@@ -477,6 +476,7 @@ def parse_particles_file(input_file_path, output_file_path=None):
 
         log.info('Begin generating echogram: %r', image_path)
 
+        from mi.common.zpls_plot import ZPLSPlot
         plot = ZPLSPlot(data_times, power_data_dict, frequencies, 0, max_depth * bin_size)
         plot.generate_plots()
         plot.write_image(image_path)
@@ -9,12 +9,6 @@ Release notes:
 This class supports the generation of ZPLSC echograms.
 """
 
-import matplotlib
-
-matplotlib.use("Agg")
-
-from matplotlib.dates import date2num
-
 from datetime import datetime
 
 import re
@@ -33,8 +27,8 @@ TRANSDUCER_1 = 'Transducer # 1: '
 TRANSDUCER_2 = 'Transducer # 2: '
 TRANSDUCER_3 = 'Transducer # 3: '
 
-# Reference time "seconds since 1900-01-01 00:00:00"
-REF_TIME = date2num(datetime(1900, 1, 1, 0, 0, 0))
+# Reference time "seconds since 1900-01-01 00:00:00", as a matplotlib date number
+REF_TIME = float(datetime(1900, 1, 1, 0, 0, 0).toordinal())
 
 # set global regex expressions to find all sample, annotation and NMEA sentences
 SAMPLE_REGEX = r'RAW\d{1}'
@@ -14,8 +14,8 @@ __license__ = 'Apache 2.0'
 from mi.core.persistent_store import PersistentStoreDict
 
 class PpsdnPersistentStoreDict(PersistentStoreDict):
-    def __init__(self, reference_designator, host = "127.0.0.1", port = "5432"):
-        PersistentStoreDict.__init__(self, "ppsdn", reference_designator, host, port)
+    def __init__(self, reference_designator, host = "127.0.0.1", port = "5432", **kwargs):
+        PersistentStoreDict.__init__(self, "ppsdn", reference_designator, host, port, **kwargs)
         self.CURRENT_FILTER_KEY = u"CURRENT_FILTER"
         self.TOTAL_FILTERS_KEY = u"TOTAL_FILTERS"
 
@@ -14,8 +14,8 @@ __license__ = 'Apache 2.0'
 from mi.core.persistent_store import PersistentStoreDict
 
 class RasflPersistentStoreDict(PersistentStoreDict):
-    def __init__(self, reference_designator, host = "127.0.0.1", port = "5432"):
-        PersistentStoreDict.__init__(self, "rasfl", reference_designator, host, port)
+    def __init__(self, reference_designator, host = "127.0.0.1", port = "5432", **kwargs):
+        PersistentStoreDict.__init__(self, "rasfl", reference_designator, host, port, **kwargs)
         self.CURRENT_COLLECTION_BAG_KEY = u"CURRENT_COLLECTION_BAG"
         self.TOTAL_COLLECTION_BAGS_KEY = u"TOTAL_COLLECTION_BAGS"
 
@@ -38,6 +38,7 @@ from mi.core.instrument.protocol_param_dict import ProtocolParameterDict
 from mi.core.log import get_logger, get_logging_metaclass
 from mi.instrument.nortek import common
 from mi.instrument.nortek.particles import validate_checksum
+from mi.instrument.nortek.scanner import NortekRecordScanner
 from mi.instrument.nortek.user_configuration import UserConfigKey, UserConfiguration, UserConfigCompositeKey
 
 __author__ = 'Rachel Manoni, Ronald Ronquillo'
@@ -45,6 +46,9 @@ __license__ = 'Apache 2.0'
 
 log = get_logger()
 
+# command responses common to all Nortek instruments
+NORTEK_SCANNER = NortekRecordScanner([], common.NORTEK_COMMON_REGEXES)
+
 
 class ParameterConstraint(BaseEnum):
     """
@@ -440,15 +444,7 @@ class NortekInstrumentProtocol(CommandResponseInstrumentProtocol):
         The method that detects data sample structures from instrument
         Should be in the format [[structure_sync_bytes, structure_len]*]
         """
-        return_list = []
-        sieve_matchers = common.NORTEK_COMMON_REGEXES
-
-        for matcher in sieve_matchers:
-            for match in matcher.finditer(raw_data):
-                return_list.append((match.start(), match.end()))
-                log.debug("sieve_function: regex found %r", raw_data[match.start():match.end()])
-
-        return return_list
+        return NORTEK_SCANNER.sieve(raw_data)
 
     ########################################################################
     # overridden superclass methods
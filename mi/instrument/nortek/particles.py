@@ -1,8 +1,11 @@
 import base64
+import re
 import struct
 from collections import namedtuple
 from datetime import datetime
 
+import numpy as np
+
 from mi.core.common import BaseEnum
 from mi.core.exceptions import SampleException
 from mi.core.instrument.data_particle import DataParticle, CommonDataParticleType, DataParticleKey, DataParticleValue
@@ -23,6 +26,39 @@ def validate_checksum(str_struct, raw_data, offset=-2):
     return True
 
 
+def unpack_record(raw_data, unpack_string, checksum_struct):
+    """
+    Unpack a binary record and validate its checksum.  Records found by the record scanner have already
+    been decoded, their fields and checksum result are used instead.
+    @param raw_data the record
+    @param unpack_string struct format of the whole record
+    @param checksum_struct struct format of the words the checksum is computed over
+    @retval tuple of (fields, checksum valid)
+    """
+    fields = getattr(raw_data, 'fields', None)
+    if fields is not None:
+        return fields, raw_data.checksum_valid
+    return struct.unpack(unpack_string, raw_data), validate_checksum(checksum_struct, raw_data)
+
+
+STRUCT_DTYPES = {'B': 'u1', 'b': 'i1', 'H': '<u2', 'h': '<i2', 'I': '<u4', 'i': '<i4'}
+
+
+def dtype_from_struct(unpack_string):
+    """
+    Build the numpy dtype of a little endian struct format.  Records read through the dtype convert
+    to the same tuples as struct.unpack, strings are read as void so no bytes are stripped.
+    """
+    formats = []
+    for count, code in re.findall(r'(\d*)([a-zA-Z])', unpack_string.lstrip('<')):
+        count = int(count or 1)
+        if code == 's':
+            formats.append('V%d' % count)
+        else:
+            formats.extend([STRUCT_DTYPES[code]] * count)
+    return np.dtype([('f%d' % index, dtype) for index, dtype in enumerate(formats)])
+
+
 def unpack_from_format(name, unpack_format, data):
     format_string = ''.join([item[1] for item in unpack_format])
     fields = [item[0] for item in unpack_format]
@@ -432,6 +468,8 @@ class VectorVelocityDataParticle(DataParticle):
     Routine for parsing velocity data into a data particle structure for the Vector sensor.
     """
     _data_particle_type = VectorDataParticleType.VELOCITY
+    _unpack_string = '<2s4B2H3h6BH'
+    _record_dtype = dtype_from_struct(_unpack_string)
 
     def _build_parsed_values(self):
         """
@@ -443,14 +481,14 @@ class VectorVelocityDataParticle(DataParticle):
 
         try:
 
-            unpack_string = '<2s4B2H3h6BH'
+            fields, checksum_valid = unpack_record(self.raw_data, self._unpack_string, '<11H')
 
             (sync_id, analog_input2_lsb, count, pressure_msb, analog_input2_msb, pressure_lsw,
              analog_input1, velocity_beam1, velocity_beam2, velocity_beam3, amplitude_beam1,
              amplitude_beam2, amplitude_beam3, correlation_beam1, correlation_beam2,
-             correlation_beam3, checksum) = struct.unpack(unpack_string, self.raw_data)
+             correlation_beam3, checksum) = fields
 
-            if not validate_checksum('<11H', self.raw_data):
+            if not checksum_valid:
                 log.warn("Failed checksum in %s from instrument (%r)", self._data_particle_type, self.raw_data)
                 self.contents[DataParticleKey.QUALITY_FLAG] = DataParticleValue.CHECKSUM_FAILED
 
@@ -498,6 +536,8 @@ class VectorVelocityHeaderDataParticle(DataParticle):
     Routine for parsing velocity header data into a data particle structure for the Vector sensor.
     """
     _data_particle_type = VectorDataParticleType.VELOCITY_HEADER
+    _unpack_string = '<4s6sH8B20sH'
+    _record_dtype = dtype_from_struct(_unpack_string)
 
     def _build_parsed_values(self):
         """
@@ -508,11 +548,11 @@ class VectorVelocityHeaderDataParticle(DataParticle):
         log.debug('VectorVelocityHeaderDataParticle: raw data =%r', self.raw_data)
 
         try:
-            unpack_string = '<4s6sH8B20sH'
+            fields, checksum_valid = unpack_record(self.raw_data, self._unpack_string, '<20H')
             sync, timestamp, number_of_records, noise1, noise2, noise3, _, correlation1, correlation2, correlation3, _,\
-                _, cksum = struct.unpack(unpack_string, self.raw_data)
+                _, cksum = fields
 
-            if not validate_checksum('<20H', self.raw_data):
+            if not checksum_valid:
                 log.warn("Failed checksum in %s from instrument (%r)", self._data_particle_type, self.raw_data)
                 self.contents[DataParticleKey.QUALITY_FLAG] = DataParticleValue.CHECKSUM_FAILED
 
@@ -557,6 +597,8 @@ class VectorSystemDataParticle(DataParticle):
     Routine for parsing system data into a data particle structure for the Vector sensor.
     """
     _data_particle_type = VectorDataParticleType.SYSTEM
+    _unpack_string = '<4s6s2H4h2bHH'
+    _record_dtype = dtype_from_struct(_unpack_string)
 
     def _build_parsed_values(self):
         """
@@ -568,12 +610,12 @@ class VectorSystemDataParticle(DataParticle):
 
         try:
 
-            unpack_string = '<4s6s2H4h2bHH'
+            fields, checksum_valid = unpack_record(self.raw_data, self._unpack_string, '<13H')
 
             (sync, timestamp, battery, sound_speed, heading, pitch,
-             roll, temperature, error, status, analog_input, cksum) = struct.unpack_from(unpack_string, self.raw_data)
+             roll, temperature, error, status, analog_input, cksum) = fields
 
-            if not validate_checksum('<13H', self.raw_data):
+            if not checksum_valid:
                 log.warn("Failed checksum in %s from instrument (%r)", self._data_particle_type, self.raw_data)
                 self.contents[DataParticleKey.QUALITY_FLAG] = DataParticleValue.CHECKSUM_FAILED
 
@@ -0,0 +1,230 @@
+"""
+@package mi.instrument.nortek.scanner
+@file mi/instrument/nortek/scanner.py
+@brief Vectorized scanner for Nortek binary data records
+
+Binary data records start with the sync byte 0xa5 followed by a record id byte and end with a checksum
+word.  The scanner finds all sync/id pairs of a buffer in one pass, validates the checksums of all records
+of a type at once and decodes them into a numpy structured array, so particles are built from the decoded
+fields rather than unpacking each record again.
+"""
+import bisect
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from mi.core.instrument.chunker import StringChunker
+from mi.core.log import get_logger
+from mi.instrument.nortek import common
+
+log = get_logger()
+
+SYNC_BYTE = 0xa5
+
+# all command responses matched by the regexes end with an acknowledgement
+ACK = '\x06\x06'
+
+# below this many sync bytes in a buffer, records are decoded one at a time as numpy's per call
+# overhead outweighs decoding them together
+BATCH_MIN_CANDIDATES = 16
+
+
+class NortekRecordType(namedtuple('NortekRecordType', 'particle_class, regex, sync, require_checksum')):
+    """
+    A binary record type.  sync holds the sync byte, the id byte and optionally the record size word.
+    The record is decoded with the particle class's _record_dtype, which covers the whole record.
+    Records failing the checksum are dropped if require_checksum is set, otherwise the particle flags them.
+    """
+
+    @property
+    def id(self):
+        return ord(self.sync[1])
+
+    @property
+    def size(self):
+        return self.particle_class._record_dtype.itemsize
+
+    @property
+    def checksum_struct(self):
+        return '<%dH' % (self.size / 2 - 1)
+
+
+class NortekRecord(str):
+    """
+    The bytes of a binary record found by the scanner, carrying its type, decoded fields and checksum result.
+    """
+
+    def __new__(cls, data, record_type, fields, checksum_valid):
+        record = str.__new__(cls, data)
+        record.record_type = record_type
+        record.fields = fields
+        record.checksum_valid = checksum_valid
+        return record
+
+
+class NortekRecordScanner(object):
+    """
+    Finds binary records and regex matched command responses in a buffer.
+    """
+
+    def __init__(self, record_types, regexes=()):
+        """
+        @param record_types list of NortekRecordType to find
+        @param regexes list of compiled regexes of command responses, each must contain an ACK
+        """
+        self.record_types = record_types
+        self.regexes = regexes
+        self._types_by_id = {record_type.id: record_type for record_type in record_types}
+        self._offsets = {record_type: np.arange(record_type.size) for record_type in record_types}
+
+    def scan(self, raw_data):
+        """
+        Find the records in a buffer.  Records of the same type don't overlap, the first one found wins.
+        @param raw_data the buffer
+        @retval list of (start, end, record) tuples sorted by start, where record is a NortekRecord for
+        binary records and None for regex matches
+        """
+        matches = []
+
+        if self.record_types and len(raw_data) > 1:
+            data = np.frombuffer(raw_data, dtype=np.uint8)
+            starts = np.flatnonzero(data[:-1] == SYNC_BYTE)
+            if len(starts) < BATCH_MIN_CANDIDATES:
+                matches.extend(self._unpack_records(raw_data, starts.tolist()))
+            else:
+                ids = data[starts + 1]
+                for record_type in self.record_types:
+                    matches.extend(self._scan_records(raw_data, data, starts[ids == record_type.id], record_type))
+
+        # skip the regexes when no command response can be present
+        if self.regexes and ACK in raw_data:
+            for regex in self.regexes:
+                for match in regex.finditer(raw_data):
+                    log.debug("scan: regex found %r", match.group())
+                    matches.append((match.start(), match.end(), None))
+
+        matches.sort(key=lambda match: match[:2])
+        return matches
+
+    def sieve(self, raw_data):
+        """
+        Sieve function for a StringChunker.
+        @retval list of (start, end) tuples of the records found
+        """
+        return [(start, end) for start, end, _ in self.scan(raw_data)]
+
+    def _unpack_records(self, raw_data, starts):
+        """
+        Validate and decode the candidate records of all types one at a time.
+        @param starts indices of the sync bytes
+        """
+        matches = []
+        ends = dict.fromkeys(self.record_types, 0)
+        for start in starts:
+            record_type = self._types_by_id.get(ord(raw_data[start + 1]))
+            if record_type is None or start < ends[record_type] or not raw_data.startswith(record_type.sync, start):
+                continue
+            end = start + record_type.size
+            record = raw_data[start:end]
+            if len(record) < record_type.size:
+                continue
+
+            checksum_valid = (common.CHECK_SUM_SEED + sum(struct.unpack_from(record_type.checksum_struct, record))) \
+                & 0xffff == struct.unpack_from('<H', record, -2)[0]
+            if record_type.require_checksum and not checksum_valid:
+                continue
+
+            fields = struct.unpack(record_type.particle_class._unpack_string, record)
+            matches.append((start, end, NortekRecord(record, record_type, fields, checksum_valid)))
+            ends[record_type] = end
+        return matches
+
+    def _scan_records(self, raw_data, data, starts, record_type):
+        """
+        Validate and decode the candidate records of one type together.
+        @param data the buffer as a uint8 array
+        @param starts indices of the sync bytes followed by the record type's id
+        """
+        size = record_type.size
+        starts = starts[starts <= len(data) - size]
+        for offset in xrange(2, len(record_type.sync)):
+            starts = starts[data[starts + offset] == ord(record_type.sync[offset])]
+        if not len(starts):
+            return []
+
+        records = data[starts[:, np.newaxis] + self._offsets[record_type]]
+        words = records.view('<u2')
+        checksum_valid = (words[:, :-1].sum(axis=1) + common.CHECK_SUM_SEED) & 0xffff == words[:, -1]
+        if record_type.require_checksum:
+            starts = starts[checksum_valid]
+            records = records[checksum_valid]
+            checksum_valid = checksum_valid[checksum_valid]
+
+        keep = self._non_overlapping(starts, size)
+        if keep is not None:
+            starts = starts[keep]
+            records = records[keep]
+            checksum_valid = checksum_valid[keep]
+
+        fields = records.view(record_type.particle_class._record_dtype).ravel().tolist()
+        return [(start, start + size, NortekRecord(raw_data[start:start + size], record_type, record_fields, valid))
+                for start, record_fields, valid in zip(starts.tolist(), fields, checksum_valid.tolist())]
+
+    @staticmethod
+    def _non_overlapping(starts, size):
+        """
+        @retval index array of the records which don't overlap a previous record, or None if none overlap
+        """
+        if len(starts) < 2 or (starts[1:] - starts[:-1]).min() >= size:
+            return None
+
+        keep = []
+        end = 0
+        for index, start in enumerate(starts.tolist()):
+            if start >= end:
+                keep.append(index)
+                end = start + size
+        return np.array(keep, dtype=np.intp)
+
+
+class NortekRecordChunker(StringChunker):
+    """
+    Chunker yielding the records found by a NortekRecordScanner.  Binary records are passed on as the
+    NortekRecord instances made by the scanner, regex matches as strings.
+    """
+
+    def __init__(self, scanner, max_buff_size=8192):
+        super(NortekRecordChunker, self).__init__(scanner.sieve, max_buff_size)
+        self.scanner = scanner
+
+    def _make_chunks(self):
+        """
+        Scan the buffer and generate a chunk (timestamp, data) for each non-overlapping record found.
+        Prune the buffer to the end of the last record.
+        """
+        end = 0
+        overlaps = 0
+        timestamp_stops = [timestamp_stop for _, timestamp_stop, _ in self.timestamps]
+
+        for start, stop, record in self.scanner.scan(self.buffer):
+            if start < end:
+                overlaps += 1
+                continue
+
+            index = bisect.bisect_right(timestamp_stops, start)
+            if index < len(self.timestamps):
+                timestamp = self.timestamps[index][2]
+            else:
+                log.error('Failed to find timestamp for chunk!')
+                timestamp = 0
+
+            self.chunks.append((timestamp, record if record is not None else self.buffer[start:stop]))
+            end = stop
+
+        if overlaps:
+            log.error('Found %d overlapping matches from record scanner', overlaps)
+
+        if end > 0:
+            self._rebase_times(end)
+            self.buffer = self.buffer[end:]
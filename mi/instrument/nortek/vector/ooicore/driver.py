@@ -12,7 +12,6 @@ from datetime import datetime
 import os
 import re
 
-from mi.core.instrument.chunker import StringChunker
 from mi.core.instrument.data_particle import DataParticleKey
 from mi.core.instrument.instrument_driver import DriverAsyncEvent, SingleConnectionInstrumentDriver
 from mi.core.instrument.protocol_param_dict import ParameterDictVisibility
@@ -20,12 +19,12 @@ from mi.core.log import get_logger
 from mi.instrument.nortek import common
 from mi.instrument.nortek.driver import InstrumentPrompts, Parameter
 from mi.instrument.nortek.driver import NortekInstrumentProtocol
-from mi.instrument.nortek.driver import validate_checksum
 from mi.instrument.nortek.particles import (VectorVelocityDataParticle, VectorSystemDataParticle,
                                             VectorVelocityHeaderDataParticle, VectorHardwareConfigDataParticle,
                                             VectorEngIdDataParticle, VectorEngBatteryDataParticle,
                                             VectorEngClockDataParticle, VectorUserConfigDataParticle,
                                             VectorHeadConfigDataParticle, VectorDataParticleType)
+from mi.instrument.nortek.scanner import NortekRecordType, NortekRecordScanner, NortekRecordChunker
 
 log = get_logger()
 
@@ -48,6 +47,15 @@ VELOCITY_HEADER_DATA_REGEX = re.compile(VELOCITY_HEADER_DATA_PATTERN, re.DOTALL)
 
 VECTOR_SAMPLE_REGEX = [VELOCITY_DATA_REGEX, SYSTEM_DATA_REGEX, VELOCITY_HEADER_DATA_REGEX]
 
+# two sync bytes are not enough for an accurate match, velocity records must have a valid checksum
+VELOCITY_RECORD = NortekRecordType(VectorVelocityDataParticle, VELOCITY_DATA_REGEX, VELOCITY_DATA_SYNC_BYTES, True)
+SYSTEM_RECORD = NortekRecordType(VectorSystemDataParticle, SYSTEM_DATA_REGEX, SYSTEM_DATA_SYNC_BYTES, False)
+VELOCITY_HEADER_RECORD = NortekRecordType(VectorVelocityHeaderDataParticle, VELOCITY_HEADER_DATA_REGEX,
+                                          VELOCITY_HEADER_DATA_SYNC_BYTES, False)
+
+VECTOR_SCANNER = NortekRecordScanner([VELOCITY_RECORD, SYSTEM_RECORD, VELOCITY_HEADER_RECORD],
+                                     common.NORTEK_COMMON_REGEXES)
+
 
 ###############################################################################
 # Driver
@@ -91,7 +99,7 @@ class Protocol(NortekInstrumentProtocol):
         NortekInstrumentProtocol.__init__(self, prompts, newline, driver_event)
 
         # create chunker for processing instrument samples.
-        self._chunker = StringChunker(self.sieve_function)
+        self._chunker = NortekRecordChunker(VECTOR_SCANNER)
         self.velocity_sync_bytes = VELOCITY_DATA_SYNC_BYTES
         self.status_particles = [VectorDataParticleType.CLOCK, VectorDataParticleType.HARDWARE_CONFIG,
                                  VectorDataParticleType.HEAD_CONFIG, VectorDataParticleType.USER_CONFIG]
@@ -103,28 +111,19 @@ class Protocol(NortekInstrumentProtocol):
         The method that detects data sample structures from instrument
         Should be in the format [[structure_sync_bytes, structure_len]*]
         """
-        return_list = []
-        sieve_matchers = common.NORTEK_COMMON_REGEXES + VECTOR_SAMPLE_REGEX
-
-        for matcher in sieve_matchers:
-            for match in matcher.finditer(raw_data):
-                if matcher == VELOCITY_DATA_REGEX:
-                    # two bytes is not enough for an accurate match
-                    # check for a valid checksum
-                    data = raw_data[match.start():match.end()]
-                    if validate_checksum('<11H', data):
-                        return_list.append((match.start(), match.end()))
-                else:
-                    return_list.append((match.start(), match.end()))
-                    log.debug("sieve_function: regex found %r", raw_data[match.start():match.end()])
-
-        return return_list
+        return VECTOR_SCANNER.sieve(raw_data)
 
     def _got_chunk(self, structure, timestamp):
         """
         The base class got_data has gotten a structure from the chunker.  Pass it to extract_sample
-        with the appropriate particle objects and REGEXes.
+        with the appropriate particle objects and REGEXes.  Binary records found by the scanner
+        already carry their type.
         """
+        record_type = getattr(structure, 'record_type', None)
+        if record_type is not None:
+            self._extract_sample(record_type.particle_class, record_type.regex, structure, timestamp)
+            return
+
         if any((
                 self._extract_sample(VectorHardwareConfigDataParticle, common.HARDWARE_CONFIG_DATA_REGEX, structure,
                                      timestamp),
@@ -203,8 +202,10 @@ class PlaybackProtocol(Protocol):
         The base class got_data has gotten a structure from the chunker.  Pass it to extract_sample
         with the appropriate particle objects and REGEXes.
         """
-        if self._extract_sample(VectorVelocityDataParticle, VELOCITY_DATA_REGEX, structure,
-                                timestamp, internal_timestamp=self.last_header_timestamp):
+        # only velocity records take the timestamp of the last header
+        if getattr(structure, 'record_type', VELOCITY_RECORD) is VELOCITY_RECORD and \
+                self._extract_sample(VectorVelocityDataParticle, VELOCITY_DATA_REGEX, structure,
+                                     timestamp, internal_timestamp=self.last_header_timestamp):
             return
         super(PlaybackProtocol, self)._got_chunk(structure, timestamp)
 
@@ -4,24 +4,30 @@
 @author Bill Bollenbacher
 @brief Test cases for ooicore driver
 """
+import struct
 import time
+from functools import partial
 
 import ntplib
 from mi.core.exceptions import SampleException
 from mi.core.instrument.chunker import StringChunker
 from mi.core.instrument.data_particle import DataParticleKey, DataParticleValue
-from mi.core.instrument.instrument_driver import DriverConfigKey
+from mi.core.instrument.instrument_driver import DriverAsyncEvent, DriverConfigKey
+from mi.core.instrument.port_agent_client import PortAgentPacket
 from mi.core.time_tools import timegm_to_float
+from mi.core.unit_test import MiUnitTest
 from mi.idk.unit_test import InstrumentDriverTestCase
 from mi.idk.unit_test import ParameterTestConfigKey
 from mi.instrument.nortek import common
-from mi.instrument.nortek.driver import ProtocolEvent, Parameter, EngineeringParameter, ProtocolState
+from mi.instrument.nortek.driver import ProtocolEvent, Parameter, EngineeringParameter, ProtocolState, InstrumentPrompts
 from mi.instrument.nortek.particles import (VectorDataParticleType, VectorVelocityDataParticleKey,
                                             VectorVelocityHeaderDataParticleKey, VectorSystemDataParticleKey,
                                             VectorVelocityHeaderDataParticle, VectorVelocityDataParticle,
                                             VectorSystemDataParticle)
-from mi.instrument.nortek.test.test_driver import NortekUnitTest, NortekIntTest, DriverTestMixinSub, bad_sample
-from mi.instrument.nortek.vector.ooicore.driver import Protocol
+from mi.instrument.nortek.scanner import NortekRecordChunker
+from mi.instrument.nortek.test.test_driver import (NortekUnitTest, NortekIntTest, DriverTestMixinSub, bad_sample,
+                                                   hw_config_sample)
+from mi.instrument.nortek.vector.ooicore.driver import Protocol, PlaybackProtocol, VECTOR_SCANNER
 from mi.logging import log
 from nose.plugins.attrib import attr
 
@@ -51,6 +57,16 @@ def velocity_sample():
     sample_as_hex = "a51000db00008f10000049f041f72303303132120918d8f7"
     return sample_as_hex.decode('hex')
 
+
+def velocity_record(count):
+    """
+    The velocity sample with another ensemble count and a valid checksum
+    """
+    data = bytearray(velocity_sample())
+    data[3] = count % 256
+    data[22:] = struct.pack('<H', (common.CHECK_SUM_SEED + sum(struct.unpack_from('<11H', str(data)))) & 0xffff)
+    return str(data)
+
 # these values checkout against the sample above
 velocity_particle = [{VID: VectorVelocityDataParticleKey.ANALOG_INPUT2, VAL: 0},
                      {VID: VectorVelocityDataParticleKey.COUNT, VAL: 219},
@@ -100,6 +116,56 @@ system_particle = [{VID: VectorSystemDataParticleKey.TIMESTAMP, VAL: '2012-12-13
                    {VID: VectorSystemDataParticleKey.STATUS, VAL: 123},
                    {VID: VectorSystemDataParticleKey.ANALOG_INPUT, VAL: 0}]
 
+# protocols decoding a velocity stream, live and playback
+RECORD_PROTOCOLS = [('live', partial(Protocol, InstrumentPrompts, common.NEWLINE)), ('playback', PlaybackProtocol)]
+
+
+def velocity_stream(seconds):
+    """
+    Build a stream of 64 Hz velocity data, each second preceded by a velocity header and a system record
+    @param seconds  number of seconds of data
+    @retval tuple of the stream and the number of records in it
+    """
+    stream = ''.join(velocity_header_sample() + system_sample() +
+                     ''.join(velocity_record(count) for count in xrange(64)) for _ in xrange(seconds))
+    return stream, seconds * 66
+
+
+def stream_packets(stream, size=1024):
+    """
+    Split a stream into port agent packets
+    @param stream  instrument data
+    @param size  bytes of data per packet
+    @retval list of port agent packets
+    """
+    packets = []
+    for index in xrange(0, len(stream), size):
+        packet = PortAgentPacket()
+        packet.attach_data(stream[index:index + size])
+        packet.attach_timestamp(3555423720.711772)
+        packet.pack_header()
+        packets.append(packet)
+    return packets
+
+
+def protocol_particles(protocol_class, packets):
+    """
+    Feed packets through a protocol
+    @param protocol_class  callable building the protocol from an event callback
+    @param packets  port agent packets
+    @retval list of the sample particles published
+    """
+    particles = []
+
+    def got_event(event_type, value=None):
+        if event_type == DriverAsyncEvent.SAMPLE:
+            particles.append(value)
+
+    protocol = protocol_class(got_event)
+    for packet in packets:
+        protocol.got_data(packet)
+    return particles
+
 
 #################################### RULES ####################################
 #                                                                             #
@@ -346,6 +412,52 @@ class UnitFromIDK(NortekUnitTest):
         self.assert_chunker_sample_with_noise(chunker, system_sample())
         self.assert_chunker_sample_with_noise(chunker, velocity_header_sample())
 
+    def test_record_scanner(self):
+        """
+        Verify the record scanner finds each record of a fragmented stream, drops velocity records
+        failing the checksum and decodes records to the same particles as the record bytes alone
+        """
+        bad_system = system_sample()[:-1] + '\x00'
+        bad_velocity = velocity_record(200)[:-1] + '\x00'
+        records = [velocity_header_sample(), system_sample()] + [velocity_record(count) for count in xrange(100)] + \
+            [bad_system, hw_config_sample()]
+        stream = 'noise'.join(records[:2]) + ''.join(records[2:52]) + bad_velocity + ''.join(records[52:])
+
+        chunker = NortekRecordChunker(VECTOR_SCANNER)
+        chunks = []
+        for index in xrange(0, len(stream), 100):
+            chunker.add_chunk(stream[index:index + 100], index)
+            timestamp, chunk = chunker.get_next_data()
+            while chunk:
+                chunks.append(chunk)
+                timestamp, chunk = chunker.get_next_data()
+
+        self.assertEqual(chunks, records)
+        self.assertFalse(hasattr(chunks[-1], 'record_type'))
+
+        for chunk in chunks[:-1]:
+            decoded = chunk.record_type.particle_class(chunk, port_timestamp=3555423720.711772).generate()
+            unpacked = chunk.record_type.particle_class(str(chunk), port_timestamp=3555423720.711772).generate()
+            for key in [DataParticleKey.VALUES, DataParticleKey.QUALITY_FLAG, DataParticleKey.INTERNAL_TIMESTAMP]:
+                self.assertEqual(decoded.get(key), unpacked.get(key))
+        self.assertEqual(decoded[DataParticleKey.QUALITY_FLAG], DataParticleValue.CHECKSUM_FAILED)
+
+    def test_record_scanner_protocols(self):
+        """
+        Verify the live and playback protocols publish a particle for each record of a packetized stream
+        """
+        stream, records = velocity_stream(10)
+
+        chunker = NortekRecordChunker(VECTOR_SCANNER, max_buff_size=len(stream))
+        for index in xrange(0, len(stream), 1024):
+            chunker.add_chunk(stream[index:index + 1024], index)
+        self.assertEqual(len(chunker.chunks), records)
+
+        packets = stream_packets(stream)
+        for name, protocol_class in RECORD_PROTOCOLS:
+            particles = protocol_particles(protocol_class, packets)
+            self.assertEqual(len(particles), records, name)
+
     def test_corrupt_data_structures(self):
         """
         Verify when generating the particle, if the particle is corrupt, an exception is raised
@@ -363,6 +475,27 @@ class UnitFromIDK(NortekUnitTest):
             particle.generate()
 
 
+@attr('BENCHMARK', group='mi')
+class BenchmarkFromIDK(MiUnitTest):
+    def test_record_scanner(self):
+        """
+        Measure record scanning and particle throughput for ten minutes of 64 Hz velocity data
+        """
+        stream, records = velocity_stream(600)
+
+        chunker = NortekRecordChunker(VECTOR_SCANNER, max_buff_size=len(stream))
+        start = time.time()
+        for index in xrange(0, len(stream), 1024):
+            chunker.add_chunk(stream[index:index + 1024], index)
+        log.info('record scanner: %.0f records/s', records / (time.time() - start))
+
+        packets = stream_packets(stream)
+        for name, protocol_class in RECORD_PROTOCOLS:
+            start = time.time()
+            particles = protocol_particles(protocol_class, packets)
+            log.info('%s protocol: %.0f particles/s', name, len(particles) / (time.time() - start))
+
+
 ###############################################################################
 #                            INTEGRATION TESTS                                #
 #     Integration test test the direct driver / instrument interaction        #
@@ -1548,8 +1548,7 @@ class SBE16Protocol(CommandResponseInstrumentProtocol):
         if prompt not in [Prompt.COMMAND, Prompt.EXECUTED]:
             raise InstrumentProtocolException('Command not recognized: %s.' % response)
 
-        for line in response.split(NEWLINE):
-            self._param_dict.update(line)
+        self._param_dict.update_lines(response, NEWLINE)
 
         return response
 
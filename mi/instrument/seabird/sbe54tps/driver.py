@@ -1421,14 +1421,12 @@ class Protocol(SeaBirdProtocol):
 
         log.debug("Run status command: %s" % InstrumentCommands.GET_STATUS_DATA)
         response = self._do_cmd_resp(InstrumentCommands.GET_STATUS_DATA, timeout=timeout)
-        for line in response.split(NEWLINE):
-            self._param_dict.update(line)
+        self._param_dict.update_lines(response, NEWLINE)
         log.debug("status command response: %r" % response)
 
         log.debug("Run configure command: %s" % InstrumentCommands.GET_CONFIGURATION_DATA)
         response = self._do_cmd_resp(InstrumentCommands.GET_CONFIGURATION_DATA, timeout=timeout)
-        for line in response.split(NEWLINE):
-            self._param_dict.update(line)
+        self._param_dict.update_lines(response, NEWLINE)
         log.debug("configure command response: %r" % response)
 
         # Get new param dict config. If it differs from the old config,
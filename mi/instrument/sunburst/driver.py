@@ -47,6 +47,7 @@ from mi.core.exceptions import InstrumentProtocolException
 from mi.core.exceptions import InstrumentParameterException
 from mi.core.exceptions import NotImplementedException
 from mi.core.exceptions import SampleException
+from mi.core.hex_record import HexRecordLayout
 
 __author__ = 'Chris Wingard, Stuart Pearce & Kevin Stiemke'
 __license__ = 'Apache 2.0'
@@ -406,6 +407,36 @@ class SamiRegularStatusDataParticleKey(BaseEnum):
     UNIQUE_ID = 'unique_id'
 
 
+# Status flags, in bit order from the least significant bit of the two byte
+# status bit field.
+SAMI_REGULAR_STATUS_FLAGS = [SamiRegularStatusDataParticleKey.CLOCK_ACTIVE,
+                             SamiRegularStatusDataParticleKey.RECORDING_ACTIVE,
+                             SamiRegularStatusDataParticleKey.RECORD_END_ON_TIME,
+                             SamiRegularStatusDataParticleKey.RECORD_MEMORY_FULL,
+                             SamiRegularStatusDataParticleKey.RECORD_END_ON_ERROR,
+                             SamiRegularStatusDataParticleKey.DATA_DOWNLOAD_OK,
+                             SamiRegularStatusDataParticleKey.FLASH_MEMORY_OPEN,
+                             SamiRegularStatusDataParticleKey.BATTERY_LOW_PRESTART,
+                             SamiRegularStatusDataParticleKey.BATTERY_LOW_MEASUREMENT,
+                             SamiRegularStatusDataParticleKey.BATTERY_LOW_BANK,
+                             SamiRegularStatusDataParticleKey.BATTERY_LOW_EXTERNAL,
+                             SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE1_FAULT,
+                             SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE2_FAULT,
+                             SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE3_FAULT,
+                             SamiRegularStatusDataParticleKey.FLASH_ERASED,
+                             SamiRegularStatusDataParticleKey.POWER_ON_INVALID]
+
+# Layout of the regular status message following the ':' identifier
+SAMI_REGULAR_STATUS_BIT_FIELD = 'status_bit_field'
+SAMI_REGULAR_STATUS_LAYOUT = HexRecordLayout([
+    (SamiRegularStatusDataParticleKey.ELAPSED_TIME_CONFIG, 4),
+    (SAMI_REGULAR_STATUS_BIT_FIELD, 2),
+    (SamiRegularStatusDataParticleKey.NUM_DATA_RECORDS, 3),
+    (SamiRegularStatusDataParticleKey.NUM_ERROR_RECORDS, 3),
+    (SamiRegularStatusDataParticleKey.NUM_BYTES_STORED, 3),
+    (SamiRegularStatusDataParticleKey.UNIQUE_ID, 1)])
+
+
 class SamiRegularStatusDataParticle(DataParticle):
     """
     Routines for parsing raw data into an regular status data particle
@@ -438,62 +469,26 @@ class SamiRegularStatusDataParticle(DataParticle):
             raise SampleException("No regex match of parsed sample data: [%s]" %
                                   self.decoded_raw)
 
-        particle_keys = [SamiRegularStatusDataParticleKey.ELAPSED_TIME_CONFIG,
-                         SamiRegularStatusDataParticleKey.CLOCK_ACTIVE,
-                         SamiRegularStatusDataParticleKey.RECORDING_ACTIVE,
-                         SamiRegularStatusDataParticleKey.RECORD_END_ON_TIME,
-                         SamiRegularStatusDataParticleKey.RECORD_MEMORY_FULL,
-                         SamiRegularStatusDataParticleKey.RECORD_END_ON_ERROR,
-                         SamiRegularStatusDataParticleKey.DATA_DOWNLOAD_OK,
-                         SamiRegularStatusDataParticleKey.FLASH_MEMORY_OPEN,
-                         SamiRegularStatusDataParticleKey.BATTERY_LOW_PRESTART,
-                         SamiRegularStatusDataParticleKey.BATTERY_LOW_MEASUREMENT,
-                         SamiRegularStatusDataParticleKey.BATTERY_LOW_BANK,
-                         SamiRegularStatusDataParticleKey.BATTERY_LOW_EXTERNAL,
-                         SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE1_FAULT,
-                         SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE2_FAULT,
-                         SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE3_FAULT,
-                         SamiRegularStatusDataParticleKey.FLASH_ERASED,
-                         SamiRegularStatusDataParticleKey.POWER_ON_INVALID,
-                         SamiRegularStatusDataParticleKey.NUM_DATA_RECORDS,
-                         SamiRegularStatusDataParticleKey.NUM_ERROR_RECORDS,
-                         SamiRegularStatusDataParticleKey.NUM_BYTES_STORED,
-                         SamiRegularStatusDataParticleKey.UNIQUE_ID]
-
-        result = []
-        grp_index = 1  # used to index through match groups, starting at 1
-        bit_index = 0  # used to index through the bit fields represented by
-        # the two bytes after CLOCK_ACTIVE.
-
-        for key in particle_keys:
-            if key in [SamiRegularStatusDataParticleKey.CLOCK_ACTIVE,
-                       SamiRegularStatusDataParticleKey.RECORDING_ACTIVE,
-                       SamiRegularStatusDataParticleKey.RECORD_END_ON_TIME,
-                       SamiRegularStatusDataParticleKey.RECORD_MEMORY_FULL,
-                       SamiRegularStatusDataParticleKey.RECORD_END_ON_ERROR,
-                       SamiRegularStatusDataParticleKey.DATA_DOWNLOAD_OK,
-                       SamiRegularStatusDataParticleKey.FLASH_MEMORY_OPEN,
-                       SamiRegularStatusDataParticleKey.BATTERY_LOW_PRESTART,
-                       SamiRegularStatusDataParticleKey.BATTERY_LOW_MEASUREMENT,
-                       SamiRegularStatusDataParticleKey.BATTERY_LOW_BANK,
-                       SamiRegularStatusDataParticleKey.BATTERY_LOW_EXTERNAL,
-                       SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE1_FAULT,
-                       SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE2_FAULT,
-                       SamiRegularStatusDataParticleKey.EXTERNAL_DEVICE3_FAULT,
-                       SamiRegularStatusDataParticleKey.FLASH_ERASED,
-                       SamiRegularStatusDataParticleKey.POWER_ON_INVALID]:
-                # if the keys match values represented by the bits in the two
-                # byte status flags value, parse bit-by-bit using the bit-shift
-                # operator to determine the boolean value.
-                result.append({DataParticleKey.VALUE_ID: key,
-                               DataParticleKey.VALUE: int(bool(int(matched.group(2), 16) & (1 << bit_index)))})
-                bit_index += 1  # bump the bit index
-                grp_index = 3  # set the right group index for when we leave this part of the loop.
-            else:
-                # otherwise all values in the string are parsed to integers
-                result.append({DataParticleKey.VALUE_ID: key,
-                               DataParticleKey.VALUE: int(matched.group(grp_index), 16)})
-                grp_index += 1
+        # decode the whole message at once
+        record = SAMI_REGULAR_STATUS_LAYOUT.decode(self.raw_data[matched.start(1):matched.end(6)])
+
+        result = [{DataParticleKey.VALUE_ID: SamiRegularStatusDataParticleKey.ELAPSED_TIME_CONFIG,
+                   DataParticleKey.VALUE: record[SamiRegularStatusDataParticleKey.ELAPSED_TIME_CONFIG]}]
+
+        # the values represented by the bits in the two byte status flags
+        # value are parsed bit-by-bit using the bit-shift operator to
+        # determine the boolean value.
+        status_bit_field = record[SAMI_REGULAR_STATUS_BIT_FIELD]
+        for bit_index, key in enumerate(SAMI_REGULAR_STATUS_FLAGS):
+            result.append({DataParticleKey.VALUE_ID: key,
+                           DataParticleKey.VALUE: int(bool(status_bit_field & (1 << bit_index)))})
+
+        for key in [SamiRegularStatusDataParticleKey.NUM_DATA_RECORDS,
+                    SamiRegularStatusDataParticleKey.NUM_ERROR_RECORDS,
+                    SamiRegularStatusDataParticleKey.NUM_BYTES_STORED,
+                    SamiRegularStatusDataParticleKey.UNIQUE_ID]:
+            result.append({DataParticleKey.VALUE_ID: key,
+                           DataParticleKey.VALUE: record[key]})
 
         return result
 
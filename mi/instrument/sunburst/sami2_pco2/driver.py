@@ -13,6 +13,7 @@ Release notes:
 from mi.core.log import get_logger
 from mi.core.exceptions import SampleException
 from mi.core.exceptions import InstrumentTimeoutException
+from mi.core.hex_record import HexRecordLayout
 
 from mi.core.common import BaseEnum, Units
 from mi.core.instrument.data_particle import DataParticle
@@ -204,6 +205,19 @@ class Pco2wSamiSampleDataParticleKey(BaseEnum):
     CHECKSUM = 'checksum'
 
 
+# Layout of the sample record following the '*' identifier
+PCO2W_SAMPLE_LAYOUT = HexRecordLayout([
+    (Pco2wSamiSampleDataParticleKey.UNIQUE_ID, 1),
+    (Pco2wSamiSampleDataParticleKey.RECORD_LENGTH, 1),
+    (Pco2wSamiSampleDataParticleKey.RECORD_TYPE, 1),
+    (Pco2wSamiSampleDataParticleKey.RECORD_TIME, 4),
+    # 14 light measurements
+    (Pco2wSamiSampleDataParticleKey.LIGHT_MEASUREMENTS, 2, 14),
+    (Pco2wSamiSampleDataParticleKey.VOLTAGE_BATTERY, 2),
+    (Pco2wSamiSampleDataParticleKey.THERMISTER_RAW, 2),
+    (Pco2wSamiSampleDataParticleKey.CHECKSUM, 1)])
+
+
 class Pco2wSamiSampleDataParticle(DataParticle):
     """
     Routines for parsing raw data into a SAMI2-PCO2 sample data particle
@@ -234,32 +248,12 @@ class Pco2wSamiSampleDataParticle(DataParticle):
             raise SampleException("No regex match of parsed sample data: [%s]" %
                                   self.decoded_raw)
 
-        particle_keys = [Pco2wSamiSampleDataParticleKey.UNIQUE_ID,
-                         Pco2wSamiSampleDataParticleKey.RECORD_LENGTH,
-                         Pco2wSamiSampleDataParticleKey.RECORD_TYPE,
-                         Pco2wSamiSampleDataParticleKey.RECORD_TIME,
-                         Pco2wSamiSampleDataParticleKey.LIGHT_MEASUREMENTS,
-                         Pco2wSamiSampleDataParticleKey.VOLTAGE_BATTERY,
-                         Pco2wSamiSampleDataParticleKey.THERMISTER_RAW,
-                         Pco2wSamiSampleDataParticleKey.CHECKSUM]
+        # decode the whole record at once, the light measurements into a list
+        record = PCO2W_SAMPLE_LAYOUT.decode(self.raw_data[matched.start(1):matched.end(8)])
 
-        result = []
-        grp_index = 1
-
-        for key in particle_keys:
-            if key in [Pco2wSamiSampleDataParticleKey.LIGHT_MEASUREMENTS]:
-                # parse group 5 into 14, 2 byte (4 character) values stored in
-                # an array.
-                light = matched.group(grp_index)
-                light = [int(light[i:i + 4], 16) for i in xrange(0, len(light), 4)]
-                result.append({DataParticleKey.VALUE_ID: key,
-                               DataParticleKey.VALUE: light})
-            else:
-                result.append({DataParticleKey.VALUE_ID: key,
-                               DataParticleKey.VALUE: int(matched.group(grp_index), 16)})
-            grp_index += 1
-
-        return result
+        return [{DataParticleKey.VALUE_ID: key,
+                 DataParticleKey.VALUE: record[key]}
+                for key in PCO2W_SAMPLE_LAYOUT.names]
 
 
 class Pco2wSamiSampleCalibrationDataParticle(Pco2wSamiSampleDataParticle):
@@ -19,6 +19,7 @@ import time
 from mi.core.log import get_logger
 from mi.core.exceptions import SampleException
 from mi.core.exceptions import InstrumentTimeoutException
+from mi.core.hex_record import HexRecordLayout
 
 from mi.core.common import BaseEnum, Units
 from mi.core.instrument.chunker import StringChunker
@@ -249,6 +250,24 @@ class PhsenSamiSampleDataParticleKey(BaseEnum):
     CHECKSUM = 'checksum'
 
 
+# Layout of the sample record following the '*' identifier, the reserved
+# word is skipped
+PHSEN_SAMPLE_LAYOUT = HexRecordLayout([
+    (PhsenSamiSampleDataParticleKey.UNIQUE_ID, 1),
+    (PhsenSamiSampleDataParticleKey.RECORD_LENGTH, 1),
+    (PhsenSamiSampleDataParticleKey.RECORD_TYPE, 1),
+    (PhsenSamiSampleDataParticleKey.RECORD_TIME, 4),
+    (PhsenSamiSampleDataParticleKey.START_THERMISTOR, 2),
+    # 16 reference light measurements
+    (PhsenSamiSampleDataParticleKey.REF_MEASUREMENTS, 2, 16),
+    # 92 ph measurements (23 sets of 4 measurement types)
+    (PhsenSamiSampleDataParticleKey.PH_MEASUREMENTS, 2, 92),
+    (None, 2),
+    (PhsenSamiSampleDataParticleKey.VOLTAGE_BATTERY, 2),
+    (PhsenSamiSampleDataParticleKey.END_THERMISTOR, 2),
+    (PhsenSamiSampleDataParticleKey.CHECKSUM, 1)])
+
+
 class PhsenSamiSampleDataParticle(DataParticle):
     """
     Routines for parsing raw data into a SAMI2-PH sample data particle
@@ -267,60 +286,12 @@ class PhsenSamiSampleDataParticle(DataParticle):
             raise SampleException("No regex match of parsed sample data: [%s]" %
                                   self.decoded_raw)
 
-        particle_keys = [PhsenSamiSampleDataParticleKey.UNIQUE_ID,
-                         PhsenSamiSampleDataParticleKey.RECORD_LENGTH,
-                         PhsenSamiSampleDataParticleKey.RECORD_TYPE,
-                         PhsenSamiSampleDataParticleKey.RECORD_TIME,
-                         PhsenSamiSampleDataParticleKey.START_THERMISTOR,
-                         PhsenSamiSampleDataParticleKey.REF_MEASUREMENTS,
-                         PhsenSamiSampleDataParticleKey.PH_MEASUREMENTS,
-                         PhsenSamiSampleDataParticleKey.RESERVED_UNUSED,
-                         PhsenSamiSampleDataParticleKey.VOLTAGE_BATTERY,
-                         PhsenSamiSampleDataParticleKey.END_THERMISTOR,
-                         PhsenSamiSampleDataParticleKey.CHECKSUM]
-
-        result = []
-        grp_index = 1  # regex group index counter
-        unhex = lambda x: int(x, 16)
-
-        # Create secondary regexes to read the ref set and ph set into
-        # lists before putting into the data particle.
-
-        # From the regex data sample match, group 5 is a set of 16
-        # reference light measurements, and group 6 is a set of 92 light
-        # measurements from which determines pH
-        ref_measurements_string = matched.groups()[5]
-        ph_measurements_string = matched.groups()[6]
-
-        # 16 reference light measurements each 2 bytes (4 hex digits)
-        ref_regex = r'([0-9A-Fa-f]{4})' * 16
-        ref_regex_matcher = re.compile(ref_regex)
-        ref_match = ref_regex_matcher.match(ref_measurements_string)
-        ref_measurements = map(unhex, list(ref_match.groups()))
-
-        # 92 ph measurements (23 sets of 4 measurement types)
-        # each 2 bytes (4 hex digits)
-        ph_regex = r'([0-9A-Fa-f]{4})' * 92
-        ph_regex_matcher = re.compile(ph_regex)
-        ph_match = ph_regex_matcher.match(ph_measurements_string)
-        ph_measurements = map(unhex, list(ph_match.groups()))
-
-        # fill out the data particle with values
-        for key in particle_keys:
-            if key is PhsenSamiSampleDataParticleKey.REF_MEASUREMENTS:
-                result.append({DataParticleKey.VALUE_ID: key,
-                               DataParticleKey.VALUE: ref_measurements})
-            elif key is PhsenSamiSampleDataParticleKey.PH_MEASUREMENTS:
-                result.append({DataParticleKey.VALUE_ID: key,
-                               DataParticleKey.VALUE: ph_measurements})
-            elif key is PhsenSamiSampleDataParticleKey.RESERVED_UNUSED:
-                pass
-            else:
-                result.append({DataParticleKey.VALUE_ID: key,
-                               DataParticleKey.VALUE: unhex(matched.group(grp_index))})
-            grp_index += 1
+        # decode the whole record at once, the light measurements into lists
+        record = PHSEN_SAMPLE_LAYOUT.decode(self.raw_data[matched.start(1):matched.end(11)])
 
-        return result
+        return [{DataParticleKey.VALUE_ID: key,
+                 DataParticleKey.VALUE: record[key]}
+                for key in PHSEN_SAMPLE_LAYOUT.names]
 
 
 class PhsenConfigDataParticleKey(SamiConfigDataParticleKey):
@@ -6,7 +6,6 @@
 Release notes:
 """
 
-from collections import namedtuple
 import functools
 import random
 import sqlite3
@@ -27,6 +26,7 @@ from mi.core.instrument.instrument_driver import DriverConnectionState
 from mi.core.exceptions import InstrumentParameterException, SampleException
 from mi.core.instrument.driver_dict import DriverDictKey
 from mi.core.instrument.protocol_param_dict import ProtocolParameterDict
+from mi.core.instrument.particle_schema import load_paramdefs, load_paramdicts
 import mi.core.log
 
 __author__ = 'Pete Cable'
@@ -36,41 +36,6 @@ log = mi.core.log.get_logger()
 META_LOGGER = mi.core.log.get_logging_metaclass('trace')
 NEWLINE = '\n'
 
-# Preload helper items
-
-STREAM_SELECT = '''
-SELECT stream.name as name, parameter_id FROM stream JOIN stream_parameter ON stream.id=stream_id
-'''
-
-PARAMDEF_SELECT = """
- select parameter.id, name, parameter_type.value, value_encoding.value
- from parameter, value_encoding, parameter_type
- where parameter_type_id=parameter_type.id and value_encoding_id=value_encoding.id
-"""
-
-ParameterDef = namedtuple('ParameterDef', 'id, name, parameter_type, value_encoding')
-StreamParam = namedtuple('Stream', 'name, parameter_id')
-
-
-def load_paramdefs(conn):
-    log.debug('Loading Parameter Definitions')
-    c = conn.cursor()
-    c.execute(PARAMDEF_SELECT)
-    params = map(ParameterDef._make, c.fetchall())
-    return {x.id: x for x in params}
-
-
-def load_paramdicts(conn):
-    log.debug('Loading Streams')
-    c = conn.cursor()
-    c.execute(STREAM_SELECT)
-    stream_params = map(StreamParam._make, c.fetchall())
-    paramdict = {}
-    for each in stream_params:
-        paramdict.setdefault(each.name, []).append(each.parameter_id)
-    return paramdict
-
-
 class Parameter(BaseEnum):
     pass
 
@@ -7,9 +7,6 @@ from functools import wraps
 
 import click as click
 import datetime
-import pandas as pd
-import xarray as xr
-import numpy as np
 
 from mi.core.log import get_logger, LoggerManager
 
@@ -112,12 +109,16 @@ class ParticleHandler(object):
 
     @log_timing
     def to_dataframes(self):
+        import pandas as pd
+
         data_frames = {}
         for particle_type in self.samples:
             data_frames[particle_type] = self.fix_arrays(pd.DataFrame(self.samples[particle_type]))
         return data_frames
 
     def to_datasets(self):
+        import pandas as pd
+
         datasets = {}
         for particle_type in self.samples:
             datasets[particle_type] = self.fix_arrays(pd.DataFrame(self.samples[particle_type]), return_as_xr=True)
@@ -126,6 +127,9 @@ class ParticleHandler(object):
     @staticmethod
     @log_timing
     def fix_arrays(data_frame, return_as_xr=False):
+        import numpy as np
+        import xarray as xr
+
         # round-trip the dataframe through xray to get the multidimensional indexing correct
         new_ds = xr.Dataset()
         for each in data_frame: